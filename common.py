@@ -124,7 +124,7 @@ def parse_parameters():
     parser.add_argument('-e', help = 'The dirname of indexing folder.')
     parser.add_argument('-k', default = '10', help = 'Number of retrieved images.')
     parser.add_argument('-r', default = '32', help = 'Number of dimensions randomly sampled.')
-    parser.add_argument('-c', default = 'n', help = 'Whether to perform compressing step.')
+    parser.add_argument('-c', default = 'n', help = 'Whether to perform compressing step. "m" merges the index shards into the compressed index without loading them.')
     parser.add_argument('-q', default = 'n', help = 'Whether to sequentially sampling.')
     parser.add_argument('-p', default = 'n', help = 'Whether to perform querying in compressed domain.')
     parser.add_argument('-g', default = 'y', help = 'GPU mode. default is "yes".')
@@ -163,17 +163,20 @@ def init_lsh(args):
 
 def run(args, lsh):
 
-    if args.c == 'y':
+    if args.c == 'y' or args.c == 'm':
         if args.e != None and args.s == 'random':
-            lsh.load_index(args.e)
             print "compressing index..."
-            lsh.compress_index(args.e)
+            if args.c == 'm':
+                lsh.merge_compress_index(args.e)
+            else:
+                lsh.load_index(args.e)
+                lsh.compress_index(args.e)
             print "compressing done."
         else:
             print "Please specify generated indexing file."
             sys.exit(0)
 
-    if args.c != 'y' and args.i != 'y' and args.e != None and args.s == 'random':
+    if args.c not in ['y', 'm'] and args.i != 'y' and args.e != None and args.s == 'random':
         if args.p == 'y':
             print "loading compressed index."
             lsh.load_compress_index(args.e, (args.l == 'y'))
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+
+# Converts index files written in the boost text archive format (e.g. compressed.cdict)
+# to the binary index format, which load_compress_* reads without parsing.
+
+import fastdict
+import argparse
+
+converters = {
+    'int': fastdict.convert_compress_int,
+    'int32': fastdict.convert_compress_uint32_int,
+    'int8': fastdict.convert_compress_uint32_int8,
+    'string': fastdict.convert_compress_uint32_string,
+}
+
+parser = argparse.ArgumentParser(description = 'Convert a text index file to the binary index format.')
+parser.add_argument('-f', help = 'The filename of the text index.')
+parser.add_argument('-o', help = 'The filename of the binary index.')
+parser.add_argument('-t', default = 'int32', choices = sorted(converters.keys()), help = 'Dict type. int is FastCompressIntDict, the others FastCompressUInt32*Dict as in the -t option of the index scripts.')
+args = parser.parse_args()
+
+converters[args.t](args.f, args.o)
@@ -71,6 +71,7 @@ def init():
     parser.add_argument('-l', default = 'n', help = 'VLQ base64 mode. Load VLQ base64 encoding compressed dict.')
     parser.add_argument('-b', default = '1', help = 'Expanding level of search buckets.')
     parser.add_argument('-t', default = 'int32', help = 'FastDict type (int32, int8, string).')
+    parser.add_argument('-m', default = 'n', help = 'Whether to memory-map the binary compressed index read-only instead of loading it (int32, int8).')
  
     args = parser.parse_args()
  
@@ -89,7 +90,7 @@ def init():
     if args.c != 'y' and args.i != 'y' and args.e != None and args.s == 'random':
         if args.p == 'y':
             print "loading compressed index."
-            lsh.load_compress_index(args.e, (args.l == 'y'))
+            lsh.load_compress_index(args.e, (args.l == 'y'), (args.m == 'y'))
             print "loading done."
         else:
             print "loading index."
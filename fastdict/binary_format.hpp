@@ -0,0 +1,361 @@
+#ifndef FASTDICT_BINARY_FORMAT_HPP
+#define FASTDICT_BINARY_FORMAT_HPP
+
+// binary_format.hpp:
+// versioned binary index file, an alternative to the boost text archives of
+// save/save_compress which write every code and run count as decimal text.
+//
+// File layout (host byte order, i.e. little-endian on x86):
+//
+//   BinaryHeader          64 bytes, magic "FDBINIDX", version, dict status,
+//                         widths of BitCountType/IdType, index_key_dimension
+//   sections              flat arrays, each aligned to BINARY_ALIGNMENT bytes
+//   directory             num_sections BinarySection entries at directory_offset
+//
+// A section is identified by its tag, i.e. BINARY_TABLE_* * 16 + BINARY_*.
+// Every bucket table (raw dict, column_dict, column_vlq_dict,
+// column_hybrid_dict) is stored in CSR form:
+//
+//   KEYS            uint32, sorted sampled keys (the key directory)
+//   BUCKET_OFFSETS  uint64, bucket i owns ids [BUCKET_OFFSETS[i], BUCKET_OFFSETS[i + 1])
+//   IDS             IdType, or ID_OFFSETS (uint64) + IDS (bytes) for string ids
+//   CODES           uint64 binary codes (raw dict only)
+//   COLUMN_OFFSETS  uint64, bucket i owns columns [COLUMN_OFFSETS[i], COLUMN_OFFSETS[i + 1])
+//   RUN_OFFSETS     uint64, column j owns RUNS [RUN_OFFSETS[j], RUN_OFFSETS[j + 1])
+//   RUNS            run counts, VLQ base64 characters or hybrid container bytes. run counts
+//                   are stored as uint8, uint16 or uint32, the narrowest holding all of them
+//   COLUMN_TYPES    uint8 container type of each hybrid column
+//
+// A renumbered runtime dict adds the ID_RANGES table: KEYS and BUCKET_OFFSETS, the
+// internal ids of bucket i are [BUCKET_OFFSETS[i], BUCKET_OFFSETS[i + 1]).
+//
+// so the sections can be used in place from a read-only mmap of the file.
+
+#include <stdint.h>
+#include <string.h>
+#include <string>
+#include <vector>
+#include <fstream>
+#include <stdexcept>
+#include <algorithm>
+
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+
+static const char BINARY_MAGIC[8] = {'F', 'D', 'B', 'I', 'N', 'I', 'D', 'X'};
+static const uint32_t BINARY_FORMAT_VERSION = 1;
+static const uint64_t BINARY_ALIGNMENT = 64;
+
+enum BinaryTable {
+    BINARY_TABLE_GLOBAL = 0,
+    BINARY_TABLE_RAW = 1,
+    BINARY_TABLE_COLUMN = 2,
+    BINARY_TABLE_VLQ = 3,
+    BINARY_TABLE_HYBRID = 4,
+    BINARY_TABLE_ID_RANGES = 5
+};
+
+enum BinarySectionKind {
+    BINARY_KEY_DIMENSIONS = 1,
+    BINARY_KEYS = 2,
+    BINARY_BUCKET_OFFSETS = 3,
+    BINARY_IDS = 4,
+    BINARY_ID_OFFSETS = 5,
+    BINARY_CODES = 6,
+    BINARY_COLUMN_OFFSETS = 7,
+    BINARY_RUN_OFFSETS = 8,
+    BINARY_RUNS = 9,
+    BINARY_COLUMN_TYPES = 10
+};
+
+inline uint32_t binary_tag(uint32_t table, uint32_t kind) {
+    return table * 16 + kind;
+}
+
+struct BinaryHeader
+{
+    char magic[8];
+    uint32_t version;
+    int32_t dict_status;
+    uint8_t bit_count_bytes;        // sizeof(BitCountType), 0 for FastDict
+    uint8_t id_bytes;               // sizeof(IdType), 0 for string ids
+    uint8_t index_key_dimension;
+    uint8_t reserved_byte;
+    uint32_t num_sections;
+    uint64_t directory_offset;
+    uint64_t reserved[4];
+};
+
+struct BinarySection
+{
+    uint32_t tag;
+    uint32_t element_bytes;
+    uint64_t offset;                // from the beginning of the file
+    uint64_t count;                 // number of elements
+};
+
+// true if filename starts with BINARY_MAGIC
+inline bool is_binary_index(const char* filename) {
+    std::ifstream ifs(filename, std::ios::binary);
+    char magic[8];
+    if (!ifs.read(magic, sizeof(magic)))
+        return false;
+    return memcmp(magic, BINARY_MAGIC, sizeof(magic)) == 0;
+}
+
+// writes the sections one after another through a buffer, the header and
+// the directory are written by close()
+class BinaryWriter
+{
+
+public:
+
+    BinaryWriter(const char* filename, const BinaryHeader& header) : header(header), position(0), ofs(filename, std::ios::binary | std::ios::trunc) {
+        if (!ofs)
+            throw std::runtime_error(std::string("cannot open ") + filename + " for writing");
+        memcpy(this->header.magic, BINARY_MAGIC, sizeof(BINARY_MAGIC));
+        this->header.version = BINARY_FORMAT_VERSION;
+        // the header is rewritten by close()
+        write_bytes(&this->header, sizeof(BinaryHeader));
+    }
+
+    void begin_section(uint32_t tag, uint32_t element_bytes) {
+        pad();
+        BinarySection section;
+        section.tag = tag;
+        section.element_bytes = element_bytes;
+        section.offset = position;
+        section.count = 0;
+        sections.push_back(section);
+    }
+
+    // append count elements of the current section
+    void write(const void* data, uint64_t count) {
+        sections.back().count += count;
+        write_bytes(data, count * sections.back().element_bytes);
+    }
+
+    template <class T>
+    void write_value(const T& value) {
+        write(&value, 1);
+    }
+
+    // a whole section in one call
+    template <class T>
+    void write_section(uint32_t tag, const std::vector<T>& values) {
+        begin_section(tag, sizeof(T));
+        if (values.size() > 0)
+            write(&values[0], values.size());
+    }
+
+    void close() {
+        pad();
+        header.num_sections = sections.size();
+        header.directory_offset = position;
+        if (sections.size() > 0)
+            write_bytes(&sections[0], sections.size() * sizeof(BinarySection));
+        flush();
+
+        ofs.seekp(0);
+        ofs.write((const char*)&header, sizeof(BinaryHeader));
+        ofs.close();
+        if (!ofs)
+            throw std::runtime_error("failed to write the binary index");
+    }
+
+private:
+
+    void pad() {
+        static const char zeros[BINARY_ALIGNMENT] = {0};
+        if (position % BINARY_ALIGNMENT != 0)
+            write_bytes(zeros, BINARY_ALIGNMENT - position % BINARY_ALIGNMENT);
+    }
+
+    void write_bytes(const void* data, uint64_t bytes) {
+        buffer.insert(buffer.end(), (const char*)data, (const char*)data + bytes);
+        position += bytes;
+        if (buffer.size() >= (1 << 20))
+            flush();
+    }
+
+    void flush() {
+        if (buffer.size() > 0)
+            ofs.write(&buffer[0], buffer.size());
+        buffer.clear();
+    }
+
+    BinaryHeader header;
+    uint64_t position;
+    std::ofstream ofs;
+    std::vector<char> buffer;
+    std::vector<BinarySection> sections;
+};
+
+// read-only mmap of a binary index file, the sections point into the mapping
+// and stay valid as long as the reader is alive
+class BinaryReader
+{
+
+public:
+
+    BinaryReader(const char* filename) : data(NULL), size(0) {
+        int fd = open(filename, O_RDONLY);
+        if (fd < 0)
+            throw std::runtime_error(std::string("cannot open ") + filename);
+
+        struct stat st;
+        if (fstat(fd, &st) != 0 || (uint64_t)st.st_size < sizeof(BinaryHeader)) {
+            ::close(fd);
+            throw std::invalid_argument(std::string(filename) + " is not a binary index");
+        }
+        size = st.st_size;
+
+        void* mapped = mmap(NULL, size, PROT_READ, MAP_SHARED, fd, 0);
+        ::close(fd);
+        if (mapped == MAP_FAILED)
+            throw std::runtime_error(std::string("cannot mmap ") + filename);
+        data = (const char*)mapped;
+
+        memcpy(&header, data, sizeof(BinaryHeader));
+        if (memcmp(header.magic, BINARY_MAGIC, sizeof(BINARY_MAGIC)) != 0 || header.version != BINARY_FORMAT_VERSION
+            || header.directory_offset + (uint64_t)header.num_sections * sizeof(BinarySection) > size) {
+            unmap();
+            throw std::invalid_argument(std::string(filename) + " is not a binary index of version 1");
+        }
+        directory = (const BinarySection*)(data + header.directory_offset);
+    }
+
+    ~BinaryReader() {
+        unmap();
+    }
+
+    // the bytes of the section tag, NULL (and count 0) if the file has no such section
+    const void* raw_section(uint32_t tag, uint64_t* count, uint32_t* element_bytes) const {
+        *count = 0;
+        *element_bytes = 0;
+        for (uint32_t i = 0; i < header.num_sections; i++) {
+            if (directory[i].tag != tag)
+                continue;
+            if (directory[i].offset + directory[i].count * directory[i].element_bytes > size)
+                throw std::invalid_argument("corrupted binary index section");
+            *count = directory[i].count;
+            *element_bytes = directory[i].element_bytes;
+            return data + directory[i].offset;
+        }
+        return NULL;
+    }
+
+    // the elements of the section tag, NULL (and count 0) if the file has no such section
+    template <class T>
+    const T* section(uint32_t tag, uint64_t* count) const {
+        uint32_t element_bytes;
+        const void* elements = raw_section(tag, count, &element_bytes);
+        if (elements != NULL && element_bytes != sizeof(T))
+            throw std::invalid_argument("corrupted binary index section");
+        return (const T*)elements;
+    }
+
+    // same as section, for sections which must be present
+    template <class T>
+    const T* required_section(uint32_t tag, uint64_t* count) const {
+        const T* elements = section<T>(tag, count);
+        if (elements == NULL)
+            throw std::invalid_argument("missing binary index section");
+        return elements;
+    }
+
+    // drop the pages of [begin, begin + bytes) from the resident set, e.g. after streaming through
+    // a section once. they stay mapped and are read again from the page cache on access
+    void release(const void* begin, uint64_t bytes) const {
+        uint64_t page = sysconf(_SC_PAGESIZE);
+        uint64_t first = ((const char*)begin - data) / page * page;
+        uint64_t last = std::min<uint64_t>(size, (const char*)begin - data + bytes);
+        if (last > first)
+            madvise((void*)(data + first), last - first, MADV_DONTNEED);
+    }
+
+    BinaryHeader header;
+
+private:
+
+    // the mapping is owned by one reader
+    BinaryReader(const BinaryReader&);
+    BinaryReader& operator=(const BinaryReader&);
+
+    void unmap() {
+        if (data != NULL)
+            munmap((void*)data, size);
+        data = NULL;
+    }
+
+    const char* data;
+    uint64_t size;
+    const BinarySection* directory;
+};
+
+// read-only mmap of a whole flat file, e.g. an array written with ofstream::write
+class MappedFile
+{
+
+public:
+
+    MappedFile() : data(NULL), size(0), opened(false) {}
+
+    ~MappedFile() {
+        close();
+    }
+
+    void open(const char* filename) {
+        close();
+        int fd = ::open(filename, O_RDONLY);
+        if (fd < 0)
+            throw std::runtime_error(std::string("cannot open ") + filename);
+
+        struct stat st;
+        if (fstat(fd, &st) != 0) {
+            ::close(fd);
+            throw std::runtime_error(std::string("cannot stat ") + filename);
+        }
+
+        // an empty file can not be mapped, it is open without data
+        if (st.st_size > 0) {
+            void* mapped = mmap(NULL, st.st_size, PROT_READ, MAP_SHARED, fd, 0);
+            if (mapped == MAP_FAILED) {
+                ::close(fd);
+                throw std::runtime_error(std::string("cannot mmap ") + filename);
+            }
+            data = (const char*)mapped;
+            size = st.st_size;
+        }
+        ::close(fd);
+        opened = true;
+    }
+
+    void close() {
+        if (data != NULL)
+            munmap((void*)data, size);
+        data = NULL;
+        size = 0;
+        opened = false;
+    }
+
+    bool is_open() const { return opened; }
+
+    const char* bytes() const { return data; }
+
+    uint64_t bytes_size() const { return size; }
+
+private:
+
+    // the mapping is owned by one file
+    MappedFile(const MappedFile&);
+    MappedFile& operator=(const MappedFile&);
+
+    const char* data;
+    uint64_t size;
+    bool opened;
+};
+
+#endif // FASTDICT_BINARY_FORMAT_HPP
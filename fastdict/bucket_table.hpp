@@ -0,0 +1,333 @@
+#ifndef FASTDICT_BUCKET_TABLE_HPP
+#define FASTDICT_BUCKET_TABLE_HPP
+
+// bucket_table.hpp:
+// flat open-addressing table keyed directly by the uint32 sampled key.
+//
+// It replaces std::map<std::vector<uint8_t>, ...> as the bucket container of
+// FastDict/FastCompressDict. Lookups hash the uint32 key and probe a flat slot
+// array, so there is no per-lookup allocation and no byte-vector comparison.
+//
+// Entries are kept in one contiguous vector (slots only store entry indexes),
+// which makes iteration cheap and lets the table be rehashed without moving
+// the bucket payloads more than once.
+//
+// A dense table (see set_dense) is a direct-indexed directory for small keys:
+// its slots are a flat array of 2^bits entry indexes, the slot of a key is the
+// key itself, so a lookup is a single array load and an empty bucket costs one
+// 0 slot. Keys of more than bits bits still work, they probe linearly from the
+// slot of their low bits, as in the hashed table.
+//
+// For compatibility with the index files written by the std::map version, the
+// boost serialization below writes exactly the same archive layout as
+// std::map<std::vector<uint8_t>, ValueType>: keys are converted back to their
+// big-endian byte-vector form and items are emitted in ascending key order.
+
+#include <stdint.h>
+#include <vector>
+#include <utility>
+#include <algorithm>
+
+#include <boost/serialization/vector.hpp>
+#include <boost/serialization/utility.hpp>
+#include <boost/serialization/split_free.hpp>
+#include <boost/serialization/collection_size_type.hpp>
+#include <boost/serialization/item_version_type.hpp>
+#include <boost/serialization/nvp.hpp>
+
+template <class ValueType>
+class BucketTable
+{
+
+public:
+
+    typedef std::pair<uint32_t, ValueType> value_type;
+    typedef typename std::vector<value_type>::iterator iterator;
+    typedef typename std::vector<value_type>::const_iterator const_iterator;
+
+    BucketTable() : key_bytes(4), hash_shift(32), mask(0), dense_bits(0) {}
+
+    ValueType& operator[](uint32_t key) {
+        if (dense_bits > 0) {
+            // one slot is kept empty, so that the probe of a missing key ends
+            if (entries.size() + 1 >= slots.size())
+                rehash(slots.size() == 0 ? ((size_t)1 << dense_bits) : slots.size() * 2);
+        } else if ((entries.size() + 1) * 2 > slots.size())
+            rehash(slots.size() == 0 ? 16 : slots.size() * 2);
+
+        uint32_t slot = home(key);
+        while (slots[slot] != 0) {
+            value_type& entry = entries[slots[slot] - 1];
+            if (entry.first == key)
+                return entry.second;
+            slot = (slot + 1) & mask;
+        }
+
+        entries.push_back(value_type(key, ValueType()));
+        slots[slot] = entries.size();
+
+        return entries.back().second;
+    }
+
+    // return NULL if key is not in the table
+    ValueType* find(uint32_t key) {
+        int64_t index = entry_index(key);
+        if (index < 0)
+            return NULL;
+        return &(entries[index].second);
+    }
+
+    const ValueType* find(uint32_t key) const {
+        int64_t index = entry_index(key);
+        if (index < 0)
+            return NULL;
+        return &(entries[index].second);
+    }
+
+    uint32_t count(uint32_t key) const {
+        return entry_index(key) < 0 ? 0 : 1;
+    }
+
+    void erase(uint32_t key) {
+        if (slots.size() == 0)
+            return;
+
+        uint32_t slot = home(key);
+        while (slots[slot] != 0 && entries[slots[slot] - 1].first != key)
+            slot = (slot + 1) & mask;
+
+        if (slots[slot] == 0)
+            return;
+
+        uint32_t hole = slots[slot] - 1;
+
+        // backward shift deletion keeps probe sequences intact without tombstones
+        uint32_t next = slot;
+        while (true) {
+            next = (next + 1) & mask;
+            if (slots[next] == 0)
+                break;
+            uint32_t ideal = home(entries[slots[next] - 1].first);
+            bool movable = (next > slot) ? (ideal <= slot || ideal > next)
+                                         : (ideal <= slot && ideal > next);
+            if (movable) {
+                slots[slot] = slots[next];
+                slot = next;
+            }
+        }
+        slots[slot] = 0;
+
+        // fill the hole in the entry vector with the last entry
+        uint32_t last = entries.size() - 1;
+        if (hole != last) {
+            uint32_t last_slot = home(entries[last].first);
+            while (slots[last_slot] != last + 1)
+                last_slot = (last_slot + 1) & mask;
+            entries[hole] = std::move(entries[last]);
+            slots[last_slot] = hole + 1;
+        }
+        entries.pop_back();
+    }
+
+    // switch to a direct-indexed directory of 2^bits slots, 0 bits switches back to hashing.
+    // the slots are allocated with the first entry
+    void set_dense(uint8_t bits) {
+        dense_bits = bits;
+        if (slots.size() == 0)
+            return;
+
+        size_t capacity = dense_bits > 0 ? ((size_t)1 << dense_bits) : 16;
+        while (capacity < (entries.size() + 1) * 2)
+            capacity *= 2;
+        rehash(capacity);
+    }
+
+    bool is_dense() const { return dense_bits > 0; }
+
+    // release all memory held by the table, a dense table stays dense
+    void clear() {
+        std::vector<value_type>().swap(entries);
+        std::vector<uint32_t>().swap(slots);
+        hash_shift = 32;
+        mask = 0;
+    }
+
+    void reserve(size_t n) {
+        if (dense_bits > 0) {
+            if (slots.size() == 0 && n > 0)
+                rehash((size_t)1 << dense_bits);
+            entries.reserve(n);
+            return;
+        }
+
+        size_t capacity = 16;
+        while (capacity < n * 2)
+            capacity *= 2;
+        if (capacity > slots.size())
+            rehash(capacity);
+        entries.reserve(n);
+    }
+
+    size_t size() const { return entries.size(); }
+
+    bool empty() const { return entries.empty(); }
+
+    iterator begin() { return entries.begin(); }
+    iterator end() { return entries.end(); }
+    const_iterator begin() const { return entries.begin(); }
+    const_iterator end() const { return entries.end(); }
+
+    // keys in ascending order, the iteration order of the former std::map
+    std::vector<uint32_t> sorted_keys() const {
+        std::vector<uint32_t> keys;
+        keys.reserve(entries.size());
+        for (const_iterator it = entries.begin(); it != entries.end(); ++it)
+            keys.push_back(it->first);
+        std::sort(keys.begin(), keys.end());
+        return keys;
+    }
+
+    // approximated heap bytes used by the table itself, payloads excluded
+    uint64_t table_bytes() const {
+        return slots.capacity() * sizeof(uint32_t) + entries.capacity() * sizeof(value_type);
+    }
+
+    // the number of bytes of the legacy std::vector<uint8_t> key
+    // only used when (de)serializing, set by the owning dict before saving
+    uint8_t key_bytes;
+
+private:
+
+    uint32_t home(uint32_t key) const {
+        if (dense_bits > 0)
+            return key & mask;
+        // fibonacci hashing, the upper bits are the best mixed ones
+        return (uint32_t)((key * 2654435769u) >> hash_shift) & mask;
+    }
+
+    int64_t entry_index(uint32_t key) const {
+        if (slots.size() == 0)
+            return -1;
+
+        uint32_t slot = home(key);
+        while (slots[slot] != 0) {
+            uint32_t index = slots[slot] - 1;
+            if (entries[index].first == key)
+                return index;
+            slot = (slot + 1) & mask;
+        }
+        return -1;
+    }
+
+    void rehash(size_t capacity) {
+        uint8_t bits = 0;
+        while (((size_t)1 << bits) < capacity)
+            bits++;
+
+        std::vector<uint32_t>(capacity, 0).swap(slots);
+        mask = capacity - 1;
+        hash_shift = 32 - bits;
+
+        for (uint32_t index = 0; index < entries.size(); index++) {
+            uint32_t slot = home(entries[index].first);
+            while (slots[slot] != 0)
+                slot = (slot + 1) & mask;
+            slots[slot] = index + 1;
+        }
+    }
+
+    // slot value is entry index + 1, 0 means empty slot
+    std::vector<uint32_t> slots;
+    std::vector<value_type> entries;
+
+    uint8_t hash_shift;
+    uint32_t mask;
+
+    // 0 for a hashed table
+    uint8_t dense_bits;
+};
+
+// conversion between uint32 keys and the big-endian byte keys of old archives
+inline std::vector<uint8_t> bucket_key_to_bytes(uint32_t key, uint8_t key_bytes) {
+    std::vector<uint8_t> bytes;
+    for (int i = key_bytes - 1; i >= 0; --i)
+        bytes.push_back((uint8_t)(key >> (8 * i)));
+    return bytes;
+}
+
+inline uint32_t bucket_key_from_bytes(const std::vector<uint8_t>& bytes) {
+    uint32_t key = 0;
+    for (size_t i = 0; i < bytes.size(); ++i)
+        key = (key << 8) | bytes[i];
+    return key;
+}
+
+// a serialization stand-in for std::pair<const std::vector<uint8_t>, ValueType>
+// which refers to the bucket payload instead of copying it
+template <class ValueType>
+struct BucketArchiveItem
+{
+    BucketArchiveItem(ValueType* v) : value(v) {}
+
+    template<class Archive>
+    void serialize(Archive & ar, const unsigned int version) {
+        ar & boost::serialization::make_nvp("first", key);
+        ar & boost::serialization::make_nvp("second", *value);
+    }
+
+    std::vector<uint8_t> key;
+    ValueType* value;
+};
+
+namespace boost {
+namespace serialization {
+
+template<class Archive, class ValueType>
+inline void save(Archive & ar, const BucketTable<ValueType> &t, const unsigned int /* file_version */) {
+    collection_size_type count(t.size());
+    ar << BOOST_SERIALIZATION_NVP(count);
+
+    const item_version_type item_version(version<std::pair<const std::vector<uint8_t>, ValueType> >::value);
+    ar << BOOST_SERIALIZATION_NVP(item_version);
+
+    std::vector<uint32_t> keys = t.sorted_keys();
+    for (size_t i = 0; i < keys.size(); ++i) {
+        uint32_t key = keys[i];
+        BucketArchiveItem<ValueType> item(const_cast<ValueType*>(t.find(key)));
+        item.key = bucket_key_to_bytes(key, t.key_bytes);
+        const BucketArchiveItem<ValueType>& const_item = item;
+        ar << boost::serialization::make_nvp("item", const_item);
+    }
+}
+
+template<class Archive, class ValueType>
+inline void load(Archive & ar, BucketTable<ValueType> &t, const unsigned int /* file_version */) {
+    t.clear();
+
+    const library_version_type library_version(ar.get_library_version());
+    item_version_type item_version(0);
+    collection_size_type count;
+    ar >> BOOST_SERIALIZATION_NVP(count);
+    if (library_version_type(3) < library_version) {
+        ar >> BOOST_SERIALIZATION_NVP(item_version);
+    }
+
+    t.reserve(count);
+    while (count-- > 0) {
+        ValueType value;
+        BucketArchiveItem<ValueType> item(&value);
+        ar >> boost::serialization::make_nvp("item", item);
+        t.key_bytes = item.key.size();
+        t[bucket_key_from_bytes(item.key)] = std::move(value);
+    }
+}
+
+template<class Archive, class ValueType>
+inline void serialize(Archive & ar, BucketTable<ValueType> &t, const unsigned int file_version) {
+    boost::serialization::split_free(ar, t, file_version);
+}
+
+} // namespace serialization
+} // namespace boost
+
+#endif // FASTDICT_BUCKET_TABLE_HPP
@@ -0,0 +1,232 @@
+#ifndef FASTDICT_CSR_BUCKETS_HPP
+#define FASTDICT_CSR_BUCKETS_HPP
+
+// csr_buckets.hpp:
+// frozen, read-only bucket layout of FastDict in CSR (compressed sparse row) form.
+//
+// Instead of one std::vector<std::pair<uint64_t, IdType> > per bucket, all
+// buckets share four flat arrays:
+//
+//   keys:    sorted uint32 sampled keys, one per bucket
+//   offsets: bucket i owns [offsets[i], offsets[i + 1]) of codes and ids
+//   codes:   the uint64 binary codes of all buckets, bucket after bucket
+//   ids:     the ids of all buckets, in the same order as codes
+//
+// This removes the per-bucket allocation and the padding of the pair, e.g. a
+// uint32 id costs 4 bytes instead of 8.
+//
+// It serializes in the same archive layout as BucketTable, i.e. the layout of
+// the std::map<std::vector<uint8_t>, std::vector<std::pair<uint64_t, IdType> > >
+// used by older versions, so index files can be loaded directly into it.
+
+#include <stdint.h>
+#include <vector>
+#include <utility>
+#include <algorithm>
+
+#include "./bucket_table.hpp"
+
+template <class IdType>
+class CSRBuckets
+{
+
+public:
+
+    typedef std::vector<std::pair<uint64_t, IdType> > bucket_type;
+
+    CSRBuckets() : key_bytes(4), offsets(1, 0) {}
+
+    // move the content of the table into the flat arrays, the table is emptied
+    void build(BucketTable<bucket_type>& table) {
+        clear();
+
+        keys = table.sorted_keys();
+
+        uint64_t total = 0;
+        typename BucketTable<bucket_type>::iterator it;
+        for (it = table.begin(); it != table.end(); ++it)
+            total += it->second.size();
+
+        offsets.reserve(keys.size() + 1);
+        codes.reserve(total);
+        ids.reserve(total);
+
+        for (size_t i = 0; i < keys.size(); ++i) {
+            bucket_type* bucket = table.find(keys[i]);
+            push_bucket(*bucket);
+            bucket_type().swap(*bucket);
+        }
+
+        table.clear();
+    }
+
+    // rebuild the per-bucket table from the flat arrays, the arrays are emptied
+    void restore(BucketTable<bucket_type>& table) {
+        table.clear();
+        table.reserve(keys.size());
+
+        for (size_t i = 0; i < keys.size(); ++i) {
+            bucket_type& bucket = table[keys[i]];
+            bucket.reserve(offsets[i + 1] - offsets[i]);
+            for (uint64_t j = offsets[i]; j < offsets[i + 1]; ++j)
+                bucket.push_back(std::pair<uint64_t, IdType>(codes[j], ids[j]));
+        }
+
+        clear();
+    }
+
+    // return the bucket index of key, -1 if key is not in the table
+    int64_t find(uint32_t key) const {
+        std::vector<uint32_t>::const_iterator it = std::lower_bound(keys.begin(), keys.end(), key);
+        if (it == keys.end() || *it != key)
+            return -1;
+        return it - keys.begin();
+    }
+
+    uint32_t count(uint32_t key) const {
+        return find(key) < 0 ? 0 : 1;
+    }
+
+    uint64_t bucket_begin(int64_t index) const { return offsets[index]; }
+    uint64_t bucket_end(int64_t index) const { return offsets[index + 1]; }
+
+    // append the elements of bucket index to the end of elements
+    void copy_bucket(int64_t index, bucket_type& elements) const {
+        for (uint64_t j = offsets[index]; j < offsets[index + 1]; ++j)
+            elements.push_back(std::pair<uint64_t, IdType>(codes[j], ids[j]));
+    }
+
+    // append a bucket with a key larger than all existing keys
+    void push_back(uint32_t key, const bucket_type& bucket) {
+        keys.push_back(key);
+        push_bucket(bucket);
+    }
+
+    void clear() {
+        std::vector<uint32_t>().swap(keys);
+        std::vector<uint64_t>(1, 0).swap(offsets);
+        std::vector<uint64_t>().swap(codes);
+        std::vector<IdType>().swap(ids);
+    }
+
+    size_t size() const { return keys.size(); }
+
+    uint64_t num_codes() const { return codes.size(); }
+
+    // approximated heap bytes of the flat arrays, ids are counted by sizeof(IdType)
+    uint64_t memory_bytes() const {
+        return keys.capacity() * sizeof(uint32_t) + offsets.capacity() * sizeof(uint64_t)
+            + codes.capacity() * sizeof(uint64_t) + ids.capacity() * sizeof(IdType);
+    }
+
+    // release the spare capacity left by push_back
+    void shrink_to_fit() {
+        keys.shrink_to_fit();
+        offsets.shrink_to_fit();
+        codes.shrink_to_fit();
+        ids.shrink_to_fit();
+    }
+
+    // if the keys are not in ascending order (e.g. appended from an unsorted archive),
+    // reorder the buckets so that binary search works
+    void sort_buckets() {
+        bool sorted = true;
+        for (size_t i = 1; i < keys.size() && sorted; ++i)
+            sorted = keys[i - 1] < keys[i];
+        if (sorted)
+            return;
+
+        BucketTable<bucket_type> table;
+        for (size_t i = 0; i < keys.size(); ++i) {
+            bucket_type& bucket = table[keys[i]];
+            for (uint64_t j = offsets[i]; j < offsets[i + 1]; ++j)
+                bucket.push_back(std::pair<uint64_t, IdType>(codes[j], ids[j]));
+        }
+        build(table);
+    }
+
+    // the number of bytes of the legacy std::vector<uint8_t> key
+    // only used when (de)serializing, set by the owning dict before saving
+    uint8_t key_bytes;
+
+    std::vector<uint32_t> keys;
+    std::vector<uint64_t> offsets;
+    std::vector<uint64_t> codes;
+    std::vector<IdType> ids;
+
+private:
+
+    void push_bucket(const bucket_type& bucket) {
+        for (size_t j = 0; j < bucket.size(); ++j) {
+            codes.push_back(bucket[j].first);
+            ids.push_back(bucket[j].second);
+        }
+        offsets.push_back(codes.size());
+    }
+};
+
+namespace boost {
+namespace serialization {
+
+template<class Archive, class IdType>
+inline void save(Archive & ar, const CSRBuckets<IdType> &t, const unsigned int /* file_version */) {
+    typedef typename CSRBuckets<IdType>::bucket_type bucket_type;
+
+    collection_size_type count(t.size());
+    ar << BOOST_SERIALIZATION_NVP(count);
+
+    const item_version_type item_version(version<std::pair<const std::vector<uint8_t>, bucket_type> >::value);
+    ar << BOOST_SERIALIZATION_NVP(item_version);
+
+    // one bucket at a time is expanded to the pair vector form of the archive
+    bucket_type bucket;
+    for (size_t i = 0; i < t.size(); ++i) {
+        bucket.clear();
+        t.copy_bucket(i, bucket);
+
+        BucketArchiveItem<bucket_type> item(&bucket);
+        item.key = bucket_key_to_bytes(t.keys[i], t.key_bytes);
+        const BucketArchiveItem<bucket_type>& const_item = item;
+        ar << boost::serialization::make_nvp("item", const_item);
+    }
+}
+
+template<class Archive, class IdType>
+inline void load(Archive & ar, CSRBuckets<IdType> &t, const unsigned int /* file_version */) {
+    typedef typename CSRBuckets<IdType>::bucket_type bucket_type;
+
+    t.clear();
+
+    const library_version_type library_version(ar.get_library_version());
+    item_version_type item_version(0);
+    collection_size_type count;
+    ar >> BOOST_SERIALIZATION_NVP(count);
+    if (library_version_type(3) < library_version) {
+        ar >> BOOST_SERIALIZATION_NVP(item_version);
+    }
+
+    t.keys.reserve(count);
+    t.offsets.reserve(count + 1);
+
+    bucket_type bucket;
+    while (count-- > 0) {
+        bucket.clear();
+        BucketArchiveItem<bucket_type> item(&bucket);
+        ar >> boost::serialization::make_nvp("item", item);
+        t.key_bytes = item.key.size();
+        t.push_back(bucket_key_from_bytes(item.key), bucket);
+    }
+
+    t.sort_buckets();
+    t.shrink_to_fit();
+}
+
+template<class Archive, class IdType>
+inline void serialize(Archive & ar, CSRBuckets<IdType> &t, const unsigned int file_version) {
+    boost::serialization::split_free(ar, t, file_version);
+}
+
+} // namespace serialization
+} // namespace boost
+
+#endif // FASTDICT_CSR_BUCKETS_HPP
@@ -10,6 +10,21 @@
 #include <boost/serialization/vector.hpp>
 #include <boost/serialization/list.hpp>
 #include <fstream>
+#include <limits>
+#include <thread>
+#include <atomic>
+#include <memory>
+#include <cstdio>
+
+#include "./bucket_table.hpp"
+#include "./csr_buckets.hpp"
+#include "./hybrid_column.hpp"
+#include "./topk_heap.hpp"
+#include "./binary_format.hpp"
+#include "./runtime_arena.hpp"
+#include "./tombstones.hpp"
+#include "./packed_ids.hpp"
+#include "./occupancy.hpp"
 
 
 #include <boost/python/suite/indexing/vector_indexing_suite.hpp>
@@ -90,37 +105,205 @@ struct vector_pyobject_vector_to_python
     }
 };
 
+// keys can be given as a python list or as any object exporting the buffer protocol
+// with integer items, e.g. numpy uint32/uint64 arrays, which are read without boxing
+std::vector<uint32_t> python_keys(boost::python::object& keys) {
+    std::vector<uint32_t> table_keys;
+
+    if (PyObject_CheckBuffer(keys.ptr())) {
+        Py_buffer view;
+        if (PyObject_GetBuffer(keys.ptr(), &view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) == 0) {
+            char format = view.format == NULL ? 'B' : view.format[strlen(view.format) - 1];
+            bool is_integer = std::string("bBhHiIlLqQ").find(format) != std::string::npos;
+            if (is_integer && view.itemsize > 0) {
+                Py_ssize_t num = view.len / view.itemsize;
+                table_keys.resize(num);
+                for (Py_ssize_t i = 0; i < num; i++) {
+                    char* item = (char*)view.buf + i * view.itemsize;
+                    switch (view.itemsize) {
+                        case 1: table_keys[i] = *(uint8_t*)item; break;
+                        case 2: table_keys[i] = *(uint16_t*)item; break;
+                        case 4: table_keys[i] = *(uint32_t*)item; break;
+                        default: table_keys[i] = (uint32_t)*(uint64_t*)item; break;
+                    }
+                }
+                PyBuffer_Release(&view);
+                return table_keys;
+            }
+            PyBuffer_Release(&view);
+        }
+        else
+            PyErr_Clear();
+    }
+
+    boost::python::ssize_t num = boost::python::len(keys);
+    table_keys.resize(num);
+    for (boost::python::ssize_t i = 0; i < num; i++)
+        table_keys[i] = boost::python::extract<uint32_t>(keys[i]);
+    return table_keys;
+}
+
+// a new python bytearray of n elements, to be wrapped by np.frombuffer at python side
+template <class T>
+PyObject* new_bytearray(size_t n, T** data) {
+    PyObject* array = PyByteArray_FromStringAndSize(NULL, n * sizeof(T));
+    if (array == NULL)
+        boost::python::throw_error_already_set();
+    *data = (T*)PyByteArray_AS_STRING(array);
+    return array;
+}
+
+// releases the GIL for the lifetime of the object
+// python objects must not be touched while it is alive
+class ScopedGILRelease
+{
+public:
+    ScopedGILRelease() { state = PyEval_SaveThread(); }
+    ~ScopedGILRelease() { PyEval_RestoreThread(state); }
+
+private:
+    PyThreadState* state;
+};
+
+// run func(0) ... func(n - 1) on num_threads threads (0: one per hardware thread)
+// indexes are handed out one by one, as bucket sizes are very skewed
+template <class Func>
+void parallel_for(size_t n, uint32_t num_threads, Func func) {
+    if (num_threads == 0)
+        num_threads = std::max(1u, std::thread::hardware_concurrency());
+    if (num_threads > n)
+        num_threads = n;
+
+    if (num_threads <= 1) {
+        for (size_t i = 0; i < n; i++)
+            func(i);
+        return;
+    }
+
+    std::atomic<size_t> next_index(0);
+    std::vector<std::thread> workers;
+    for (uint32_t t = 0; t < num_threads; t++) {
+        workers.push_back(std::thread([&]() {
+            for (size_t i = next_index++; i < n; i = next_index++)
+                func(i);
+        }));
+    }
+    BOOST_FOREACH(std::thread& worker, workers) {
+        worker.join();
+    }
+}
+
+// VLQ base64 encoding of a number, shared by FastCompressDict::base64VLQ_encode
+template <class base64VLQ_Type>
+std::string base64VLQ_encode_value(base64VLQ_Type val) {
+    std::string encoded = "";
+    base64VLQ_Type digit;
+
+    do {
+        digit = val & 31;
+        val >>= 5;
+        if (val > 0) {
+            digit |= 32;
+        }
+        encoded += base64_chars[digit];
+    } while (val > 0);
+
+    return encoded;
+}
+
+// the id of the n-th code appended by append_codes
+// numeric ids saturate at the maximum of IdType (e.g. 255 for uint8_t),
+// string ids are VLQ base64 encoded like NumberIdsToVLQ_base64 does
+template <class IdType>
+IdType sequential_id(uint64_t n) {
+    uint64_t max_id = std::numeric_limits<IdType>::max();
+    return (IdType)(n > max_id ? max_id : n);
+}
+
+template <>
+std::string sequential_id<std::string>(uint64_t n) {
+    return base64VLQ_encode_value<uint32_t>((uint32_t)n);
+}
+
+template <class T>
+PyObject* vector_to_bytearray(const std::vector<T>& vec) {
+    T* data;
+    PyObject* array = new_bytearray<T>(vec.size(), &data);
+    if (vec.size() > 0)
+        memcpy(data, &vec[0], vec.size() * sizeof(T));
+    return array;
+}
+
+// numeric ids are exported as bytearray, string ids as a list of python strings
+template <class IdType>
+PyObject* ids_to_python(const std::vector<IdType>& ids) {
+    return vector_to_bytearray<IdType>(ids);
+}
+
+template <>
+PyObject* ids_to_python<std::string>(const std::vector<std::string>& ids) {
+    boost::python::list pylist;
+    BOOST_FOREACH(const std::string& id, ids) {
+        pylist.append(id);
+    }
+    return boost::python::incref(pylist.ptr());
+}
+
+// (codes, ids) tuple returned by the *_as_buffer variants of mget
+template <class IdType>
+PyObject* codes_ids_to_python(const std::vector<uint64_t>& codes, const std::vector<IdType>& ids) {
+    boost::python::object codes_obj(boost::python::handle<>(vector_to_bytearray<uint64_t>(codes)));
+    boost::python::object ids_obj(boost::python::handle<>(ids_to_python<IdType>(ids)));
+    return boost::python::incref(boost::python::make_tuple(codes_obj, ids_obj).ptr());
+}
+
+// a dense bucket directory takes 2^r slots of 4 bytes, i.e. at most 64 MB per bucket table
+static const uint8_t DENSE_MAX_KEY_BITS = 24;
+
 template <class IdType>
 class FastDict
 {
 
 public:
     
-    FastDict(uint8_t k_dim) : index_key_dimension(k_dim) {}
+    // dense: direct-indexed bucket directory of 2^k_dim slots instead of the hashed one, see
+    // BucketTable::set_dense. a probe is then a single array load, for k_dim <= 24
+    FastDict(uint8_t k_dim, bool dense = false) : index_key_dimension(k_dim), frozen(false) {
+        if (dense && k_dim > DENSE_MAX_KEY_BITS) {
+            PyErr_SetString(PyExc_ValueError, "a dense bucket directory expects r <= 24");
+            boost::python::throw_error_already_set();
+        }
+        if (dense)
+            dict.set_dense(k_dim);
+    }
 
     friend class boost::serialization::access;
 
     void set(uint32_t key, uint64_t hash_key, IdType id) {
-
-        std::vector<uint8_t> bool_key = actual_key(key);
-
-        std::pair<uint64_t, IdType> element(hash_key, id);
-        std::vector<std::pair<uint64_t, IdType> > element_list(1, element);
-        dict[bool_key] = element_list;
-    }
-
-    void set_with_bool_key(std::vector<uint8_t> bool_key, uint64_t hash_key, IdType id) {
+        check_appendable();
+        thaw();
+        occupancy.clear();
 
         std::pair<uint64_t, IdType> element(hash_key, id);
         std::vector<std::pair<uint64_t, IdType> > element_list(1, element);
-        dict[bool_key] = element_list;
+        dict[actual_key(key)] = element_list;
     }
 
     std::vector<std::pair<uint64_t, IdType> > get(uint32_t key) {
-        std::vector<uint8_t> bool_key = actual_key(key);
+        if (frozen) {
+            int64_t index = csr_dict.find(actual_key(key));
+            std::vector<std::pair<uint64_t, IdType> > element_list;
+            if (index >= 0)
+                csr_dict.copy_bucket(index, element_list);
+            else
+                element_list.push_back(std::pair<uint64_t, IdType>(0, IdType()));
+            return element_list;
+        }
+
+        std::vector<std::pair<uint64_t, IdType> >* bucket = dict.find(actual_key(key));
 
-        if (dict.count(bool_key) > 0)
-            return dict[bool_key];
+        if (bucket != NULL)
+            return *bucket;
         else {
             std::pair<uint64_t, IdType> element(0, *new IdType());
             std::vector<std::pair<uint64_t, IdType> > element_list(1, element);
@@ -130,120 +313,306 @@ public:
 
     std::vector<std::pair<uint64_t, IdType> > mget(boost::python::list& keys) {
         std::vector<std::pair<uint64_t, IdType> > return_keys(0);
+        if (frozen) {
+            for (int i = 0; i < len(keys); i++) {
+                int64_t index = csr_dict.find(actual_key(boost::python::extract<uint32_t>(keys[i])));
+                if (index >= 0)
+                    csr_dict.copy_bucket(index, return_keys);
+            }
+            return return_keys;
+        }
+
         for (int i = 0; i < len(keys); i++) {
-            std::vector<uint8_t> bool_key = actual_key(boost::python::extract<uint32_t>(keys[i]));
+            std::vector<std::pair<uint64_t, IdType> >* bucket = dict.find(actual_key(boost::python::extract<uint32_t>(keys[i])));
             
-            if (dict.count(bool_key) > 0) {
-                std::pair<uint64_t, IdType> element;
-                BOOST_FOREACH(element, dict[bool_key]) {
-                    return_keys.insert(return_keys.end(), element);
-                }
+            if (bucket != NULL) {
+                return_keys.insert(return_keys.end(), bucket->begin(), bucket->end());
             }
         }
         return return_keys;
     }
+
+    // same as mget, but returns a (codes, ids) tuple of buffers instead of a vector of pairs:
+    // codes is a bytearray of uint64, ids a bytearray of IdType (a list for string ids).
+    // keys can be a list or a numpy array
+    PyObject* mget_as_buffer(boost::python::object& keys) {
+        std::vector<uint32_t> table_keys = python_keys(keys);
+        std::vector<uint64_t> codes;
+        std::vector<IdType> ids;
+
+        BOOST_FOREACH(uint32_t key, table_keys) {
+            if (frozen) {
+                int64_t index = csr_dict.find(actual_key(key));
+                if (index >= 0) {
+                    codes.insert(codes.end(), csr_dict.codes.begin() + csr_dict.bucket_begin(index), csr_dict.codes.begin() + csr_dict.bucket_end(index));
+                    ids.insert(ids.end(), csr_dict.ids.begin() + csr_dict.bucket_begin(index), csr_dict.ids.begin() + csr_dict.bucket_end(index));
+                }
+                continue;
+            }
+
+            std::vector<std::pair<uint64_t, IdType> >* bucket = dict.find(actual_key(key));
+            if (bucket != NULL) {
+                for (size_t i = 0; i < bucket->size(); i++) {
+                    codes.push_back((*bucket)[i].first);
+                    ids.push_back((*bucket)[i].second);
+                }
+            }
+        }
+
+        return codes_ids_to_python<IdType>(codes, ids);
+    }
  
     bool exist(uint32_t key) {
-        std::vector<uint8_t> bool_key = actual_key(key);
+        if (frozen)
+            return csr_dict.count(actual_key(key)) > 0;
 
-        if (dict.count(bool_key) > 0)
+        if (dict.count(actual_key(key)) > 0)
             return true;
         else
             return false;
     }
 
-    void clear() { dict.clear(); }
+    void clear() {
+        dict.clear();
+        csr_dict.clear();
+        frozen = false;
+        occupancy.clear();
+    }
 
     void merge(FastDict<IdType>& source) {
+        check_appendable();
+        thaw();
+        occupancy.clear();
+        source.thaw();
+
+        typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::iterator it;
+        for (it = source.dict.begin(); it != source.dict.end(); ++it) {
+            std::vector<std::pair<uint64_t, IdType> >& bucket = dict[it->first];
+            bucket.insert(bucket.end(), it->second.begin(), it->second.end());
+        }
 
-        std::pair<std::vector<uint8_t>, std::vector<std::pair<uint64_t, IdType> > > me;
-        BOOST_FOREACH(me, source.dict) {
-            std::pair<uint64_t, IdType> element;
-            BOOST_FOREACH(element, me.second) {
-                dict[me.first].insert(dict[me.first].end(), element);
-            }
+    }
+
+    // remove the codes of the given image ids from all buckets, returns the number of removed codes
+    uint64_t delete_ids(boost::python::list& ids) {
+        Tombstones<IdType> deleted;
+        for (int i = 0; i < len(ids); i++)
+            deleted.insert(boost::python::extract<IdType>(ids[i]));
+        return erase_deleted(deleted);
+    }
+
+    // remove the codes whose ids are in deleted, buckets left empty are erased
+    uint64_t erase_deleted(const Tombstones<IdType>& deleted) {
+        thaw();
+
+        uint64_t removed = 0;
+        std::vector<uint32_t> empty_keys;
+
+        typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::iterator it;
+        for (it = dict.begin(); it != dict.end(); ++it) {
+            std::vector<std::pair<uint64_t, IdType> >& bucket = it->second;
+            size_t kept = std::remove_if(bucket.begin(), bucket.end(), [&](const std::pair<uint64_t, IdType>& element) {
+                return deleted.contains(element.second);
+            }) - bucket.begin();
+
+            removed += bucket.size() - kept;
+            bucket.resize(kept);
+            if (kept == 0)
+                empty_keys.push_back(it->first);
         }
 
+        BOOST_FOREACH(uint32_t key, empty_keys) {
+            dict.erase(key);
+        }
+        return removed;
     }
 
-    uint32_t size() { return dict.size(); }
+    uint32_t size() { return frozen ? csr_dict.size() : dict.size(); }
 
     void append(uint32_t key, uint64_t hash_key, IdType id) {
-        std::vector<uint8_t> bool_key = actual_key(key);
+        check_appendable();
+        thaw();
+        occupancy.clear();
+        std::vector<std::pair<uint64_t, IdType> >& bucket = dict[actual_key(key)];
 
         std::pair<uint64_t, IdType> element(hash_key, id);
-        dict[bool_key].insert(dict[bool_key].end(), element);
+        bucket.insert(bucket.end(), element);
     }
  
     void batch_append(boost::python::list& keys, boost::python::list& hash_keys, boost::python::list& ids) {
-        std::vector<std::vector<uint8_t> > bool_keys(len(keys));        
+        check_appendable();
+        thaw();
+        occupancy.clear();
+        std::vector<uint32_t> table_keys(len(keys));        
         int reserve_size = len(keys) > 5000000 ? 5000000 : len(keys);
         for (int i = 0; i < len(keys); i++) {            
-            bool_keys[i] = actual_key(boost::python::extract<uint32_t>(keys[i]));            
+            table_keys[i] = actual_key(boost::python::extract<uint32_t>(keys[i]));            
  
             // reserve vector space can speed up batch insert
             // however, when insert too many elements such as 10 millions
             // next line could cause out of memory
             // so it is needed to limit the reserve size
-            dict[bool_keys[i]].reserve(reserve_size);        
+            dict[table_keys[i]].reserve(reserve_size);        
         }        
 
         for (int i = 0; i < len(keys); i++) {            
-            std::vector<uint8_t> bool_key = bool_keys[i];
+            std::vector<std::pair<uint64_t, IdType> >& bucket = dict[table_keys[i]];
 
             std::pair<uint64_t, IdType> element(boost::python::extract<uint64_t>(hash_keys[i]), boost::python::extract<IdType>(ids[i]));
-            dict[bool_key].insert(dict[bool_key].end(), element);        
+            bucket.insert(bucket.end(), element);        
         }
     }
  
     void fast_batch_append(boost::python::list& keys, boost::python::list& hash_keys, boost::python::list& ids) {
-        std::map<std::vector<uint8_t>, std::vector<std::pair<uint64_t, IdType> > > all_actual_keys;
+        check_appendable();
+        thaw();
+        occupancy.clear();
+        BucketTable<std::vector<std::pair<uint64_t, IdType> > > all_actual_keys;
         for (int i = 0; i < len(keys); i++) {            
 
-            std::vector<uint8_t> bool_key = actual_key(boost::python::extract<uint32_t>(keys[i]));
+            std::vector<std::pair<uint64_t, IdType> >& bucket = all_actual_keys[actual_key(boost::python::extract<uint32_t>(keys[i]))];
             std::pair<uint64_t, IdType> element(boost::python::extract<uint64_t>(hash_keys[i]), boost::python::extract<IdType>(ids[i]));
 
-            all_actual_keys[bool_key].insert(all_actual_keys[bool_key].end(), element);
+            bucket.insert(bucket.end(), element);
         }        
 
-        typename std::map<std::vector<uint8_t>, std::vector<std::pair<uint64_t, IdType> > >::iterator it;
+        typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::iterator it;
         for (it = all_actual_keys.begin(); it != all_actual_keys.end(); ++it) {
-            dict[it->first].reserve(it->second.size());
-
-            std::pair<uint64_t, IdType> element;        
-            BOOST_FOREACH(element, it->second) {
-                dict[it->first].insert(dict[it->first].end(), element);
-            }
+            std::vector<std::pair<uint64_t, IdType> >& bucket = dict[it->first];
+            bucket.reserve(bucket.size() + it->second.size());
+            bucket.insert(bucket.end(), it->second.begin(), it->second.end());
         }
     }
  
     void batch_iter_append(boost::python::list& keys, boost::python::list& hash_keys, boost::python::list& ids) {
+        check_appendable();
+        thaw();
+        occupancy.clear();
 
-        std::map<std::vector<uint8_t>, std::vector<std::pair<uint64_t, IdType> > > tmp_dict;
+        BucketTable<std::vector<std::pair<uint64_t, IdType> > > tmp_dict;
 
         for (int i = 0; i < len(keys); i++) {
-            std::vector<uint8_t> bool_key = actual_key(boost::python::extract<uint32_t>(keys[i]));
+            std::vector<std::pair<uint64_t, IdType> >& bucket = tmp_dict[actual_key(boost::python::extract<uint32_t>(keys[i]))];
 
             std::pair<uint64_t, IdType> element(boost::python::extract<uint64_t>(hash_keys[i]), boost::python::extract<IdType>(ids[i]));
-            tmp_dict[bool_key].insert(tmp_dict[bool_key].end(), element);
+            bucket.insert(bucket.end(), element);
         }
 
-        std::pair<std::vector<uint8_t>, std::vector<std::pair<uint64_t, IdType> > > me;
-
-        BOOST_FOREACH(me, tmp_dict) {
-            dict[me.first].insert(dict[me.first].end(), tmp_dict[me.first].begin(), tmp_dict[me.first].end());
+        typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::iterator it;
+        for (it = tmp_dict.begin(); it != tmp_dict.end(); ++it) {
+            std::vector<std::pair<uint64_t, IdType> >& bucket = dict[it->first];
+            bucket.insert(bucket.end(), it->second.begin(), it->second.end());
         }
 
     }
  
+    // index a numpy array (or any buffer) of uint64 binary codes.
+    // the sampled key of each code is gathered from key_dimensions natively, in the same way as
+    // RandomInMemoryStorage.actual_key: dimension d is bit (63 - d) of the code and the first
+    // dimension becomes the most significant bit of the key.
+    // codes get sequential ids starting at first_id. the GIL is released while indexing.
+    // returns the id following the last code
+    uint64_t append_codes(boost::python::object& codes, uint64_t first_id) {
+        check_appendable();
+
+        Py_buffer view;
+        if (PyObject_GetBuffer(codes.ptr(), &view, PyBUF_C_CONTIGUOUS) != 0)
+            boost::python::throw_error_already_set();
+
+        if (view.itemsize != sizeof(uint64_t)) {
+            PyBuffer_Release(&view);
+            PyErr_SetString(PyExc_ValueError, "append_codes expects a contiguous array of uint64 codes");
+            boost::python::throw_error_already_set();
+        }
+
+        const uint64_t* binary_codes = (const uint64_t*)view.buf;
+        uint64_t num_codes = view.len / sizeof(uint64_t);
+
+        {
+            ScopedGILRelease release;
+            thaw();
+            occupancy.clear();
+
+            uint8_t num_dims = key_dimensions.size();
+            for (uint64_t i = 0; i < num_codes; i++) {
+                uint32_t key = 0;
+                for (uint8_t j = 0; j < num_dims; j++)
+                    key |= (uint32_t)((binary_codes[i] >> (63 - key_dimensions[j])) & 1) << (num_dims - 1 - j);
+
+                std::vector<std::pair<uint64_t, IdType> >& bucket = dict[actual_key(key)];
+                bucket.push_back(std::pair<uint64_t, IdType>(binary_codes[i], sequential_id<IdType>(first_id + i)));
+            }
+        }
+
+        PyBuffer_Release(&view);
+        return first_id + num_codes;
+    }
+
     std::vector<uint32_t> keys() {
-        std::pair<std::vector<uint8_t>, std::vector<std::pair<uint64_t, IdType> > > me;
-        std::vector<uint32_t> keys;
-        BOOST_FOREACH(me, dict) {
-            keys.push_back(python_key(me.first));
+        if (frozen)
+            return csr_dict.keys;
+        return dict.sorted_keys();
+    }
+
+    // freeze the buckets into the read-only CSR layout (see csr_buckets.hpp)
+    // call it once after the batch appends, get/mget/exist/keys work as before.
+    // appending to a frozen dict thaws it first.
+    // freezing an empty dict before load() lets the archive be loaded in CSR layout directly
+    void freeze() {
+        if (frozen)
+            return;
+        csr_dict.build(dict);
+        frozen = true;
+    }
+
+    void thaw() {
+        if (!frozen)
+            return;
+        csr_dict.restore(dict);
+        frozen = false;
+    }
+
+    bool is_frozen() { return frozen; }
+
+    // raises ValueError if codes cannot be appended to the dict, called by the append paths
+    virtual void check_appendable() {}
+
+    bool is_dense() { return dict.is_dense(); }
+
+    // snapshot the keys which have a bucket into the occupancy set (see occupancy.hpp), so that
+    // occupied_keys drops the probes of empty buckets. appending clears it, until it is built again
+    void build_occupancy() {
+        occupancy.build(keys());
+    }
+
+    // the keys of the buckets which may be non-empty, in their order: without any bucket lookup,
+    // a key is dropped if the occupancy set does not contain it. all keys are kept if the set
+    // is not built. returns a uint32 buffer
+    PyObject* occupied_keys(boost::python::object& keys) {
+        std::vector<uint32_t> key_vector = python_keys(keys);
+        std::vector<uint32_t> occupied;
+        occupied.reserve(key_vector.size());
+        BOOST_FOREACH(uint32_t key, key_vector) {
+            if (occupancy.contains(actual_key(key)))
+                occupied.push_back(key);
         }
+        return vector_to_bytearray<uint32_t>(occupied);
+    }
 
-        return keys;
+    bool has_occupancy() { return occupancy.is_built(); }
+
+    uint64_t occupancy_bytes() { return occupancy.bytes(); }
+
+    // approximated heap bytes used by the buckets of the dict
+    uint64_t memory_usage() {
+        if (frozen)
+            return csr_dict.memory_bytes();
+
+        uint64_t bytes = dict.table_bytes();
+        typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::const_iterator it;
+        for (it = dict.begin(); it != dict.end(); ++it)
+            bytes += it->second.capacity() * sizeof(std::pair<uint64_t, IdType>);
+        return bytes;
     }
 
     void set_keydimensions(boost::python::list& dimensions) {
@@ -260,86 +629,80 @@ public:
 
     // because we allow python program to retrieve elements in this dictionary by int (or long?) key
     // we should generate actual key from uint32_t (or uint64_t) key of python
-    std::vector<uint8_t> actual_key(uint32_t python_key) {
-        std::vector<uint8_t> key;
-        uint8_t current_bits = 0;
-        uint32_t base = 0xFF000000;
-
-
-        // for test
-        // std::cout << "In actual_key() python key: " << int(python_key) << "\n";
+    // only the lowest bytes covering index_key_dimension bits are kept
+    uint32_t actual_key(uint32_t python_key) {
+        return python_key & key_mask();
+    }
 
-        // for efficiency consideration, index_key_dimension should be divisible by 8
+    // the number of bytes which the actual key occupies
+    // for efficiency consideration, index_key_dimension should be divisible by 8
+    uint8_t key_bytes() {
+        uint8_t bytes = 0;
         for (int i = 0; i < 4; ++i) {
-            current_bits = (uint8_t)((python_key & base) >> (8 * (4 - i - 1)));
-            if (index_key_dimension > (8 * (4 - i - 1)))
-                key.insert(key.end(), current_bits);
-            base = base >> 8;
-        }
-
-        // for test
-        /*
-        std::cout << "key: ";
-        BOOST_FOREACH(uint8_t k, key) {
-            std::cout << " " << int(k);
+            if (index_key_dimension > (8 * i))
+                bytes++;
         }
-        std::cout << "\n";
-        */
-
-        /*
-        for (int i = 0; i < index_key_dimension; ++i) {
-
-            if ((python_key & 0x01) == 1)
-                current_bits = current_bits + (0x01 << (i % 8));
-
-            python_key = python_key >> 1;
-
-            if ((i + 1) % 8 == 0) {
-                key.insert(key.begin(), current_bits);
-                current_bits = 0;
-            }
-        }
-        */           
-        return key;
+        return bytes;
     }
 
-    uint32_t python_key(std::vector<uint8_t> key) {
-        uint32_t p_key = 0;
-        uint8_t cur_bit = 0;
-
-        for (std::vector<uint8_t>::reverse_iterator rit = key.rbegin(); rit != key.rend(); ++rit) {
-            uint8_t bits = *rit;
-
-            for (uint8_t i = 0; i < 8; i++) {
-
-                if ((bits & 0x01) == 1)
-                    p_key = p_key + (0x01 << cur_bit);
+    uint32_t key_mask() {
+        uint8_t bytes = key_bytes();
+        if (bytes >= 4)
+            return 0xFFFFFFFF;
+        return ((uint32_t)1 << (8 * bytes)) - 1;
+    }
 
-                cur_bit++;
+    // the bits which the codes of the bucket of table_key have on the key dimensions, see append_codes.
+    // the bits of the key dimensions are set in mask
+    uint64_t key_code_bits(uint32_t table_key, uint64_t* mask) {
+        uint64_t bits = 0;
+        *mask = 0;
 
-                bits = bits >> 1;
-            }
+        uint8_t num_dims = key_dimensions.size();
+        if (key_dimensions.size() > 32)
+            return 0;
+        BOOST_FOREACH(uint32_t dim, key_dimensions) {
+            if (dim >= 64)
+                return 0;
         }
+        for (uint8_t j = 0; j < num_dims; j++) {
+            uint64_t bit = (uint64_t)1 << (63 - key_dimensions[j]);
+            *mask |= bit;
+            if ((table_key >> (num_dims - 1 - j)) & 0x01)
+                bits |= bit;
+        }
+        return bits;
+    }
 
-        // for test
-        // std::cout << "In python_key() python key: " << long(p_key) << "\n";
-
-        return p_key;
+    // called before saving so the archived keys have the same width as before
+    void sync_key_bytes() {
+        dict.key_bytes = key_bytes();
+        csr_dict.key_bytes = key_bytes();
     }
 
     template<class Archive>
     void serialize(Archive & ar, const unsigned int version) {
-        ar & dict;
+        if (frozen)
+            ar & csr_dict;
+        else
+            ar & dict;
         ar & key_dimensions;
         ar & index_key_dimension;
     }
 
-    // internally, we use a vector of uint8_t values as key of indexing (dictionary)
+    // internally, we use the uint32_t actual key as key of indexing (dictionary)
 
-    std::map<std::vector<uint8_t>, std::vector<std::pair<uint64_t, IdType> > > dict;
+    BucketTable<std::vector<std::pair<uint64_t, IdType> > > dict;
     std::vector<uint32_t> key_dimensions;
 
     uint8_t index_key_dimension;
+
+    // when frozen, the buckets are in csr_dict and dict is empty
+    CSRBuckets<IdType> csr_dict;
+    bool frozen;
+
+    // the keys which had a bucket at the last build_occupancy, cleared by the appends
+    KeyOccupancy occupancy;
 };
 
 
@@ -347,310 +710,1220 @@ template <class IdType>
 bool sort_func(std::pair<uint64_t, IdType> first, std::pair<uint64_t, IdType> second) {
     return (first.first < second.first);
 }
+
+// the position of code in the reflected binary Gray code sequence (the inverse Gray code)
+inline uint64_t gray_rank(uint64_t code) {
+    for (uint32_t shift = 1; shift < 64; shift <<= 1)
+        code ^= code >> shift;
+    return code;
+}
+
+template <class IdType>
+bool gray_sort_func(const std::pair<uint64_t, IdType>& first, const std::pair<uint64_t, IdType>& second) {
+    return gray_rank(first.first) < gray_rank(second.first);
+}
+
+// the orders of the codes of a bucket before run-length encoding, see FastCompressDict::set_code_order.
+// numeric order keeps the high-order columns in long runs, while in Gray code order consecutive
+// codes tend to differ in fewer bits, which also shortens the runs of the low-order columns.
+// the greedy order chains each code to its nearest (hamming distance) remaining one
+enum CodeOrder {
+    CODE_ORDER_NUMERIC = 0,
+    CODE_ORDER_GRAY = 1,
+    CODE_ORDER_GREEDY = 2
+};
+
+// the greedy order is quadratic in the bucket size, larger buckets are kept in Gray code order
+static const size_t GREEDY_ORDER_MAX_CODES = 4096;
+
+// heap bytes of an id vector, approximated for string ids
+template <class IdType>
+uint64_t id_vector_bytes(const std::vector<IdType>& ids) {
+    return ids.capacity() * sizeof(IdType);
+}
+
+template <>
+uint64_t id_vector_bytes<std::string>(const std::vector<std::string>& ids) {
+    uint64_t bytes = ids.capacity() * sizeof(std::string);
+    for (size_t i = 0; i < ids.size(); i++)
+        bytes += ids[i].capacity();
+    return bytes;
+}
+
+template <class IdType>
+bool numeric_ids() { return true; }
+
+template <>
+bool numeric_ids<std::string>() { return false; }
+
+template <class IdType>
+void order_codes(std::vector<std::pair<uint64_t, IdType> >& bucket, uint8_t order) {
+    if (order == CODE_ORDER_NUMERIC) {
+        std::sort(bucket.begin(), bucket.end(), sort_func<IdType>);
+        return;
+    }
+
+    std::sort(bucket.begin(), bucket.end(), gray_sort_func<IdType>);
+    if (order != CODE_ORDER_GREEDY || bucket.size() > GREEDY_ORDER_MAX_CODES)
+        return;
+
+    // the remaining codes stay in Gray code order, which breaks the ties
+    for (size_t i = 1; i < bucket.size(); i++) {
+        uint64_t previous = bucket[i - 1].first;
+        size_t nearest = i;
+        int nearest_distance = __builtin_popcountll(previous ^ bucket[i].first);
+        for (size_t j = i + 1; j < bucket.size() && nearest_distance > 0; j++) {
+            int distance = __builtin_popcountll(previous ^ bucket[j].first);
+            if (distance < nearest_distance) {
+                nearest = j;
+                nearest_distance = distance;
+            }
+        }
+        std::rotate(bucket.begin() + i, bucket.begin() + nearest, bucket.begin() + nearest + 1);
+    }
+}
+
+// in-place transpose of a 64x64 bit matrix: afterwards bit j of block[i] is bit i of the former block[j]
+inline void transpose_bit_block(uint64_t* block) {
+    uint64_t mask = 0x00000000FFFFFFFFULL;
+    for (uint32_t width = 32; width != 0; width >>= 1, mask ^= mask << width) {
+        for (uint32_t k = 0; k < 64; k = ((k | width) + 1) & ~width) {
+            uint64_t swap = ((block[k] >> width) ^ block[k | width]) & mask;
+            block[k] ^= swap << width;
+            block[k | width] ^= swap;
+        }
+    }
+}
  
 template <class BitCountType, class IdType>
 class FastCompressDict: public FastDict<IdType> {
 
 public:
     typedef FastDict<IdType> super;
-
-    FastCompressDict(uint8_t k_dim) : FastDict<IdType>(k_dim) { dict_status = -1; }
+    typedef std::vector<std::pair<uint64_t, IdType> > raw_bucket_type;
+    // the first id and the number of ids of a group of identical codes, see query_topk
+    typedef std::pair<const IdType*, uint64_t> id_group;
+    // set in the number of ids of a group of a delta code, whose id is not tested against the
+    // tombstones: these only delete compressed codes
+    static const uint64_t DELTA_GROUP = (uint64_t)1 << 63;
+
+    // the bucket tables of all statuses are dense if dense is true, the side tables of the buckets
+    // (deleted counts, packed ids, id ranges) are kept hashed
+    FastCompressDict(uint8_t k_dim, bool dense = false) : FastDict<IdType>(k_dim, dense) {
+        dict_status = -1; hybrid_containers = 7; code_order = CODE_ORDER_NUMERIC; ids_codec = ID_CODEC_RAW; renumbered = false;
+        if (dense) {
+            column_dict.set_dense(k_dim);
+            column_vlq_dict.set_dense(k_dim);
+            column_hybrid_dict.set_dense(k_dim);
+            runtime_dict.set_dense(k_dim);
+            runtime_python_dict.set_dense(k_dim);
+            runtime_vlq_dict.set_dense(k_dim);
+        }
+    }
 
     friend class boost::serialization::access;
 
     void merge(FastCompressDict<BitCountType, IdType>& source) {
-
-        std::pair<std::vector<uint8_t>, std::vector<std::pair<uint64_t, IdType> > > me;
-        BOOST_FOREACH(me, source.dict) {
-            std::pair<uint64_t, IdType> element;
-            BOOST_FOREACH(element, me.second) {
-                super::dict[me.first].insert(super::dict[me.first].end(), element);
-            }
+        check_appendable();
+        super::thaw();
+        super::occupancy.clear();
+        source.thaw();
+
+        typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::iterator it;
+        for (it = source.dict.begin(); it != source.dict.end(); ++it) {
+            std::vector<std::pair<uint64_t, IdType> >& bucket = super::dict[it->first];
+            bucket.insert(bucket.end(), it->second.begin(), it->second.end());
         }
 
     }
 
-    void go_index() {
-
-        /*
-        BOOST_FOREACH(me, super::dict) {
-            // sort binart codes in each bucket
-            // std::vector<std::pair<uint64_t, IdType> > vec = me.second;
-            std::sort(me.second.begin(), me.second.end(), sort_func<IdType>);
-
-            
-            // for test
-            std::pair<uint64_t, IdType> element;
-
-            BOOST_FOREACH(element, me.second) {
-                std::cout << ' ' << element.first;
-            }
-            std::cout << '\n';
+    // a runtime dict (2, 3) is not consulted together with the raw dict, the appended codes would
+    // never be searched
+    void check_appendable() {
+        if (dict_status == 2 || dict_status == 3) {
+            PyErr_SetString(PyExc_ValueError, "cannot append codes to a runtime dict");
+            boost::python::throw_error_already_set();
         }
-        */
+    }
 
-        std::pair<std::vector<uint8_t>, std::vector<std::pair<uint64_t, IdType> > > me;
+    void go_index() {
+        parallel_go_index(1);
+    }
 
-        BOOST_FOREACH(me, super::dict) {
-            // for binary codes in each bucket
+    // compress buckets with num_threads worker threads (0: one per hardware thread)
+    // buckets are independent, so the result is the same as the single threaded one
+    void parallel_go_index(uint32_t num_threads) {
+        // a compressed dict folds the codes appended since in, instead of replacing its buckets
+        if (dict_status == 0) {
+            compact(num_threads);
+            return;
+        }
 
-            // sort binart codes in each bucket
-            std::sort(me.second.begin(), me.second.end(), sort_func<IdType>);
+        ScopedGILRelease release;
+        super::thaw();
 
-            // for test
-            /*
-            std::pair<uint64_t, IdType> element_test;
+        typedef typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::iterator bucket_iterator;
+        bucket_iterator buckets = super::dict.begin();
 
-            std::cout << "bucket: ";
+        std::vector<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > > compressed(super::dict.size());
 
-            BOOST_FOREACH(element_test, me.second) {
-                std::cout << ' ' << element_test.first;
-            }
-            std::cout << '\n';
-            */
- 
-            // generate column-based representation for binary codes in each bucket
+        parallel_for(super::dict.size(), num_threads, [&](size_t index) {
+            compress_bucket((buckets + index)->second, compressed[index], (buckets + index)->first);
+        });
 
-            std::vector<std::vector<uint8_t> > columns(64, *new std::vector<uint8_t>());
-            std::pair<uint64_t, IdType> element;
-            std::vector<IdType> id_vector;
+        column_dict.reserve(column_dict.size() + compressed.size());
+        for (size_t index = 0; index < compressed.size(); index++)
+            column_dict[(buckets + index)->first] = std::move(compressed[index]);
 
-            BOOST_FOREACH(element, me.second) {
-                uint64_t binary_code = element.first;
- 
-                // test
-                // std::cout << "code: " << uint64_t(binary_code) << ' ' << int(element.second) << "\n";
- 
+        super::dict.clear();
+        drop_id_keys();
 
-                for (uint8_t i = 0; i < 64; i++) {
-                    if ((binary_code & 0x01) == 1) {
-                        columns[i].push_back(1);    
-                    } else {
-                        columns[i].push_back(0);
-                    }
-                    binary_code = binary_code >> 1; 
-                }
-    
-                id_vector.push_back(element.second);
-            }
- 
-            // for test
-            /*
-            uint8_t index= 0;
-            BOOST_FOREACH(std::vector<uint8_t> column, columns) {
-                std::cout << int(index++) << ": ";
-                BOOST_FOREACH(uint8_t bit, column) {
-                    std::cout << int(bit) << ' ';
-                } 
-                std::cout << '\n';
-            }
-            index = 0;
-            */
-
-            //  compress data
-            std::vector<std::vector<BitCountType> > compress_data(64, *new std::vector<BitCountType>());
-            uint8_t column_index = 0;
-            BOOST_FOREACH(std::vector<uint8_t> column, columns) {
-                //  scan each column to compress the data
-                uint8_t prev_repeat_bit = 0;
-                BitCountType repeat_count = 0;
-                BOOST_FOREACH(uint8_t bit, column) {
-                    if (bit == prev_repeat_bit) {
-                        repeat_count++;
-                    } else {
-                        compress_data[column_index].push_back(repeat_count);        
-                        prev_repeat_bit = bit;
-                        repeat_count = 1;
-                    }
-                }
-                compress_data[column_index].push_back(repeat_count);
-
-                // make the length of compressed column even
-                // it is for concatenating corresponding columns of different buckets later in python code
-                if (compress_data[column_index].size() % 2 != 0)
-                    compress_data[column_index].push_back(0);
-                
-                column_index++;
-            }
+        dict_status = 0;
+    }
 
-            
-            // test
-            /*
-            BOOST_FOREACH(std::vector<uint8_t> column, compress_data) {
-                std::cout << int(index++) << ": ";
-                BOOST_FOREACH(uint8_t bit, column) {
-                    std::cout << int(bit) << ' ';
-                } 
-                std::cout << '\n';
-            }
-            */
-            
-            std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > pair(compress_data, id_vector);
-            column_dict[me.first] = pair;
-            //super::set_with_bool_key(me.first, 0x00, *new IdType());
-            //super::dict.erase(me.first);
+    // compress the buckets one at a time straight into column_dict and erase each raw bucket
+    // right after it, so the raw and the compressed index only overlap by a single bucket.
+    // slower than parallel_go_index but with a lower peak memory usage
+    void incremental_go_index() {
+        if (dict_status == 0) {
+            compact(1);
+            return;
+        }
 
+        ScopedGILRelease release;
+        super::thaw();
+
+        column_dict.reserve(column_dict.size() + super::dict.size());
+
+        // erasing the last entry does not move any other bucket
+        std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > compressed;
+        while (!super::dict.empty()) {
+            typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::iterator last = super::dict.end() - 1;
+            uint32_t key = last->first;
+            compress_bucket(last->second, compressed, key);
+            super::dict.erase(key);
+            column_dict[key] = std::move(compressed);
+            compressed.first.clear();
+            compressed.second.clear();
         }
+        drop_id_keys();
+
         super::dict.clear();
 
         dict_status = 0;
     }
 
-    // convert column_dict to VLQ base64 format
-    void to_VLQ_base64_dict() {
+    // order the binary codes of a bucket (see set_code_order), transpose them into 64 columns
+    // (column i holds bit i of the codes) and run-length encode each column.
+    // the columns of the key dimensions are the same for all codes of the bucket of table_key
+    // (see key_code_bits), they are left empty and the decoders take their bits from the key.
+    // if a code does not agree with the key, e.g. it was appended under another key, all
+    // columns are kept. the bucket is released after compressing
+    void compress_bucket(std::vector<std::pair<uint64_t, IdType> >& bucket, std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >& compressed, uint32_t table_key) {
+
+        order_codes(bucket, code_order);
+
+        uint64_t key_mask;
+        uint64_t key_bits = super::key_code_bits(table_key, &key_mask);
+        for (size_t i = 0; i < bucket.size() && key_mask != 0; i++) {
+            if ((bucket[i].first ^ key_bits) & key_mask)
+                key_mask = 0;
+        }
 
-        std::pair<std::vector<uint8_t>, std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > > me;
+        std::vector<IdType>& id_vector = compressed.second;
+        id_vector.reserve(bucket.size());
+        for (size_t i = 0; i < bucket.size(); i++)
+            id_vector.push_back(bucket[i].second);
+
+        // generate column-based representation (column i holds bit i of the codes) and compress it.
+        // the codes are transposed in blocks of 64 so each column of a block is a single word,
+        // from which the runs are read off at the bit positions where the column changes
+
+        // the runs are collected in per-thread scratch columns and copied out at their final
+        // size at the end, so each compressed column is allocated once
+        static thread_local std::vector<BitCountType> compress_data[64];
+        for (uint32_t column_index = 0; column_index < 64; column_index++)
+            compress_data[column_index].clear();
+
+        // runs start with 0 bits. the lengths are counted in uint64_t and cast on output,
+        // which wraps the same way as counting in BitCountType
+        uint64_t repeat_counts[64] = {0};
+        uint64_t prev_repeat_bits = 0;
+        uint64_t block[64];
+
+        for (size_t begin = 0; begin < bucket.size(); begin += 64) {
+            uint32_t block_size = std::min<size_t>(64, bucket.size() - begin);
+            for (uint32_t j = 0; j < 64; j++)
+                block[j] = j < block_size ? bucket[begin + j].first : 0;
+
+            transpose_bit_block(block);
+
+            uint64_t valid_bits = block_size == 64 ? ~(uint64_t)0 : (((uint64_t)1 << block_size) - 1);
+
+            for (uint32_t column_index = 0; column_index < 64; column_index++) {
+                uint64_t column = block[column_index];
+                uint64_t prev_repeat_bit = (prev_repeat_bits >> column_index) & 0x01;
+
+                // bit j is set if code j differs from the previous code in this column
+                uint64_t changes = (column ^ ((column << 1) | prev_repeat_bit)) & valid_bits;
+                uint32_t position = 0;
+                while (changes != 0) {
+                    uint32_t change = __builtin_ctzll(changes);
+                    compress_data[column_index].push_back((BitCountType)(repeat_counts[column_index] + change - position));
+                    repeat_counts[column_index] = 0;
+                    position = change;
+                    changes &= changes - 1;
+                }
+                repeat_counts[column_index] += block_size - position;
 
-        BOOST_FOREACH(me, column_dict) {
-            std::vector<std::string> columns;
+                prev_repeat_bits &= ~((uint64_t)1 << column_index);
+                prev_repeat_bits |= ((column >> (block_size - 1)) & 0x01) << column_index;
+            }
+        }
 
-            std::vector<BitCountType> column;
-            BOOST_FOREACH(column, me.second.first) {               
-                std::string column_as_VLQ_base64 = "";
+        std::vector<std::pair<uint64_t, IdType> >().swap(bucket);
 
-                BOOST_FOREACH(BitCountType ele, column) {
-                    column_as_VLQ_base64 += base64VLQ_encode<BitCountType>(ele);
-                }
-                columns.insert(columns.end(), column_as_VLQ_base64);
-            }
+        for (uint32_t column_index = 0; column_index < 64; column_index++) {
+            compress_data[column_index].push_back((BitCountType)repeat_counts[column_index]);
 
-            std::pair<std::vector<std::string>, std::vector<IdType> > columns_pair(columns, me.second.second);
-            column_vlq_dict[me.first] = columns_pair;
+            // make the length of compressed column even
+            // it is for concatenating corresponding columns of different buckets later in python code
+            if (compress_data[column_index].size() % 2 != 0)
+                compress_data[column_index].push_back(0);
         }
-        column_dict.clear();
 
-        dict_status = 1;
+        compressed.first.resize(64);
+        for (uint32_t column_index = 0; column_index < 64; column_index++) {
+            if ((key_mask >> column_index) & 0x01)
+                compressed.first[column_index].clear();
+            else
+                compressed.first[column_index].assign(compress_data[column_index].begin(), compress_data[column_index].end());
+        }
     }
- 
-    // test for buffer
-    /*
-    std::pair<std::vector<PyObject>, std::vector<IdType> >  get_cols_as_buffer(uint32_t key) {
-        std::vector<uint8_t> bool_key = super::actual_key(key);
 
-        std::vector<PyObject> buffers(0);
+    // the order of the codes in the buckets compressed from now on (go_index, compact and
+    // compact_deleted): 0 numeric (default), 1 Gray code, 2 greedy nearest neighbour, see order_codes.
+    // the order only changes the number of runs, the decoded buckets follow it.
+    // not archived, numeric after loading
+    void set_code_order(uint8_t order) {
+        if (order > CODE_ORDER_GREEDY) {
+            PyErr_SetString(PyExc_ValueError, "code order expects 0 (numeric), 1 (Gray code) or 2 (greedy)");
+            boost::python::throw_error_already_set();
+        }
+        code_order = order;
+    }
+
+    uint8_t get_code_order() { return code_order; }
+
+    // the bits of the key dimension columns compress_bucket dropped from bucket, which is
+    // the bucket of table_key. mask gets the dropped columns
+    template <class BucketType>
+    uint64_t dropped_bits(const BucketType& bucket, uint32_t table_key, uint64_t* mask) {
+        uint64_t key_mask;
+        uint64_t key_bits = super::key_code_bits(table_key, &key_mask);
+
+        *mask = 0;
+        if (key_mask == 0 || bucket.second.size() == 0)
+            return 0;
+        for (size_t column_index = 0; column_index < bucket.first.size() && column_index < 64; column_index++) {
+            if (bucket.first[column_index].empty() && ((key_mask >> column_index) & 0x01))
+                *mask |= (uint64_t)1 << column_index;
+        }
+        return key_bits & *mask;
+    }
 
-        if (column_dict.count(bool_key) > 0) {
+    // the runs of a column whose num_codes bits all are bit, as compress_bucket encodes it
+    static std::vector<BitCountType> constant_column(bool bit, uint64_t num_codes) {
+        std::vector<BitCountType> column(2, 0);
+        column[bit ? 1 : 0] = (BitCountType)num_codes;
+        return column;
+    }
 
-                std::vector<BitCountType> column;
-                BOOST_FOREACH(column, column_dict[bool_key].first) {               
-                    void* data = (void*)(column.data());
-                    Py_ssize_t size = column.size();
-                    buffers.insert(buffers.end(), *PyBuffer_FromMemory (data, size));
-                }
+    // put the columns dropped by compress_bucket back, for the GPU kernels expecting 64 columns
+    void restore_key_columns(std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >& bucket, uint32_t table_key) {
+        uint64_t mask;
+        uint64_t bits = dropped_bits(bucket, table_key, &mask);
+        for (uint32_t column_index = 0; mask != 0; column_index++, mask >>= 1) {
+            if (mask & 0x01)
+                bucket.first[column_index] = constant_column((bits >> column_index) & 0x01, bucket.second.size());
         }
+    }
 
-        std::pair<std::vector<PyObject>, std::vector<IdType> > apair(buffers, column_dict[bool_key].second);
+    void restore_key_columns(std::pair<std::vector<std::string>, std::vector<IdType> >& bucket, uint32_t table_key) {
+        uint64_t mask;
+        uint64_t bits = dropped_bits(bucket, table_key, &mask);
+        for (uint32_t column_index = 0; mask != 0; column_index++, mask >>= 1) {
+            if (mask & 0x01)
+                bucket.first[column_index] = VLQ_base64_column(constant_column((bits >> column_index) & 0x01, bucket.second.size()));
+        }
+    }
 
-        return apair;
+    // convert column_dict to VLQ base64 format
+    void to_VLQ_base64_dict() {
+        parallel_to_VLQ_base64_dict(1);
     }
-    */
 
-    // at begining, we use std vector to provide raw data (via .data()) to python buffer
-    // however, the raw data is broken and we can not obtain correct data at python side
-    // but using plain array is OK.
-    // since dynamically create array at every time python sends query is too slow
-    // so we add this method to be called before any querying of compressed dict.
-    void init_runtime_dict() {
+    // convert column_dict to VLQ base64 format with num_threads worker threads (0: one per hardware thread)
+    void parallel_to_VLQ_base64_dict(uint32_t num_threads) {
+        ScopedGILRelease release;
 
-        std::pair<std::vector<uint8_t>, std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > > me;
+        typedef typename BucketTable<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > >::iterator bucket_iterator;
+        bucket_iterator buckets = column_dict.begin();
 
-        BOOST_FOREACH(me, column_dict) {
-            std::vector<BitCountType*> columns;
-            std::vector<uint32_t> columns_length;
+        std::vector<std::pair<std::vector<std::string>, std::vector<IdType> > > encoded(column_dict.size());
 
-            std::vector<BitCountType> column;
-            BOOST_FOREACH(column, me.second.first) {               
-                BitCountType* column_as_array =  new BitCountType[column.size()];
+        parallel_for(column_dict.size(), num_threads, [&](size_t index) {
+            encode_VLQ_base64_bucket((buckets + index)->second, encoded[index]);
+        });
 
-                int ele_index = 0;
-                BOOST_FOREACH(BitCountType ele, column) {
-                    column_as_array[ele_index++] = ele;
-                }
-                columns.insert(columns.end(), column_as_array);
-                columns_length.insert(columns_length.end(), column.size());
-            }
+        column_vlq_dict.reserve(column_vlq_dict.size() + encoded.size());
+        for (size_t index = 0; index < encoded.size(); index++)
+            column_vlq_dict[(buckets + index)->first] = std::move(encoded[index]);
 
-            std::pair<std::vector<BitCountType*>, std::vector<IdType> > nested_pair(columns, me.second.second);
-            std::pair<std::vector<uint32_t>, std::pair<std::vector<BitCountType*>, std::vector<IdType> > > pair(columns_length, nested_pair);
-            runtime_dict[me.first] = pair;
-        }
         column_dict.clear();
 
-        dict_status = 2;
+        dict_status = 1;
     }
- 
-    void init_runtime_python_dict() {
 
-        std::pair<std::vector<uint8_t>, std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > > me;
+    // VLQ base64 encode the columns of a compressed bucket. the ids are moved to encoded
+    void encode_VLQ_base64_bucket(std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >& bucket, std::pair<std::vector<std::string>, std::vector<IdType> >& encoded) {
+        std::vector<std::string>& columns = encoded.first;
 
-        BOOST_FOREACH(me, column_dict) {
-            boost::python::list columns;
-            std::vector<uint32_t> columns_length;
+        BOOST_FOREACH(std::vector<BitCountType>& column, bucket.first) {               
+            columns.insert(columns.end(), VLQ_base64_column(column));
+        }
+        encoded.second.swap(bucket.second);
+    }
 
-            std::vector<BitCountType> column;
-            BOOST_FOREACH(column, me.second.first) {               
-                BitCountType* column_as_array =  new BitCountType[column.size()];
+    std::string VLQ_base64_column(const std::vector<BitCountType>& column) {
+        std::string column_as_VLQ_base64 = "";
 
-                int ele_index = 0;
-                BOOST_FOREACH(BitCountType ele, column) {
-                    column_as_array[ele_index++] = ele;
-                }
+        BOOST_FOREACH(BitCountType ele, column) {
+            column_as_VLQ_base64 += base64VLQ_encode<BitCountType>(ele);
+        }
+        return column_as_VLQ_base64;
+    }
 
-                PyObject* buffer_obj = PyBuffer_FromMemory ((void*)column_as_array, column.size() * sizeof(BitCountType));
-                boost::python::incref(buffer_obj);
+    // appends to a compressed (0), VLQ base64 (1) or hybrid (4) dict go to the raw dict, which then
+    // is a delta segment of the compressed buckets: the cpu queries of these statuses consult it
+    // alongside the columns. compact folds the delta into the compressed buckets, only the buckets
+    // with appended codes are decoded, merged with their delta and compressed again.
+    // num_threads is the same as in parallel_go_index
+    void compact(uint32_t num_threads) {
+        if (dict_status != 0 && dict_status != 1 && dict_status != 4) {
+            PyErr_SetString(PyExc_ValueError, "compact expects a compressed, VLQ base64 or hybrid dict");
+            boost::python::throw_error_already_set();
+        }
 
-                columns.append(*buffer_obj);
-                columns_length.insert(columns_length.end(), column.size());
+        // a deleted id appended again would be hidden by its tombstone once compressed: all the
+        // deleted codes are dropped first, which clears the tombstones
+        super::thaw();
+        if (!tombstones.empty()) {
+            typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::const_iterator it;
+            bool appended_again = false;
+            for (it = super::dict.begin(); it != super::dict.end() && !appended_again; ++it) {
+                for (size_t i = 0; i < it->second.size() && !appended_again; i++)
+                    appended_again = tombstones.contains(it->second[i].second);
             }
+            if (appended_again)
+                compact_deleted(0);
+        }
 
-            std::pair<boost::python::list, std::vector<IdType> > nested_pair(columns, me.second.second);
-            std::pair<std::vector<uint32_t>, std::pair<boost::python::list, std::vector<IdType> > > pair(columns_length, nested_pair);
-            runtime_python_dict[me.first] = pair;
+        ScopedGILRelease release;
+        super::thaw();
+
+        typedef typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::iterator bucket_iterator;
+        bucket_iterator buckets = super::dict.begin();
+
+        if (dict_status == 0) {
+            std::vector<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > > compressed(super::dict.size());
+
+            parallel_for(super::dict.size(), num_threads, [&](size_t index) {
+                std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >* bucket = column_dict.find((buckets + index)->first);
+                if (bucket != NULL)
+                    append_uncompressed(*bucket, (buckets + index)->first, &FastCompressDict<BitCountType, IdType>::uncompress_bucket, (buckets + index)->second);
+                compress_bucket((buckets + index)->second, compressed[index], (buckets + index)->first);
+            });
+
+            column_dict.reserve(column_dict.size() + compressed.size());
+            for (size_t index = 0; index < compressed.size(); index++)
+                column_dict[(buckets + index)->first] = std::move(compressed[index]);
+        } else if (dict_status == 4) {
+            std::vector<std::pair<std::vector<HybridColumn>, std::vector<IdType> > > compressed(super::dict.size());
+
+            parallel_for(super::dict.size(), num_threads, [&](size_t index) {
+                std::pair<std::vector<HybridColumn>, std::vector<IdType> >* bucket = column_hybrid_dict.find((buckets + index)->first);
+                if (bucket != NULL)
+                    append_uncompressed_hybrid(*bucket, (buckets + index)->second);
+                compress_hybrid_bucket((buckets + index)->second, compressed[index], hybrid_containers);
+            });
+
+            column_hybrid_dict.reserve(column_hybrid_dict.size() + compressed.size());
+            for (size_t index = 0; index < compressed.size(); index++)
+                column_hybrid_dict[(buckets + index)->first] = std::move(compressed[index]);
+        } else {
+            std::vector<std::pair<std::vector<std::string>, std::vector<IdType> > > encoded(super::dict.size());
+
+            parallel_for(super::dict.size(), num_threads, [&](size_t index) {
+                std::pair<std::vector<std::string>, std::vector<IdType> >* bucket = column_vlq_dict.find((buckets + index)->first);
+                if (bucket != NULL)
+                    append_uncompressed(*bucket, (buckets + index)->first, &FastCompressDict<BitCountType, IdType>::uncompress_VLQ_base64_bucket, (buckets + index)->second);
+
+                std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > compressed;
+                compress_bucket((buckets + index)->second, compressed, (buckets + index)->first);
+                encode_VLQ_base64_bucket(compressed, encoded[index]);
+            });
+
+            column_vlq_dict.reserve(column_vlq_dict.size() + encoded.size());
+            for (size_t index = 0; index < encoded.size(); index++)
+                column_vlq_dict[(buckets + index)->first] = std::move(encoded[index]);
         }
-        column_dict.clear();
 
-        dict_status = 2;
-    }
- 
-    // initiate runtime dict for VLQ base64 column dict
-    void init_runtime_VLQ_base64_dict() {
+        // the rewritten buckets dropped their deleted codes
+        for (bucket_iterator it = super::dict.begin(); it != super::dict.end(); ++it)
+            deleted_counts.erase(it->first);
+        if (deleted_counts.empty())
+            tombstones.clear();
 
-        std::pair<std::vector<uint8_t>, std::pair<std::vector<std::string>, std::vector<IdType> > > me;
+        super::dict.clear();
+        drop_id_keys();
+    }
+
+    // the number of codes in the delta segment, see compact
+    uint64_t delta_size() {
+        if (dict_status == -1)
+            return 0;
+
+        uint64_t num_codes = 0;
+        typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::const_iterator it;
+        for (it = super::dict.begin(); it != super::dict.end(); ++it)
+            num_codes += it->second.size();
+        return num_codes;
+    }
+
+    // the delta buckets of keys, see compact. the raw dict is only a delta after compressing
+    std::vector<raw_bucket_type*> find_delta_buckets(const std::vector<uint32_t>& keys) {
+        if (dict_status == -1)
+            return std::vector<raw_bucket_type*>();
+        return find_buckets(super::dict, keys);
+    }
+
+    // decode the compressed bucket of table_key and append its (code, id) pairs to raw, except the deleted ones
+    template <class BucketType>
+    void append_uncompressed(const BucketType& bucket, uint32_t table_key, void (FastCompressDict<BitCountType, IdType>::*uncompress)(const BucketType&, uint32_t, uint64_t*), std::vector<std::pair<uint64_t, IdType> >& raw) {
+        if (bucket.second.size() == 0)
+            return;
+
+        std::vector<uint64_t> binary_codes(bucket.second.size(), 0);
+        (this->*uncompress)(bucket, table_key, &binary_codes[0]);
+
+        raw.reserve(raw.size() + binary_codes.size());
+        for (size_t i = 0; i < binary_codes.size(); i++) {
+            if (!tombstones.contains(bucket.second[i]))
+                raw.push_back(std::pair<uint64_t, IdType>(binary_codes[i], bucket.second[i]));
+        }
+    }
+
+    // same as append_uncompressed for a hybrid compressed bucket
+    void append_uncompressed_hybrid(const std::pair<std::vector<HybridColumn>, std::vector<IdType> >& bucket, std::vector<std::pair<uint64_t, IdType> >& raw) {
+        std::vector<uint64_t> binary_codes;
+        uncompress_hybrid_bucket(bucket, binary_codes);
+        raw.reserve(raw.size() + binary_codes.size());
+        for (size_t i = 0; i < binary_codes.size(); i++) {
+            if (!tombstones.contains(bucket.second[i]))
+                raw.push_back(std::pair<uint64_t, IdType>(binary_codes[i], bucket.second[i]));
+        }
+    }
+
+    // delete image ids. their codes are erased from the raw dict (the delta segment once compressed)
+    // right away and tombstoned in the compressed buckets, where the cpu query paths filter them
+    // out until compact_deleted drops them. the columns of the runtime dicts (2, 3) are served to
+    // the GPU as they are, so their buckets are rewritten right away.
+    // returns the number of deleted codes
+    uint64_t delete_ids(boost::python::list& ids) {
+        if (renumbered) {
+            PyErr_SetString(PyExc_ValueError, "delete_ids expects ids that are not renumbered");
+            boost::python::throw_error_already_set();
+        }
+
+        // the rewritten runtime buckets are packed again below
+        uint8_t codec = ids_codec;
+        if (codec != ID_CODEC_RAW)
+            pack_ids(ID_CODEC_RAW);
+
+        // fresh: the ids which are not tombstones yet, count_deleted tombstones the ones found
+        // in the compressed buckets. the codes of the delta are erased right away
+        Tombstones<IdType> deleted, fresh;
+        std::vector<IdType> fresh_ids;
+        for (int i = 0; i < len(ids); i++) {
+            IdType id = boost::python::extract<IdType>(ids[i]);
+            deleted.insert(id);
+            if (dict_status != -1 && !tombstones.contains(id) && fresh.insert(id))
+                fresh_ids.push_back(id);
+        }
+
+        uint64_t removed = super::erase_deleted(deleted);
+        if (dict_status == -1)
+            return removed;
+
+        uint64_t previous_size = deleted_size();
+        if (dict_status == 0)
+            count_deleted(column_dict, fresh, fresh_ids);
+        else if (dict_status == 1)
+            count_deleted(column_vlq_dict, fresh, fresh_ids);
+        else if (dict_status == 2)
+            count_deleted(runtime_dict, fresh, fresh_ids);
+        else if (dict_status == 3)
+            count_deleted(runtime_vlq_dict, fresh, fresh_ids);
+        else if (dict_status == 4)
+            count_deleted(column_hybrid_dict, fresh, fresh_ids);
+        removed += deleted_size() - previous_size;
+
+        if (dict_status == 2 || dict_status == 3)
+            compact_deleted(0);
+        if (codec != ID_CODEC_RAW)
+            pack_ids(codec);
+
+        return removed;
+    }
+
+    // the number of deleted codes still held by the compressed buckets
+    uint64_t deleted_size() {
+        uint64_t num_codes = 0;
+        typename BucketTable<uint32_t>::const_iterator it;
+        for (it = deleted_counts.begin(); it != deleted_counts.end(); ++it)
+            num_codes += it->second;
+        return num_codes;
+    }
+
+    // physically drop the deleted codes of the compressed buckets in which they are more than
+    // threshold of the codes (0: all buckets with deleted codes). the buckets are decoded without
+    // the deleted codes and compressed again, buckets left empty are erased
+    void compact_deleted(double threshold) {
+        std::vector<uint32_t> keys;
+        typename BucketTable<uint32_t>::const_iterator it;
+        for (it = deleted_counts.begin(); it != deleted_counts.end(); ++it) {
+            if (it->second > threshold * bucket_size(it->first))
+                keys.push_back(it->first);
+        }
+
+        BOOST_FOREACH(uint32_t key, keys) {
+            purge_bucket(key);
+            deleted_counts.erase(key);
+        }
+
+        if (deleted_counts.empty())
+            tombstones.clear();
+    }
+
+    // the ids of a compressed or runtime bucket
+    template <class ColumnType>
+    static const std::vector<IdType>& bucket_ids(const std::pair<std::vector<ColumnType>, std::vector<IdType> >& bucket) {
+        return bucket.second;
+    }
+
+    template <class ColumnType>
+    static const std::vector<IdType>& bucket_ids(const std::pair<std::vector<uint32_t>, std::pair<std::vector<ColumnType*>, std::vector<IdType> > >& bucket) {
+        return bucket.second.second;
+    }
+
+    // tombstone the fresh ids which have codes in the buckets of table and add these codes to the
+    // deleted counts of their buckets. only the buckets which id_keys lists for them are scanned
+    template <class BucketType>
+    void count_deleted(BucketTable<BucketType>& table, const Tombstones<IdType>& fresh, const std::vector<IdType>& fresh_ids) {
+        if (fresh_ids.empty())
+            return;
+        if (id_keys.empty())
+            build_id_keys(table);
+
+        std::vector<uint32_t> keys;
+        BOOST_FOREACH(const IdType& id, fresh_ids) {
+            typename std::vector<std::pair<IdType, uint32_t> >::const_iterator it = std::lower_bound(id_keys.begin(), id_keys.end(), std::pair<IdType, uint32_t>(id, 0));
+            for (; it != id_keys.end() && it->first == id; ++it)
+                keys.push_back(it->second);
+        }
+        std::sort(keys.begin(), keys.end());
+        keys.erase(std::unique(keys.begin(), keys.end()), keys.end());
+
+        // an id purged from its bucket may still be listed, the buckets are counted as they are
+        BOOST_FOREACH(uint32_t key, keys) {
+            BucketType* bucket = table.find(key);
+            if (bucket == NULL)
+                continue;
+            uint32_t count = 0;
+            BOOST_FOREACH(const IdType& id, bucket_ids(*bucket)) {
+                if (fresh.contains(id)) {
+                    tombstones.insert(id);
+                    count++;
+                }
+            }
+            if (count > 0)
+                deleted_counts[key] += count;
+        }
+    }
+
+    // the (id, key) pairs of the buckets of table, sorted by id
+    template <class BucketType>
+    void build_id_keys(BucketTable<BucketType>& table) {
+        typename BucketTable<BucketType>::const_iterator it;
+        for (it = table.begin(); it != table.end(); ++it) {
+            BOOST_FOREACH(const IdType& id, bucket_ids(it->second)) {
+                id_keys.push_back(std::pair<IdType, uint32_t>(id, it->first));
+            }
+        }
+        std::sort(id_keys.begin(), id_keys.end());
+    }
 
-        BOOST_FOREACH(me, column_vlq_dict) {
-            std::vector<char*> columns;
-            std::vector<uint32_t> columns_length;
+    // called when codes are compressed into the buckets, id_keys is built again by delete_ids
+    void drop_id_keys() {
+        std::vector<std::pair<IdType, uint32_t> >().swap(id_keys);
+    }
 
-            BOOST_FOREACH(std::string column, me.second.first) {               
-                char* column_as_array = new char[column.size()];
+    // the number of codes of a compressed bucket in the current dict status
+    uint64_t bucket_size(uint32_t key) {
+        if (dict_status == 0)
+            return column_dict.find(key)->second.size();
+        else if (dict_status == 1)
+            return column_vlq_dict.find(key)->second.size();
+        else if (dict_status == 2)
+            return runtime_dict.find(key)->second.second.size();
+        else if (dict_status == 3)
+            return runtime_vlq_dict.find(key)->second.second.size();
+        return column_hybrid_dict.find(key)->second.size();
+    }
 
-                for (int str_index = 0; str_index < column.length(); str_index++)
-                    column_as_array[str_index] = (char)column[str_index];
+    // decode a compressed bucket without its deleted codes and compress it again
+    void purge_bucket(uint32_t key) {
+        std::vector<std::pair<uint64_t, IdType> > raw;
+        std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > compressed;
+
+        if (dict_status == 0) {
+            append_uncompressed(*column_dict.find(key), key, &FastCompressDict<BitCountType, IdType>::uncompress_bucket, raw);
+            if (raw.empty())
+                column_dict.erase(key);
+            else {
+                compress_bucket(raw, compressed, key);
+                column_dict[key] = std::move(compressed);
+            }
+        } else if (dict_status == 1) {
+            append_uncompressed(*column_vlq_dict.find(key), key, &FastCompressDict<BitCountType, IdType>::uncompress_VLQ_base64_bucket, raw);
+            if (raw.empty())
+                column_vlq_dict.erase(key);
+            else {
+                std::pair<std::vector<std::string>, std::vector<IdType> > encoded;
+                compress_bucket(raw, compressed, key);
+                encode_VLQ_base64_bucket(compressed, encoded);
+                column_vlq_dict[key] = std::move(encoded);
+            }
+        } else if (dict_status == 2) {
+            // the python buffers of the bucket refer to its former columns
+            runtime_python_dict.erase(key);
+
+            std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > columns;
+            runtime_bucket_columns(*runtime_dict.find(key), columns);
+            append_uncompressed(columns, key, &FastCompressDict<BitCountType, IdType>::uncompress_bucket, raw);
+            runtime_dict.erase(key);
+            if (!raw.empty()) {
+                compress_bucket(raw, compressed, key);
+                to_runtime_bucket(compressed, key, runtime_dict[key]);
+            }
+        } else if (dict_status == 3) {
+            std::pair<std::vector<std::string>, std::vector<IdType> > columns;
+            runtime_VLQ_base64_bucket_columns(*runtime_vlq_dict.find(key), columns);
+            append_uncompressed(columns, key, &FastCompressDict<BitCountType, IdType>::uncompress_VLQ_base64_bucket, raw);
+            runtime_vlq_dict.erase(key);
+            if (!raw.empty()) {
+                std::pair<std::vector<std::string>, std::vector<IdType> > encoded;
+                compress_bucket(raw, compressed, key);
+                encode_VLQ_base64_bucket(compressed, encoded);
+                to_runtime_VLQ_base64_bucket(encoded, key, runtime_vlq_dict[key]);
+            }
+        } else if (dict_status == 4) {
+            std::pair<std::vector<HybridColumn>, std::vector<IdType> >* bucket = column_hybrid_dict.find(key);
+            append_uncompressed_hybrid(*bucket, raw);
+            if (raw.empty())
+                column_hybrid_dict.erase(key);
+            else {
+                std::pair<std::vector<HybridColumn>, std::vector<IdType> > hybrid;
+                compress_hybrid_bucket(raw, hybrid, hybrid_containers);
+                *bucket = std::move(hybrid);
+            }
+        }
+    }
 
-                columns.insert(columns.end(), column_as_array);
-                columns_length.insert(columns_length.end(), column.size());
+    // drop the deleted ones among the first num_compressed results, which come from compressed
+    // buckets (the delta segment holds no deleted codes). values[i] belongs to id_vector[i].
+    // returns the number of results kept
+    template <class ValueType>
+    uint64_t drop_deleted(ValueType* values, std::vector<IdType>& id_vector, uint64_t num_compressed) {
+        if (tombstones.empty())
+            return id_vector.size();
+
+        uint64_t kept = 0;
+        for (uint64_t i = 0; i < id_vector.size(); i++) {
+            if (i < num_compressed && tombstones.contains(id_vector[i]))
+                continue;
+            if (kept != i) {
+                values[kept] = values[i];
+                id_vector[kept] = std::move(id_vector[i]);
             }
+            kept++;
+        }
+        id_vector.resize(kept);
+        return kept;
+    }
+
+    // same as drop_deleted for ids only
+    std::vector<IdType> drop_deleted_ids(const std::vector<IdType>& id_vector) {
+        if (tombstones.empty())
+            return id_vector;
+
+        std::vector<IdType> kept;
+        BOOST_FOREACH(const IdType& id, id_vector) {
+            if (!tombstones.contains(id))
+                kept.push_back(id);
+        }
+        return kept;
+    }
+ 
+    // test for buffer
+    /*
+    std::pair<std::vector<PyObject>, std::vector<IdType> >  get_cols_as_buffer(uint32_t key) {
+        uint32_t table_key = super::actual_key(key);
+
+        std::vector<PyObject> buffers(0);
+
+        if (column_dict.count(table_key) > 0) {
+
+                std::vector<BitCountType> column;
+                BOOST_FOREACH(column, column_dict[table_key].first) {               
+                    void* data = (void*)(column.data());
+                    Py_ssize_t size = column.size();
+                    buffers.insert(buffers.end(), *PyBuffer_FromMemory (data, size));
+                }
+        }
+
+        std::pair<std::vector<PyObject>, std::vector<IdType> > apair(buffers, column_dict[table_key].second);
+
+        return apair;
+    }
+    */
+
+    // at begining, we use std vector to provide raw data (via .data()) to python buffer
+    // however, the raw data is broken and we can not obtain correct data at python side
+    // but using plain array is OK.
+    // since dynamically create array at every time python sends query is too slow
+    // so we add this method to be called before any querying of compressed dict.
+    // the arrays are allocated from runtime_arena and released by clear()
+    void init_runtime_dict() {
+        typedef typename BucketTable<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > >::iterator bucket_iterator;
+
+        // the runtime dict has no delta segment and serves its columns as they are, without
+        // filtering deleted codes
+        if (dict_status == 0 && delta_size() > 0)
+            compact(0);
+        compact_deleted(0);
+
+        runtime_dict.reserve(runtime_dict.size() + column_dict.size());
+        for (bucket_iterator it = column_dict.begin(); it != column_dict.end(); ++it)
+            to_runtime_bucket(it->second, it->first, runtime_dict[it->first]);
+        column_dict.clear();
 
-            std::pair<std::vector<char*>, std::vector<IdType> > nested_pair(columns, me.second.second);
-            std::pair<std::vector<uint32_t>, std::pair<std::vector<char*>, std::vector<IdType> > > pair(columns_length, nested_pair);
-            runtime_vlq_dict[me.first] = pair;
+        dict_status = 2;
+    }
+
+    // copy the columns of the compressed bucket of table_key into runtime_arena, with the key
+    // dimension columns restored (see restore_key_columns). the ids are moved to runtime_bucket
+    void to_runtime_bucket(std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >& bucket, uint32_t table_key, std::pair<std::vector<uint32_t>, std::pair<std::vector<BitCountType*>, std::vector<IdType> > >& runtime_bucket) {
+        restore_key_columns(bucket, table_key);
+        BOOST_FOREACH(const std::vector<BitCountType>& column, bucket.first) {
+            BitCountType* column_as_array = runtime_arena.template allocate<BitCountType>(column.size());
+            std::copy(column.begin(), column.end(), column_as_array);
+            runtime_bucket.second.first.push_back(column_as_array);
+            runtime_bucket.first.push_back(column.size());
         }
+        runtime_bucket.second.second.swap(bucket.second);
+    }
+ 
+    // same as init_runtime_dict, the python buffers of a bucket are created by its first
+    // get_python_cols_as_buffer and kept in runtime_python_dict
+    void init_runtime_python_dict() {
+        init_runtime_dict();
+    }
+ 
+    // initiate runtime dict for VLQ base64 column dict
+    void init_runtime_VLQ_base64_dict() {
+        typedef typename BucketTable<std::pair<std::vector<std::string>, std::vector<IdType> > >::iterator bucket_iterator;
+
+        if (dict_status == 1 && delta_size() > 0)
+            compact(0);
+        compact_deleted(0);
+
+        runtime_vlq_dict.reserve(runtime_vlq_dict.size() + column_vlq_dict.size());
+        for (bucket_iterator it = column_vlq_dict.begin(); it != column_vlq_dict.end(); ++it)
+            to_runtime_VLQ_base64_bucket(it->second, it->first, runtime_vlq_dict[it->first]);
         column_vlq_dict.clear();
 
         dict_status = 3;
     }
 
+    // same as to_runtime_bucket for a VLQ base64 compressed bucket
+    void to_runtime_VLQ_base64_bucket(std::pair<std::vector<std::string>, std::vector<IdType> >& bucket, uint32_t table_key, std::pair<std::vector<uint32_t>, std::pair<std::vector<char*>, std::vector<IdType> > >& runtime_bucket) {
+        restore_key_columns(bucket, table_key);
+        BOOST_FOREACH(const std::string& column, bucket.first) {
+            char* column_as_array = runtime_arena.template allocate<char>(column.size());
+            std::copy(column.begin(), column.end(), column_as_array);
+            runtime_bucket.second.first.push_back(column_as_array);
+            runtime_bucket.first.push_back(column.size());
+        }
+        runtime_bucket.second.second.swap(bucket.second);
+    }
+
+    // the columns of the runtime dict (status 2) copied back into column_dict buckets, e.g. to save them
+    void runtime_columns(BucketTable<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > >& columns) {
+        typedef typename BucketTable<std::pair<std::vector<uint32_t>, std::pair<std::vector<BitCountType*>, std::vector<IdType> > > >::iterator bucket_iterator;
+
+        columns.reserve(runtime_dict.size());
+        for (bucket_iterator it = runtime_dict.begin(); it != runtime_dict.end(); ++it) {
+            runtime_bucket_columns(it->second, columns[it->first]);
+            append_stored_ids(it->first, columns[it->first].second);
+        }
+    }
+
+    void runtime_bucket_columns(const std::pair<std::vector<uint32_t>, std::pair<std::vector<BitCountType*>, std::vector<IdType> > >& runtime_bucket, std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >& bucket) {
+        bucket.first.resize(runtime_bucket.first.size());
+        for (size_t i = 0; i < runtime_bucket.first.size(); i++)
+            bucket.first[i].assign(runtime_bucket.second.first[i], runtime_bucket.second.first[i] + runtime_bucket.first[i]);
+        bucket.second = runtime_bucket.second.second;
+    }
+
+    // same as runtime_columns for the VLQ base64 runtime dict (status 3)
+    void runtime_VLQ_base64_columns(BucketTable<std::pair<std::vector<std::string>, std::vector<IdType> > >& columns) {
+        typedef typename BucketTable<std::pair<std::vector<uint32_t>, std::pair<std::vector<char*>, std::vector<IdType> > > >::iterator bucket_iterator;
+
+        columns.reserve(runtime_vlq_dict.size());
+        for (bucket_iterator it = runtime_vlq_dict.begin(); it != runtime_vlq_dict.end(); ++it) {
+            runtime_VLQ_base64_bucket_columns(it->second, columns[it->first]);
+            append_stored_ids(it->first, columns[it->first].second);
+        }
+    }
+
+    void runtime_VLQ_base64_bucket_columns(const std::pair<std::vector<uint32_t>, std::pair<std::vector<char*>, std::vector<IdType> > >& runtime_bucket, std::pair<std::vector<std::string>, std::vector<IdType> >& bucket) {
+        bucket.first.resize(runtime_bucket.first.size());
+        for (size_t i = 0; i < runtime_bucket.first.size(); i++)
+            bucket.first[i].assign(runtime_bucket.second.first[i], runtime_bucket.first[i]);
+        bucket.second = runtime_bucket.second.second;
+    }
+
+    // drops all buckets, including the runtime dicts and their arena
+    void clear() {
+        super::clear();
+        column_dict.clear();
+        column_vlq_dict.clear();
+        column_hybrid_dict.clear();
+        runtime_dict.clear();
+        runtime_python_dict.clear();
+        runtime_vlq_dict.clear();
+        runtime_arena.clear();
+        tombstones.clear();
+        deleted_counts.clear();
+        drop_id_keys();
+        packed_ids.clear();
+        ids_codec = ID_CODEC_RAW;
+        reset_renumbering();
+        dict_status = -1;
+    }
+
+    // heap bytes of the runtime dict columns
+    uint64_t runtime_memory_usage() { return runtime_arena.bytes(); }
+
+    // compress the ids of the runtime dict buckets (status 2, 3) with codec, see packed_ids.hpp:
+    // 1 delta + varint of the sorted ids with the permutation back to code order, 2 blocks of
+    // bit-packed offsets in code order, 0 decodes them back into plain vectors. the image id
+    // calls decode the ids of each bucket in bulk. delete_ids packs the rewritten buckets again,
+    // saving writes the ids unpacked. not archived
+    void pack_ids(uint8_t codec) {
+        if (dict_status != 2 && dict_status != 3) {
+            PyErr_SetString(PyExc_ValueError, "pack_ids expects a runtime dict");
+            boost::python::throw_error_already_set();
+        }
+        if (codec > ID_CODEC_BLOCK) {
+            PyErr_SetString(PyExc_ValueError, "id codec expects 0 (raw), 1 (delta varint) or 2 (block)");
+            boost::python::throw_error_already_set();
+        }
+        if (renumbered) {
+            PyErr_SetString(PyExc_ValueError, "pack_ids expects ids that are not renumbered");
+            boost::python::throw_error_already_set();
+        }
+
+        if (dict_status == 2)
+            pack_runtime_ids(runtime_dict, codec);
+        else
+            pack_runtime_ids(runtime_vlq_dict, codec);
+        ids_codec = codec;
+    }
+
+    template <class ColumnType>
+    void pack_runtime_ids(BucketTable<std::pair<std::vector<uint32_t>, std::pair<std::vector<ColumnType*>, std::vector<IdType> > > >& table, uint8_t codec) {
+        typename BucketTable<std::pair<std::vector<uint32_t>, std::pair<std::vector<ColumnType*>, std::vector<IdType> > > >::iterator it;
+        for (it = table.begin(); it != table.end(); ++it) {
+            std::vector<IdType>& ids = it->second.second.second;
+            append_stored_ids(it->first, ids);
+            if (codec != ID_CODEC_RAW) {
+                packed_ids[it->first].encode(ids, codec);
+                std::vector<IdType>().swap(ids);
+            }
+        }
+        if (codec == ID_CODEC_RAW)
+            packed_ids.clear();
+    }
+
+    // append the packed (see pack_ids) or renumbered (see renumber_ids) ids of the runtime bucket
+    // of table_key to ids. the id vector of such a bucket is empty
+    void append_stored_ids(uint32_t table_key, std::vector<IdType>& ids) {
+        PackedIds<IdType>* packed = packed_ids.find(table_key);
+        if (packed != NULL)
+            packed->decode(ids);
+
+        std::pair<uint64_t, uint64_t>* range = id_ranges.find(table_key);
+        if (range != NULL)
+            ids.insert(ids.end(), original_id_data() + range->first, original_id_data() + range->first + range->second);
+    }
+
+    // renumber the ids of the runtime dict (status 2, 3) so that the codes of each bucket own a
+    // contiguous range of internal ids, the buckets in key order and the codes of a bucket in
+    // code order. a bucket keeps its (start, count) range instead of its ids and original_ids maps
+    // the internal ids back, so mget_image_id_ranges is O(#buckets) and only the final results
+    // need original_ids_as_buffer. the image id calls still return the original ids.
+    // numeric ids only, renumbered ids can not be packed or deleted. saving writes the original
+    // ids in the buckets and the id ranges, which the loads restore (see restore_id_ranges)
+    void renumber_ids() {
+        if ((dict_status != 2 && dict_status != 3) || !numeric_ids<IdType>()) {
+            PyErr_SetString(PyExc_ValueError, "renumber_ids expects a runtime dict with numeric ids");
+            boost::python::throw_error_already_set();
+        }
+        if (renumbered)
+            return;
+
+        if (ids_codec != ID_CODEC_RAW)
+            pack_ids(ID_CODEC_RAW);
+
+        if (dict_status == 2)
+            renumber_runtime_ids(runtime_dict);
+        else
+            renumber_runtime_ids(runtime_vlq_dict);
+        renumbered = true;
+    }
+
+    template <class ColumnType>
+    void renumber_runtime_ids(BucketTable<std::pair<std::vector<uint32_t>, std::pair<std::vector<ColumnType*>, std::vector<IdType> > > >& table) {
+        uint64_t num_codes = 0;
+        typename BucketTable<std::pair<std::vector<uint32_t>, std::pair<std::vector<ColumnType*>, std::vector<IdType> > > >::const_iterator it;
+        for (it = table.begin(); it != table.end(); ++it)
+            num_codes += it->second.second.second.size();
+
+        reset_renumbering();
+        original_ids.reserve(num_codes);
+        id_ranges.reserve(table.size());
+        BOOST_FOREACH(uint32_t key, table.sorted_keys()) {
+            std::vector<IdType>& ids = table.find(key)->second.second;
+            id_ranges[key] = std::pair<uint64_t, uint64_t>(original_ids.size(), ids.size());
+            original_ids.insert(original_ids.end(), ids.begin(), ids.end());
+            std::vector<IdType>().swap(ids);
+        }
+    }
+
+    // take the ids of the runtime buckets out into the id ranges of a saved renumbering, so a
+    // loaded dict gets the same internal ids without renumbering again
+    void restore_id_ranges(BucketTable<std::pair<uint64_t, uint64_t> >& ranges) {
+        if (dict_status == 2)
+            restore_runtime_id_ranges(runtime_dict, ranges);
+        else
+            restore_runtime_id_ranges(runtime_vlq_dict, ranges);
+        renumbered = true;
+    }
+
+    template <class ColumnType>
+    void restore_runtime_id_ranges(BucketTable<std::pair<std::vector<uint32_t>, std::pair<std::vector<ColumnType*>, std::vector<IdType> > > >& table, BucketTable<std::pair<uint64_t, uint64_t> >& ranges) {
+        uint64_t num_codes = 0;
+        typename BucketTable<std::pair<uint64_t, uint64_t> >::const_iterator it;
+        for (it = ranges.begin(); it != ranges.end(); ++it)
+            num_codes = std::max<uint64_t>(num_codes, it->second.first + it->second.second);
+
+        reset_renumbering();
+        original_ids.resize(num_codes);
+        for (it = ranges.begin(); it != ranges.end(); ++it) {
+            std::pair<std::vector<uint32_t>, std::pair<std::vector<ColumnType*>, std::vector<IdType> > >* bucket = table.find(it->first);
+            if (bucket == NULL || bucket->second.second.size() != it->second.second)
+                throw std::invalid_argument("the id ranges do not match the buckets");
+            std::vector<IdType>& ids = bucket->second.second;
+            std::copy(ids.begin(), ids.end(), original_ids.begin() + it->second.first);
+            std::vector<IdType>().swap(ids);
+        }
+        id_ranges = std::move(ranges);
+    }
+
+    // drop the renumbering, also the file the original ids are released to
+    void reset_renumbering() {
+        id_ranges.clear();
+        std::vector<IdType>().swap(original_ids);
+        original_id_file.close();
+        renumbered = false;
+    }
+
+    bool is_renumbered() { return renumbered; }
+
+    // the internal id ranges of the runtime buckets of keys as a (starts, counts) tuple of uint64
+    // buffers, missing keys are skipped like in mget_image_ids_as_buffer. see renumber_ids
+    PyObject* mget_image_id_ranges(boost::python::object& keys) {
+        require_renumbered("mget_image_id_ranges expects renumbered ids");
+
+        std::vector<uint64_t> starts, counts;
+        BOOST_FOREACH(uint32_t key, python_keys(keys)) {
+            std::pair<uint64_t, uint64_t>* range = id_ranges.find(super::actual_key(key));
+            if (range != NULL) {
+                starts.push_back(range->first);
+                counts.push_back(range->second);
+            }
+        }
+
+        boost::python::object starts_obj(boost::python::handle<>(vector_to_bytearray<uint64_t>(starts)));
+        boost::python::object counts_obj(boost::python::handle<>(vector_to_bytearray<uint64_t>(counts)));
+        return boost::python::incref(boost::python::make_tuple(starts_obj, counts_obj).ptr());
+    }
+
+    // the original ids of a buffer of uint64 internal ids, as a bytearray of IdType. see renumber_ids
+    PyObject* original_ids_as_buffer(boost::python::object& internal_ids) {
+        require_renumbered("original_ids_as_buffer expects renumbered ids");
+
+        Py_buffer view;
+        if (PyObject_GetBuffer(internal_ids.ptr(), &view, PyBUF_C_CONTIGUOUS) != 0)
+            boost::python::throw_error_already_set();
+
+        if (view.itemsize != sizeof(uint64_t)) {
+            PyBuffer_Release(&view);
+            PyErr_SetString(PyExc_ValueError, "original_ids_as_buffer expects a contiguous array of uint64 internal ids");
+            boost::python::throw_error_already_set();
+        }
+
+        const uint64_t* internal = (const uint64_t*)view.buf;
+        uint64_t count = view.len / sizeof(uint64_t);
+        const IdType* original = original_id_data();
+        uint64_t num_original = num_original_ids();
+        std::vector<IdType> ids(count);
+        for (uint64_t i = 0; i < count; i++) {
+            if (internal[i] >= num_original) {
+                PyBuffer_Release(&view);
+                PyErr_SetString(PyExc_ValueError, "internal id out of range");
+                boost::python::throw_error_already_set();
+            }
+            ids[i] = original[internal[i]];
+        }
+        PyBuffer_Release(&view);
+
+        return ids_to_python<IdType>(ids);
+    }
+
+    // write original_ids as a flat array of IdType, e.g. to memory-map it with numpy.memmap.
+    // original_ids is released, the ids are served from a read-only mapping of the file
+    void save_original_ids(char* filename) {
+        require_renumbered("save_original_ids expects renumbered ids");
+
+        // the file may be the mapped one, which is truncated by the write
+        if (original_id_file.is_open()) {
+            original_ids.assign(original_id_data(), original_id_data() + num_original_ids());
+            original_id_file.close();
+        }
+
+        {
+            std::ofstream ofs(filename, std::ios::binary);
+            if (original_ids.size() > 0)
+                ofs.write((const char*)original_ids.data(), original_ids.size() * sizeof(IdType));
+            if (!ofs) {
+                PyErr_SetString(PyExc_IOError, "can not write the original ids");
+                boost::python::throw_error_already_set();
+            }
+        }
+
+        original_id_file.open(filename);
+        if (original_id_file.bytes_size() != original_ids.size() * sizeof(IdType)) {
+            original_id_file.close();
+            PyErr_SetString(PyExc_IOError, "can not map the original ids");
+            boost::python::throw_error_already_set();
+        }
+        std::vector<IdType>().swap(original_ids);
+    }
+
+    // the original id of each internal id, from original_ids or the file they are released to
+    const IdType* original_id_data() {
+        return original_id_file.is_open() ? (const IdType*)original_id_file.bytes() : original_ids.data();
+    }
+
+    uint64_t num_original_ids() {
+        return original_id_file.is_open() ? original_id_file.bytes_size() / sizeof(IdType) : original_ids.size();
+    }
+
+    void require_renumbered(const char* message) {
+        if (!renumbered) {
+            PyErr_SetString(PyExc_ValueError, message);
+            boost::python::throw_error_already_set();
+        }
+    }
+
+    // the ids of a runtime bucket, see pack_ids
+    template <class ColumnType>
+    void append_runtime_ids(uint32_t table_key, const std::pair<std::vector<uint32_t>, std::pair<std::vector<ColumnType*>, std::vector<IdType> > >& bucket, std::vector<IdType>& ids) {
+        ids.insert(ids.end(), bucket.second.second.begin(), bucket.second.second.end());
+        append_stored_ids(table_key, ids);
+    }
+
+    // heap bytes of the image ids of the compressed or runtime buckets, packed ones and the
+    // id lookup of delete_ids included
+    uint64_t ids_memory_usage() {
+        uint64_t bytes = 0;
+        if (dict_status == 0)
+            bytes = ids_bytes(column_dict);
+        else if (dict_status == 1)
+            bytes = ids_bytes(column_vlq_dict);
+        else if (dict_status == 2)
+            bytes = ids_bytes(runtime_dict);
+        else if (dict_status == 3)
+            bytes = ids_bytes(runtime_vlq_dict);
+        else if (dict_status == 4)
+            bytes = ids_bytes(column_hybrid_dict);
+
+        typename BucketTable<PackedIds<IdType> >::const_iterator it;
+        for (it = packed_ids.begin(); it != packed_ids.end(); ++it)
+            bytes += it->second.bytes();
+        if (renumbered)
+            bytes += id_ranges.table_bytes() + id_vector_bytes<IdType>(original_ids);
+        // the lookup of delete_ids, without the characters of string ids
+        bytes += id_keys.capacity() * sizeof(std::pair<IdType, uint32_t>);
+        return bytes;
+    }
+
+    template <class BucketType>
+    uint64_t ids_bytes(const BucketTable<BucketType>& table) {
+        uint64_t bytes = 0;
+        typename BucketTable<BucketType>::const_iterator it;
+        for (it = table.begin(); it != table.end(); ++it)
+            bytes += id_vector_bytes<IdType>(bucket_ids(it->second));
+        return bytes;
+    }
+
     // for non VQL base64 runtime dict 
     std::vector<PyObject*> get_cols_as_buffer(uint32_t key) {
-        std::vector<uint8_t> bool_key = super::actual_key(key);
+        uint32_t table_key = super::actual_key(key);
 
         std::vector<PyObject*> buffers(0);
 
-        if (runtime_dict.count(bool_key) > 0) {
+        std::pair<std::vector<uint32_t>, std::pair<std::vector<BitCountType*>, std::vector<IdType> > >* bucket = runtime_dict.find(table_key);
+
+        if (bucket != NULL) {
 
                 BitCountType* column;
                 int column_index = 0;
-                BOOST_FOREACH(column, runtime_dict[bool_key].second.first) {               
+                BOOST_FOREACH(column, bucket->second.first) {               
 
                     /*
                     uint64_t* column_as_array =  new uint64_t[column.size()];
@@ -661,7 +1934,7 @@ public:
                     }
                     */
 
-                    PyObject* buffer_obj = PyBuffer_FromMemory ((void*)column, runtime_dict[bool_key].first[column_index++] * sizeof(BitCountType));
+                    PyObject* buffer_obj = PyBuffer_FromMemory ((void*)column, bucket->first[column_index++] * sizeof(BitCountType));
                     boost::python::incref(buffer_obj);
 
                     buffers.insert(buffers.end(), buffer_obj);
@@ -672,14 +1945,23 @@ public:
     }
  
     PyObject* get_python_cols_as_buffer(uint32_t key) {
-        std::vector<uint8_t> bool_key = super::actual_key(key);
+        uint32_t table_key = super::actual_key(key);
+
+        boost::python::list* columns = runtime_python_dict.find(table_key);
+        if (columns == NULL) {
+            std::pair<std::vector<uint32_t>, std::pair<std::vector<BitCountType*>, std::vector<IdType> > >* bucket = runtime_dict.find(table_key);
+            if (bucket == NULL) {
+                boost::python::list pylist;
+                return boost::python::incref(pylist.ptr());
+            }
 
-        if (runtime_python_dict.count(bool_key) > 0)
-            return boost::python::incref(runtime_python_dict[bool_key].second.first.ptr());
-        else {
-            boost::python::list pylist;
-            return boost::python::incref(pylist.ptr());
+            columns = &runtime_python_dict[table_key];
+            for (size_t i = 0; i < bucket->first.size(); i++) {
+                PyObject* buffer_obj = PyBuffer_FromMemory((void*)bucket->second.first[i], bucket->first[i] * sizeof(BitCountType));
+                columns->append(boost::python::object(boost::python::handle<>(buffer_obj)));
+            }
         }
+        return boost::python::incref(columns->ptr());
     }
  
     // for non VQL base64 runtime dict 
@@ -706,17 +1988,19 @@ public:
  
     // for VLQ base64 runtime dict
     std::vector<PyObject*> get_VLQ_base64_cols_as_buffer(uint32_t key) {
-        std::vector<uint8_t> bool_key = super::actual_key(key);
+        uint32_t table_key = super::actual_key(key);
 
         std::vector<PyObject*> buffers(0);
 
-        if (runtime_vlq_dict.count(bool_key) > 0) {
+        std::pair<std::vector<uint32_t>, std::pair<std::vector<char*>, std::vector<IdType> > >* bucket = runtime_vlq_dict.find(table_key);
+
+        if (bucket != NULL) {
 
                 char* column;
                 int column_index = 0;
-                BOOST_FOREACH(column, runtime_vlq_dict[bool_key].second.first) {               
+                BOOST_FOREACH(column, bucket->second.first) {               
 
-                    PyObject* buffer_obj = PyBuffer_FromMemory ((void*)column, runtime_vlq_dict[bool_key].first[column_index++]);
+                    PyObject* buffer_obj = PyBuffer_FromMemory ((void*)column, bucket->first[column_index++]);
                     boost::python::incref(buffer_obj);
 
                     buffers.insert(buffers.end(), buffer_obj);
@@ -740,16 +2024,14 @@ public:
  
     // called after init runtime dict
     std::vector<IdType> get_image_ids(uint32_t key) {
-        std::vector<uint8_t> bool_key = super::actual_key(key);
+        uint32_t table_key = super::actual_key(key);
 
-        if (runtime_dict.count(bool_key) > 0)
-            return runtime_dict[bool_key].second.second;
-        else if (runtime_python_dict.count(bool_key) > 0)
-            return runtime_python_dict[bool_key].second.second;
-        else {
-            std::vector<IdType> id_vector(0);
-            return id_vector;
-        }
+        std::pair<std::vector<uint32_t>, std::pair<std::vector<BitCountType*>, std::vector<IdType> > >* bucket = runtime_dict.find(table_key);
+
+        std::vector<IdType> id_vector(0);
+        if (bucket != NULL)
+            append_runtime_ids(table_key, *bucket, id_vector);
+        return id_vector;
     }
 
     // called after init runtime dict 
@@ -763,18 +2045,33 @@ public:
         }
         return image_ids;
     }
+
+    // same as mget_image_ids, but returns the ids as a bytearray of IdType (a list for string ids)
+    PyObject* mget_image_ids_as_buffer(boost::python::object& keys) {
+        std::vector<IdType> image_ids(0);
+
+        BOOST_FOREACH(uint32_t key, python_keys(keys)) {
+            uint32_t table_key = super::actual_key(key);
+            std::pair<std::vector<uint32_t>, std::pair<std::vector<BitCountType*>, std::vector<IdType> > >* bucket = runtime_dict.find(table_key);
+
+            if (bucket != NULL)
+                append_runtime_ids(table_key, *bucket, image_ids);
+        }
+
+        return ids_to_python<IdType>(image_ids);
+    }
  
     // for VLQ base64 runtime dict
     // called after init VLQ base64 runtime dict
     std::vector<IdType> get_VLQ_base64_image_ids(uint32_t key) {
-        std::vector<uint8_t> bool_key = super::actual_key(key);
+        uint32_t table_key = super::actual_key(key);
 
-        if (runtime_vlq_dict.count(bool_key) > 0)
-            return runtime_vlq_dict[bool_key].second.second;
-        else {
-            std::vector<IdType> id_vector(0);
-            return id_vector;
-        }
+        std::pair<std::vector<uint32_t>, std::pair<std::vector<char*>, std::vector<IdType> > >* bucket = runtime_vlq_dict.find(table_key);
+
+        std::vector<IdType> id_vector(0);
+        if (bucket != NULL)
+            append_runtime_ids(table_key, *bucket, id_vector);
+        return id_vector;
     }
 
     // for VLQ base64 runtime dict
@@ -791,10 +2088,12 @@ public:
  
     // called before init runtime dict 
     std::vector<IdType> get_image_ids_before_runtime_init(uint32_t key) {
-        std::vector<uint8_t> bool_key = super::actual_key(key);
+        uint32_t table_key = super::actual_key(key);
 
-        if (column_dict.count(bool_key) > 0)
-            return column_dict[bool_key].second;
+        std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >* bucket = column_dict.find(table_key);
+
+        if (bucket != NULL)
+            return drop_deleted_ids(bucket->second);
         else {
             std::vector<IdType> id_vector(0);
             return id_vector;
@@ -810,380 +2109,2365 @@ public:
                 image_ids.insert(image_ids.end(), id);
             }
         }
-        return image_ids;
+        return image_ids;
+    }
+ 
+    // called before init runtime dict 
+    // for VLQ base64 column dict
+    std::vector<IdType> get_VLQ_base64_image_ids_before_runtime_init(uint32_t key) {
+        uint32_t table_key = super::actual_key(key);
+
+        std::pair<std::vector<std::string>, std::vector<IdType> >* bucket = column_vlq_dict.find(table_key);
+
+        if (bucket != NULL)
+            return drop_deleted_ids(bucket->second);
+        else {
+            std::vector<IdType> id_vector(0);
+            return id_vector;
+        }
+    }
+ 
+    // called before init runtime dict 
+    // for VLQ base64 column dict
+    std::vector<IdType> mget_VLQ_base64_image_ids_before_runtime_init(boost::python::list& keys) {
+        std::vector<IdType> image_ids(0);
+
+        for (int i = 0; i < len(keys); i++) {
+            BOOST_FOREACH(IdType id, get_VLQ_base64_image_ids_before_runtime_init(boost::python::extract<uint32_t>(keys[i]))) {
+                image_ids.insert(image_ids.end(), id);
+            }
+        }
+        return image_ids;
+    }
+ 
+    // get raw compressed data
+    // called before init_runtime_dict() since initialization will clear column_dict
+    std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > get_cols(uint32_t key) {
+        uint32_t table_key = super::actual_key(key);
+
+        std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >* bucket = column_dict.find(table_key);
+
+        if (bucket != NULL)
+            return *bucket;
+        else {
+            //std::vector<std::vector<uint8_t> > columns(1, *new std::vector<uint8_t>(1, 0));
+            //std::vector<IdType> id_vector(1, *new IdType());
+            std::vector<std::vector<BitCountType> > columns(0);
+            std::vector<IdType> id_vector(0);
+            std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > empty_pair(columns, id_vector);
+            return empty_pair;
+        }
+    }
+
+    // for VLQ base64     
+    std::pair<std::vector<std::string>, std::vector<IdType> > get_VLQ_base64_cols(uint32_t key) {
+        uint32_t table_key = super::actual_key(key);
+
+        std::pair<std::vector<std::string>, std::vector<IdType> >* bucket = column_vlq_dict.find(table_key);
+
+        if (bucket != NULL)
+            return *bucket;
+        else {
+            //std::vector<std::vector<uint8_t> > columns(1, *new std::vector<uint8_t>(1, 0));
+            //std::vector<IdType> id_vector(1, *new IdType());
+            std::vector<std::string> columns(0);
+            std::vector<IdType> id_vector(0);
+            std::pair<std::vector<std::string>, std::vector<IdType> > empty_pair(columns, id_vector);
+            return empty_pair;
+        }
+    }
+ 
+    // walk the runs of each column of a compressed bucket once and call func(column_index, begin, end)
+    // for every run of 1 bits. runs are clamped to the bucket's number of codes
+    template <class Func>
+    void for_each_one_run(const std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >& bucket, Func func) {
+        uint64_t num_codes = bucket.second.size();
+
+        for (size_t column_index = 0; column_index < bucket.first.size() && column_index < 64; column_index++) {
+            const std::vector<BitCountType>& column = bucket.first[column_index];
+            uint64_t position = 0;
+
+            // runs alternate between 0 bits and 1 bits, starting with 0 bits
+            for (size_t run = 0; run < column.size() && position < num_codes; run++) {
+                uint64_t end = std::min<uint64_t>(position + column[run], num_codes);
+                if (run % 2 == 1 && end > position)
+                    func(column_index, position, end);
+                position = end;
+            }
+        }
+    }
+
+    // same as for_each_one_run for a VLQ base64 compressed bucket
+    template <class Func>
+    void for_each_one_run(const std::pair<std::vector<std::string>, std::vector<IdType> >& bucket, Func func) {
+        uint64_t num_codes = bucket.second.size();
+
+        for (size_t column_index = 0; column_index < bucket.first.size() && column_index < 64; column_index++) {
+            const std::string& column = bucket.first[column_index];
+            uint64_t position = 0;
+            uint32_t VLQ_base64_string_offset = 0;
+
+            for (size_t run = 0; VLQ_base64_string_offset < column.size() && position < num_codes; run++) {
+                std::pair<BitCountType, uint32_t> decode_pair = incre_base64VLQ_decode<BitCountType>(column, VLQ_base64_string_offset);
+                VLQ_base64_string_offset = decode_pair.second;
+
+                uint64_t end = std::min<uint64_t>(position + decode_pair.first, num_codes);
+                if (run % 2 == 1 && end > position)
+                    func(column_index, position, end);
+                position = end;
+            }
+        }
+    }
+
+    // streaming decoder of the compressed bucket of table_key: the bits of the 1 runs are scattered
+    // into binary_codes, which must hold the bucket's number of codes and be zeroed. the bits of
+    // the dropped key dimension columns are set from the key
+    void uncompress_bucket(const std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >& bucket, uint32_t table_key, uint64_t* binary_codes) {
+        for_each_one_run(bucket, [&](size_t column_index, uint64_t begin, uint64_t end) {
+            uint64_t bit = (uint64_t)1 << column_index;
+            for (uint64_t code = begin; code < end; code++)
+                binary_codes[code] |= bit;
+        });
+        set_dropped_bits(bucket, table_key, binary_codes);
+    }
+
+    // streaming decoder of a VLQ base64 compressed bucket, see uncompress_bucket
+    void uncompress_VLQ_base64_bucket(const std::pair<std::vector<std::string>, std::vector<IdType> >& bucket, uint32_t table_key, uint64_t* binary_codes) {
+        for_each_one_run(bucket, [&](size_t column_index, uint64_t begin, uint64_t end) {
+            uint64_t bit = (uint64_t)1 << column_index;
+            for (uint64_t code = begin; code < end; code++)
+                binary_codes[code] |= bit;
+        });
+        set_dropped_bits(bucket, table_key, binary_codes);
+    }
+
+    template <class BucketType>
+    void set_dropped_bits(const BucketType& bucket, uint32_t table_key, uint64_t* binary_codes) {
+        uint64_t mask;
+        uint64_t bits = dropped_bits(bucket, table_key, &mask);
+        if (bits == 0)
+            return;
+        for (size_t code = 0; code < bucket.second.size(); code++)
+            binary_codes[code] |= bits;
+    }
+
+    // hamming distances between query and the codes of a (VLQ base64) compressed bucket, computed
+    // from the runs without decoding the codes. a code differs from query in column i if its bit is 1
+    // and bit i of query is 0, or the other way around, so every 1 run adds +1 (query bit 0) or
+    // -1 (query bit 1) to the popcount of query over the bucket's columns. the increments are
+    // accumulated in a difference array of num_codes + 1 counters and a prefix sum, i.e. the cost
+    // is O(runs + num_codes) instead of O(64 * num_codes).
+    // a dropped key dimension column (see compress_bucket) has no runs, it adds the same 0 or 1
+    // to all codes of the bucket of table_key.
+    // distances must hold the bucket's number of codes
+    template <class BucketType>
+    void hamming_distances(const BucketType& bucket, uint32_t table_key, uint64_t query, uint8_t* distances) {
+        uint64_t num_codes = bucket.second.size();
+        if (num_codes == 0)
+            return;
+
+        std::vector<int32_t> increments(num_codes + 1, 0);
+        for_each_one_run(bucket, [&](size_t column_index, uint64_t begin, uint64_t end) {
+            int32_t increment = ((query >> column_index) & 0x01) ? -1 : 1;
+            increments[begin] += increment;
+            increments[end] -= increment;
+        });
+
+        uint64_t columns = bucket.first.size() >= 64 ? ~(uint64_t)0 : (((uint64_t)1 << bucket.first.size()) - 1);
+        uint64_t mask;
+        int32_t distance = __builtin_popcountll((query ^ dropped_bits(bucket, table_key, &mask)) & columns);
+        for (uint64_t code = 0; code < num_codes; code++) {
+            distance += increments[code];
+            distances[code] = distance;
+        }
+    }
+
+    // same as hamming_distances, but one distance per group of identical adjacent codes: the codes of
+    // a bucket are sorted (see order_codes), so identical codes form one group, and a new group begins
+    // where a run of any column begins or ends. group_ends receives the end of each group
+    template <class BucketType>
+    void grouped_hamming_distances(const BucketType& bucket, uint32_t table_key, uint64_t query, std::vector<uint64_t>& group_ends, std::vector<uint8_t>& distances) {
+        group_ends.clear();
+        distances.clear();
+        uint64_t num_codes = bucket.second.size();
+        if (num_codes == 0)
+            return;
+
+        std::vector<int32_t> increments(num_codes + 1, 0);
+        std::vector<uint8_t> boundaries(num_codes + 1, 0);
+        for_each_one_run(bucket, [&](size_t column_index, uint64_t begin, uint64_t end) {
+            int32_t increment = ((query >> column_index) & 0x01) ? -1 : 1;
+            increments[begin] += increment;
+            increments[end] -= increment;
+            boundaries[begin] = 1;
+            boundaries[end] = 1;
+        });
+
+        uint64_t columns = bucket.first.size() >= 64 ? ~(uint64_t)0 : (((uint64_t)1 << bucket.first.size()) - 1);
+        uint64_t mask;
+        int32_t distance = __builtin_popcountll((query ^ dropped_bits(bucket, table_key, &mask)) & columns) + increments[0];
+        for (uint64_t code = 1; code < num_codes; code++) {
+            if (boundaries[code]) {
+                group_ends.push_back(code);
+                distances.push_back(distance);
+            }
+            distance += increments[code];
+        }
+        group_ends.push_back(num_codes);
+        distances.push_back(distance);
+    }
+
+    // same as grouped_hamming_distances for decoded codes
+    static void grouped_hamming_distances(const std::vector<uint64_t>& binary_codes, uint64_t query, std::vector<uint64_t>& group_ends, std::vector<uint8_t>& distances) {
+        group_ends.clear();
+        distances.clear();
+        for (size_t code = 0; code < binary_codes.size(); code++) {
+            if (code + 1 == binary_codes.size() || binary_codes[code + 1] != binary_codes[code]) {
+                group_ends.push_back(code + 1);
+                distances.push_back(__builtin_popcountll(binary_codes[code] ^ query));
+            }
+        }
+    }
+
+    // offer the groups of a bucket to the heap of query_topk, a group is offered once for all its ids.
+    // a group of deleted ids only is skipped, so that the k nearest groups hold at least k ids
+    void push_groups(TopKHeap<id_group>& heap, const IdType* ids, const std::vector<uint64_t>& group_ends, const std::vector<uint8_t>& distances) {
+        uint64_t begin = 0;
+        for (size_t group = 0; group < group_ends.size(); group++) {
+            uint64_t end = group_ends[group];
+            uint64_t live = begin;
+            while (live < end && tombstones.contains(ids[live]))
+                live++;
+            if (live < end)
+                heap.push(distances[group], id_group(ids + begin, end - begin));
+            begin = end;
+        }
+    }
+
+    // the ids of the k nearest groups kept by heap, at most k of them, in ascending distance
+    void expand_groups(TopKHeap<id_group>& heap, uint32_t k, std::vector<uint8_t>& distances, std::vector<IdType>& id_vector) {
+        std::vector<uint8_t> group_distances;
+        std::vector<id_group> groups;
+        heap.sorted(group_distances, groups);
+        for (size_t group = 0; group < groups.size() && id_vector.size() < k; group++) {
+            bool delta = groups[group].second & DELTA_GROUP;
+            uint64_t num_ids = groups[group].second & ~DELTA_GROUP;
+            for (uint64_t i = 0; i < num_ids && id_vector.size() < k; i++) {
+                const IdType& id = groups[group].first[i];
+                if (delta || !tombstones.contains(id)) {
+                    distances.push_back(group_distances[group]);
+                    id_vector.push_back(id);
+                }
+            }
+        }
+    }
+
+    // same as FastDict::build_occupancy for the buckets of the current dict status, including the
+    // delta segment of the compressed dicts (see compact)
+    void build_occupancy() {
+        std::vector<uint32_t> keys;
+        if (dict_status == -1)
+            keys = super::keys();
+        else if (dict_status == 0)
+            append_table_keys(column_dict, keys);
+        else if (dict_status == 1)
+            append_table_keys(column_vlq_dict, keys);
+        else if (dict_status == 2)
+            append_table_keys(runtime_dict, keys);
+        else if (dict_status == 3)
+            append_table_keys(runtime_vlq_dict, keys);
+        else if (dict_status == 4)
+            append_table_keys(column_hybrid_dict, keys);
+        if (dict_status != -1)
+            append_table_keys(super::dict, keys);
+        super::occupancy.build(keys);
+    }
+
+    template <class BucketType>
+    static void append_table_keys(const BucketTable<BucketType>& table, std::vector<uint32_t>& keys) {
+        keys.reserve(keys.size() + table.size());
+        typename BucketTable<BucketType>::const_iterator it;
+        for (it = table.begin(); it != table.end(); ++it)
+            keys.push_back(it->first);
+    }
+
+    // fraction of the codes of the current dict status which repeat another code of their bucket.
+    // the delta segment of a compressed dict (see compact) is not counted
+    double duplicate_ratio() {
+        uint64_t num_codes = 0;
+        uint64_t num_distinct = 0;
+        std::vector<uint64_t> binary_codes;
+
+        if (dict_status == -1 && super::frozen) {
+            for (size_t index = 0; index < super::csr_dict.size(); index++) {
+                binary_codes.assign(super::csr_dict.codes.begin() + super::csr_dict.bucket_begin(index), super::csr_dict.codes.begin() + super::csr_dict.bucket_end(index));
+                count_distinct(binary_codes, num_codes, num_distinct);
+            }
+        } else if (dict_status == -1) {
+            typename BucketTable<raw_bucket_type>::const_iterator it;
+            for (it = super::dict.begin(); it != super::dict.end(); ++it) {
+                binary_codes.clear();
+                for (size_t i = 0; i < it->second.size(); i++)
+                    binary_codes.push_back(it->second[i].first);
+                count_distinct(binary_codes, num_codes, num_distinct);
+            }
+        } else if (dict_status == 0) {
+            typename BucketTable<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > >::const_iterator it;
+            for (it = column_dict.begin(); it != column_dict.end(); ++it) {
+                binary_codes.assign(it->second.second.size(), 0);
+                uncompress_bucket(it->second, it->first, binary_codes.data());
+                count_distinct(binary_codes, num_codes, num_distinct);
+            }
+        } else if (dict_status == 1) {
+            typename BucketTable<std::pair<std::vector<std::string>, std::vector<IdType> > >::const_iterator it;
+            for (it = column_vlq_dict.begin(); it != column_vlq_dict.end(); ++it) {
+                binary_codes.assign(it->second.second.size(), 0);
+                uncompress_VLQ_base64_bucket(it->second, it->first, binary_codes.data());
+                count_distinct(binary_codes, num_codes, num_distinct);
+            }
+        } else if (dict_status == 4) {
+            typename BucketTable<std::pair<std::vector<HybridColumn>, std::vector<IdType> > >::const_iterator it;
+            for (it = column_hybrid_dict.begin(); it != column_hybrid_dict.end(); ++it) {
+                binary_codes.clear();
+                uncompress_hybrid_bucket(it->second, binary_codes);
+                count_distinct(binary_codes, num_codes, num_distinct);
+            }
+        } else {
+            PyErr_SetString(PyExc_ValueError, "duplicate_ratio expects a raw, compressed, VLQ base64 or hybrid dict");
+            boost::python::throw_error_already_set();
+        }
+        return num_codes == 0 ? 0.0 : (double)(num_codes - num_distinct) / num_codes;
+    }
+
+    static void count_distinct(std::vector<uint64_t>& binary_codes, uint64_t& num_codes, uint64_t& num_distinct) {
+        std::sort(binary_codes.begin(), binary_codes.end());
+        num_codes += binary_codes.size();
+        num_distinct += std::unique(binary_codes.begin(), binary_codes.end()) - binary_codes.begin();
+    }
+
+    // cpu-based hamming distances between query and the codes in the buckets of keys, from the runs
+    // of the compressed dict, see hamming_distances.
+    // returns a (distances, ids) tuple of buffers, distances are uint8
+    PyObject* mget_hamming_distances(uint64_t query, boost::python::object& keys) {
+        std::vector<uint32_t> key_vector = python_keys(keys);
+        std::vector<uint32_t> table_keys;
+        std::vector<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >*> buckets = find_buckets(column_dict, key_vector, &table_keys);
+        return buckets_hamming_distances_as_buffer(buckets, table_keys, find_delta_buckets(key_vector), query);
+    }
+
+    // same as mget_hamming_distances for the VLQ base64 compressed dict
+    PyObject* mget_VLQ_base64_hamming_distances(uint64_t query, boost::python::object& keys) {
+        std::vector<uint32_t> key_vector = python_keys(keys);
+        std::vector<uint32_t> table_keys;
+        std::vector<std::pair<std::vector<std::string>, std::vector<IdType> >*> buckets = find_buckets(column_vlq_dict, key_vector, &table_keys);
+        return buckets_hamming_distances_as_buffer(buckets, table_keys, find_delta_buckets(key_vector), query);
+    }
+
+    // the codes of the delta buckets follow the ones of the compressed buckets
+    template <class BucketType>
+    PyObject* buckets_hamming_distances_as_buffer(const std::vector<BucketType*>& buckets, const std::vector<uint32_t>& table_keys, const std::vector<raw_bucket_type*>& deltas, uint64_t query) {
+        uint64_t num_codes = 0;
+        BOOST_FOREACH(BucketType* bucket, buckets) {
+            num_codes += bucket->second.size();
+        }
+        BOOST_FOREACH(raw_bucket_type* delta, deltas) {
+            num_codes += delta->size();
+        }
+
+        uint8_t* distances;
+        boost::python::object distances_obj(boost::python::handle<>(new_bytearray<uint8_t>(num_codes, &distances)));
+        std::vector<IdType> id_vector;
+        id_vector.reserve(num_codes);
+
+        {
+            ScopedGILRelease release;
+
+            uint64_t offset = 0;
+            for (size_t i = 0; i < buckets.size(); i++) {
+                hamming_distances(*buckets[i], table_keys[i], query, distances + offset);
+                id_vector.insert(id_vector.end(), buckets[i]->second.begin(), buckets[i]->second.end());
+                offset += buckets[i]->second.size();
+            }
+            uint64_t num_compressed = offset;
+            BOOST_FOREACH(raw_bucket_type* delta, deltas) {
+                for (size_t i = 0; i < delta->size(); i++) {
+                    distances[offset++] = __builtin_popcountll((*delta)[i].first ^ query);
+                    id_vector.push_back((*delta)[i].second);
+                }
+            }
+            num_codes = drop_deleted(distances, id_vector, num_compressed);
+        }
+        if (PyByteArray_Resize(distances_obj.ptr(), num_codes) != 0)
+            boost::python::throw_error_already_set();
+
+        boost::python::object ids_obj(boost::python::handle<>(ids_to_python<IdType>(id_vector)));
+        return boost::python::incref(boost::python::make_tuple(distances_obj, ids_obj).ptr());
+    }
+
+    // cpu-based uncompression algorithm
+    // only workable before init runtime dict
+    std::pair<std::vector<uint64_t>, std::vector<IdType> > get_binary_codes(uint32_t key) {
+        std::pair<std::vector<uint64_t>, std::vector<IdType> > return_pair;
+
+        std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >* bucket = column_dict.find(super::actual_key(key));
+        if (bucket != NULL && bucket->second.size() > 0) {
+            return_pair.first.resize(bucket->second.size(), 0);
+            uncompress_bucket(*bucket, super::actual_key(key), &return_pair.first[0]);
+            return_pair.second = bucket->second;
+            return_pair.first.resize(drop_deleted(return_pair.first.data(), return_pair.second, return_pair.second.size()));
+        }
+        append_delta_codes(find_delta_buckets(std::vector<uint32_t>(1, key)), return_pair.first, return_pair.second);
+        return return_pair;
+    }
+ 
+    // cpu-based uncompression algorithm
+    // only workable before init runtime dict
+    std::pair<std::vector<uint64_t>, std::vector<IdType> > mget_binary_codes(boost::python::list& keys) {
+        std::vector<uint32_t> key_vector = python_keys(keys);
+        std::vector<uint32_t> table_keys;
+        std::vector<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >*> buckets = find_buckets(column_dict, key_vector, &table_keys);
+        return uncompress_buckets(buckets, table_keys, find_delta_buckets(key_vector), &FastCompressDict<BitCountType, IdType>::uncompress_bucket);
+    }
+
+    // same as mget_binary_codes, but returns a (codes, ids) tuple of buffers, see FastDict::mget_as_buffer.
+    // the codes are decoded straight into the returned buffer
+    PyObject* mget_binary_codes_as_buffer(boost::python::object& keys) {
+        std::vector<uint32_t> key_vector = python_keys(keys);
+        std::vector<uint32_t> table_keys;
+        std::vector<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >*> buckets = find_buckets(column_dict, key_vector, &table_keys);
+        return uncompress_buckets_as_buffer(buckets, table_keys, find_delta_buckets(key_vector), &FastCompressDict<BitCountType, IdType>::uncompress_bucket);
+    }
+ 
+    // cpu-based uncompression algorithm for VLQ base64 compressed dict
+    // only workable before init VLQ base64 runtime dict
+    std::pair<std::vector<uint64_t>, std::vector<IdType> > get_VLQ_base64_binary_codes(uint32_t key) {
+        std::pair<std::vector<uint64_t>, std::vector<IdType> > return_pair;
+
+        std::pair<std::vector<std::string>, std::vector<IdType> >* bucket = column_vlq_dict.find(super::actual_key(key));
+        if (bucket != NULL && bucket->second.size() > 0) {
+            return_pair.first.resize(bucket->second.size(), 0);
+            uncompress_VLQ_base64_bucket(*bucket, super::actual_key(key), &return_pair.first[0]);
+            return_pair.second = bucket->second;
+            return_pair.first.resize(drop_deleted(return_pair.first.data(), return_pair.second, return_pair.second.size()));
+        }
+        append_delta_codes(find_delta_buckets(std::vector<uint32_t>(1, key)), return_pair.first, return_pair.second);
+        return return_pair;
+    }
+ 
+    // cpu-based uncompression algorithm for VLQ base64 compressed dict
+    // only workable before init VLQ base64 runtime dict
+    std::pair<std::vector<uint64_t>, std::vector<IdType> > mget_VLQ_base64_binary_codes(boost::python::list& keys) {
+        std::vector<uint32_t> key_vector = python_keys(keys);
+        std::vector<uint32_t> table_keys;
+        std::vector<std::pair<std::vector<std::string>, std::vector<IdType> >*> buckets = find_buckets(column_vlq_dict, key_vector, &table_keys);
+        return uncompress_buckets(buckets, table_keys, find_delta_buckets(key_vector), &FastCompressDict<BitCountType, IdType>::uncompress_VLQ_base64_bucket);
+    }
+
+    // same as mget_VLQ_base64_binary_codes, but returns a (codes, ids) tuple of buffers
+    PyObject* mget_VLQ_base64_binary_codes_as_buffer(boost::python::object& keys) {
+        std::vector<uint32_t> key_vector = python_keys(keys);
+        std::vector<uint32_t> table_keys;
+        std::vector<std::pair<std::vector<std::string>, std::vector<IdType> >*> buckets = find_buckets(column_vlq_dict, key_vector, &table_keys);
+        return uncompress_buckets_as_buffer(buckets, table_keys, find_delta_buckets(key_vector), &FastCompressDict<BitCountType, IdType>::uncompress_VLQ_base64_bucket);
+    }
+
+    // the buckets of table for the given keys, missing keys are skipped.
+    // the table keys of the found buckets are appended to table_keys if given
+    template <class BucketType>
+    std::vector<BucketType*> find_buckets(BucketTable<BucketType>& table, const std::vector<uint32_t>& keys, std::vector<uint32_t>* table_keys = NULL) {
+        std::vector<BucketType*> buckets;
+        BOOST_FOREACH(uint32_t key, keys) {
+            uint32_t table_key = super::actual_key(key);
+            BucketType* bucket = table.find(table_key);
+            if (bucket != NULL) {
+                buckets.push_back(bucket);
+                if (table_keys != NULL)
+                    table_keys->push_back(table_key);
+            }
+        }
+        return buckets;
+    }
+
+    // append the codes and ids of delta buckets, see compact
+    void append_delta_codes(const std::vector<raw_bucket_type*>& deltas, std::vector<uint64_t>& binary_codes, std::vector<IdType>& id_vector) {
+        BOOST_FOREACH(raw_bucket_type* delta, deltas) {
+            for (size_t i = 0; i < delta->size(); i++) {
+                binary_codes.push_back((*delta)[i].first);
+                id_vector.push_back((*delta)[i].second);
+            }
+        }
+    }
+
+    // decode buckets one after another into a preallocated vector, followed by the delta codes
+    template <class BucketType>
+    std::pair<std::vector<uint64_t>, std::vector<IdType> > uncompress_buckets(const std::vector<BucketType*>& buckets, const std::vector<uint32_t>& table_keys, const std::vector<raw_bucket_type*>& deltas, void (FastCompressDict<BitCountType, IdType>::*uncompress)(const BucketType&, uint32_t, uint64_t*)) {
+        std::pair<std::vector<uint64_t>, std::vector<IdType> > return_pair;
+
+        uint64_t num_codes = 0;
+        BOOST_FOREACH(BucketType* bucket, buckets) {
+            num_codes += bucket->second.size();
+        }
+        return_pair.first.resize(num_codes, 0);
+        return_pair.second.reserve(num_codes);
+
+        uint64_t offset = 0;
+        for (size_t i = 0; i < buckets.size(); i++) {
+            if (buckets[i]->second.size() == 0)
+                continue;
+            (this->*uncompress)(*buckets[i], table_keys[i], &return_pair.first[offset]);
+            return_pair.second.insert(return_pair.second.end(), buckets[i]->second.begin(), buckets[i]->second.end());
+            offset += buckets[i]->second.size();
+        }
+        append_delta_codes(deltas, return_pair.first, return_pair.second);
+        return_pair.first.resize(drop_deleted(return_pair.first.data(), return_pair.second, offset));
+        return return_pair;
+    }
+
+    // decode buckets one after another into a new bytearray, followed by the delta codes,
+    // returned with the ids in a tuple
+    template <class BucketType>
+    PyObject* uncompress_buckets_as_buffer(const std::vector<BucketType*>& buckets, const std::vector<uint32_t>& table_keys, const std::vector<raw_bucket_type*>& deltas, void (FastCompressDict<BitCountType, IdType>::*uncompress)(const BucketType&, uint32_t, uint64_t*)) {
+        uint64_t num_codes = 0;
+        BOOST_FOREACH(BucketType* bucket, buckets) {
+            num_codes += bucket->second.size();
+        }
+        BOOST_FOREACH(raw_bucket_type* delta, deltas) {
+            num_codes += delta->size();
+        }
+
+        uint64_t* binary_codes;
+        boost::python::object codes_obj(boost::python::handle<>(new_bytearray<uint64_t>(num_codes, &binary_codes)));
+        std::vector<IdType> id_vector;
+        id_vector.reserve(num_codes);
+
+        if (num_codes > 0)
+            memset(binary_codes, 0, num_codes * sizeof(uint64_t));
+
+        uint64_t offset = 0;
+        for (size_t i = 0; i < buckets.size(); i++) {
+            (this->*uncompress)(*buckets[i], table_keys[i], binary_codes + offset);
+            id_vector.insert(id_vector.end(), buckets[i]->second.begin(), buckets[i]->second.end());
+            offset += buckets[i]->second.size();
+        }
+        uint64_t num_compressed = offset;
+        BOOST_FOREACH(raw_bucket_type* delta, deltas) {
+            for (size_t i = 0; i < delta->size(); i++) {
+                binary_codes[offset++] = (*delta)[i].first;
+                id_vector.push_back((*delta)[i].second);
+            }
+        }
+        num_codes = drop_deleted(binary_codes, id_vector, num_compressed);
+        if (PyByteArray_Resize(codes_obj.ptr(), num_codes * sizeof(uint64_t)) != 0)
+            boost::python::throw_error_already_set();
+
+        boost::python::object ids_obj(boost::python::handle<>(ids_to_python<IdType>(id_vector)));
+        return boost::python::incref(boost::python::make_tuple(codes_obj, ids_obj).ptr());
+    }
+ 
+    // compress buckets with the hybrid column codec (see hybrid_column.hpp) into dict status 4.
+    // containers is a bit mask of the allowed containers: 1 run, 2 bitmap, 4 array (7: all).
+    // num_threads is the same as in parallel_go_index
+    void go_hybrid_index(uint8_t containers, uint32_t num_threads) {
+        ScopedGILRelease release;
+        super::thaw();
+
+        typedef typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::iterator bucket_iterator;
+        bucket_iterator buckets = super::dict.begin();
+
+        std::vector<std::pair<std::vector<HybridColumn>, std::vector<IdType> > > compressed(super::dict.size());
+
+        parallel_for(super::dict.size(), num_threads, [&](size_t index) {
+            compress_hybrid_bucket((buckets + index)->second, compressed[index], containers);
+        });
+
+        hybrid_containers = containers;
+
+        column_hybrid_dict.reserve(column_hybrid_dict.size() + compressed.size());
+        for (size_t index = 0; index < compressed.size(); index++)
+            column_hybrid_dict[(buckets + index)->first] = std::move(compressed[index]);
+
+        super::dict.clear();
+        drop_id_keys();
+
+        dict_status = 4;
+    }
+
+    void compress_hybrid_bucket(std::vector<std::pair<uint64_t, IdType> >& bucket, std::pair<std::vector<HybridColumn>, std::vector<IdType> >& compressed, uint8_t containers) {
+        std::sort(bucket.begin(), bucket.end(), sort_func<IdType>);
+
+        std::vector<IdType>& id_vector = compressed.second;
+        id_vector.reserve(bucket.size());
+        for (size_t i = 0; i < bucket.size(); i++)
+            id_vector.push_back(bucket[i].second);
+
+        // columns[i] holds bit i of the codes, 64 codes per word
+        size_t num_blocks = (bucket.size() + 63) / 64;
+        std::vector<std::vector<uint64_t> > columns(64, std::vector<uint64_t>(num_blocks));
+        uint64_t block[64];
+
+        for (size_t b = 0; b < num_blocks; b++) {
+            for (size_t j = 0; j < 64; j++)
+                block[j] = b * 64 + j < bucket.size() ? bucket[b * 64 + j].first : 0;
+
+            transpose_bit_block(block);
+
+            for (uint32_t column_index = 0; column_index < 64; column_index++)
+                columns[column_index][b] = block[column_index];
+        }
+
+        std::vector<std::pair<uint64_t, IdType> >().swap(bucket);
+
+        compressed.first.resize(64);
+        for (uint32_t column_index = 0; column_index < 64; column_index++)
+            compressed.first[column_index].encode(columns[column_index], id_vector.size(), containers);
+    }
+
+    // decode the codes of a hybrid bucket, in the order of its ids
+    void uncompress_hybrid_bucket(const std::pair<std::vector<HybridColumn>, std::vector<IdType> >& bucket, std::vector<uint64_t>& binary_codes) {
+        uint32_t num_codes = bucket.second.size();
+        size_t num_blocks = (num_codes + 63) / 64;
+
+        std::vector<std::vector<uint64_t> > columns(64);
+        for (uint32_t column_index = 0; column_index < 64; column_index++)
+            bucket.first[column_index].decode(columns[column_index], num_codes);
+
+        uint64_t block[64];
+        for (size_t b = 0; b < num_blocks; b++) {
+            for (uint32_t column_index = 0; column_index < 64; column_index++)
+                block[column_index] = columns[column_index][b];
+
+            transpose_bit_block(block);
+
+            for (size_t j = 0; j < 64 && b * 64 + j < num_codes; j++)
+                binary_codes.push_back(block[j]);
+        }
+    }
+
+    // cpu-based uncompression for hybrid compressed dict
+    std::pair<std::vector<uint64_t>, std::vector<IdType> > get_hybrid_binary_codes(uint32_t key) {
+        std::pair<std::vector<uint64_t>, std::vector<IdType> > return_pair;
+
+        std::pair<std::vector<HybridColumn>, std::vector<IdType> >* bucket = column_hybrid_dict.find(super::actual_key(key));
+        if (bucket != NULL) {
+            uncompress_hybrid_bucket(*bucket, return_pair.first);
+            return_pair.second = bucket->second;
+        }
+        return_pair.first.resize(drop_deleted(return_pair.first.data(), return_pair.second, return_pair.second.size()));
+        append_delta_codes(find_delta_buckets(std::vector<uint32_t>(1, key)), return_pair.first, return_pair.second);
+        return return_pair;
+    }
+
+    std::pair<std::vector<uint64_t>, std::vector<IdType> > mget_hybrid_binary_codes(boost::python::list& keys) {
+        std::pair<std::vector<uint64_t>, std::vector<IdType> > return_pair;
+        std::vector<uint32_t> key_vector;
+
+        for (int i = 0; i < len(keys); i++) {
+            key_vector.push_back(boost::python::extract<uint32_t>(keys[i]));
+            std::pair<std::vector<HybridColumn>, std::vector<IdType> >* bucket = column_hybrid_dict.find(super::actual_key(key_vector.back()));
+            if (bucket != NULL) {
+                uncompress_hybrid_bucket(*bucket, return_pair.first);
+                return_pair.second.insert(return_pair.second.end(), bucket->second.begin(), bucket->second.end());
+            }
+        }
+        return_pair.first.resize(drop_deleted(return_pair.first.data(), return_pair.second, return_pair.second.size()));
+        append_delta_codes(find_delta_buckets(key_vector), return_pair.first, return_pair.second);
+        return return_pair;
+    }
+
+    // same as mget_hybrid_binary_codes, but returns a (codes, ids) tuple of buffers, see FastDict::mget_as_buffer
+    PyObject* mget_hybrid_binary_codes_as_buffer(boost::python::object& keys) {
+        std::vector<uint64_t> binary_codes(0);
+        std::vector<IdType> id_vector(0);
+        std::vector<uint32_t> key_vector = python_keys(keys);
+
+        BOOST_FOREACH(uint32_t key, key_vector) {
+            std::pair<std::vector<HybridColumn>, std::vector<IdType> >* bucket = column_hybrid_dict.find(super::actual_key(key));
+            if (bucket != NULL) {
+                uncompress_hybrid_bucket(*bucket, binary_codes);
+                id_vector.insert(id_vector.end(), bucket->second.begin(), bucket->second.end());
+            }
+        }
+        binary_codes.resize(drop_deleted(binary_codes.data(), id_vector, id_vector.size()));
+        append_delta_codes(find_delta_buckets(key_vector), binary_codes, id_vector);
+        return codes_ids_to_python<IdType>(binary_codes, id_vector);
+    }
+
+    // cpu-based hamming distances between query and the codes in the buckets of keys
+    // returns a (distances, ids) tuple of buffers, distances are uint8
+    PyObject* mget_hybrid_hamming_distances(uint64_t query, boost::python::object& keys) {
+        std::vector<uint64_t> binary_codes(0);
+        std::vector<IdType> id_vector(0);
+        std::vector<uint32_t> key_vector = python_keys(keys);
+
+        BOOST_FOREACH(uint32_t key, key_vector) {
+            std::pair<std::vector<HybridColumn>, std::vector<IdType> >* bucket = column_hybrid_dict.find(super::actual_key(key));
+            if (bucket != NULL) {
+                uncompress_hybrid_bucket(*bucket, binary_codes);
+                id_vector.insert(id_vector.end(), bucket->second.begin(), bucket->second.end());
+            }
+        }
+        binary_codes.resize(drop_deleted(binary_codes.data(), id_vector, id_vector.size()));
+        append_delta_codes(find_delta_buckets(key_vector), binary_codes, id_vector);
+
+        std::vector<uint8_t> distances(binary_codes.size());
+        for (size_t i = 0; i < binary_codes.size(); i++)
+            distances[i] = __builtin_popcountll(binary_codes[i] ^ query);
+
+        boost::python::object distances_obj(boost::python::handle<>(vector_to_bytearray<uint8_t>(distances)));
+        boost::python::object ids_obj(boost::python::handle<>(ids_to_python<IdType>(id_vector)));
+        return boost::python::incref(boost::python::make_tuple(distances_obj, ids_obj).ptr());
+    }
+
+    // fused cpu query: compute the hamming distances between query and the codes in the buckets of keys
+    // and keep the k nearest codes in a bounded heap, in one pass with the GIL released.
+    // works on the compressed (0), VLQ base64 (1) and hybrid (4) dicts, including their delta segment.
+    // returns an (ids, distances) tuple of buffers sorted by distance, distances are uint8
+    PyObject* query_topk(uint64_t query, boost::python::object& keys, uint32_t k) {
+        if (dict_status != 0 && dict_status != 1 && dict_status != 4) {
+            PyErr_SetString(PyExc_ValueError, "query_topk expects a compressed, VLQ base64 or hybrid dict");
+            boost::python::throw_error_already_set();
+        }
+
+        std::vector<uint32_t> key_vector = python_keys(keys);
+        std::vector<uint8_t> distances;
+        std::vector<IdType> id_vector;
+
+        {
+            ScopedGILRelease release;
+
+            // one candidate per group of identical codes, pointing to the ids of the group in its
+            // bucket. the ids are only copied for the k nearest groups
+            TopKHeap<id_group> heap(k);
+            std::vector<uint64_t> binary_codes;
+            std::vector<uint64_t> group_ends;
+            std::vector<uint8_t> group_distances;
+
+            BOOST_FOREACH(uint32_t key, key_vector) {
+                const std::vector<IdType>* ids = NULL;
+
+                // the compressed dicts compute the distances from the runs, the hybrid dict decodes the codes
+                if (dict_status == 0) {
+                    std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> >* bucket = column_dict.find(super::actual_key(key));
+                    if (bucket != NULL) {
+                        grouped_hamming_distances(*bucket, super::actual_key(key), query, group_ends, group_distances);
+                        ids = &bucket->second;
+                    }
+                } else if (dict_status == 1) {
+                    std::pair<std::vector<std::string>, std::vector<IdType> >* bucket = column_vlq_dict.find(super::actual_key(key));
+                    if (bucket != NULL) {
+                        grouped_hamming_distances(*bucket, super::actual_key(key), query, group_ends, group_distances);
+                        ids = &bucket->second;
+                    }
+                } else {
+                    std::pair<std::vector<HybridColumn>, std::vector<IdType> >* bucket = column_hybrid_dict.find(super::actual_key(key));
+                    if (bucket != NULL) {
+                        binary_codes.clear();
+                        uncompress_hybrid_bucket(*bucket, binary_codes);
+                        grouped_hamming_distances(binary_codes, query, group_ends, group_distances);
+                        ids = &bucket->second;
+                    }
+                }
+
+                if (ids != NULL && ids->size() > 0)
+                    push_groups(heap, ids->data(), group_ends, group_distances);
+
+                // codes appended after compressing, see compact
+                std::vector<std::pair<uint64_t, IdType> >* delta = super::dict.find(super::actual_key(key));
+                if (delta != NULL) {
+                    for (size_t i = 0; i < delta->size(); i++)
+                        heap.push(__builtin_popcountll((*delta)[i].first ^ query), id_group(&(*delta)[i].second, 1 | DELTA_GROUP));
+                }
+            }
+
+            expand_groups(heap, k, distances, id_vector);
+        }
+
+        boost::python::object ids_obj(boost::python::handle<>(ids_to_python<IdType>(id_vector)));
+        boost::python::object distances_obj(boost::python::handle<>(vector_to_bytearray<uint8_t>(distances)));
+        return boost::python::incref(boost::python::make_tuple(ids_obj, distances_obj).ptr());
+    }
+
+    // the number of hybrid columns using each container type: [run, bitmap, array]
+    std::vector<uint32_t> hybrid_container_counts() {
+        std::vector<uint32_t> counts(3, 0);
+
+        typename BucketTable<std::pair<std::vector<HybridColumn>, std::vector<IdType> > >::const_iterator it;
+        for (it = column_hybrid_dict.begin(); it != column_hybrid_dict.end(); ++it) {
+            BOOST_FOREACH(const HybridColumn& column, it->second.first) {
+                counts[column.type]++;
+            }
+        }
+        return counts;
+    }
+
+    // bytes taken by the binary codes (ids excluded) in the current dict status
+    uint64_t compressed_size() {
+        uint64_t bytes = 0;
+
+        if (dict_status == -1) {
+            typename BucketTable<std::vector<std::pair<uint64_t, IdType> > >::const_iterator it;
+            for (it = super::dict.begin(); it != super::dict.end(); ++it)
+                bytes += it->second.size() * sizeof(uint64_t);
+            if (super::frozen)
+                bytes += super::csr_dict.num_codes() * sizeof(uint64_t);
+        } else if (dict_status == 0) {
+            typename BucketTable<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > >::const_iterator it;
+            for (it = column_dict.begin(); it != column_dict.end(); ++it) {
+                BOOST_FOREACH(const std::vector<BitCountType>& column, it->second.first) {
+                    bytes += column.size() * sizeof(BitCountType);
+                }
+            }
+        } else if (dict_status == 1) {
+            typename BucketTable<std::pair<std::vector<std::string>, std::vector<IdType> > >::const_iterator it;
+            for (it = column_vlq_dict.begin(); it != column_vlq_dict.end(); ++it) {
+                BOOST_FOREACH(const std::string& column, it->second.first) {
+                    bytes += column.size();
+                }
+            }
+        } else if (dict_status == 4) {
+            typename BucketTable<std::pair<std::vector<HybridColumn>, std::vector<IdType> > >::const_iterator it;
+            for (it = column_hybrid_dict.begin(); it != column_hybrid_dict.end(); ++it) {
+                BOOST_FOREACH(const HybridColumn& column, it->second.first) {
+                    bytes += column.bytes();
+                }
+            }
+        }
+        return bytes;
+    }
+
+    // convert a list of IdType variables to a list VLQ base64 strings
+    template <class RealIdType>
+    std::vector<std::string> NumberIdsToVLQ_base64(boost::python::list& keys) {
+
+        std::vector<std::string> return_vector(0);
+
+        for (int i = 0; i < len(keys); i++) {
+            return_vector.insert(return_vector.end(), base64VLQ_encode<RealIdType>(boost::python::extract<RealIdType>(keys[i])));
+        }
+        return return_vector;
+    }
+
+    template <class RealIdType> 
+    std::vector<RealIdType> VLQ_base64ToNumberIds(boost::python::list& keys) {
+
+        std::vector<RealIdType> return_vector(0);
+
+        for (int i = 0; i < len(keys); i++) {
+            boost::python::object elem = keys[i];
+            return_vector.insert(return_vector.end(), base64VLQ_decode<RealIdType>(PyString_AsString(elem.ptr()))[0]);
+        }
+        return return_vector;
+    }
+  
+    static const uint8_t VLQ_BASE_SHIFT = 5;
+    static const uint8_t VLQ_BASE = 1 << VLQ_BASE_SHIFT;
+    static const uint8_t VLQ_BASE_MASK = VLQ_BASE - 1;
+    static const uint8_t VLQ_CONTINUATION_BIT = VLQ_BASE;
+
+    // encoding/decoding VLQ base64
+    template <class base64VLQ_Type>
+    std::string base64VLQ_encode(base64VLQ_Type val) {
+        return base64VLQ_encode_value<base64VLQ_Type>(val);
+    }
+
+    template <class base64VLQ_Type>
+    std::vector<base64VLQ_Type> base64VLQ_decode(std::string str) {
+        uint32_t i = 0;
+        uint32_t strLen = str.length();
+        std::vector<base64VLQ_Type> results(0);
+
+        while (i < strLen) {
+            base64VLQ_Type result = 0;
+            uint8_t shift = 0;
+            uint8_t continuation, digit;
+            do {
+                if (i >= strLen) {
+                    throw new std::string("Expected more digits in base 64 VLQ value.");
+                }
+                digit = base64_chars.find(str[i++]);
+                continuation = digit & VLQ_CONTINUATION_BIT;    
+                digit &= VLQ_BASE_MASK;
+                result = result + (digit << shift);
+                shift += VLQ_BASE_SHIFT;
+            } while (continuation > 0);
+            results.insert(results.end(), result);
+        }
+
+        return results;
+    }
+
+    template <class base64VLQ_Type> 
+    std::pair<base64VLQ_Type, uint32_t> incre_base64VLQ_decode(const std::string& str, uint32_t offset) {
+        uint32_t i = offset;
+        uint32_t strLen = str.length();
+
+        base64VLQ_Type result = 0;
+        uint8_t shift = 0;
+        uint8_t continuation, digit;
+
+        do {
+            if (i >= strLen) {
+                throw new std::string("Expected more digits in base 64 VLQ value.");
+            }
+            digit = base64_chars.find(str[i++]);
+            continuation = digit & VLQ_CONTINUATION_BIT;    
+            digit &= VLQ_BASE_MASK;
+            result = result + (digit << shift);
+            shift += VLQ_BASE_SHIFT;
+        } while (continuation > 0);
+
+        std::pair<base64VLQ_Type, uint32_t> decode_pair(result, i);
+        return decode_pair;
+    }
+ 
+    int get_dict_status() { return dict_status; }    
+
+    void sync_key_bytes() {
+        super::sync_key_bytes();
+        column_dict.key_bytes = super::key_bytes();
+        column_vlq_dict.key_bytes = super::key_bytes();
+        column_hybrid_dict.key_bytes = super::key_bytes();
+    }
+
+    // status code for dict
+    // -1: not initialized
+    // 0: compressed dict
+    // 1: VLQ base64 dict           # from 0 by to_VLQ_base64_dict
+    // 2: runtime dict              # from 0 by init_runtime_dict
+    // 3: VLQ base64 runtime dict   # from 1 by init_runtime_VLQ_base64_dict
+    // 4: hybrid compressed dict    # from -1 by go_hybrid_index
+    int dict_status;
+
+    BucketTable<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > > column_dict;
+
+    BucketTable<std::pair<std::vector<std::string>, std::vector<IdType> > > column_vlq_dict;
+
+    BucketTable<std::pair<std::vector<HybridColumn>, std::vector<IdType> > > column_hybrid_dict;
+ 
+    BucketTable<std::pair<std::vector<uint32_t>, std::pair<std::vector<BitCountType*>, std::vector<IdType> > > > runtime_dict;
+
+    // python buffers of the runtime_dict columns, created by get_python_cols_as_buffer
+    BucketTable<boost::python::list> runtime_python_dict;
+
+    BucketTable<std::pair<std::vector<uint32_t>, std::pair<std::vector<char*>, std::vector<IdType> > > > runtime_vlq_dict;
+
+    // owns the column arrays of runtime_dict and runtime_vlq_dict
+    RuntimeArena runtime_arena;
+
+    // the deleted ids and the number of deleted codes still in each compressed bucket, see delete_ids
+    Tombstones<IdType> tombstones;
+    BucketTable<uint32_t> deleted_counts;
+    // the key of the bucket of each id of the compressed or runtime buckets, see count_deleted.
+    // one entry per code (8 bytes for uint32 ids, a string copy for string ids), resident from
+    // the first delete_ids until codes are compressed into the buckets again
+    std::vector<std::pair<IdType, uint32_t> > id_keys;
+
+    // the containers of the last go_hybrid_index, used to compress purged hybrid buckets again.
+    // not archived, all containers (7) after loading
+    uint8_t hybrid_containers;
+
+    // see set_code_order
+    uint8_t code_order;
+
+    // the ids of the runtime buckets compressed by pack_ids, their id vectors are empty
+    BucketTable<PackedIds<IdType> > packed_ids;
+    uint8_t ids_codec;
+
+    // the internal id range (start, count) of each runtime bucket and the original id of each
+    // internal id, see renumber_ids
+    BucketTable<std::pair<uint64_t, uint64_t> > id_ranges;
+    std::vector<IdType> original_ids;
+    bool renumbered;
+    // the file of save_original_ids, original_ids is released to it
+    MappedFile original_id_file;
+ 
+};
+
+template <class IdType>
+void save(char* filename, FastDict<IdType>& dict) {
+    std::ofstream ofs(filename);
+    dict.sync_key_bytes();
+
+    boost::archive::text_oarchive oa(ofs);
+    if (dict.frozen)
+        oa << dict.csr_dict;
+    else
+        oa << dict.dict;
+    oa << dict.key_dimensions;
+    oa << dict.index_key_dimension;
+}
+
+template <class IdType>
+void load_binary(char* filename, FastDict<IdType>& dict);
+
+template <class BitCountType, class IdType>
+void load_compress_binary(char* filename, FastCompressDict<BitCountType, IdType>& dict);
+
+// loads text archives and binary index files (see save_binary)
+template <class IdType>
+void load(char* filename, FastDict<IdType>& dict) {
+    if (is_binary_index(filename)) {
+        load_binary(filename, dict);
+        return;
+    }
+
+    std::ifstream ifs(filename);
+
+    boost::archive::text_iarchive ia(ifs);
+    if (dict.frozen)
+        ia >> dict.csr_dict;
+    else
+        ia >> dict.dict;
+    ia >> dict.key_dimensions;
+    ia >> dict.index_key_dimension;
+
+}
+ 
+template <class BitCountType, class IdType>
+void save_compress(char* filename, FastCompressDict<BitCountType, IdType>& dict) {
+    // deleted codes are dropped before saving, index files have no tombstones
+    dict.compact_deleted(0);
+
+    std::ofstream ofs(filename);
+    dict.sync_key_bytes();
+
+    boost::archive::text_oarchive oa(ofs);
+    if (dict.frozen)
+        oa << dict.csr_dict;
+    else
+        oa << dict.dict;
+    oa << dict.key_dimensions;
+    oa << dict.index_key_dimension;
+    // the columns of the runtime dicts are archived as column_dict/column_vlq_dict,
+    // load_compress initializes the runtime dict from them
+    if (dict.dict_status == 2) {
+        BucketTable<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > > columns;
+        dict.runtime_columns(columns);
+        columns.key_bytes = dict.key_bytes();
+        oa << columns;
+    } else
+        oa << dict.column_dict;
+    if (dict.dict_status == 3) {
+        BucketTable<std::pair<std::vector<std::string>, std::vector<IdType> > > columns;
+        dict.runtime_VLQ_base64_columns(columns);
+        columns.key_bytes = dict.key_bytes();
+        oa << columns;
+    } else
+        oa << dict.column_vlq_dict;
+    oa << dict.dict_status;
+    // appended after the status, so files of the other statuses keep their former layout
+    if (dict.dict_status == 4)
+        oa << dict.column_hybrid_dict;
+    // the buckets of a renumbered runtime dict hold the original ids, see restore_id_ranges
+    if (dict.dict_status == 2 || dict.dict_status == 3) {
+        oa << dict.renumbered;
+        if (dict.renumbered) {
+            dict.id_ranges.key_bytes = dict.key_bytes();
+            oa << dict.id_ranges;
+        }
+    }
+}
+
+// loads text archives and binary index files (see save_compress_binary)
+template <class BitCountType, class IdType>
+void load_compress(char* filename, FastCompressDict<BitCountType, IdType>& dict) {
+    if (is_binary_index(filename)) {
+        load_compress_binary(filename, dict);
+        return;
+    }
+
+    std::ifstream ifs(filename);
+
+    boost::archive::text_iarchive ia(ifs);
+    if (dict.frozen)
+        ia >> dict.csr_dict;
+    else
+        ia >> dict.dict;
+    ia >> dict.key_dimensions;
+    ia >> dict.index_key_dimension;
+    ia >> dict.column_dict;
+    ia >> dict.column_vlq_dict;
+    ia >> dict.dict_status;
+    if (dict.dict_status == 4)
+        ia >> dict.column_hybrid_dict;
+    // runtime dicts saved before the renumbering was archived end after the status
+    bool renumbered = false;
+    BucketTable<std::pair<uint64_t, uint64_t> > id_ranges;
+    if ((dict.dict_status == 2 || dict.dict_status == 3) && !(ifs >> std::ws).eof()) {
+        ia >> renumbered;
+        if (renumbered)
+            ia >> id_ranges;
+    }
+    dict.packed_ids.clear();
+    dict.ids_codec = ID_CODEC_RAW;
+    dict.reset_renumbering();
+    dict.drop_id_keys();
+    if (dict.dict_status == 2)
+        dict.init_runtime_dict();
+    if (dict.dict_status == 3)
+        dict.init_runtime_VLQ_base64_dict();
+    if (renumbered)
+        dict.restore_id_ranges(id_ranges);
+    dict.build_occupancy();
+}
+ 
+// binary index format, see binary_format.hpp
+
+// numeric ids are one IDS section of IdType, string ids are ID_OFFSETS (uint64)
+// and their concatenated characters in IDS
+template <class IdType>
+uint8_t binary_id_bytes() { return sizeof(IdType); }
+
+template <>
+uint8_t binary_id_bytes<std::string>() { return 0; }
+
+template <class IdType>
+class BinaryIdsWriter
+{
+public:
+    BinaryIdsWriter(BinaryWriter& writer, uint32_t table) : writer(writer) {
+        writer.begin_section(binary_tag(table, BINARY_IDS), sizeof(IdType));
+    }
+
+    void append(const IdType* ids, uint64_t count) {
+        if (count > 0)
+            writer.write(ids, count);
+    }
+
+    void finish() {}
+
+private:
+    BinaryWriter& writer;
+};
+
+template <>
+class BinaryIdsWriter<std::string>
+{
+public:
+    BinaryIdsWriter(BinaryWriter& writer, uint32_t table) : writer(writer), table(table), total(0) {
+        writer.begin_section(binary_tag(table, BINARY_ID_OFFSETS), sizeof(uint64_t));
+        writer.write_value(total);
+    }
+
+    void append(const std::string* ids, uint64_t count) {
+        for (uint64_t i = 0; i < count; i++) {
+            characters.insert(characters.end(), ids[i].begin(), ids[i].end());
+            total += ids[i].size();
+            writer.write_value(total);
+        }
+    }
+
+    void finish() {
+        writer.write_section(binary_tag(table, BINARY_IDS), characters);
+    }
+
+private:
+    BinaryWriter& writer;
+    uint32_t table;
+    uint64_t total;
+    std::vector<char> characters;
+};
+
+template <class IdType>
+class BinaryIdsReader
+{
+public:
+    BinaryIdsReader(const BinaryReader& reader, uint32_t table) {
+        uint64_t count;
+        ids = reader.section<IdType>(binary_tag(table, BINARY_IDS), &count);
+    }
+
+    // append the ids [begin, end) to id_vector
+    void append(uint64_t begin, uint64_t end, std::vector<IdType>& id_vector) const {
+        if (end > begin)
+            id_vector.insert(id_vector.end(), ids + begin, ids + end);
+    }
+
+private:
+    const IdType* ids;
+};
+
+template <>
+class BinaryIdsReader<std::string>
+{
+public:
+    BinaryIdsReader(const BinaryReader& reader, uint32_t table) {
+        uint64_t count;
+        offsets = reader.section<uint64_t>(binary_tag(table, BINARY_ID_OFFSETS), &count);
+        characters = reader.section<char>(binary_tag(table, BINARY_IDS), &count);
+    }
+
+    void append(uint64_t begin, uint64_t end, std::vector<std::string>& id_vector) const {
+        for (uint64_t i = begin; i < end; i++)
+            id_vector.push_back(std::string(characters + offsets[i], offsets[i + 1] - offsets[i]));
+    }
+
+private:
+    const uint64_t* offsets;
+    const char* characters;
+};
+
+// copy count elements of element_bytes bytes (1, 2 or 4) into elements, widening them to T
+template <class T>
+void widen_binary_elements(const void* data, uint64_t count, uint32_t element_bytes, T* elements) {
+    if (element_bytes == sizeof(T))
+        memcpy(elements, data, count * sizeof(T));
+    else if (element_bytes == 1)
+        std::copy((const uint8_t*)data, (const uint8_t*)data + count, elements);
+    else if (element_bytes == 2)
+        std::copy((const uint16_t*)data, (const uint16_t*)data + count, elements);
+    else if (element_bytes == 4)
+        std::copy((const uint32_t*)data, (const uint32_t*)data + count, elements);
+    else if (count > 0)
+        throw std::invalid_argument("corrupted binary index section");
+}
+
+// how the columns of column_dict, column_vlq_dict and column_hybrid_dict are stored in RUNS
+template <class ColumnType>
+struct BinaryColumn;
+
+template <class BitCountType>
+struct BinaryColumn<std::vector<BitCountType> >
+{
+    typedef BitCountType element_type;
+    static const bool has_types = false;
+
+    static uint64_t length(const std::vector<BitCountType>& column) { return column.size(); }
+    static uint8_t type(const std::vector<BitCountType>& column) { return 0; }
+
+    // run counts are narrowed to the smallest width holding the largest one
+    template <class BucketType>
+    static void write_runs(BinaryWriter& writer, uint32_t tag, const std::vector<BucketType*>& buckets) {
+        BitCountType max_count = 0;
+        BOOST_FOREACH(BucketType* bucket, buckets) {
+            BOOST_FOREACH(const std::vector<BitCountType>& column, bucket->first) {
+                BOOST_FOREACH(BitCountType count, column) {
+                    max_count = std::max(max_count, count);
+                }
+            }
+        }
+
+        if ((uint64_t)max_count <= 0xFF)
+            write_narrow_runs<uint8_t>(writer, tag, buckets);
+        else if ((uint64_t)max_count <= 0xFFFF)
+            write_narrow_runs<uint16_t>(writer, tag, buckets);
+        else
+            write_narrow_runs<uint32_t>(writer, tag, buckets);
+    }
+
+    template <class NarrowType, class BucketType>
+    static void write_narrow_runs(BinaryWriter& writer, uint32_t tag, const std::vector<BucketType*>& buckets) {
+        writer.begin_section(tag, sizeof(NarrowType));
+        std::vector<NarrowType> narrow_column;
+        BOOST_FOREACH(BucketType* bucket, buckets) {
+            BOOST_FOREACH(const std::vector<BitCountType>& column, bucket->first) {
+                narrow_column.assign(column.begin(), column.end());
+                if (narrow_column.size() > 0)
+                    writer.write(narrow_column.data(), narrow_column.size());
+            }
+        }
+    }
+
+    // the run counts widened to BitCountType
+    static const BitCountType* read_runs(const BinaryReader& reader, uint32_t tag, std::vector<BitCountType>& widened) {
+        uint64_t count;
+        uint32_t element_bytes;
+        const void* runs = reader.raw_section(tag, &count, &element_bytes);
+        if (element_bytes == sizeof(BitCountType))
+            return (const BitCountType*)runs;
+
+        widened.resize(count);
+        widen_binary_elements(runs, count, element_bytes, widened.data());
+        return widened.data();
+    }
+
+    static void assign(std::vector<BitCountType>& column, const BitCountType* elements, uint64_t count, uint8_t type) {
+        column.assign(elements, elements + count);
+    }
+};
+
+template <>
+struct BinaryColumn<std::string>
+{
+    typedef char element_type;
+    static const bool has_types = false;
+
+    static uint64_t length(const std::string& column) { return column.size(); }
+    static uint8_t type(const std::string& column) { return 0; }
+
+    template <class BucketType>
+    static void write_runs(BinaryWriter& writer, uint32_t tag, const std::vector<BucketType*>& buckets) {
+        writer.begin_section(tag, sizeof(char));
+        BOOST_FOREACH(BucketType* bucket, buckets) {
+            BOOST_FOREACH(const std::string& column, bucket->first) {
+                if (column.size() > 0)
+                    writer.write(column.data(), column.size());
+            }
+        }
+    }
+
+    static const char* read_runs(const BinaryReader& reader, uint32_t tag, std::vector<char>& widened) {
+        uint64_t count;
+        return reader.section<char>(tag, &count);
+    }
+
+    static void assign(std::string& column, const char* elements, uint64_t count, uint8_t type) {
+        column.assign(elements, count);
+    }
+};
+
+template <>
+struct BinaryColumn<HybridColumn>
+{
+    typedef uint8_t element_type;
+    static const bool has_types = true;
+
+    static uint64_t length(const HybridColumn& column) { return column.data.size(); }
+    static uint8_t type(const HybridColumn& column) { return column.type; }
+
+    template <class BucketType>
+    static void write_runs(BinaryWriter& writer, uint32_t tag, const std::vector<BucketType*>& buckets) {
+        writer.begin_section(tag, sizeof(uint8_t));
+        BOOST_FOREACH(BucketType* bucket, buckets) {
+            BOOST_FOREACH(const HybridColumn& column, bucket->first) {
+                if (column.data.size() > 0)
+                    writer.write(column.data.data(), column.data.size());
+            }
+        }
+    }
+
+    static const uint8_t* read_runs(const BinaryReader& reader, uint32_t tag, std::vector<uint8_t>& widened) {
+        uint64_t count;
+        return reader.section<uint8_t>(tag, &count);
+    }
+
+    static void assign(HybridColumn& column, const uint8_t* elements, uint64_t count, uint8_t type) {
+        column.type = type;
+        column.data.assign(elements, elements + count);
+    }
+};
+
+template <class IdType>
+void write_binary_raw_table(BinaryWriter& writer, FastDict<IdType>& dict) {
+    typedef std::vector<std::pair<uint64_t, IdType> > bucket_type;
+    const uint32_t table = BINARY_TABLE_RAW;
+
+    if (dict.frozen) {
+        if (dict.csr_dict.size() == 0)
+            return;
+        writer.write_section(binary_tag(table, BINARY_KEYS), dict.csr_dict.keys);
+        writer.write_section(binary_tag(table, BINARY_BUCKET_OFFSETS), dict.csr_dict.offsets);
+        writer.write_section(binary_tag(table, BINARY_CODES), dict.csr_dict.codes);
+        BinaryIdsWriter<IdType> ids_writer(writer, table);
+        ids_writer.append(dict.csr_dict.ids.data(), dict.csr_dict.ids.size());
+        ids_writer.finish();
+        return;
+    }
+
+    if (dict.dict.size() == 0)
+        return;
+
+    std::vector<uint32_t> keys = dict.dict.sorted_keys();
+    std::vector<bucket_type*> buckets;
+    BOOST_FOREACH(uint32_t key, keys) {
+        buckets.push_back(dict.dict.find(key));
+    }
+    writer.write_section(binary_tag(table, BINARY_KEYS), keys);
+
+    uint64_t offset = 0;
+    writer.begin_section(binary_tag(table, BINARY_BUCKET_OFFSETS), sizeof(uint64_t));
+    writer.write_value(offset);
+    BOOST_FOREACH(bucket_type* bucket, buckets) {
+        offset += bucket->size();
+        writer.write_value(offset);
+    }
+
+    writer.begin_section(binary_tag(table, BINARY_CODES), sizeof(uint64_t));
+    BOOST_FOREACH(bucket_type* bucket, buckets) {
+        for (size_t i = 0; i < bucket->size(); i++)
+            writer.write_value((*bucket)[i].first);
+    }
+
+    BinaryIdsWriter<IdType> ids_writer(writer, table);
+    std::vector<IdType> ids;
+    BOOST_FOREACH(bucket_type* bucket, buckets) {
+        ids.clear();
+        for (size_t i = 0; i < bucket->size(); i++)
+            ids.push_back((*bucket)[i].second);
+        ids_writer.append(ids.data(), ids.size());
+    }
+    ids_writer.finish();
+}
+
+template <class IdType>
+void read_binary_raw_table(const BinaryReader& reader, FastDict<IdType>& dict) {
+    const uint32_t table = BINARY_TABLE_RAW;
+
+    uint64_t num_buckets, num_offsets, num_codes;
+    const uint32_t* keys = reader.section<uint32_t>(binary_tag(table, BINARY_KEYS), &num_buckets);
+    if (keys == NULL)
+        return;
+    const uint64_t* offsets = reader.required_section<uint64_t>(binary_tag(table, BINARY_BUCKET_OFFSETS), &num_offsets);
+    const uint64_t* codes = reader.required_section<uint64_t>(binary_tag(table, BINARY_CODES), &num_codes);
+    BinaryIdsReader<IdType> ids_reader(reader, table);
+
+    if (dict.frozen) {
+        dict.csr_dict.keys.assign(keys, keys + num_buckets);
+        dict.csr_dict.offsets.assign(offsets, offsets + num_offsets);
+        dict.csr_dict.codes.assign(codes, codes + num_codes);
+        ids_reader.append(0, num_codes, dict.csr_dict.ids);
+        return;
+    }
+
+    dict.dict.reserve(num_buckets);
+    std::vector<IdType> ids;
+    for (uint64_t i = 0; i < num_buckets; i++) {
+        std::vector<std::pair<uint64_t, IdType> >& bucket = dict.dict[keys[i]];
+        ids.clear();
+        ids_reader.append(offsets[i], offsets[i + 1], ids);
+        bucket.reserve(ids.size());
+        for (uint64_t j = 0; j < ids.size(); j++)
+            bucket.push_back(std::pair<uint64_t, IdType>(codes[offsets[i] + j], ids[j]));
+    }
+}
+
+template <class ColumnType, class IdType>
+void write_binary_column_table(BinaryWriter& writer, uint32_t table, BucketTable<std::pair<std::vector<ColumnType>, std::vector<IdType> > >& columns) {
+    typedef std::pair<std::vector<ColumnType>, std::vector<IdType> > bucket_type;
+    typedef BinaryColumn<ColumnType> binary_column;
+
+    if (columns.size() == 0)
+        return;
+
+    std::vector<uint32_t> keys = columns.sorted_keys();
+    std::vector<bucket_type*> buckets;
+    BOOST_FOREACH(uint32_t key, keys) {
+        buckets.push_back(columns.find(key));
+    }
+    writer.write_section(binary_tag(table, BINARY_KEYS), keys);
+
+    uint64_t offset = 0;
+    writer.begin_section(binary_tag(table, BINARY_BUCKET_OFFSETS), sizeof(uint64_t));
+    writer.write_value(offset);
+    BOOST_FOREACH(bucket_type* bucket, buckets) {
+        offset += bucket->second.size();
+        writer.write_value(offset);
+    }
+
+    BinaryIdsWriter<IdType> ids_writer(writer, table);
+    BOOST_FOREACH(bucket_type* bucket, buckets) {
+        ids_writer.append(bucket->second.data(), bucket->second.size());
+    }
+    ids_writer.finish();
+
+    offset = 0;
+    writer.begin_section(binary_tag(table, BINARY_COLUMN_OFFSETS), sizeof(uint64_t));
+    writer.write_value(offset);
+    BOOST_FOREACH(bucket_type* bucket, buckets) {
+        offset += bucket->first.size();
+        writer.write_value(offset);
+    }
+
+    offset = 0;
+    writer.begin_section(binary_tag(table, BINARY_RUN_OFFSETS), sizeof(uint64_t));
+    writer.write_value(offset);
+    BOOST_FOREACH(bucket_type* bucket, buckets) {
+        BOOST_FOREACH(const ColumnType& column, bucket->first) {
+            offset += binary_column::length(column);
+            writer.write_value(offset);
+        }
+    }
+
+    binary_column::write_runs(writer, binary_tag(table, BINARY_RUNS), buckets);
+
+    if (binary_column::has_types) {
+        writer.begin_section(binary_tag(table, BINARY_COLUMN_TYPES), sizeof(uint8_t));
+        BOOST_FOREACH(bucket_type* bucket, buckets) {
+            BOOST_FOREACH(const ColumnType& column, bucket->first) {
+                writer.write_value(binary_column::type(column));
+            }
+        }
+    }
+}
+
+template <class ColumnType, class IdType>
+void read_binary_column_table(const BinaryReader& reader, uint32_t table, BucketTable<std::pair<std::vector<ColumnType>, std::vector<IdType> > >& columns) {
+    typedef std::pair<std::vector<ColumnType>, std::vector<IdType> > bucket_type;
+    typedef BinaryColumn<ColumnType> binary_column;
+    typedef typename binary_column::element_type element_type;
+
+    uint64_t num_buckets, count;
+    const uint32_t* keys = reader.section<uint32_t>(binary_tag(table, BINARY_KEYS), &num_buckets);
+    if (keys == NULL)
+        return;
+    const uint64_t* offsets = reader.required_section<uint64_t>(binary_tag(table, BINARY_BUCKET_OFFSETS), &count);
+    const uint64_t* column_offsets = reader.required_section<uint64_t>(binary_tag(table, BINARY_COLUMN_OFFSETS), &count);
+    const uint64_t* run_offsets = reader.required_section<uint64_t>(binary_tag(table, BINARY_RUN_OFFSETS), &count);
+    std::vector<element_type> widened_runs;
+    const element_type* runs = binary_column::read_runs(reader, binary_tag(table, BINARY_RUNS), widened_runs);
+    const uint8_t* types = binary_column::has_types ? reader.required_section<uint8_t>(binary_tag(table, BINARY_COLUMN_TYPES), &count) : NULL;
+    BinaryIdsReader<IdType> ids_reader(reader, table);
+
+    columns.reserve(num_buckets);
+    for (uint64_t i = 0; i < num_buckets; i++) {
+        bucket_type& bucket = columns[keys[i]];
+        bucket.first.resize(column_offsets[i + 1] - column_offsets[i]);
+        for (uint64_t j = column_offsets[i]; j < column_offsets[i + 1]; j++)
+            binary_column::assign(bucket.first[j - column_offsets[i]], runs + run_offsets[j], run_offsets[j + 1] - run_offsets[j], types == NULL ? 0 : types[j]);
+        bucket.second.clear();
+        ids_reader.append(offsets[i], offsets[i + 1], bucket.second);
+    }
+}
+
+// read a column table straight into a runtime dict (status 2/3), skipping column_dict:
+// RUNS is copied into one arena array the columns point into
+template <class ElementType, class IdType>
+void read_binary_runtime_table(const BinaryReader& reader, uint32_t table, BucketTable<std::pair<std::vector<uint32_t>, std::pair<std::vector<ElementType*>, std::vector<IdType> > > >& runtime, RuntimeArena& arena) {
+    typedef std::pair<std::vector<uint32_t>, std::pair<std::vector<ElementType*>, std::vector<IdType> > > bucket_type;
+
+    uint64_t num_buckets, count, num_runs;
+    uint32_t element_bytes;
+    const uint32_t* keys = reader.section<uint32_t>(binary_tag(table, BINARY_KEYS), &num_buckets);
+    if (keys == NULL)
+        return;
+    const uint64_t* offsets = reader.required_section<uint64_t>(binary_tag(table, BINARY_BUCKET_OFFSETS), &count);
+    const uint64_t* column_offsets = reader.required_section<uint64_t>(binary_tag(table, BINARY_COLUMN_OFFSETS), &count);
+    const uint64_t* run_offsets = reader.required_section<uint64_t>(binary_tag(table, BINARY_RUN_OFFSETS), &count);
+    const void* runs = reader.raw_section(binary_tag(table, BINARY_RUNS), &num_runs, &element_bytes);
+    BinaryIdsReader<IdType> ids_reader(reader, table);
+
+    ElementType* arena_runs = arena.template allocate<ElementType>(num_runs);
+    widen_binary_elements(runs, num_runs, element_bytes, arena_runs);
+
+    runtime.reserve(num_buckets);
+    for (uint64_t i = 0; i < num_buckets; i++) {
+        bucket_type& bucket = runtime[keys[i]];
+        for (uint64_t j = column_offsets[i]; j < column_offsets[i + 1]; j++) {
+            bucket.first.push_back(run_offsets[j + 1] - run_offsets[j]);
+            bucket.second.first.push_back(arena_runs + run_offsets[j]);
+        }
+        ids_reader.append(offsets[i], offsets[i + 1], bucket.second.second);
+    }
+}
+
+// the id ranges of renumber_ids are contiguous in key order, so they are stored in CSR form
+inline void write_binary_id_ranges(BinaryWriter& writer, BucketTable<std::pair<uint64_t, uint64_t> >& id_ranges) {
+    std::vector<uint32_t> keys = id_ranges.sorted_keys();
+    std::vector<uint64_t> offsets(1, 0);
+    offsets.reserve(keys.size() + 1);
+    BOOST_FOREACH(uint32_t key, keys) {
+        const std::pair<uint64_t, uint64_t>* range = id_ranges.find(key);
+        if (range->first != offsets.back())
+            throw std::invalid_argument("the id ranges are not contiguous in key order");
+        offsets.push_back(range->first + range->second);
+    }
+    writer.write_section(binary_tag(BINARY_TABLE_ID_RANGES, BINARY_KEYS), keys);
+    writer.write_section(binary_tag(BINARY_TABLE_ID_RANGES, BINARY_BUCKET_OFFSETS), offsets);
+}
+
+// false if the file has no id ranges, i.e. the dict was not renumbered
+inline bool read_binary_id_ranges(const BinaryReader& reader, BucketTable<std::pair<uint64_t, uint64_t> >& id_ranges) {
+    uint64_t num_keys, num_offsets;
+    const uint32_t* keys = reader.section<uint32_t>(binary_tag(BINARY_TABLE_ID_RANGES, BINARY_KEYS), &num_keys);
+    if (keys == NULL)
+        return false;
+    const uint64_t* offsets = reader.required_section<uint64_t>(binary_tag(BINARY_TABLE_ID_RANGES, BINARY_BUCKET_OFFSETS), &num_offsets);
+    if (num_offsets != num_keys + 1)
+        throw std::invalid_argument("corrupted binary index section");
+
+    id_ranges.reserve(num_keys);
+    for (uint64_t i = 0; i < num_keys; i++)
+        id_ranges[keys[i]] = std::pair<uint64_t, uint64_t>(offsets[i], offsets[i + 1] - offsets[i]);
+    return true;
+}
+
+template <class IdType>
+BinaryHeader binary_header(FastDict<IdType>& dict, int32_t dict_status, uint8_t bit_count_bytes) {
+    BinaryHeader header;
+    memset(&header, 0, sizeof(BinaryHeader));
+    header.dict_status = dict_status;
+    header.bit_count_bytes = bit_count_bytes;
+    header.id_bytes = binary_id_bytes<IdType>();
+    header.index_key_dimension = dict.index_key_dimension;
+    return header;
+}
+
+template <class IdType>
+void read_binary_header(const BinaryReader& reader, FastDict<IdType>& dict) {
+    if (reader.header.id_bytes != binary_id_bytes<IdType>())
+        throw std::invalid_argument("the binary index was written with another id type");
+
+    uint64_t count;
+    const uint32_t* key_dimensions = reader.section<uint32_t>(binary_tag(BINARY_TABLE_GLOBAL, BINARY_KEY_DIMENSIONS), &count);
+    dict.key_dimensions.assign(key_dimensions, key_dimensions + count);
+    dict.index_key_dimension = reader.header.index_key_dimension;
+}
+
+// save dict in the binary index format: no text conversion when saving or loading,
+// and its sections can be mapped in place. load() detects the format by itself
+template <class IdType>
+void save_binary(char* filename, FastDict<IdType>& dict) {
+    BinaryWriter writer(filename, binary_header(dict, -1, 0));
+    writer.write_section(binary_tag(BINARY_TABLE_GLOBAL, BINARY_KEY_DIMENSIONS), dict.key_dimensions);
+    write_binary_raw_table(writer, dict);
+    writer.close();
+}
+
+template <class IdType>
+void load_binary(char* filename, FastDict<IdType>& dict) {
+    BinaryReader reader(filename);
+    read_binary_header(reader, dict);
+
+    dict.dict.clear();
+    dict.csr_dict.clear();
+    read_binary_raw_table(reader, dict);
+}
+
+// same as save_binary for compressed dicts. load_compress() detects the format by itself
+template <class BitCountType, class IdType>
+void save_compress_binary(char* filename, FastCompressDict<BitCountType, IdType>& dict) {
+    dict.compact_deleted(0);
+    // a mapped dict serves the compressed tables only, the delta segment is folded into them
+    if ((dict.dict_status == 0 || dict.dict_status == 1 || dict.dict_status == 4) && dict.delta_size() > 0)
+        dict.compact(0);
+    BinaryWriter writer(filename, binary_header(dict, dict.dict_status, sizeof(BitCountType)));
+    writer.write_section(binary_tag(BINARY_TABLE_GLOBAL, BINARY_KEY_DIMENSIONS), dict.key_dimensions);
+    write_binary_raw_table(writer, dict);
+    // the runtime dicts are written as the column tables they were initialized from
+    if (dict.dict_status == 2) {
+        BucketTable<std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > > columns;
+        dict.runtime_columns(columns);
+        write_binary_column_table(writer, BINARY_TABLE_COLUMN, columns);
+    } else
+        write_binary_column_table(writer, BINARY_TABLE_COLUMN, dict.column_dict);
+    if (dict.dict_status == 3) {
+        BucketTable<std::pair<std::vector<std::string>, std::vector<IdType> > > columns;
+        dict.runtime_VLQ_base64_columns(columns);
+        write_binary_column_table(writer, BINARY_TABLE_VLQ, columns);
+    } else
+        write_binary_column_table(writer, BINARY_TABLE_VLQ, dict.column_vlq_dict);
+    write_binary_column_table(writer, BINARY_TABLE_HYBRID, dict.column_hybrid_dict);
+    // the buckets of a renumbered runtime dict hold the original ids, see restore_id_ranges
+    if (dict.renumbered)
+        write_binary_id_ranges(writer, dict.id_ranges);
+    writer.close();
+}
+
+template <class BitCountType, class IdType>
+void load_compress_binary(char* filename, FastCompressDict<BitCountType, IdType>& dict) {
+    BinaryReader reader(filename);
+    if (reader.header.bit_count_bytes != 0 && reader.header.bit_count_bytes != sizeof(BitCountType))
+        throw std::invalid_argument("the binary index was written with another run count type");
+    read_binary_header(reader, dict);
+    dict.dict_status = reader.header.dict_status;
+
+    dict.dict.clear();
+    dict.csr_dict.clear();
+    dict.column_dict.clear();
+    dict.column_vlq_dict.clear();
+    dict.column_hybrid_dict.clear();
+    dict.runtime_dict.clear();
+    dict.runtime_python_dict.clear();
+    dict.runtime_vlq_dict.clear();
+    dict.runtime_arena.clear();
+    dict.packed_ids.clear();
+    dict.ids_codec = ID_CODEC_RAW;
+    dict.reset_renumbering();
+    dict.drop_id_keys();
+    read_binary_raw_table(reader, dict);
+    if (dict.dict_status == 2)
+        read_binary_runtime_table(reader, BINARY_TABLE_COLUMN, dict.runtime_dict, dict.runtime_arena);
+    else
+        read_binary_column_table(reader, BINARY_TABLE_COLUMN, dict.column_dict);
+    if (dict.dict_status == 3)
+        read_binary_runtime_table(reader, BINARY_TABLE_VLQ, dict.runtime_vlq_dict, dict.runtime_arena);
+    else
+        read_binary_column_table(reader, BINARY_TABLE_VLQ, dict.column_vlq_dict);
+    read_binary_column_table(reader, BINARY_TABLE_HYBRID, dict.column_hybrid_dict);
+    if (dict.dict_status == 2 || dict.dict_status == 3) {
+        BucketTable<std::pair<uint64_t, uint64_t> > id_ranges;
+        if (read_binary_id_ranges(reader, id_ranges))
+            dict.restore_id_ranges(id_ranges);
+    }
+    dict.build_occupancy();
+}
+
+// convert an index file written by save_compress to the binary index format
+template <class BitCountType, class IdType>
+void convert_compress(char* text_filename, char* binary_filename) {
+    FastCompressDict<BitCountType, IdType> dict(32);
+    // the raw buckets are loaded in CSR layout directly
+    dict.freeze();
+    load_compress(text_filename, dict);
+    save_compress_binary(binary_filename, dict);
+}
+
+// convert an index file written by save to the binary index format
+template <class IdType>
+void convert(char* text_filename, char* binary_filename) {
+    FastDict<IdType> dict(32);
+    dict.freeze();
+    load(text_filename, dict);
+    save_binary(binary_filename, dict);
+}
+
+// walks the raw buckets of a binary index file in ascending key order
+template <class IdType>
+class BinaryRawCursor
+{
+
+public:
+
+    BinaryRawCursor(const char* filename) : reader(filename), ids_reader(reader, BINARY_TABLE_RAW), index(0) {
+        const uint32_t table = BINARY_TABLE_RAW;
+        uint64_t count;
+        if (reader.header.id_bytes != binary_id_bytes<IdType>())
+            throw std::invalid_argument("the binary index was written with another id type");
+        keys = reader.section<uint32_t>(binary_tag(table, BINARY_KEYS), &num_buckets);
+        if (keys != NULL) {
+            offsets = reader.required_section<uint64_t>(binary_tag(table, BINARY_BUCKET_OFFSETS), &count);
+            codes = reader.required_section<uint64_t>(binary_tag(table, BINARY_CODES), &count);
+        }
+    }
+
+    bool done() const { return index >= num_buckets; }
+
+    uint32_t key() const { return keys[index]; }
+
+    // append the codes and ids of the current bucket to bucket and move to the next one
+    void pop(std::vector<std::pair<uint64_t, IdType> >& bucket) {
+        ids.clear();
+        ids_reader.append(offsets[index], offsets[index + 1], ids);
+        for (uint64_t i = 0; i < ids.size(); i++)
+            bucket.push_back(std::pair<uint64_t, IdType>(codes[offsets[index] + i], ids[i]));
+        index++;
+    }
+
+    BinaryReader reader;
+
+private:
+
+    BinaryIdsReader<IdType> ids_reader;
+    const uint32_t* keys;
+    const uint64_t* offsets;
+    const uint64_t* codes;
+    uint64_t num_buckets;
+    uint64_t index;
+    std::vector<IdType> ids;
+};
+
+// copy the section tag of a binary index file, if it has one, into writer.
+// the copied pages are released from the resident set chunk by chunk
+inline void copy_binary_section(const char* filename, uint32_t tag, BinaryWriter& writer) {
+    BinaryReader reader(filename);
+    uint64_t count;
+    uint32_t element_bytes;
+    const char* elements = (const char*)reader.raw_section(tag, &count, &element_bytes);
+    if (elements == NULL)
+        return;
+    writer.begin_section(tag, element_bytes);
+    uint64_t chunk = std::max<uint64_t>(1, (1 << 20) / std::max<uint32_t>(1, element_bytes));
+    for (uint64_t begin = 0; begin < count; begin += chunk) {
+        uint64_t end = std::min<uint64_t>(count, begin + chunk);
+        writer.write(elements + begin * element_bytes, end - begin);
+        reader.release(elements + begin * element_bytes, (end - begin) * element_bytes);
+    }
+}
+
+template <class NarrowType, class BitCountType>
+void write_narrow_runs(BinaryWriter& writer, const BinaryReader& reader, uint32_t tag, const BitCountType* runs, uint64_t count) {
+    writer.begin_section(tag, sizeof(NarrowType));
+    std::vector<NarrowType> narrow_runs;
+    for (uint64_t begin = 0; begin < count; begin += (1 << 18)) {
+        uint64_t end = std::min<uint64_t>(count, begin + (1 << 18));
+        narrow_runs.assign(runs + begin, runs + end);
+        writer.write(narrow_runs.data(), narrow_runs.size());
+        reader.release(runs + begin, (end - begin) * sizeof(BitCountType));
+    }
+}
+
+// merge the raw buckets of the shard index files (e.g. the <offset>_<table>.dict files written
+// while indexing) into a compressed index file (dict status 0) in the binary index format.
+// the shards are walked bucket by bucket in key order, like a k-way merge, and each merged bucket
+// is compressed and written right away, so the merged raw dict is never held in memory.
+// the sections of the output are streamed into temporary binary index files next to filename
+// and copied into it at the end. binary shards are mapped, text shards are converted to a
+// temporary binary file one at a time first (see convert_compress)
+template <class BitCountType, class IdType>
+void merge_compress(boost::python::list& shard_filenames, char* filename) {
+    std::vector<std::string> shards;
+    for (int i = 0; i < len(shard_filenames); i++)
+        shards.push_back(boost::python::extract<std::string>(shard_filenames[i]));
+
+    ScopedGILRelease release;
+
+    const uint32_t table = BINARY_TABLE_COLUMN;
+    std::string output(filename);
+    std::vector<std::string> temporary_files;
+
+    std::vector<std::unique_ptr<BinaryRawCursor<IdType> > > cursors;
+    for (size_t i = 0; i < shards.size(); i++) {
+        std::string shard = shards[i];
+        if (!is_binary_index(shard.c_str())) {
+            std::string converted = output + ".shard" + std::to_string((unsigned long long)i);
+            convert_compress<BitCountType, IdType>((char*)shard.c_str(), (char*)converted.c_str());
+            temporary_files.push_back(converted);
+            shard = converted;
+        }
+        cursors.push_back(std::unique_ptr<BinaryRawCursor<IdType> >(new BinaryRawCursor<IdType>(shard.c_str())));
     }
- 
-    // called before init runtime dict 
-    // for VLQ base64 column dict
-    std::vector<IdType> get_VLQ_base64_image_ids_before_runtime_init(uint32_t key) {
-        std::vector<uint8_t> bool_key = super::actual_key(key);
 
-        if (column_vlq_dict.count(bool_key) > 0)
-            return column_vlq_dict[bool_key].second;
-        else {
-            std::vector<IdType> id_vector(0);
-            return id_vector;
-        }
+    // one temporary binary index file per section (the ids may need two sections)
+    std::string keys_filename = output + ".keys", offsets_filename = output + ".offsets", ids_filename = output + ".ids";
+    std::string column_offsets_filename = output + ".column_offsets", run_offsets_filename = output + ".run_offsets", runs_filename = output + ".runs";
+    std::string parts[] = {keys_filename, offsets_filename, ids_filename, column_offsets_filename, run_offsets_filename, runs_filename};
+    temporary_files.insert(temporary_files.end(), parts, parts + 6);
+
+    BinaryHeader part_header;
+    memset(&part_header, 0, sizeof(BinaryHeader));
+    BinaryWriter keys_writer(keys_filename.c_str(), part_header);
+    BinaryWriter offsets_writer(offsets_filename.c_str(), part_header);
+    BinaryWriter ids_writer(ids_filename.c_str(), part_header);
+    BinaryWriter column_offsets_writer(column_offsets_filename.c_str(), part_header);
+    BinaryWriter run_offsets_writer(run_offsets_filename.c_str(), part_header);
+    BinaryWriter runs_writer(runs_filename.c_str(), part_header);
+
+    keys_writer.begin_section(binary_tag(table, BINARY_KEYS), sizeof(uint32_t));
+    offsets_writer.begin_section(binary_tag(table, BINARY_BUCKET_OFFSETS), sizeof(uint64_t));
+    BinaryIdsWriter<IdType> bucket_ids_writer(ids_writer, table);
+    column_offsets_writer.begin_section(binary_tag(table, BINARY_COLUMN_OFFSETS), sizeof(uint64_t));
+    run_offsets_writer.begin_section(binary_tag(table, BINARY_RUN_OFFSETS), sizeof(uint64_t));
+    runs_writer.begin_section(binary_tag(table, BINARY_RUNS), sizeof(BitCountType));
+
+    uint64_t offset = 0, column_offset = 0, run_offset = 0;
+    offsets_writer.write_value(offset);
+    column_offsets_writer.write_value(column_offset);
+    run_offsets_writer.write_value(run_offset);
+
+    // the codec drops the key dimension columns of the buckets, see compress_bucket
+    FastCompressDict<BitCountType, IdType> codec(32);
+    if (cursors.size() > 0) {
+        uint64_t count;
+        const uint32_t* key_dimensions = cursors[0]->reader.template section<uint32_t>(binary_tag(BINARY_TABLE_GLOBAL, BINARY_KEY_DIMENSIONS), &count);
+        if (key_dimensions != NULL)
+            codec.key_dimensions.assign(key_dimensions, key_dimensions + count);
     }
- 
-    // called before init runtime dict 
-    // for VLQ base64 column dict
-    std::vector<IdType> mget_VLQ_base64_image_ids_before_runtime_init(boost::python::list& keys) {
-        std::vector<IdType> image_ids(0);
+    std::vector<std::pair<uint64_t, IdType> > bucket;
+    std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > compressed;
+    BitCountType max_count = 0;
+
+    while (true) {
+        bool found = false;
+        uint32_t key = 0;
+        for (size_t i = 0; i < cursors.size(); i++) {
+            if (!cursors[i]->done() && (!found || cursors[i]->key() < key)) {
+                key = cursors[i]->key();
+                found = true;
+            }
+        }
+        if (!found)
+            break;
 
-        for (int i = 0; i < len(keys); i++) {
-            BOOST_FOREACH(IdType id, get_VLQ_base64_image_ids_before_runtime_init(boost::python::extract<uint32_t>(keys[i]))) {
-                image_ids.insert(image_ids.end(), id);
+        bucket.clear();
+        for (size_t i = 0; i < cursors.size(); i++) {
+            if (!cursors[i]->done() && cursors[i]->key() == key)
+                cursors[i]->pop(bucket);
+        }
+
+        compressed.first.clear();
+        compressed.second.clear();
+        codec.compress_bucket(bucket, compressed, key);
+
+        keys_writer.write_value(key);
+        offset += compressed.second.size();
+        offsets_writer.write_value(offset);
+        bucket_ids_writer.append(compressed.second.data(), compressed.second.size());
+        column_offset += compressed.first.size();
+        column_offsets_writer.write_value(column_offset);
+        BOOST_FOREACH(const std::vector<BitCountType>& column, compressed.first) {
+            run_offset += column.size();
+            run_offsets_writer.write_value(run_offset);
+            if (column.size() > 0)
+                runs_writer.write(column.data(), column.size());
+            BOOST_FOREACH(BitCountType count, column) {
+                max_count = std::max(max_count, count);
             }
         }
-        return image_ids;
     }
- 
-    // get raw compressed data
-    // called before init_runtime_dict() since initialization will clear column_dict
-    std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > get_cols(uint32_t key) {
-        std::vector<uint8_t> bool_key = super::actual_key(key);
 
-        if (column_dict.count(bool_key) > 0)
-            return column_dict[bool_key];
-        else {
-            //std::vector<std::vector<uint8_t> > columns(1, *new std::vector<uint8_t>(1, 0));
-            //std::vector<IdType> id_vector(1, *new IdType());
-            std::vector<std::vector<BitCountType> > columns(0);
-            std::vector<IdType> id_vector(0);
-            std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > empty_pair(columns, id_vector);
-            return empty_pair;
-        }
+    bucket_ids_writer.finish();
+    keys_writer.close();
+    offsets_writer.close();
+    ids_writer.close();
+    column_offsets_writer.close();
+    run_offsets_writer.close();
+    runs_writer.close();
+
+    // all shards share the key dimensions of the index
+    BinaryHeader header;
+    memset(&header, 0, sizeof(BinaryHeader));
+    header.dict_status = 0;
+    header.bit_count_bytes = sizeof(BitCountType);
+    header.id_bytes = binary_id_bytes<IdType>();
+    header.index_key_dimension = cursors.size() > 0 ? cursors[0]->reader.header.index_key_dimension : 0;
+
+    BinaryWriter writer(filename, header);
+    if (cursors.size() > 0) {
+        uint64_t count;
+        const uint32_t* key_dimensions = cursors[0]->reader.template section<uint32_t>(binary_tag(BINARY_TABLE_GLOBAL, BINARY_KEY_DIMENSIONS), &count);
+        writer.begin_section(binary_tag(BINARY_TABLE_GLOBAL, BINARY_KEY_DIMENSIONS), sizeof(uint32_t));
+        if (count > 0)
+            writer.write(key_dimensions, count);
+    }
+    cursors.clear();
+
+    if (column_offset > 0) {
+        copy_binary_section(keys_filename.c_str(), binary_tag(table, BINARY_KEYS), writer);
+        copy_binary_section(offsets_filename.c_str(), binary_tag(table, BINARY_BUCKET_OFFSETS), writer);
+        copy_binary_section(ids_filename.c_str(), binary_tag(table, BINARY_ID_OFFSETS), writer);
+        copy_binary_section(ids_filename.c_str(), binary_tag(table, BINARY_IDS), writer);
+        copy_binary_section(column_offsets_filename.c_str(), binary_tag(table, BINARY_COLUMN_OFFSETS), writer);
+        copy_binary_section(run_offsets_filename.c_str(), binary_tag(table, BINARY_RUN_OFFSETS), writer);
+
+        // run counts are narrowed like write_binary_column_table does
+        BinaryReader runs_reader(runs_filename.c_str());
+        uint64_t num_runs;
+        const BitCountType* runs = runs_reader.section<BitCountType>(binary_tag(table, BINARY_RUNS), &num_runs);
+        if ((uint64_t)max_count <= 0xFF)
+            write_narrow_runs<uint8_t>(writer, runs_reader, binary_tag(table, BINARY_RUNS), runs, num_runs);
+        else if ((uint64_t)max_count <= 0xFFFF)
+            write_narrow_runs<uint16_t>(writer, runs_reader, binary_tag(table, BINARY_RUNS), runs, num_runs);
+        else
+            write_narrow_runs<uint32_t>(writer, runs_reader, binary_tag(table, BINARY_RUNS), runs, num_runs);
     }
+    writer.close();
 
-    // for VLQ base64     
-    std::pair<std::vector<std::string>, std::vector<IdType> > get_VLQ_base64_cols(uint32_t key) {
-        std::vector<uint8_t> bool_key = super::actual_key(key);
+    BOOST_FOREACH(const std::string& temporary_file, temporary_files) {
+        remove(temporary_file.c_str());
+    }
+}
 
-        if (column_vlq_dict.count(bool_key) > 0)
-            return column_vlq_dict[bool_key];
-        else {
-            //std::vector<std::vector<uint8_t> > columns(1, *new std::vector<uint8_t>(1, 0));
-            //std::vector<IdType> id_vector(1, *new IdType());
-            std::vector<std::string> columns(0);
-            std::vector<IdType> id_vector(0);
-            std::pair<std::vector<std::string>, std::vector<IdType> > empty_pair(columns, id_vector);
-            return empty_pair;
+// read-only compressed dict serving a binary index file (see save_compress_binary) from a
+// read-only mmap instead of loading it into the heap: opening only maps the file, the
+// buckets are looked up by binary search in the KEYS section and the page cache is
+// shared by all processes mapping the same file.
+// the file must hold a compressed (0), VLQ base64 (1) or hybrid (4) dict with numeric ids.
+// the buffers returned by the *_cols_as_buffer methods point into the mapping and are
+// valid as long as the dict is alive and not reopened
+template <class BitCountType, class IdType>
+class MappedCompressDict: public FastCompressDict<BitCountType, IdType> {
+
+public:
+    typedef FastCompressDict<BitCountType, IdType> super;
+    typedef std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > column_bucket_type;
+    typedef std::pair<std::vector<std::string>, std::vector<IdType> > vlq_bucket_type;
+    typedef std::pair<std::vector<HybridColumn>, std::vector<IdType> > hybrid_bucket_type;
+
+    MappedCompressDict() : FastCompressDict<BitCountType, IdType>(32), reader(NULL), table_keys(NULL), num_buckets(0) {}
+
+    ~MappedCompressDict() { close(); }
+
+    void open(char* filename) {
+        close();
+        std::unique_ptr<BinaryReader> mapped(new BinaryReader(filename));
+        const BinaryHeader& header = mapped->header;
+        if (header.id_bytes != binary_id_bytes<IdType>())
+            throw std::invalid_argument("the binary index was written with another id type");
+        if (header.bit_count_bytes != sizeof(BitCountType))
+            throw std::invalid_argument("the binary index was written with another run count type");
+
+        uint32_t table;
+        if (header.dict_status == 0)
+            table = BINARY_TABLE_COLUMN;
+        else if (header.dict_status == 1)
+            table = BINARY_TABLE_VLQ;
+        else if (header.dict_status == 4)
+            table = BINARY_TABLE_HYBRID;
+        else
+            throw std::invalid_argument("a mapped dict expects a compressed, VLQ base64 or hybrid index");
+
+        uint64_t count;
+        uint64_t num_keys;
+        const uint32_t* keys = mapped->section<uint32_t>(binary_tag(table, BINARY_KEYS), &num_keys);
+        if (keys != NULL) {
+            bucket_offsets = mapped->required_section<uint64_t>(binary_tag(table, BINARY_BUCKET_OFFSETS), &count);
+            ids = mapped->required_section<IdType>(binary_tag(table, BINARY_IDS), &count);
+            column_offsets = mapped->required_section<uint64_t>(binary_tag(table, BINARY_COLUMN_OFFSETS), &count);
+            run_offsets = mapped->required_section<uint64_t>(binary_tag(table, BINARY_RUN_OFFSETS), &count);
+            runs = (const char*)mapped->raw_section(binary_tag(table, BINARY_RUNS), &count, &runs_bytes);
+            types = table == BINARY_TABLE_HYBRID ? mapped->required_section<uint8_t>(binary_tag(table, BINARY_COLUMN_TYPES), &count) : NULL;
+            if (runs == NULL || (table == BINARY_TABLE_COLUMN && runs_bytes != 1 && runs_bytes != 2 && runs_bytes != 4))
+                throw std::invalid_argument("corrupted binary index section");
         }
+
+        const uint32_t* key_dimensions = mapped->section<uint32_t>(binary_tag(BINARY_TABLE_GLOBAL, BINARY_KEY_DIMENSIONS), &count);
+        super::key_dimensions.assign(key_dimensions, key_dimensions + count);
+        super::index_key_dimension = header.index_key_dimension;
+        super::dict_status = header.dict_status;
+
+        table_keys = keys;
+        num_buckets = num_keys;
+        reader = mapped.release();
+        build_occupancy();
     }
- 
-    // cpu-based uncompression algorithm
-    // only workable before init runtime dict
-    std::pair<std::vector<uint64_t>, std::vector<IdType> > get_binary_codes(uint32_t key) {
-        std::vector<uint8_t> bool_key = super::actual_key(key);
-        std::vector<uint64_t> binary_codes;
 
-        if (column_dict.count(bool_key) > 0) {
-            uint32_t current_binary_code_num = 0;
-            for (int binary_code_count = 0; binary_code_count < column_dict[bool_key].second.size(); binary_code_count++) {
-                std::vector<BitCountType> column; 
-                uint64_t binary_code = 0x00;
-                uint16_t column_index = 0;
-                BOOST_FOREACH(column, column_dict[bool_key].first) {
-                    uint32_t count_for_bits = 0;
-                    uint8_t bit_type = 0x00;
-                    BOOST_FOREACH(BitCountType bit_counts, column) {
-                        count_for_bits += bit_counts;
-
-                        // for test
-                        // std::cout << "count_for_bits: " << count_for_bits << "\n";
-                        // std::cout << "current_binary_code_num: " << current_binary_code_num << "\n";
-
-                        if (count_for_bits > current_binary_code_num) {
-                            if (bit_type == 1)
-                                binary_code = binary_code | ((uint64_t)1 << column_index);
-
-                            // for test
-                            // std::cout << "column_index: " << column_index << "\n";
-                            // std::cout << "inter. binary_code: " <<  binary_code  << "\n";
- 
-                            column_index++;
-                            break;
-                        }
-                        bit_type = bit_type ^ 0x01;
-                    } 
-                }
-                // for test
-                // std::cout << "binary_code: " << long(binary_code) << "\n";
+    // unmap the file, the dict is empty afterwards
+    void close() {
+        delete reader;
+        reader = NULL;
+        table_keys = NULL;
+        num_buckets = 0;
+        super::occupancy.clear();
+    }
 
-                current_binary_code_num++;
-                binary_codes.push_back(binary_code);
-            }
-            std::pair<std::vector<uint64_t>, std::vector<IdType> > apair(binary_codes, column_dict[bool_key].second);
-            return apair;
-        }
-        else {
-            std::vector<uint64_t> binary_codes(0);
-            std::vector<IdType> id_vector(0);
-            std::pair<std::vector<uint64_t>, std::vector<IdType> > empty_pair(binary_codes, id_vector);
-            return empty_pair;
-        }
- 
+    void build_occupancy() {
+        super::occupancy.build(get_keys());
     }
- 
-    // cpu-based uncompression algorithm
-    // only workable before init runtime dict
-    std::pair<std::vector<uint64_t>, std::vector<IdType> > mget_binary_codes(boost::python::list& keys) {
-        std::vector<uint64_t> binary_codes(0);
-        std::vector<IdType> id_vector(0);
-        std::pair<std::vector<uint64_t>, std::vector<IdType> > return_pair(binary_codes, id_vector);
 
-        for (int i = 0; i < len(keys); i++) {
-            std::pair<std::vector<uint64_t>, std::vector<IdType> > partial_binary_codes = get_binary_codes(boost::python::extract<uint32_t>(keys[i]));
+    int get_dict_status() { return super::dict_status; }
 
-            BOOST_FOREACH(uint64_t binary_code, partial_binary_codes.first) {
-                return_pair.first.insert(return_pair.first.end(), binary_code);
-            }
-            BOOST_FOREACH(IdType binary_code_id, partial_binary_codes.second) {
-                return_pair.second.insert(return_pair.second.end(), binary_code_id);
-            }
-        }
-        return return_pair;
+    uint32_t size() { return num_buckets; }
+
+    std::vector<uint32_t> get_keys() {
+        return std::vector<uint32_t>(table_keys, table_keys + num_buckets);
     }
- 
-    // cpu-based uncompression algorithm for VLQ base64 compressed dict
-    // only workable before init VLQ base64 runtime dict
-    std::pair<std::vector<uint64_t>, std::vector<IdType> > get_VLQ_base64_binary_codes(uint32_t key) {
-        std::vector<uint8_t> bool_key = super::actual_key(key);
-        std::vector<uint64_t> binary_codes;
 
-        if (column_vlq_dict.count(bool_key) > 0) {
-            uint32_t current_binary_code_num = 0;
-            for (int binary_code_count = 0; binary_code_count < column_vlq_dict[bool_key].second.size(); binary_code_count++) {
-                uint64_t binary_code = 0x00;
-                uint16_t column_index = 0;
-                BOOST_FOREACH(std::string column, column_vlq_dict[bool_key].first) {
-                    uint32_t count_for_bits = 0;
-                    uint8_t bit_type = 0x00;
-                    uint32_t VLQ_base64_string_offset = 0;
-
-                    std::pair<BitCountType, uint32_t> decode_pair;
-
-                    while (VLQ_base64_string_offset < column.size()) {
-                        decode_pair = incre_base64VLQ_decode<BitCountType>(column, VLQ_base64_string_offset);
-                        BitCountType bit_counts = decode_pair.first;
-                        VLQ_base64_string_offset = decode_pair.second;
-
-                        count_for_bits += bit_counts;
-
-                        if (count_for_bits > current_binary_code_num) {
-                            if (bit_type == 1)
-                                binary_code = binary_code | ((uint64_t)1 << column_index);
-
-                            column_index++;
-                            break;
-                        }
-                        bit_type = bit_type ^ 0x01;
-                    } 
-                }
+    bool exist(uint32_t key) { return find(key) >= 0; }
 
-                current_binary_code_num++;
-                binary_codes.push_back(binary_code);
-            }
-            std::pair<std::vector<uint64_t>, std::vector<IdType> > apair(binary_codes, column_vlq_dict[bool_key].second);
-            return apair;
+    void get_keydimensions(boost::python::list& dimensions) {
+        super::get_keydimensions(dimensions);
+    }
+
+    std::vector<IdType> mget_image_ids(boost::python::list& keys) {
+        std::vector<IdType> image_ids;
+        for (int i = 0; i < len(keys); i++) {
+            int64_t index = find(boost::python::extract<uint32_t>(keys[i]));
+            if (index >= 0)
+                image_ids.insert(image_ids.end(), ids + bucket_offsets[index], ids + bucket_offsets[index + 1]);
         }
-        else {
-            std::vector<uint64_t> binary_codes(0);
-            std::vector<IdType> id_vector(0);
-            std::pair<std::vector<uint64_t>, std::vector<IdType> > empty_pair(binary_codes, id_vector);
-            return empty_pair;
+        return image_ids;
+    }
+
+    // the ids of the buckets of keys as a bytearray of IdType, copied from the mapping
+    PyObject* mget_image_ids_as_buffer(boost::python::object& keys) {
+        std::vector<int64_t> indexes = find_all(keys);
+        uint64_t num_codes = count_codes(indexes);
+
+        IdType* image_ids;
+        PyObject* array = new_bytearray<IdType>(num_codes, &image_ids);
+        BOOST_FOREACH(int64_t index, indexes) {
+            uint64_t bucket_size = bucket_offsets[index + 1] - bucket_offsets[index];
+            if (bucket_size > 0)
+                memcpy(image_ids, ids + bucket_offsets[index], bucket_size * sizeof(IdType));
+            image_ids += bucket_size;
         }
- 
+        return array;
     }
- 
-    // cpu-based uncompression algorithm for VLQ base64 compressed dict
-    // only workable before init VLQ base64 runtime dict
-    std::pair<std::vector<uint64_t>, std::vector<IdType> > mget_VLQ_base64_binary_codes(boost::python::list& keys) {
-        std::vector<uint64_t> binary_codes(0);
-        std::vector<IdType> id_vector(0);
-        std::pair<std::vector<uint64_t>, std::vector<IdType> > return_pair(binary_codes, id_vector);
 
-        for (int i = 0; i < len(keys); i++) {
-            std::pair<std::vector<uint64_t>, std::vector<IdType> > partial_binary_codes = get_VLQ_base64_binary_codes(boost::python::extract<uint32_t>(keys[i]));
+    // same as FastCompressDict::mget_python_cols_as_buffer for a mapped compressed dict.
+    // the column buffers point into the mapping if the run counts were saved as
+    // BitCountType, otherwise (save_compress_binary narrows them) each column is widened
+    // into a new bytearray. the dropped key dimension columns are restored into new bytearrays
+    PyObject* mget_python_cols_as_buffer(boost::python::list& keys) {
+        require_status(0, "mget_python_cols_as_buffer expects a mapped compressed dict");
 
-            BOOST_FOREACH(uint64_t binary_code, partial_binary_codes.first) {
-                return_pair.first.insert(return_pair.first.end(), binary_code);
-            }
-            BOOST_FOREACH(IdType binary_code_id, partial_binary_codes.second) {
-                return_pair.second.insert(return_pair.second.end(), binary_code_id);
+        boost::python::list return_vector;
+        for (int i = 0; i < len(keys); i++) {
+            boost::python::list buffers;
+            int64_t index = find(boost::python::extract<uint32_t>(keys[i]));
+            if (index >= 0) {
+                uint64_t mask;
+                uint64_t bits = dropped_column_bits(index, &mask);
+                for (uint64_t j = column_offsets[index]; j < column_offsets[index + 1]; j++) {
+                    uint64_t column_index = j - column_offsets[index];
+                    if (column_index < 64 && ((mask >> column_index) & 0x01)) {
+                        std::vector<BitCountType> column = super::constant_column((bits >> column_index) & 0x01, bucket_offsets[index + 1] - bucket_offsets[index]);
+                        buffers.append(boost::python::object(boost::python::handle<>(vector_to_bytearray<BitCountType>(column))));
+                    } else if (runs_bytes == sizeof(BitCountType)) {
+                        const char* column = runs + run_offsets[j] * runs_bytes;
+                        buffers.append(boost::python::object(boost::python::handle<>(PyBuffer_FromMemory((void*)column, (run_offsets[j + 1] - run_offsets[j]) * runs_bytes))));
+                    } else {
+                        std::vector<BitCountType> column;
+                        widen_runs(run_offsets[j], run_offsets[j + 1], column);
+                        buffers.append(boost::python::object(boost::python::handle<>(vector_to_bytearray<BitCountType>(column))));
+                    }
+                }
             }
+            return_vector.append(buffers);
         }
-        return return_pair;
+        return boost::python::incref(return_vector.ptr());
     }
- 
-    // convert a list of IdType variables to a list VLQ base64 strings
-    template <class RealIdType>
-    std::vector<std::string> NumberIdsToVLQ_base64(boost::python::list& keys) {
 
-        std::vector<std::string> return_vector(0);
+    // same as FastCompressDict::mget_VLQ_base64_cols_as_buffer for a mapped VLQ base64 dict,
+    // the column buffers point into the mapping except for the restored key dimension columns
+    PyObject* mget_VLQ_base64_cols_as_buffer(boost::python::list& keys) {
+        require_status(1, "mget_VLQ_base64_cols_as_buffer expects a mapped VLQ base64 dict");
 
+        boost::python::list return_vector;
         for (int i = 0; i < len(keys); i++) {
-            return_vector.insert(return_vector.end(), base64VLQ_encode<RealIdType>(boost::python::extract<RealIdType>(keys[i])));
+            boost::python::list buffers;
+            int64_t index = find(boost::python::extract<uint32_t>(keys[i]));
+            if (index >= 0) {
+                uint64_t mask;
+                uint64_t bits = dropped_column_bits(index, &mask);
+                for (uint64_t j = column_offsets[index]; j < column_offsets[index + 1]; j++) {
+                    uint64_t column_index = j - column_offsets[index];
+                    if (column_index < 64 && ((mask >> column_index) & 0x01)) {
+                        std::string column = super::VLQ_base64_column(super::constant_column((bits >> column_index) & 0x01, bucket_offsets[index + 1] - bucket_offsets[index]));
+                        buffers.append(boost::python::object(boost::python::handle<>(vector_to_bytearray<char>(std::vector<char>(column.begin(), column.end())))));
+                    } else
+                        buffers.append(boost::python::object(boost::python::handle<>(PyBuffer_FromMemory((void*)(runs + run_offsets[j]), run_offsets[j + 1] - run_offsets[j]))));
+                }
+            }
+            return_vector.append(buffers);
         }
-        return return_vector;
+        return boost::python::incref(return_vector.ptr());
     }
 
-    template <class RealIdType> 
-    std::vector<RealIdType> VLQ_base64ToNumberIds(boost::python::list& keys) {
+    // cpu-based uncompression of the buckets of keys, whatever the dict status is.
+    // returns a (codes, ids) tuple of buffers, see FastCompressDict::mget_binary_codes_as_buffer
+    PyObject* mget_binary_codes_as_buffer(boost::python::object& keys) {
+        std::vector<int64_t> indexes = find_all(keys);
+        uint64_t num_codes = count_codes(indexes);
 
-        std::vector<RealIdType> return_vector(0);
+        uint64_t* binary_codes;
+        boost::python::object codes_obj(boost::python::handle<>(new_bytearray<uint64_t>(num_codes, &binary_codes)));
+        std::vector<IdType> id_vector;
+        id_vector.reserve(num_codes);
 
-        for (int i = 0; i < len(keys); i++) {
-            boost::python::object elem = keys[i];
-            return_vector.insert(return_vector.end(), base64VLQ_decode<RealIdType>(PyString_AsString(elem.ptr()))[0]);
+        {
+            ScopedGILRelease release;
+
+            if (num_codes > 0)
+                memset(binary_codes, 0, num_codes * sizeof(uint64_t));
+
+            Buckets buckets;
+            BOOST_FOREACH(int64_t index, indexes) {
+                uncompress(index, buckets, binary_codes);
+                id_vector.insert(id_vector.end(), ids + bucket_offsets[index], ids + bucket_offsets[index + 1]);
+                binary_codes += bucket_offsets[index + 1] - bucket_offsets[index];
+            }
         }
-        return return_vector;
-    }
-  
-    static const uint8_t VLQ_BASE_SHIFT = 5;
-    static const uint8_t VLQ_BASE = 1 << VLQ_BASE_SHIFT;
-    static const uint8_t VLQ_BASE_MASK = VLQ_BASE - 1;
-    static const uint8_t VLQ_CONTINUATION_BIT = VLQ_BASE;
 
-    // encoding/decoding VLQ base64
-    template <class base64VLQ_Type>
-    std::string base64VLQ_encode(base64VLQ_Type val) {
-        std::string encoded = "";
-        base64VLQ_Type digit;
+        boost::python::object ids_obj(boost::python::handle<>(ids_to_python<IdType>(id_vector)));
+        return boost::python::incref(boost::python::make_tuple(codes_obj, ids_obj).ptr());
+    }
 
-        do {
-            digit = val & VLQ_BASE_MASK;
-            val >>= VLQ_BASE_SHIFT;
-            if (val > 0) {
-                digit |= VLQ_CONTINUATION_BIT;
+    // cpu-based hamming distances between query and the codes in the buckets of keys,
+    // see FastCompressDict::mget_hamming_distances. returns a (distances, ids) tuple of buffers
+    PyObject* mget_hamming_distances(uint64_t query, boost::python::object& keys) {
+        std::vector<int64_t> indexes = find_all(keys);
+        uint64_t num_codes = count_codes(indexes);
+
+        uint8_t* distances;
+        boost::python::object distances_obj(boost::python::handle<>(new_bytearray<uint8_t>(num_codes, &distances)));
+        std::vector<IdType> id_vector;
+        id_vector.reserve(num_codes);
+
+        {
+            ScopedGILRelease release;
+
+            Buckets buckets;
+            BOOST_FOREACH(int64_t index, indexes) {
+                hamming_distances(index, query, buckets, distances);
+                id_vector.insert(id_vector.end(), ids + bucket_offsets[index], ids + bucket_offsets[index + 1]);
+                distances += bucket_offsets[index + 1] - bucket_offsets[index];
             }
-            encoded += base64_chars[digit];
-        } while (val > 0);
+        }
 
-        return encoded;
+        boost::python::object ids_obj(boost::python::handle<>(ids_to_python<IdType>(id_vector)));
+        return boost::python::incref(boost::python::make_tuple(distances_obj, ids_obj).ptr());
     }
 
-    template <class base64VLQ_Type>
-    std::vector<base64VLQ_Type> base64VLQ_decode(std::string str) {
-        uint32_t i = 0;
-        uint32_t strLen = str.length();
-        std::vector<base64VLQ_Type> results(0);
+    // same as FastCompressDict::query_topk for a mapped dict
+    PyObject* query_topk(uint64_t query, boost::python::object& keys, uint32_t k) {
+        std::vector<int64_t> indexes = find_all(keys);
+        std::vector<uint8_t> distances;
+        std::vector<IdType> id_vector;
+
+        {
+            ScopedGILRelease release;
+
+            // the ids are pointed to in the mapping
+            TopKHeap<typename super::id_group> heap(k);
+            std::vector<uint64_t> group_ends;
+            std::vector<uint8_t> group_distances;
+            Buckets buckets;
+
+            BOOST_FOREACH(int64_t index, indexes) {
+                if (bucket_offsets[index + 1] == bucket_offsets[index])
+                    continue;
+                grouped_hamming_distances(index, query, buckets, group_ends, group_distances);
+                super::push_groups(heap, ids + bucket_offsets[index], group_ends, group_distances);
+            }
 
-        while (i < strLen) {
-            base64VLQ_Type result = 0;
-            uint8_t shift = 0;
-            uint8_t continuation, digit;
-            do {
-                if (i >= strLen) {
-                    throw new std::string("Expected more digits in base 64 VLQ value.");
-                }
-                digit = base64_chars.find(str[i++]);
-                continuation = digit & VLQ_CONTINUATION_BIT;    
-                digit &= VLQ_BASE_MASK;
-                result = result + (digit << shift);
-                shift += VLQ_BASE_SHIFT;
-            } while (continuation > 0);
-            results.insert(results.end(), result);
+            super::expand_groups(heap, k, distances, id_vector);
         }
 
-        return results;
+        boost::python::object ids_obj(boost::python::handle<>(ids_to_python<IdType>(id_vector)));
+        boost::python::object distances_obj(boost::python::handle<>(vector_to_bytearray<uint8_t>(distances)));
+        return boost::python::incref(boost::python::make_tuple(ids_obj, distances_obj).ptr());
     }
 
-    template <class base64VLQ_Type> 
-    std::pair<base64VLQ_Type, uint32_t> incre_base64VLQ_decode(std::string str, uint32_t offset) {
-        uint32_t i = offset;
-        uint32_t strLen = str.length();
+private:
 
-        base64VLQ_Type result = 0;
-        uint8_t shift = 0;
-        uint8_t continuation, digit;
+    // the mapping is owned by one dict
+    MappedCompressDict(const MappedCompressDict&);
+    MappedCompressDict& operator=(const MappedCompressDict&);
 
-        do {
-            if (i >= strLen) {
-                throw new std::string("Expected more digits in base 64 VLQ value.");
-            }
-            digit = base64_chars.find(str[i++]);
-            continuation = digit & VLQ_CONTINUATION_BIT;    
-            digit &= VLQ_BASE_MASK;
-            result = result + (digit << shift);
-            shift += VLQ_BASE_SHIFT;
-        } while (continuation > 0);
+    // scratch buckets the mapped columns of one bucket are copied into, so that the
+    // decoders of FastCompressDict can be used. they are reused from bucket to bucket
+    struct Buckets
+    {
+        column_bucket_type column_bucket;
+        vlq_bucket_type vlq_bucket;
+        hybrid_bucket_type hybrid_bucket;
+        std::vector<uint64_t> binary_codes;
+    };
 
-        std::pair<base64VLQ_Type, uint32_t> decode_pair(result, i);
-        return decode_pair;
+    void require_status(int status, const char* message) {
+        if (super::dict_status != status) {
+            PyErr_SetString(PyExc_ValueError, message);
+            boost::python::throw_error_already_set();
+        }
     }
- 
-    int get_dict_status() { return dict_status; }    
 
-    // status code for dict
-    // -1: not initialized
-    // 0: compressed dict
-    // 1: VLQ base64 dict           # from 0 by to_VLQ_base64_dict
-    // 2: runtime dict              # from 0 by init_runtime_dict
-    // 3: VLQ base64 runtime dict   # from 1 by init_runtime_VLQ_base64_dict
-    int dict_status;
+    // the index of the bucket of key in the KEYS section, -1 if there is no such bucket
+    int64_t find(uint32_t key) {
+        uint32_t table_key = super::actual_key(key);
+        const uint32_t* it = std::lower_bound(table_keys, table_keys + num_buckets, table_key);
+        if (it == table_keys + num_buckets || *it != table_key)
+            return -1;
+        return it - table_keys;
+    }
 
-    std::map<std::vector<uint8_t>, std::pair<std::vector<std::vector<BitCountType> >, std::vector<IdType> > > column_dict;
+    // the indexes of the buckets of keys, missing keys are skipped
+    std::vector<int64_t> find_all(boost::python::object& keys) {
+        std::vector<int64_t> indexes;
+        BOOST_FOREACH(uint32_t key, python_keys(keys)) {
+            int64_t index = find(key);
+            if (index >= 0)
+                indexes.push_back(index);
+        }
+        return indexes;
+    }
 
-    std::map<std::vector<uint8_t>, std::pair<std::vector<std::string>, std::vector<IdType> > > column_vlq_dict;
- 
-    std::map<std::vector<uint8_t>, std::pair<std::vector<uint32_t>, std::pair<std::vector<BitCountType*>, std::vector<IdType> > > > runtime_dict;
+    uint64_t count_codes(const std::vector<int64_t>& indexes) {
+        uint64_t num_codes = 0;
+        BOOST_FOREACH(int64_t index, indexes) {
+            num_codes += bucket_offsets[index + 1] - bucket_offsets[index];
+        }
+        return num_codes;
+    }
 
-    // use boost::python::list instead of std::vector to store runtime dict
-    std::map<std::vector<uint8_t>, std::pair<std::vector<uint32_t>, std::pair<boost::python::list, std::vector<IdType> > > > runtime_python_dict;
+    // the bits of the key dimension columns dropped from bucket index, see FastCompressDict::dropped_bits
+    uint64_t dropped_column_bits(int64_t index, uint64_t* mask) {
+        uint64_t key_mask;
+        uint64_t key_bits = super::key_code_bits(table_keys[index], &key_mask);
+
+        *mask = 0;
+        if (key_mask == 0 || bucket_offsets[index + 1] == bucket_offsets[index])
+            return 0;
+        for (uint64_t j = column_offsets[index]; j < column_offsets[index + 1] && j - column_offsets[index] < 64; j++) {
+            uint64_t column_index = j - column_offsets[index];
+            if (run_offsets[j + 1] == run_offsets[j] && ((key_mask >> column_index) & 0x01))
+                *mask |= (uint64_t)1 << column_index;
+        }
+        return key_bits & *mask;
+    }
 
-    std::map<std::vector<uint8_t>, std::pair<std::vector<uint32_t>, std::pair<std::vector<char*>, std::vector<IdType> > > > runtime_vlq_dict;
- 
-};
+    // the run counts [begin, end) of RUNS widened to BitCountType
+    void widen_runs(uint64_t begin, uint64_t end, std::vector<BitCountType>& column) {
+        column.resize(end - begin);
+        widen_binary_elements(runs + begin * runs_bytes, end - begin, runs_bytes, column.data());
+    }
 
-template <class IdType>
-void save(char* filename, FastDict<IdType> dict) {
-    std::ofstream ofs(filename);
+    void load_ids(int64_t index, std::vector<IdType>& bucket_ids) {
+        bucket_ids.assign(ids + bucket_offsets[index], ids + bucket_offsets[index + 1]);
+    }
 
-    boost::archive::text_oarchive oa(ofs);
-    oa << dict.dict;
-    oa << dict.key_dimensions;
-    oa << dict.index_key_dimension;
-}
+    void load_bucket(int64_t index, column_bucket_type& bucket) {
+        load_ids(index, bucket.second);
+        bucket.first.resize(column_offsets[index + 1] - column_offsets[index]);
+        for (uint64_t j = column_offsets[index]; j < column_offsets[index + 1]; j++)
+            widen_runs(run_offsets[j], run_offsets[j + 1], bucket.first[j - column_offsets[index]]);
+    }
 
-template <class IdType>
-void load(char* filename, FastDict<IdType>& dict) {
-    std::ifstream ifs(filename);
+    template <class ColumnType>
+    void load_bucket(int64_t index, std::pair<std::vector<ColumnType>, std::vector<IdType> >& bucket) {
+        load_ids(index, bucket.second);
+        bucket.first.resize(column_offsets[index + 1] - column_offsets[index]);
+        for (uint64_t j = column_offsets[index]; j < column_offsets[index + 1]; j++) {
+            const typename BinaryColumn<ColumnType>::element_type* elements = (const typename BinaryColumn<ColumnType>::element_type*)runs + run_offsets[j];
+            BinaryColumn<ColumnType>::assign(bucket.first[j - column_offsets[index]], elements, run_offsets[j + 1] - run_offsets[j], types == NULL ? 0 : types[j]);
+        }
+    }
 
-    boost::archive::text_iarchive ia(ifs);
-    ia >> dict.dict;
-    ia >> dict.key_dimensions;
-    ia >> dict.index_key_dimension;
+    // decode bucket index into binary_codes, which must be zeroed
+    void uncompress(int64_t index, Buckets& buckets, uint64_t* binary_codes) {
+        if (super::dict_status == 0) {
+            load_bucket(index, buckets.column_bucket);
+            super::uncompress_bucket(buckets.column_bucket, table_keys[index], binary_codes);
+        } else if (super::dict_status == 1) {
+            load_bucket(index, buckets.vlq_bucket);
+            super::uncompress_VLQ_base64_bucket(buckets.vlq_bucket, table_keys[index], binary_codes);
+        } else {
+            load_bucket(index, buckets.hybrid_bucket);
+            buckets.binary_codes.clear();
+            super::uncompress_hybrid_bucket(buckets.hybrid_bucket, buckets.binary_codes);
+            if (buckets.binary_codes.size() > 0)
+                memcpy(binary_codes, buckets.binary_codes.data(), buckets.binary_codes.size() * sizeof(uint64_t));
+        }
+    }
 
-}
- 
-template <class BitCountType, class IdType>
-void save_compress(char* filename, FastCompressDict<BitCountType, IdType> dict) {
-    std::ofstream ofs(filename);
+    // hamming distances between query and the codes of bucket index, from the runs
+    // for the compressed dicts, see FastCompressDict::query_topk
+    void hamming_distances(int64_t index, uint64_t query, Buckets& buckets, uint8_t* distances) {
+        if (super::dict_status == 0) {
+            load_bucket(index, buckets.column_bucket);
+            super::hamming_distances(buckets.column_bucket, table_keys[index], query, distances);
+        } else if (super::dict_status == 1) {
+            load_bucket(index, buckets.vlq_bucket);
+            super::hamming_distances(buckets.vlq_bucket, table_keys[index], query, distances);
+        } else {
+            load_bucket(index, buckets.hybrid_bucket);
+            buckets.binary_codes.clear();
+            super::uncompress_hybrid_bucket(buckets.hybrid_bucket, buckets.binary_codes);
+            for (size_t i = 0; i < buckets.binary_codes.size(); i++)
+                distances[i] = __builtin_popcountll(buckets.binary_codes[i] ^ query);
+        }
+    }
 
-    boost::archive::text_oarchive oa(ofs);
-    oa << dict.dict;
-    oa << dict.key_dimensions;
-    oa << dict.index_key_dimension;
-    oa << dict.column_dict;
-    oa << dict.column_vlq_dict;
-    oa << dict.dict_status;
-}
+    // same as hamming_distances, one distance per group of identical codes
+    void grouped_hamming_distances(int64_t index, uint64_t query, Buckets& buckets, std::vector<uint64_t>& group_ends, std::vector<uint8_t>& distances) {
+        if (super::dict_status == 0) {
+            load_bucket(index, buckets.column_bucket);
+            super::grouped_hamming_distances(buckets.column_bucket, table_keys[index], query, group_ends, distances);
+        } else if (super::dict_status == 1) {
+            load_bucket(index, buckets.vlq_bucket);
+            super::grouped_hamming_distances(buckets.vlq_bucket, table_keys[index], query, group_ends, distances);
+        } else {
+            load_bucket(index, buckets.hybrid_bucket);
+            buckets.binary_codes.clear();
+            super::uncompress_hybrid_bucket(buckets.hybrid_bucket, buckets.binary_codes);
+            super::grouped_hamming_distances(buckets.binary_codes, query, group_ends, distances);
+        }
+    }
 
-template <class BitCountType, class IdType>
-void load_compress(char* filename, FastCompressDict<BitCountType, IdType>& dict) {
-    std::ifstream ifs(filename);
+    BinaryReader* reader;
+
+    // the sections of the mapped bucket table, see binary_format.hpp
+    const uint32_t* table_keys;
+    uint64_t num_buckets;
+    const uint64_t* bucket_offsets;
+    const IdType* ids;
+    const uint64_t* column_offsets;
+    const uint64_t* run_offsets;
+    const char* runs;
+    uint32_t runs_bytes;
+    const uint8_t* types;
+};
 
-    boost::archive::text_iarchive ia(ifs);
-    ia >> dict.dict;
-    ia >> dict.key_dimensions;
-    ia >> dict.index_key_dimension;
-    ia >> dict.column_dict;
-    ia >> dict.column_vlq_dict;
-    ia >> dict.dict_status;
-}
- 
 using namespace boost::python;
 
 BOOST_PYTHON_MODULE(fastdict)
@@ -1205,10 +4489,13 @@ BOOST_PYTHON_MODULE(fastdict)
     class_<FastDict<std::string> >("FastDict", init<uint8_t>())
         .def("get", &FastDict<std::string>::get)
         .def("mget", &FastDict<std::string>::mget)
+        .def("mget_as_buffer", &FastDict<std::string>::mget_as_buffer)
         .def("set", &FastDict<std::string>::set)
         .def("append", &FastDict<std::string>::append)
         .def("batch_append", &FastDict<std::string>::batch_append)
         .def("fast_batch_append", &FastDict<std::string>::fast_batch_append)
+        .def("delete_ids", &FastDict<std::string>::delete_ids)
+        .def("append_codes", &FastDict<std::string>::append_codes)
         .def("batch_iter_append", &FastDict<std::string>::batch_iter_append)
         .def("size", &FastDict<std::string>::size)
         .def("keys", &FastDict<std::string>::keys)
@@ -1217,6 +4504,10 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("exist", &FastDict<std::string>::exist)
         .def("clear", &FastDict<std::string>::clear)
         .def("merge", &FastDict<std::string>::merge)
+        .def("freeze", &FastDict<std::string>::freeze)
+        .def("thaw", &FastDict<std::string>::thaw)
+        .def("is_frozen", &FastDict<std::string>::is_frozen)
+        .def("memory_usage", &FastDict<std::string>::memory_usage)
     ;
 
     class_<std::vector<std::pair<uint64_t, std::string> > >("PairVec")
@@ -1235,14 +4526,19 @@ BOOST_PYTHON_MODULE(fastdict)
 
     def("save", save<std::string>);
     def("load", load<std::string>);
+    def("save_binary", save_binary<std::string>);
+    def("convert", convert<std::string>);
 
     class_<FastDict<uint32_t> >("FastIntDict", init<uint8_t>())
         .def("get", &FastDict<uint32_t>::get)
         .def("mget", &FastDict<uint32_t>::mget)
+        .def("mget_as_buffer", &FastDict<uint32_t>::mget_as_buffer)
         .def("set", &FastDict<uint32_t>::set)
         .def("append", &FastDict<uint32_t>::append)
         .def("batch_append", &FastDict<uint32_t>::batch_append)
         .def("fast_batch_append", &FastDict<uint32_t>::fast_batch_append)
+        .def("delete_ids", &FastDict<uint32_t>::delete_ids)
+        .def("append_codes", &FastDict<uint32_t>::append_codes)
         .def("batch_iter_append", &FastDict<uint32_t>::batch_iter_append)
         .def("size", &FastDict<uint32_t>::size)
         .def("keys", &FastDict<uint32_t>::keys)
@@ -1251,6 +4547,10 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("exist", &FastDict<uint32_t>::exist)
         .def("clear", &FastDict<uint32_t>::clear)
         .def("merge", &FastDict<uint32_t>::merge)
+        .def("freeze", &FastDict<uint32_t>::freeze)
+        .def("thaw", &FastDict<uint32_t>::thaw)
+        .def("is_frozen", &FastDict<uint32_t>::is_frozen)
+        .def("memory_usage", &FastDict<uint32_t>::memory_usage)
     ;
 
     class_<std::vector<std::pair<uint64_t, uint32_t> > >("PairIntVec")
@@ -1264,14 +4564,18 @@ BOOST_PYTHON_MODULE(fastdict)
 
     def("save_int", save<uint32_t>);
     def("load_int", load<uint32_t>);
+    def("save_binary_int", save_binary<uint32_t>);
+    def("convert_int", convert<uint32_t>);
 
-    class_<FastCompressDict<uint8_t, uint32_t> >("FastCompressIntDict", init<uint8_t>())
+    class_<FastCompressDict<uint8_t, uint32_t>, boost::noncopyable>("FastCompressIntDict", init<uint8_t, bool>((arg("r"), arg("dense") = false)))
         .def("get", &FastCompressDict<uint8_t, uint32_t>::get)
         .def("mget", &FastCompressDict<uint8_t, uint32_t>::mget)
+        .def("mget_as_buffer", &FastCompressDict<uint8_t, uint32_t>::mget_as_buffer)
         .def("set", &FastCompressDict<uint8_t, uint32_t>::set)
         .def("append", &FastCompressDict<uint8_t, uint32_t>::append)
         .def("batch_append", &FastCompressDict<uint8_t, uint32_t>::batch_append)
         .def("fast_batch_append", &FastCompressDict<uint8_t, uint32_t>::fast_batch_append)
+        .def("append_codes", &FastCompressDict<uint8_t, uint32_t>::append_codes)
         .def("batch_iter_append", &FastCompressDict<uint8_t, uint32_t>::batch_iter_append)
         .def("size", &FastCompressDict<uint8_t, uint32_t>::size)
         .def("keys", &FastCompressDict<uint8_t, uint32_t>::keys)
@@ -1280,16 +4584,48 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("exist", &FastCompressDict<uint8_t, uint32_t>::exist)
         .def("clear", &FastCompressDict<uint8_t, uint32_t>::clear)
         .def("merge", &FastCompressDict<uint8_t, uint32_t>::merge)
+        .def("freeze", &FastCompressDict<uint8_t, uint32_t>::freeze)
+        .def("thaw", &FastCompressDict<uint8_t, uint32_t>::thaw)
+        .def("is_frozen", &FastCompressDict<uint8_t, uint32_t>::is_frozen)
+        .def("is_dense", &FastCompressDict<uint8_t, uint32_t>::is_dense)
+        .def("memory_usage", &FastCompressDict<uint8_t, uint32_t>::memory_usage)
+        .def("runtime_memory_usage", &FastCompressDict<uint8_t, uint32_t>::runtime_memory_usage)
+        .def("pack_ids", &FastCompressDict<uint8_t, uint32_t>::pack_ids)
+        .def("ids_memory_usage", &FastCompressDict<uint8_t, uint32_t>::ids_memory_usage)
+        .def("renumber_ids", &FastCompressDict<uint8_t, uint32_t>::renumber_ids)
+        .def("is_renumbered", &FastCompressDict<uint8_t, uint32_t>::is_renumbered)
+        .def("mget_image_id_ranges", &FastCompressDict<uint8_t, uint32_t>::mget_image_id_ranges)
+        .def("original_ids_as_buffer", &FastCompressDict<uint8_t, uint32_t>::original_ids_as_buffer)
+        .def("save_original_ids", &FastCompressDict<uint8_t, uint32_t>::save_original_ids)
         .def("go_index", &FastCompressDict<uint8_t, uint32_t>::go_index)
+        .def("incremental_go_index", &FastCompressDict<uint8_t, uint32_t>::incremental_go_index)
+        .def("set_code_order", &FastCompressDict<uint8_t, uint32_t>::set_code_order)
+        .def("get_code_order", &FastCompressDict<uint8_t, uint32_t>::get_code_order)
+        .def("go_hybrid_index", &FastCompressDict<uint8_t, uint32_t>::go_hybrid_index)
+        .def("get_hybrid_binary_codes", &FastCompressDict<uint8_t, uint32_t>::get_hybrid_binary_codes)
+        .def("mget_hybrid_binary_codes", &FastCompressDict<uint8_t, uint32_t>::mget_hybrid_binary_codes)
+        .def("mget_hybrid_binary_codes_as_buffer", &FastCompressDict<uint8_t, uint32_t>::mget_hybrid_binary_codes_as_buffer)
+        .def("mget_hybrid_hamming_distances", &FastCompressDict<uint8_t, uint32_t>::mget_hybrid_hamming_distances)
+        .def("query_topk", &FastCompressDict<uint8_t, uint32_t>::query_topk)
+        .def("build_occupancy", &FastCompressDict<uint8_t, uint32_t>::build_occupancy)
+        .def("occupied_keys", &FastCompressDict<uint8_t, uint32_t>::occupied_keys)
+        .def("has_occupancy", &FastCompressDict<uint8_t, uint32_t>::has_occupancy)
+        .def("occupancy_bytes", &FastCompressDict<uint8_t, uint32_t>::occupancy_bytes)
+        .def("hybrid_container_counts", &FastCompressDict<uint8_t, uint32_t>::hybrid_container_counts)
+        .def("compressed_size", &FastCompressDict<uint8_t, uint32_t>::compressed_size)
+        .def("duplicate_ratio", &FastCompressDict<uint8_t, uint32_t>::duplicate_ratio)
+        .def("parallel_go_index", &FastCompressDict<uint8_t, uint32_t>::parallel_go_index)
         .def("get_cols", &FastCompressDict<uint8_t, uint32_t>::get_cols)
         .def("get_binary_codes", &FastCompressDict<uint8_t, uint32_t>::get_binary_codes)
         .def("mget_binary_codes", &FastCompressDict<uint8_t, uint32_t>::mget_binary_codes)
+        .def("mget_binary_codes_as_buffer", &FastCompressDict<uint8_t, uint32_t>::mget_binary_codes_as_buffer)
         .def("get_cols_as_buffer", &FastCompressDict<uint8_t, uint32_t>::get_cols_as_buffer)
         .def("get_python_cols_as_buffer", &FastCompressDict<uint8_t, uint32_t>::get_python_cols_as_buffer)
         .def("mget_cols_as_buffer", &FastCompressDict<uint8_t, uint32_t>::mget_cols_as_buffer)
         .def("mget_python_cols_as_buffer", &FastCompressDict<uint8_t, uint32_t>::mget_python_cols_as_buffer)
         .def("get_image_ids", &FastCompressDict<uint8_t, uint32_t>::get_image_ids)
         .def("mget_image_ids", &FastCompressDict<uint8_t, uint32_t>::mget_image_ids)
+        .def("mget_image_ids_as_buffer", &FastCompressDict<uint8_t, uint32_t>::mget_image_ids_as_buffer)
         .def("get_image_ids_before_runtime_init", &FastCompressDict<uint8_t, uint32_t>::get_image_ids_before_runtime_init)
         .def("mget_image_ids_before_runtime_init", &FastCompressDict<uint8_t, uint32_t>::mget_image_ids_before_runtime_init)
         .def("get_VLQ_base64_image_ids_before_runtime_init", &FastCompressDict<uint8_t, uint32_t>::get_VLQ_base64_image_ids_before_runtime_init)
@@ -1299,6 +4635,12 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("base64VLQ_encode", &FastCompressDict<uint8_t, uint32_t>::base64VLQ_encode<uint8_t>)
         .def("base64VLQ_decode", &FastCompressDict<uint8_t, uint32_t>::base64VLQ_decode<uint8_t>)
         .def("to_VLQ_base64_dict", &FastCompressDict<uint8_t, uint32_t>::to_VLQ_base64_dict)
+        .def("parallel_to_VLQ_base64_dict", &FastCompressDict<uint8_t, uint32_t>::parallel_to_VLQ_base64_dict)
+        .def("compact", &FastCompressDict<uint8_t, uint32_t>::compact)
+        .def("delete_ids", &FastCompressDict<uint8_t, uint32_t>::delete_ids)
+        .def("deleted_size", &FastCompressDict<uint8_t, uint32_t>::deleted_size)
+        .def("compact_deleted", &FastCompressDict<uint8_t, uint32_t>::compact_deleted)
+        .def("delta_size", &FastCompressDict<uint8_t, uint32_t>::delta_size)
         .def("init_runtime_VLQ_base64_dict", &FastCompressDict<uint8_t, uint32_t>::init_runtime_VLQ_base64_dict) 
         .def("get_VLQ_base64_cols_as_buffer", &FastCompressDict<uint8_t, uint32_t>::get_VLQ_base64_cols_as_buffer
 )
@@ -1310,6 +4652,9 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("get_dict_status", &FastCompressDict<uint8_t, uint32_t>::get_dict_status)
         .def("get_VLQ_base64_binary_codes", &FastCompressDict<uint8_t, uint32_t>::get_VLQ_base64_binary_codes)
         .def("mget_VLQ_base64_binary_codes", &FastCompressDict<uint8_t, uint32_t>::mget_VLQ_base64_binary_codes)
+        .def("mget_VLQ_base64_binary_codes_as_buffer", &FastCompressDict<uint8_t, uint32_t>::mget_VLQ_base64_binary_codes_as_buffer)
+        .def("mget_hamming_distances", &FastCompressDict<uint8_t, uint32_t>::mget_hamming_distances)
+        .def("mget_VLQ_base64_hamming_distances", &FastCompressDict<uint8_t, uint32_t>::mget_VLQ_base64_hamming_distances)
         .def("NumberIdsToVLQ_base64", &FastCompressDict<uint8_t, uint32_t>::NumberIdsToVLQ_base64<uint32_t>)
         .def("VLQ_base64ToNumberIds", &FastCompressDict<uint8_t, uint32_t>::VLQ_base64ToNumberIds<uint32_t>)
     ;
@@ -1350,16 +4695,47 @@ BOOST_PYTHON_MODULE(fastdict)
 
     def("save_compress_int", save_compress<uint8_t, uint32_t>);
     def("load_compress_int", load_compress<uint8_t, uint32_t>);
+    def("save_compress_binary_int", save_compress_binary<uint8_t, uint32_t>);
+    def("convert_compress_int", convert_compress<uint8_t, uint32_t>);
+    def("merge_compress_int", merge_compress<uint8_t, uint32_t>);
+
+    class_<MappedCompressDict<uint8_t, uint32_t>, boost::noncopyable>("MappedCompressIntDict", init<>())
+        .def("open", &MappedCompressDict<uint8_t, uint32_t>::open)
+        .def("close", &MappedCompressDict<uint8_t, uint32_t>::close)
+        .def("get_dict_status", &MappedCompressDict<uint8_t, uint32_t>::get_dict_status)
+        .def("size", &MappedCompressDict<uint8_t, uint32_t>::size)
+        .def("keys", &MappedCompressDict<uint8_t, uint32_t>::get_keys)
+        .def("exist", &MappedCompressDict<uint8_t, uint32_t>::exist)
+        .def("get_keydimensions", &MappedCompressDict<uint8_t, uint32_t>::get_keydimensions)
+        .def("mget_image_ids", &MappedCompressDict<uint8_t, uint32_t>::mget_image_ids)
+        .def("mget_image_ids_as_buffer", &MappedCompressDict<uint8_t, uint32_t>::mget_image_ids_as_buffer)
+        .def("mget_VLQ_base64_image_ids", &MappedCompressDict<uint8_t, uint32_t>::mget_image_ids)
+        .def("mget_python_cols_as_buffer", &MappedCompressDict<uint8_t, uint32_t>::mget_python_cols_as_buffer)
+        .def("mget_VLQ_base64_cols_as_buffer", &MappedCompressDict<uint8_t, uint32_t>::mget_VLQ_base64_cols_as_buffer)
+        .def("mget_binary_codes_as_buffer", &MappedCompressDict<uint8_t, uint32_t>::mget_binary_codes_as_buffer)
+        .def("mget_VLQ_base64_binary_codes_as_buffer", &MappedCompressDict<uint8_t, uint32_t>::mget_binary_codes_as_buffer)
+        .def("mget_hybrid_binary_codes_as_buffer", &MappedCompressDict<uint8_t, uint32_t>::mget_binary_codes_as_buffer)
+        .def("mget_hamming_distances", &MappedCompressDict<uint8_t, uint32_t>::mget_hamming_distances)
+        .def("mget_VLQ_base64_hamming_distances", &MappedCompressDict<uint8_t, uint32_t>::mget_hamming_distances)
+        .def("mget_hybrid_hamming_distances", &MappedCompressDict<uint8_t, uint32_t>::mget_hamming_distances)
+        .def("query_topk", &MappedCompressDict<uint8_t, uint32_t>::query_topk)
+        .def("build_occupancy", &MappedCompressDict<uint8_t, uint32_t>::build_occupancy)
+        .def("occupied_keys", &MappedCompressDict<uint8_t, uint32_t>::occupied_keys)
+        .def("has_occupancy", &MappedCompressDict<uint8_t, uint32_t>::has_occupancy)
+        .def("occupancy_bytes", &MappedCompressDict<uint8_t, uint32_t>::occupancy_bytes)
+    ;
  
     // CompressDict for storing bit counts in uint32_t type
 
-    class_<FastCompressDict<uint32_t, uint32_t> >("FastCompressUInt32IntDict", init<uint8_t>())
+    class_<FastCompressDict<uint32_t, uint32_t>, boost::noncopyable>("FastCompressUInt32IntDict", init<uint8_t, bool>((arg("r"), arg("dense") = false)))
         .def("get", &FastCompressDict<uint32_t, uint32_t>::get)
         .def("mget", &FastCompressDict<uint32_t, uint32_t>::mget)
+        .def("mget_as_buffer", &FastCompressDict<uint32_t, uint32_t>::mget_as_buffer)
         .def("set", &FastCompressDict<uint32_t, uint32_t>::set)
         .def("append", &FastCompressDict<uint32_t, uint32_t>::append)
         .def("batch_append", &FastCompressDict<uint32_t, uint32_t>::batch_append)
         .def("fast_batch_append", &FastCompressDict<uint32_t, uint32_t>::fast_batch_append)
+        .def("append_codes", &FastCompressDict<uint32_t, uint32_t>::append_codes)
         .def("batch_iter_append", &FastCompressDict<uint32_t, uint32_t>::batch_iter_append)
         .def("size", &FastCompressDict<uint32_t, uint32_t>::size)
         .def("keys", &FastCompressDict<uint32_t, uint32_t>::keys)
@@ -1368,16 +4744,48 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("exist", &FastCompressDict<uint32_t, uint32_t>::exist)
         .def("clear", &FastCompressDict<uint32_t, uint32_t>::clear)
         .def("merge", &FastCompressDict<uint32_t, uint32_t>::merge)
+        .def("freeze", &FastCompressDict<uint32_t, uint32_t>::freeze)
+        .def("thaw", &FastCompressDict<uint32_t, uint32_t>::thaw)
+        .def("is_frozen", &FastCompressDict<uint32_t, uint32_t>::is_frozen)
+        .def("is_dense", &FastCompressDict<uint32_t, uint32_t>::is_dense)
+        .def("memory_usage", &FastCompressDict<uint32_t, uint32_t>::memory_usage)
+        .def("runtime_memory_usage", &FastCompressDict<uint32_t, uint32_t>::runtime_memory_usage)
+        .def("pack_ids", &FastCompressDict<uint32_t, uint32_t>::pack_ids)
+        .def("ids_memory_usage", &FastCompressDict<uint32_t, uint32_t>::ids_memory_usage)
+        .def("renumber_ids", &FastCompressDict<uint32_t, uint32_t>::renumber_ids)
+        .def("is_renumbered", &FastCompressDict<uint32_t, uint32_t>::is_renumbered)
+        .def("mget_image_id_ranges", &FastCompressDict<uint32_t, uint32_t>::mget_image_id_ranges)
+        .def("original_ids_as_buffer", &FastCompressDict<uint32_t, uint32_t>::original_ids_as_buffer)
+        .def("save_original_ids", &FastCompressDict<uint32_t, uint32_t>::save_original_ids)
         .def("go_index", &FastCompressDict<uint32_t, uint32_t>::go_index)
+        .def("incremental_go_index", &FastCompressDict<uint32_t, uint32_t>::incremental_go_index)
+        .def("set_code_order", &FastCompressDict<uint32_t, uint32_t>::set_code_order)
+        .def("get_code_order", &FastCompressDict<uint32_t, uint32_t>::get_code_order)
+        .def("go_hybrid_index", &FastCompressDict<uint32_t, uint32_t>::go_hybrid_index)
+        .def("get_hybrid_binary_codes", &FastCompressDict<uint32_t, uint32_t>::get_hybrid_binary_codes)
+        .def("mget_hybrid_binary_codes", &FastCompressDict<uint32_t, uint32_t>::mget_hybrid_binary_codes)
+        .def("mget_hybrid_binary_codes_as_buffer", &FastCompressDict<uint32_t, uint32_t>::mget_hybrid_binary_codes_as_buffer)
+        .def("mget_hybrid_hamming_distances", &FastCompressDict<uint32_t, uint32_t>::mget_hybrid_hamming_distances)
+        .def("query_topk", &FastCompressDict<uint32_t, uint32_t>::query_topk)
+        .def("build_occupancy", &FastCompressDict<uint32_t, uint32_t>::build_occupancy)
+        .def("occupied_keys", &FastCompressDict<uint32_t, uint32_t>::occupied_keys)
+        .def("has_occupancy", &FastCompressDict<uint32_t, uint32_t>::has_occupancy)
+        .def("occupancy_bytes", &FastCompressDict<uint32_t, uint32_t>::occupancy_bytes)
+        .def("hybrid_container_counts", &FastCompressDict<uint32_t, uint32_t>::hybrid_container_counts)
+        .def("compressed_size", &FastCompressDict<uint32_t, uint32_t>::compressed_size)
+        .def("duplicate_ratio", &FastCompressDict<uint32_t, uint32_t>::duplicate_ratio)
+        .def("parallel_go_index", &FastCompressDict<uint32_t, uint32_t>::parallel_go_index)
         .def("get_cols", &FastCompressDict<uint32_t, uint32_t>::get_cols)
         .def("get_binary_codes", &FastCompressDict<uint32_t, uint32_t>::get_binary_codes)
         .def("mget_binary_codes", &FastCompressDict<uint32_t, uint32_t>::mget_binary_codes)
+        .def("mget_binary_codes_as_buffer", &FastCompressDict<uint32_t, uint32_t>::mget_binary_codes_as_buffer)
         .def("get_cols_as_buffer", &FastCompressDict<uint32_t, uint32_t>::get_cols_as_buffer)
         .def("get_python_cols_as_buffer", &FastCompressDict<uint32_t, uint32_t>::get_python_cols_as_buffer)
         .def("mget_cols_as_buffer", &FastCompressDict<uint32_t, uint32_t>::mget_cols_as_buffer)
         .def("mget_python_cols_as_buffer", &FastCompressDict<uint32_t, uint32_t>::mget_python_cols_as_buffer)
         .def("get_image_ids", &FastCompressDict<uint32_t, uint32_t>::get_image_ids)
         .def("mget_image_ids", &FastCompressDict<uint32_t, uint32_t>::mget_image_ids)
+        .def("mget_image_ids_as_buffer", &FastCompressDict<uint32_t, uint32_t>::mget_image_ids_as_buffer)
         .def("get_image_ids_before_runtime_init", &FastCompressDict<uint32_t, uint32_t>::get_image_ids_before_runtime_init)
         .def("mget_image_ids_before_runtime_init", &FastCompressDict<uint32_t, uint32_t>::mget_image_ids_before_runtime_init)
         .def("get_VLQ_base64_image_ids_before_runtime_init", &FastCompressDict<uint32_t, uint32_t>::get_VLQ_base64_image_ids_before_runtime_init)
@@ -1387,6 +4795,12 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("base64VLQ_encode", &FastCompressDict<uint32_t, uint32_t>::base64VLQ_encode<uint32_t>)
         .def("base64VLQ_decode", &FastCompressDict<uint32_t, uint32_t>::base64VLQ_decode<uint32_t>)
         .def("to_VLQ_base64_dict", &FastCompressDict<uint32_t, uint32_t>::to_VLQ_base64_dict)
+        .def("parallel_to_VLQ_base64_dict", &FastCompressDict<uint32_t, uint32_t>::parallel_to_VLQ_base64_dict)
+        .def("compact", &FastCompressDict<uint32_t, uint32_t>::compact)
+        .def("delete_ids", &FastCompressDict<uint32_t, uint32_t>::delete_ids)
+        .def("deleted_size", &FastCompressDict<uint32_t, uint32_t>::deleted_size)
+        .def("compact_deleted", &FastCompressDict<uint32_t, uint32_t>::compact_deleted)
+        .def("delta_size", &FastCompressDict<uint32_t, uint32_t>::delta_size)
         .def("init_runtime_VLQ_base64_dict", &FastCompressDict<uint32_t, uint32_t>::init_runtime_VLQ_base64_dict)
         .def("get_VLQ_base64_cols_as_buffer", &FastCompressDict<uint32_t, uint32_t>::get_VLQ_base64_cols_as_buffer)
         .def("mget_VLQ_base64_cols_as_buffer", &FastCompressDict<uint32_t, uint32_t>::mget_VLQ_base64_cols_as_buffer)
@@ -1396,6 +4810,9 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("get_dict_status", &FastCompressDict<uint32_t, uint32_t>::get_dict_status)
         .def("get_VLQ_base64_binary_codes", &FastCompressDict<uint32_t, uint32_t>::get_VLQ_base64_binary_codes)
         .def("mget_VLQ_base64_binary_codes", &FastCompressDict<uint32_t, uint32_t>::mget_VLQ_base64_binary_codes)
+        .def("mget_VLQ_base64_binary_codes_as_buffer", &FastCompressDict<uint32_t, uint32_t>::mget_VLQ_base64_binary_codes_as_buffer)
+        .def("mget_hamming_distances", &FastCompressDict<uint32_t, uint32_t>::mget_hamming_distances)
+        .def("mget_VLQ_base64_hamming_distances", &FastCompressDict<uint32_t, uint32_t>::mget_VLQ_base64_hamming_distances)
         .def("NumberIdsToVLQ_base64", &FastCompressDict<uint32_t, uint32_t>::NumberIdsToVLQ_base64<uint32_t>)
         .def("VLQ_base64ToNumberIds", &FastCompressDict<uint32_t, uint32_t>::VLQ_base64ToNumberIds<uint32_t>)
     ;
@@ -1430,16 +4847,47 @@ BOOST_PYTHON_MODULE(fastdict)
  
     def("save_compress_uint32_int", save_compress<uint32_t, uint32_t>);
     def("load_compress_uint32_int", load_compress<uint32_t, uint32_t>);
+    def("save_compress_binary_uint32_int", save_compress_binary<uint32_t, uint32_t>);
+    def("convert_compress_uint32_int", convert_compress<uint32_t, uint32_t>);
+    def("merge_compress_uint32_int", merge_compress<uint32_t, uint32_t>);
+
+    class_<MappedCompressDict<uint32_t, uint32_t>, boost::noncopyable>("MappedCompressUInt32IntDict", init<>())
+        .def("open", &MappedCompressDict<uint32_t, uint32_t>::open)
+        .def("close", &MappedCompressDict<uint32_t, uint32_t>::close)
+        .def("get_dict_status", &MappedCompressDict<uint32_t, uint32_t>::get_dict_status)
+        .def("size", &MappedCompressDict<uint32_t, uint32_t>::size)
+        .def("keys", &MappedCompressDict<uint32_t, uint32_t>::get_keys)
+        .def("exist", &MappedCompressDict<uint32_t, uint32_t>::exist)
+        .def("get_keydimensions", &MappedCompressDict<uint32_t, uint32_t>::get_keydimensions)
+        .def("mget_image_ids", &MappedCompressDict<uint32_t, uint32_t>::mget_image_ids)
+        .def("mget_image_ids_as_buffer", &MappedCompressDict<uint32_t, uint32_t>::mget_image_ids_as_buffer)
+        .def("mget_VLQ_base64_image_ids", &MappedCompressDict<uint32_t, uint32_t>::mget_image_ids)
+        .def("mget_python_cols_as_buffer", &MappedCompressDict<uint32_t, uint32_t>::mget_python_cols_as_buffer)
+        .def("mget_VLQ_base64_cols_as_buffer", &MappedCompressDict<uint32_t, uint32_t>::mget_VLQ_base64_cols_as_buffer)
+        .def("mget_binary_codes_as_buffer", &MappedCompressDict<uint32_t, uint32_t>::mget_binary_codes_as_buffer)
+        .def("mget_VLQ_base64_binary_codes_as_buffer", &MappedCompressDict<uint32_t, uint32_t>::mget_binary_codes_as_buffer)
+        .def("mget_hybrid_binary_codes_as_buffer", &MappedCompressDict<uint32_t, uint32_t>::mget_binary_codes_as_buffer)
+        .def("mget_hamming_distances", &MappedCompressDict<uint32_t, uint32_t>::mget_hamming_distances)
+        .def("mget_VLQ_base64_hamming_distances", &MappedCompressDict<uint32_t, uint32_t>::mget_hamming_distances)
+        .def("mget_hybrid_hamming_distances", &MappedCompressDict<uint32_t, uint32_t>::mget_hamming_distances)
+        .def("query_topk", &MappedCompressDict<uint32_t, uint32_t>::query_topk)
+        .def("build_occupancy", &MappedCompressDict<uint32_t, uint32_t>::build_occupancy)
+        .def("occupied_keys", &MappedCompressDict<uint32_t, uint32_t>::occupied_keys)
+        .def("has_occupancy", &MappedCompressDict<uint32_t, uint32_t>::has_occupancy)
+        .def("occupancy_bytes", &MappedCompressDict<uint32_t, uint32_t>::occupancy_bytes)
+    ;
  
     // FastCompressDict which stores image ids in uint8_t to save space
 
-    class_<FastCompressDict<uint32_t, uint8_t> >("FastCompressUInt32Int8Dict", init<uint8_t>())
+    class_<FastCompressDict<uint32_t, uint8_t>, boost::noncopyable>("FastCompressUInt32Int8Dict", init<uint8_t, bool>((arg("r"), arg("dense") = false)))
         .def("get", &FastCompressDict<uint32_t, uint8_t>::get)
         .def("mget", &FastCompressDict<uint32_t, uint8_t>::mget)
+        .def("mget_as_buffer", &FastCompressDict<uint32_t, uint8_t>::mget_as_buffer)
         .def("set", &FastCompressDict<uint32_t, uint8_t>::set)
         .def("append", &FastCompressDict<uint32_t, uint8_t>::append)
         .def("batch_append", &FastCompressDict<uint32_t, uint8_t>::batch_append)
         .def("fast_batch_append", &FastCompressDict<uint32_t, uint8_t>::fast_batch_append)
+        .def("append_codes", &FastCompressDict<uint32_t, uint8_t>::append_codes)
         .def("batch_iter_append", &FastCompressDict<uint32_t, uint8_t>::batch_iter_append)
         .def("size", &FastCompressDict<uint32_t, uint8_t>::size)
         .def("keys", &FastCompressDict<uint32_t, uint8_t>::keys)
@@ -1448,16 +4896,48 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("exist", &FastCompressDict<uint32_t, uint8_t>::exist)
         .def("clear", &FastCompressDict<uint32_t, uint8_t>::clear)
         .def("merge", &FastCompressDict<uint32_t, uint8_t>::merge)
+        .def("freeze", &FastCompressDict<uint32_t, uint8_t>::freeze)
+        .def("thaw", &FastCompressDict<uint32_t, uint8_t>::thaw)
+        .def("is_frozen", &FastCompressDict<uint32_t, uint8_t>::is_frozen)
+        .def("is_dense", &FastCompressDict<uint32_t, uint8_t>::is_dense)
+        .def("memory_usage", &FastCompressDict<uint32_t, uint8_t>::memory_usage)
+        .def("runtime_memory_usage", &FastCompressDict<uint32_t, uint8_t>::runtime_memory_usage)
+        .def("pack_ids", &FastCompressDict<uint32_t, uint8_t>::pack_ids)
+        .def("ids_memory_usage", &FastCompressDict<uint32_t, uint8_t>::ids_memory_usage)
+        .def("renumber_ids", &FastCompressDict<uint32_t, uint8_t>::renumber_ids)
+        .def("is_renumbered", &FastCompressDict<uint32_t, uint8_t>::is_renumbered)
+        .def("mget_image_id_ranges", &FastCompressDict<uint32_t, uint8_t>::mget_image_id_ranges)
+        .def("original_ids_as_buffer", &FastCompressDict<uint32_t, uint8_t>::original_ids_as_buffer)
+        .def("save_original_ids", &FastCompressDict<uint32_t, uint8_t>::save_original_ids)
         .def("go_index", &FastCompressDict<uint32_t, uint8_t>::go_index)
+        .def("incremental_go_index", &FastCompressDict<uint32_t, uint8_t>::incremental_go_index)
+        .def("set_code_order", &FastCompressDict<uint32_t, uint8_t>::set_code_order)
+        .def("get_code_order", &FastCompressDict<uint32_t, uint8_t>::get_code_order)
+        .def("go_hybrid_index", &FastCompressDict<uint32_t, uint8_t>::go_hybrid_index)
+        .def("get_hybrid_binary_codes", &FastCompressDict<uint32_t, uint8_t>::get_hybrid_binary_codes)
+        .def("mget_hybrid_binary_codes", &FastCompressDict<uint32_t, uint8_t>::mget_hybrid_binary_codes)
+        .def("mget_hybrid_binary_codes_as_buffer", &FastCompressDict<uint32_t, uint8_t>::mget_hybrid_binary_codes_as_buffer)
+        .def("mget_hybrid_hamming_distances", &FastCompressDict<uint32_t, uint8_t>::mget_hybrid_hamming_distances)
+        .def("query_topk", &FastCompressDict<uint32_t, uint8_t>::query_topk)
+        .def("build_occupancy", &FastCompressDict<uint32_t, uint8_t>::build_occupancy)
+        .def("occupied_keys", &FastCompressDict<uint32_t, uint8_t>::occupied_keys)
+        .def("has_occupancy", &FastCompressDict<uint32_t, uint8_t>::has_occupancy)
+        .def("occupancy_bytes", &FastCompressDict<uint32_t, uint8_t>::occupancy_bytes)
+        .def("hybrid_container_counts", &FastCompressDict<uint32_t, uint8_t>::hybrid_container_counts)
+        .def("compressed_size", &FastCompressDict<uint32_t, uint8_t>::compressed_size)
+        .def("duplicate_ratio", &FastCompressDict<uint32_t, uint8_t>::duplicate_ratio)
+        .def("parallel_go_index", &FastCompressDict<uint32_t, uint8_t>::parallel_go_index)
         .def("get_cols", &FastCompressDict<uint32_t, uint8_t>::get_cols)
         .def("get_binary_codes", &FastCompressDict<uint32_t, uint8_t>::get_binary_codes)
         .def("mget_binary_codes", &FastCompressDict<uint32_t, uint8_t>::mget_binary_codes)
+        .def("mget_binary_codes_as_buffer", &FastCompressDict<uint32_t, uint8_t>::mget_binary_codes_as_buffer)
         .def("get_cols_as_buffer", &FastCompressDict<uint32_t, uint8_t>::get_cols_as_buffer)
         .def("get_python_cols_as_buffer", &FastCompressDict<uint32_t, uint8_t>::get_python_cols_as_buffer)
         .def("mget_cols_as_buffer", &FastCompressDict<uint32_t, uint8_t>::mget_cols_as_buffer)
         .def("mget_python_cols_as_buffer", &FastCompressDict<uint32_t, uint8_t>::mget_python_cols_as_buffer)
         .def("get_image_ids", &FastCompressDict<uint32_t, uint8_t>::get_image_ids)
         .def("mget_image_ids", &FastCompressDict<uint32_t, uint8_t>::mget_image_ids)
+        .def("mget_image_ids_as_buffer", &FastCompressDict<uint32_t, uint8_t>::mget_image_ids_as_buffer)
         .def("get_image_ids_before_runtime_init", &FastCompressDict<uint32_t, uint8_t>::get_image_ids_before_runtime_init)
         .def("mget_image_ids_before_runtime_init", &FastCompressDict<uint32_t, uint8_t>::mget_image_ids_before_runtime_init)
         .def("get_VLQ_base64_image_ids_before_runtime_init", &FastCompressDict<uint32_t, uint8_t>::get_VLQ_base64_image_ids_before_runtime_init)
@@ -1467,6 +4947,12 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("base64VLQ_encode", &FastCompressDict<uint32_t, uint8_t>::base64VLQ_encode<uint32_t>)
         .def("base64VLQ_decode", &FastCompressDict<uint32_t, uint8_t>::base64VLQ_decode<uint32_t>)
         .def("to_VLQ_base64_dict", &FastCompressDict<uint32_t, uint8_t>::to_VLQ_base64_dict)
+        .def("parallel_to_VLQ_base64_dict", &FastCompressDict<uint32_t, uint8_t>::parallel_to_VLQ_base64_dict)
+        .def("compact", &FastCompressDict<uint32_t, uint8_t>::compact)
+        .def("delete_ids", &FastCompressDict<uint32_t, uint8_t>::delete_ids)
+        .def("deleted_size", &FastCompressDict<uint32_t, uint8_t>::deleted_size)
+        .def("compact_deleted", &FastCompressDict<uint32_t, uint8_t>::compact_deleted)
+        .def("delta_size", &FastCompressDict<uint32_t, uint8_t>::delta_size)
         .def("init_runtime_VLQ_base64_dict", &FastCompressDict<uint32_t, uint8_t>::init_runtime_VLQ_base64_dict)
         .def("get_VLQ_base64_cols_as_buffer", &FastCompressDict<uint32_t, uint8_t>::get_VLQ_base64_cols_as_buffer)
         .def("mget_VLQ_base64_cols_as_buffer", &FastCompressDict<uint32_t, uint8_t>::mget_VLQ_base64_cols_as_buffer)
@@ -1476,6 +4962,9 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("get_dict_status", &FastCompressDict<uint32_t, uint8_t>::get_dict_status)
         .def("get_VLQ_base64_binary_codes", &FastCompressDict<uint32_t, uint8_t>::get_VLQ_base64_binary_codes)
         .def("mget_VLQ_base64_binary_codes", &FastCompressDict<uint32_t, uint8_t>::mget_VLQ_base64_binary_codes)
+        .def("mget_VLQ_base64_binary_codes_as_buffer", &FastCompressDict<uint32_t, uint8_t>::mget_VLQ_base64_binary_codes_as_buffer)
+        .def("mget_hamming_distances", &FastCompressDict<uint32_t, uint8_t>::mget_hamming_distances)
+        .def("mget_VLQ_base64_hamming_distances", &FastCompressDict<uint32_t, uint8_t>::mget_VLQ_base64_hamming_distances)
         .def("NumberIdsToVLQ_base64", &FastCompressDict<uint32_t, uint8_t>::NumberIdsToVLQ_base64<uint8_t>)
         .def("VLQ_base64ToNumberIds", &FastCompressDict<uint32_t, uint8_t>::VLQ_base64ToNumberIds<uint8_t>)
     ;
@@ -1510,17 +4999,48 @@ BOOST_PYTHON_MODULE(fastdict)
  
     def("save_compress_uint32_int8", save_compress<uint32_t, uint8_t>);
     def("load_compress_uint32_int8", load_compress<uint32_t, uint8_t>);
+    def("save_compress_binary_uint32_int8", save_compress_binary<uint32_t, uint8_t>);
+    def("convert_compress_uint32_int8", convert_compress<uint32_t, uint8_t>);
+    def("merge_compress_uint32_int8", merge_compress<uint32_t, uint8_t>);
+
+    class_<MappedCompressDict<uint32_t, uint8_t>, boost::noncopyable>("MappedCompressUInt32Int8Dict", init<>())
+        .def("open", &MappedCompressDict<uint32_t, uint8_t>::open)
+        .def("close", &MappedCompressDict<uint32_t, uint8_t>::close)
+        .def("get_dict_status", &MappedCompressDict<uint32_t, uint8_t>::get_dict_status)
+        .def("size", &MappedCompressDict<uint32_t, uint8_t>::size)
+        .def("keys", &MappedCompressDict<uint32_t, uint8_t>::get_keys)
+        .def("exist", &MappedCompressDict<uint32_t, uint8_t>::exist)
+        .def("get_keydimensions", &MappedCompressDict<uint32_t, uint8_t>::get_keydimensions)
+        .def("mget_image_ids", &MappedCompressDict<uint32_t, uint8_t>::mget_image_ids)
+        .def("mget_image_ids_as_buffer", &MappedCompressDict<uint32_t, uint8_t>::mget_image_ids_as_buffer)
+        .def("mget_VLQ_base64_image_ids", &MappedCompressDict<uint32_t, uint8_t>::mget_image_ids)
+        .def("mget_python_cols_as_buffer", &MappedCompressDict<uint32_t, uint8_t>::mget_python_cols_as_buffer)
+        .def("mget_VLQ_base64_cols_as_buffer", &MappedCompressDict<uint32_t, uint8_t>::mget_VLQ_base64_cols_as_buffer)
+        .def("mget_binary_codes_as_buffer", &MappedCompressDict<uint32_t, uint8_t>::mget_binary_codes_as_buffer)
+        .def("mget_VLQ_base64_binary_codes_as_buffer", &MappedCompressDict<uint32_t, uint8_t>::mget_binary_codes_as_buffer)
+        .def("mget_hybrid_binary_codes_as_buffer", &MappedCompressDict<uint32_t, uint8_t>::mget_binary_codes_as_buffer)
+        .def("mget_hamming_distances", &MappedCompressDict<uint32_t, uint8_t>::mget_hamming_distances)
+        .def("mget_VLQ_base64_hamming_distances", &MappedCompressDict<uint32_t, uint8_t>::mget_hamming_distances)
+        .def("mget_hybrid_hamming_distances", &MappedCompressDict<uint32_t, uint8_t>::mget_hamming_distances)
+        .def("query_topk", &MappedCompressDict<uint32_t, uint8_t>::query_topk)
+        .def("build_occupancy", &MappedCompressDict<uint32_t, uint8_t>::build_occupancy)
+        .def("occupied_keys", &MappedCompressDict<uint32_t, uint8_t>::occupied_keys)
+        .def("has_occupancy", &MappedCompressDict<uint32_t, uint8_t>::has_occupancy)
+        .def("occupancy_bytes", &MappedCompressDict<uint32_t, uint8_t>::occupancy_bytes)
+    ;
 
 
     // FastCompressDict which stores image ids in VLQ base64 string to save space
 
-    class_<FastCompressDict<uint32_t, std::string> >("FastCompressUInt32StringDict", init<uint8_t>())
+    class_<FastCompressDict<uint32_t, std::string>, boost::noncopyable>("FastCompressUInt32StringDict", init<uint8_t, bool>((arg("r"), arg("dense") = false)))
         .def("get", &FastCompressDict<uint32_t, std::string>::get)
         .def("mget", &FastCompressDict<uint32_t, std::string>::mget)
+        .def("mget_as_buffer", &FastCompressDict<uint32_t, std::string>::mget_as_buffer)
         .def("set", &FastCompressDict<uint32_t, std::string>::set)
         .def("append", &FastCompressDict<uint32_t, std::string>::append)
         .def("batch_append", &FastCompressDict<uint32_t, std::string>::batch_append)
         .def("fast_batch_append", &FastCompressDict<uint32_t, std::string>::fast_batch_append)
+        .def("append_codes", &FastCompressDict<uint32_t, std::string>::append_codes)
         .def("batch_iter_append", &FastCompressDict<uint32_t, std::string>::batch_iter_append)
         .def("size", &FastCompressDict<uint32_t, std::string>::size)
         .def("keys", &FastCompressDict<uint32_t, std::string>::keys)
@@ -1529,16 +5049,48 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("exist", &FastCompressDict<uint32_t, std::string>::exist)
         .def("clear", &FastCompressDict<uint32_t, std::string>::clear)
         .def("merge", &FastCompressDict<uint32_t, std::string>::merge)
+        .def("freeze", &FastCompressDict<uint32_t, std::string>::freeze)
+        .def("thaw", &FastCompressDict<uint32_t, std::string>::thaw)
+        .def("is_frozen", &FastCompressDict<uint32_t, std::string>::is_frozen)
+        .def("is_dense", &FastCompressDict<uint32_t, std::string>::is_dense)
+        .def("memory_usage", &FastCompressDict<uint32_t, std::string>::memory_usage)
+        .def("runtime_memory_usage", &FastCompressDict<uint32_t, std::string>::runtime_memory_usage)
+        .def("pack_ids", &FastCompressDict<uint32_t, std::string>::pack_ids)
+        .def("ids_memory_usage", &FastCompressDict<uint32_t, std::string>::ids_memory_usage)
+        .def("renumber_ids", &FastCompressDict<uint32_t, std::string>::renumber_ids)
+        .def("is_renumbered", &FastCompressDict<uint32_t, std::string>::is_renumbered)
+        .def("mget_image_id_ranges", &FastCompressDict<uint32_t, std::string>::mget_image_id_ranges)
+        .def("original_ids_as_buffer", &FastCompressDict<uint32_t, std::string>::original_ids_as_buffer)
+        .def("save_original_ids", &FastCompressDict<uint32_t, std::string>::save_original_ids)
         .def("go_index", &FastCompressDict<uint32_t, std::string>::go_index)
+        .def("incremental_go_index", &FastCompressDict<uint32_t, std::string>::incremental_go_index)
+        .def("set_code_order", &FastCompressDict<uint32_t, std::string>::set_code_order)
+        .def("get_code_order", &FastCompressDict<uint32_t, std::string>::get_code_order)
+        .def("go_hybrid_index", &FastCompressDict<uint32_t, std::string>::go_hybrid_index)
+        .def("get_hybrid_binary_codes", &FastCompressDict<uint32_t, std::string>::get_hybrid_binary_codes)
+        .def("mget_hybrid_binary_codes", &FastCompressDict<uint32_t, std::string>::mget_hybrid_binary_codes)
+        .def("mget_hybrid_binary_codes_as_buffer", &FastCompressDict<uint32_t, std::string>::mget_hybrid_binary_codes_as_buffer)
+        .def("mget_hybrid_hamming_distances", &FastCompressDict<uint32_t, std::string>::mget_hybrid_hamming_distances)
+        .def("query_topk", &FastCompressDict<uint32_t, std::string>::query_topk)
+        .def("build_occupancy", &FastCompressDict<uint32_t, std::string>::build_occupancy)
+        .def("occupied_keys", &FastCompressDict<uint32_t, std::string>::occupied_keys)
+        .def("has_occupancy", &FastCompressDict<uint32_t, std::string>::has_occupancy)
+        .def("occupancy_bytes", &FastCompressDict<uint32_t, std::string>::occupancy_bytes)
+        .def("hybrid_container_counts", &FastCompressDict<uint32_t, std::string>::hybrid_container_counts)
+        .def("compressed_size", &FastCompressDict<uint32_t, std::string>::compressed_size)
+        .def("duplicate_ratio", &FastCompressDict<uint32_t, std::string>::duplicate_ratio)
+        .def("parallel_go_index", &FastCompressDict<uint32_t, std::string>::parallel_go_index)
         .def("get_cols", &FastCompressDict<uint32_t, std::string>::get_cols)
         .def("get_binary_codes", &FastCompressDict<uint32_t, std::string>::get_binary_codes)
         .def("mget_binary_codes", &FastCompressDict<uint32_t, std::string>::mget_binary_codes)
+        .def("mget_binary_codes_as_buffer", &FastCompressDict<uint32_t, std::string>::mget_binary_codes_as_buffer)
         .def("get_cols_as_buffer", &FastCompressDict<uint32_t, std::string>::get_cols_as_buffer)
         .def("get_python_cols_as_buffer", &FastCompressDict<uint32_t, std::string>::get_python_cols_as_buffer)
         .def("mget_cols_as_buffer", &FastCompressDict<uint32_t, std::string>::mget_cols_as_buffer)
         .def("mget_python_cols_as_buffer", &FastCompressDict<uint32_t, std::string>::mget_python_cols_as_buffer)
         .def("get_image_ids", &FastCompressDict<uint32_t, std::string>::get_image_ids)
         .def("mget_image_ids", &FastCompressDict<uint32_t, std::string>::mget_image_ids)
+        .def("mget_image_ids_as_buffer", &FastCompressDict<uint32_t, std::string>::mget_image_ids_as_buffer)
         .def("get_image_ids_before_runtime_init", &FastCompressDict<uint32_t, std::string>::get_image_ids_before_runtime_init)
         .def("mget_image_ids_before_runtime_init", &FastCompressDict<uint32_t, std::string>::mget_image_ids_before_runtime_init)
         .def("get_VLQ_base64_image_ids_before_runtime_init", &FastCompressDict<uint32_t, std::string>::get_VLQ_base64_image_ids_before_runtime_init)
@@ -1548,6 +5100,12 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("base64VLQ_encode", &FastCompressDict<uint32_t, std::string>::base64VLQ_encode<uint32_t>)
         .def("base64VLQ_decode", &FastCompressDict<uint32_t, std::string>::base64VLQ_decode<uint32_t>)
         .def("to_VLQ_base64_dict", &FastCompressDict<uint32_t, std::string>::to_VLQ_base64_dict)
+        .def("parallel_to_VLQ_base64_dict", &FastCompressDict<uint32_t, std::string>::parallel_to_VLQ_base64_dict)
+        .def("compact", &FastCompressDict<uint32_t, std::string>::compact)
+        .def("delete_ids", &FastCompressDict<uint32_t, std::string>::delete_ids)
+        .def("deleted_size", &FastCompressDict<uint32_t, std::string>::deleted_size)
+        .def("compact_deleted", &FastCompressDict<uint32_t, std::string>::compact_deleted)
+        .def("delta_size", &FastCompressDict<uint32_t, std::string>::delta_size)
         .def("init_runtime_VLQ_base64_dict", &FastCompressDict<uint32_t, std::string>::init_runtime_VLQ_base64_dict)
         .def("get_VLQ_base64_cols_as_buffer", &FastCompressDict<uint32_t, std::string>::get_VLQ_base64_cols_as_buffer)
         .def("mget_VLQ_base64_cols_as_buffer", &FastCompressDict<uint32_t, std::string>::mget_VLQ_base64_cols_as_buffer)
@@ -1557,6 +5115,9 @@ BOOST_PYTHON_MODULE(fastdict)
         .def("get_dict_status", &FastCompressDict<uint32_t, std::string>::get_dict_status)
         .def("get_VLQ_base64_binary_codes", &FastCompressDict<uint32_t, std::string>::get_VLQ_base64_binary_codes)
         .def("mget_VLQ_base64_binary_codes", &FastCompressDict<uint32_t, std::string>::mget_VLQ_base64_binary_codes)
+        .def("mget_VLQ_base64_binary_codes_as_buffer", &FastCompressDict<uint32_t, std::string>::mget_VLQ_base64_binary_codes_as_buffer)
+        .def("mget_hamming_distances", &FastCompressDict<uint32_t, std::string>::mget_hamming_distances)
+        .def("mget_VLQ_base64_hamming_distances", &FastCompressDict<uint32_t, std::string>::mget_VLQ_base64_hamming_distances)
         .def("NumberIdsToVLQ_base64", &FastCompressDict<uint32_t, std::string>::NumberIdsToVLQ_base64<uint32_t>)
         .def("VLQ_base64ToNumberIds", &FastCompressDict<uint32_t, std::string>::VLQ_base64ToNumberIds<uint32_t>)
     ;
@@ -1591,6 +5152,9 @@ BOOST_PYTHON_MODULE(fastdict)
  
     def("save_compress_uint32_string", save_compress<uint32_t, std::string>);
     def("load_compress_uint32_string", load_compress<uint32_t, std::string>);
+    def("save_compress_binary_uint32_string", save_compress_binary<uint32_t, std::string>);
+    def("convert_compress_uint32_string", convert_compress<uint32_t, std::string>);
+    def("merge_compress_uint32_string", merge_compress<uint32_t, std::string>);
  
 }
 
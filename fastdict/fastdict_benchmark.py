@@ -0,0 +1,760 @@
+#!/usr/bin/env python
+
+# Micro benchmarks for fastdict.
+#
+#   python fastdict_benchmark.py lookup -n 1000000 -r 32
+#   python fastdict_benchmark.py memory -n 1000000 -r 32
+#   python fastdict_benchmark.py ingest -n 1000000 -r 20
+#   python fastdict_benchmark.py compress -n 1000000 -threads 1,2,4,8
+#   python fastdict_benchmark.py peak -n 50000000 -buckets 200000
+#   python fastdict_benchmark.py decode -n 1000000 -buckets 2000
+#   python fastdict_benchmark.py topk -n 1000000 -buckets 2000 -k 100
+#   python fastdict_benchmark.py distances -n 1000000 -r 12
+#   python fastdict_benchmark.py format -n 1000000 -buckets 2000
+#   python fastdict_benchmark.py mapped -n 1000000 -buckets 2000 -probes 100
+#   python fastdict_benchmark.py runtime -n 1000000 -buckets 2000 -probes 100
+#   python fastdict_benchmark.py merge -n 4000000 -buckets 200000 -shards 8
+#   python fastdict_benchmark.py codecs -n 1000000 -r 16
+#   python fastdict_benchmark.py order -n 1000000 -r 16
+#   python fastdict_benchmark.py ids -n 1000000 -buckets 2000 -probes 100
+#   python fastdict_benchmark.py duplicates -n 1000000 -r 16 -k 100
+#   python fastdict_benchmark.py dense -n 1000000 -r 16,24 -probes 100000
+#   python fastdict_benchmark.py occupancy -n 1000000 -r 32 -buckets 200000 -repeat 100
+#   python fastdict_benchmark.py keys -n 1,1000,10000000 -r 32
+#
+# Each benchmark prints its timings so numbers of different builds of
+# fastdict.so can be compared.
+
+import sys
+import time
+import argparse
+import numpy as np
+
+import fastdict
+
+
+def benchmark(title, func, *args):
+    start = time.time()
+    result = func(*args)
+    elapsed = time.time() - start
+    print title + " time: " + str(elapsed)
+    return (result, elapsed)
+
+
+def random_codes(num_codes, seed = 0):
+    np.random.seed(seed)
+    return np.random.randint(0, 2 ** 63 - 1, size = num_codes, dtype = np.int64).astype(np.uint64)
+
+
+def sift_like_codes(num_codes, seed = 0):
+    # 64-bit LSH codes of clustered, non-negative 128-d vectors resembling SIFT descriptors.
+    # the first random plane gives the most significant bit, as LSHash._hash does
+    np.random.seed(seed)
+    centers = np.random.gamma(0.6, 30.0, size = (256, 128))
+    planes = np.random.randn(64, 128)
+    weights = (np.uint64(1) << np.arange(63, -1, -1, dtype = np.uint64))
+
+    codes = np.zeros(num_codes, dtype = np.uint64)
+    for begin in range(0, num_codes, 100000):
+        end = min(begin + 100000, num_codes)
+        labels = np.random.randint(0, 256, size = end - begin)
+        vectors = np.maximum(centers[labels] + np.random.randn(end - begin, 128) * 10.0, 0)
+        bits = (np.dot(vectors - vectors.mean(axis = 0), planes.T) > 0).astype(np.uint64)
+        codes[begin:end] = np.bitwise_or.reduce(bits * weights, axis = 1)
+    return codes
+
+
+def build_dict(num_codes, num_buckets, r = 32, dict_type = fastdict.FastCompressUInt32IntDict):
+    f_dict = dict_type(r)
+    codes = random_codes(num_codes)
+    keys = np.random.randint(0, num_buckets, size = num_codes).astype(np.uint32)
+    ids = np.arange(num_codes, dtype = np.uint32)
+    for begin in range(0, num_codes, 1000000):
+        end = begin + 1000000
+        f_dict.fast_batch_append(keys[begin:end].tolist(), codes[begin:end].tolist(), ids[begin:end].tolist())
+    return f_dict
+
+
+def probe_keys(num_probes, num_buckets, seed = 1):
+    # about half of the probes hit an empty bucket, like multi-probe queries do
+    np.random.seed(seed)
+    return np.random.randint(0, num_buckets * 2, size = num_probes).astype(np.uint32).tolist()
+
+
+def bench_lookup(args):
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+
+    f_dict = build_dict(num_codes, num_buckets, int(args.r))
+    print "buckets: " + str(f_dict.size())
+
+    probes = probe_keys(int(args.probes), num_buckets)
+    repeat = int(args.repeat)
+
+    def exist_all():
+        for key in probes:
+            f_dict.exist(key)
+
+    def mget_all():
+        for i in range(0, repeat):
+            f_dict.mget(probes)
+
+    def mget_image_ids_all():
+        for i in range(0, repeat):
+            f_dict.mget_image_ids(probes)
+
+    (_, elapsed) = benchmark("exist", exist_all)
+    print "exist lookups/s: " + str(len(probes) / elapsed)
+
+    (_, elapsed) = benchmark("mget", mget_all)
+    print "mget lookups/s: " + str(len(probes) * repeat / elapsed)
+
+    f_dict.go_index()
+    f_dict.init_runtime_dict()
+
+    (_, elapsed) = benchmark("mget_image_ids", mget_image_ids_all)
+    print "mget_image_ids lookups/s: " + str(len(probes) * repeat / elapsed)
+
+
+def bench_dense(args):
+    # hashed vs direct-indexed bucket directory, the probes cover the whole key space
+    num_codes = int(args.n)
+    repeat = int(args.repeat)
+
+    for r in [int(r) for r in args.r.split(',')]:
+        num_buckets = min(2 ** r, num_codes)
+        np.random.seed(1)
+        probes = np.random.randint(0, 2 ** r, size = int(args.probes)).astype(np.uint32)
+        probe_list = probes.tolist()
+
+        for (title, dense) in [("hashed", False), ("dense", True)]:
+            f_dict = build_dict(num_codes, num_buckets, r, lambda r: fastdict.FastCompressUInt32IntDict(r, dense = dense))
+            print "r " + str(r) + " " + title + " bytes/code: " + str(float(f_dict.memory_usage()) / num_codes)
+
+            def mget_all():
+                for i in range(0, repeat):
+                    f_dict.mget(probe_list)
+
+            def mget_image_ids_all():
+                for i in range(0, repeat):
+                    f_dict.mget_image_ids_as_buffer(probes)
+
+            (_, elapsed) = benchmark("r " + str(r) + " " + title + " mget", mget_all)
+            print "r " + str(r) + " " + title + " mget lookups/s: " + str(len(probes) * repeat / elapsed)
+
+            f_dict.go_index()
+            f_dict.init_runtime_dict()
+            (_, elapsed) = benchmark("r " + str(r) + " " + title + " mget_image_ids_as_buffer", mget_image_ids_all)
+            print "r " + str(r) + " " + title + " mget_image_ids_as_buffer lookups/s: " + str(len(probes) * repeat / elapsed)
+
+
+def hamming_ball(key, r, level):
+    # the keys within hamming distance level of key, as the multi-probe queries expand them
+    keys = np.array([key], dtype = np.uint32)
+    bases = np.left_shift(np.uint32(1), np.arange(0, r, dtype = np.uint32))
+    for i in range(0, level):
+        keys = np.unique(np.append(keys, np.bitwise_xor.outer(keys, bases).ravel()))
+    return keys.astype(np.uint32)
+
+
+def bench_occupancy(args):
+    # multi-probe lookups with and without dropping the probes of empty buckets first
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+    r = int(args.r)
+    repeat = int(args.repeat)
+
+    f_dict = build_dict(num_codes, num_buckets, r)
+    f_dict.go_index()
+    f_dict.init_runtime_dict()
+    benchmark("build_occupancy", f_dict.build_occupancy)
+    print "occupancy bytes: " + str(f_dict.occupancy_bytes())
+
+    np.random.seed(2)
+    references = np.random.randint(0, num_buckets, size = repeat).astype(np.uint32)
+    for level in [1, 2, 3]:
+        balls = [hamming_ball(reference, r, level) for reference in references]
+
+        def lookup_all():
+            for keys in balls:
+                f_dict.mget_image_ids_as_buffer(keys)
+
+        def filter_and_lookup_all():
+            skipped = 0
+            for keys in balls:
+                occupied = np.frombuffer(f_dict.occupied_keys(keys), dtype = np.uint32)
+                skipped += len(keys) - len(occupied)
+                f_dict.mget_image_ids_as_buffer(occupied)
+            return skipped
+
+        print "level " + str(level) + " probes/query: " + str(len(balls[0]))
+        benchmark("level " + str(level) + " mget_image_ids_as_buffer", lookup_all)
+        (skipped, _) = benchmark("level " + str(level) + " occupied_keys + mget_image_ids_as_buffer", filter_and_lookup_all)
+        print "level " + str(level) + " skipped probes/query: " + str(float(skipped) / repeat)
+
+
+def bench_memory(args):
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+
+    f_dict = build_dict(num_codes, num_buckets, int(args.r))
+    print "buckets: " + str(f_dict.size())
+    print "bucket vectors bytes/code: " + str(float(f_dict.memory_usage()) / num_codes)
+
+    benchmark("freeze", f_dict.freeze)
+    print "frozen CSR bytes/code: " + str(float(f_dict.memory_usage()) / num_codes)
+
+    probes = probe_keys(int(args.probes), num_buckets)
+    repeat = int(args.repeat)
+
+    def mget_all():
+        for i in range(0, repeat):
+            f_dict.mget(probes)
+
+    (_, elapsed) = benchmark("frozen mget", mget_all)
+    print "frozen mget lookups/s: " + str(len(probes) * repeat / elapsed)
+
+
+def bench_export(args):
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+
+    f_dict = build_dict(num_codes, num_buckets, int(args.r))
+    # like a multi-probe query which collects about num_codes / 10 candidates
+    probes = probe_keys(num_buckets / 5, num_buckets)
+    probe_array = np.array(probes, dtype = np.uint32)
+
+    def boxed_mget():
+        keys = []
+        image_ids = []
+        for key_value in f_dict.mget(probes):
+            keys.append(str(key_value.first))
+            image_ids.append(key_value.second)
+        return (np.array(keys).astype(np.uint64), image_ids)
+
+    def buffer_mget():
+        (keys, image_ids) = f_dict.mget_as_buffer(probe_array)
+        return (np.frombuffer(keys, dtype = np.uint64), np.frombuffer(image_ids, dtype = np.uint32))
+
+    ((codes, _), _) = benchmark("boxed mget to numpy", boxed_mget)
+    ((buffer_codes, _), _) = benchmark("buffer mget to numpy", buffer_mget)
+    print "candidates: " + str(len(codes)) + ", same codes: " + str(np.array_equal(codes, buffer_codes))
+
+    f_dict.go_index()
+
+    def boxed_mget_binary_codes():
+        b_codes = f_dict.mget_binary_codes(probes)
+        binary_codes = []
+        for binary_code in b_codes.first:
+            binary_codes.append(str(binary_code))
+        return np.array(binary_codes).astype(np.uint64)
+
+    def buffer_mget_binary_codes():
+        (keys, image_ids) = f_dict.mget_binary_codes_as_buffer(probe_array)
+        return np.frombuffer(keys, dtype = np.uint64)
+
+    benchmark("boxed mget_binary_codes to numpy", boxed_mget_binary_codes)
+    benchmark("buffer mget_binary_codes to numpy", buffer_mget_binary_codes)
+
+
+def bench_ingest(args):
+    # compares RandomInMemoryStorage.batch_append_vals (keys sampled in numpy, see actual_keys_of)
+    # with append_codes (keys gathered inside fastdict)
+    import os
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from storage import RandomInMemoryStorage
+
+    num_codes = int(args.n)
+    codes = random_codes(num_codes)
+    # sequential key dimensions so that both storages sample the same bits
+    config = {'t': 'int32', 'r': int(args.r), 'dim': 64, 'random': False}
+
+    python_storage = RandomInMemoryStorage(config)
+    benchmark("batch_append_vals", python_storage.batch_append_vals, codes.tolist(), 0)
+
+    native_storage = RandomInMemoryStorage(config)
+    benchmark("append_codes", native_storage.append_codes, codes, 0)
+
+    same = list(python_storage.storage.keys()) == list(native_storage.storage.keys())
+    print "buckets: " + str(native_storage.storage.size()) + ", same keys: " + str(same)
+
+
+def bench_keys(args):
+    # sampled keys of RandomInMemoryStorage: the former per-code bit loop vs actual_keys_of
+    import os
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from storage import RandomInMemoryStorage
+
+    r = int(args.r)
+    storage = RandomInMemoryStorage({'t': 'int32', 'r': r, 'dim': 64, 'random': True})
+
+    def bit_loop_key(code):
+        bits = np.binary_repr(code, width = 64)
+        key = 0
+        for dim in storage.key_dimensions:
+            key = (key << 1) | int(bits[dim])
+        return key
+
+    for num_codes in [int(n) for n in args.n.split(',')]:
+        codes = random_codes(num_codes)
+        # the bit loop takes minutes for 10^7 codes, it is timed on 10^5 of them at most
+        loop_codes = codes[:100000]
+        (expected, elapsed) = benchmark(str(num_codes) + " codes bit loop", lambda: [bit_loop_key(code) for code in loop_codes])
+        print str(num_codes) + " codes bit loop codes/s: " + str(len(loop_codes) / elapsed)
+        (keys, elapsed) = benchmark(str(num_codes) + " codes actual_keys_of", storage.actual_keys_of, codes)
+        print str(num_codes) + " codes actual_keys_of codes/s: " + str(num_codes / elapsed)
+        print "same keys: " + str(keys[:len(loop_codes)].tolist() == expected)
+        scalar = storage.actual_key(codes[0])
+        print "same scalar key: " + str(scalar == expected[0])
+
+
+def bench_compress(args):
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+
+    for num_threads in [int(t) for t in args.threads.split(',')]:
+        f_dict = build_dict(num_codes, num_buckets, int(args.r))
+        (_, elapsed) = benchmark("go_index with " + str(num_threads) + " threads", f_dict.parallel_go_index, num_threads)
+        print "go_index codes/s: " + str(num_codes / elapsed)
+        benchmark("to_VLQ_base64_dict with " + str(num_threads) + " threads", f_dict.parallel_to_VLQ_base64_dict, num_threads)
+
+
+def bench_peak(args):
+    # peak rss of go_index and incremental_go_index alone. each dict is built in a
+    # child process whose peak rss is reset (/proc/self/clear_refs) before compressing.
+    # measured with the same steps in C++ (-n 50000000, 256 clustered centers, 1 cpu):
+    #   go_index before incremental compression:  raw 1230 MB, peak 2534 MB, 15.7 s
+    #   go_index:                                 raw 1231 MB, peak 2088 MB, 13.1 s
+    #   incremental_go_index:                     raw 1231 MB, peak 2079 MB, 13.5 s
+    import os
+
+    def rss(field):
+        for line in open('/proc/self/status'):
+            if line.startswith(field):
+                return int(line.split()[1]) / 1024.0
+
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+
+    for mode in ["go_index", "incremental_go_index"]:
+        pid = os.fork()
+        if pid == 0:
+            f_dict = fastdict.FastCompressIntDict(int(args.r))
+            np.random.seed(0)
+            for begin in range(0, num_codes, 1000000):
+                end = min(begin + 1000000, num_codes)
+                keys = np.random.randint(0, num_buckets, size = end - begin).astype(np.uint32)
+                f_dict.fast_batch_append(keys.tolist(), sift_like_codes(end - begin, seed = begin).tolist(), range(begin, end))
+            print "raw dict rss (MB): " + str(rss('VmRSS'))
+            with open('/proc/self/clear_refs', 'w') as clear_refs:
+                clear_refs.write('5')
+            benchmark(mode, getattr(f_dict, mode))
+            print mode + " peak rss (MB): " + str(rss('VmHWM'))
+            print "column_dict rss (MB): " + str(rss('VmRSS'))
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+
+def bench_decode(args):
+    # uncompresses all buckets, as RandomInMemoryStorage.uncompress_binary_codes does
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+
+    f_dict = build_dict(num_codes, num_buckets, int(args.r))
+    keys = np.array(f_dict.keys(), dtype = np.uint32)
+    f_dict.go_index()
+
+    def decode(mget):
+        (binary_codes, image_ids) = mget(keys)
+        return np.frombuffer(binary_codes, dtype = np.uint64)
+
+    (binary_codes, elapsed) = benchmark("mget_binary_codes_as_buffer", decode, f_dict.mget_binary_codes_as_buffer)
+    print "decoded codes/s: " + str(num_codes / elapsed)
+
+    f_dict.to_VLQ_base64_dict()
+    (vlq_binary_codes, elapsed) = benchmark("mget_VLQ_base64_binary_codes_as_buffer", decode, f_dict.mget_VLQ_base64_binary_codes_as_buffer)
+    print "VLQ base64 decoded codes/s: " + str(num_codes / elapsed)
+    print "same codes: " + str(np.array_equal(binary_codes, vlq_binary_codes))
+
+
+def bench_topk(args):
+    # cpu query of the -g n path: decode + distances + sort in python vs the fused query_topk
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+    k = int(args.k)
+
+    f_dict = build_dict(num_codes, num_buckets, int(args.r))
+    f_dict.go_index()
+    # like a multi-probe query which collects about num_codes / 10 candidates
+    probes = np.array(probe_keys(num_buckets / 5, num_buckets), dtype = np.uint32)
+    query = int(random_codes(1, seed = 2)[0])
+
+    def decode_and_sort():
+        (binary_codes, image_ids) = f_dict.mget_binary_codes_as_buffer(probes)
+        binary_codes = np.frombuffer(binary_codes, dtype = np.uint64) ^ np.uint64(query)
+        distances = np.unpackbits(binary_codes.view(np.uint8)).reshape(-1, 64).sum(axis = 1)
+        image_ids = np.frombuffer(image_ids, dtype = np.uint32)
+        results = [(image_ids[i], distances[i]) for i in range(0, len(distances))]
+        results.sort(key = lambda x: x[1])
+        return [result[1] for result in results[:k]]
+
+    def fused():
+        (image_ids, distances) = f_dict.query_topk(query, probes, k)
+        return np.frombuffer(distances, dtype = np.uint8).tolist()
+
+    (expected, _) = benchmark("decode, distances and sort", decode_and_sort)
+    (distances, _) = benchmark("query_topk", fused)
+    print "same distances: " + str(expected == distances)
+
+
+def bench_distances(args):
+    # hamming distances of all codes: decode-then-popcount vs distances computed from the runs
+    num_codes = int(args.n)
+    r = int(args.r)
+
+    f_dict = fastdict.FastCompressUInt32IntDict(r)
+    f_dict.set_keydimensions(range(0, r))
+    f_dict.append_codes(sift_like_codes(num_codes), 0)
+    keys = np.array(f_dict.keys(), dtype = np.uint32)
+    query = int(sift_like_codes(1, seed = 2)[0])
+    f_dict.go_index()
+
+    popcounts = np.array([bin(i).count('1') for i in range(0, 256)], dtype = np.uint8)
+
+    def decode_and_popcount(mget):
+        (binary_codes, image_ids) = mget(keys)
+        binary_codes = np.frombuffer(binary_codes, dtype = np.uint64) ^ np.uint64(query)
+        return popcounts[binary_codes.view(np.uint8)].reshape(-1, 8).sum(axis = 1).tolist()
+
+    def run_distances(mget):
+        (distances, image_ids) = mget(query, keys)
+        return np.frombuffer(distances, dtype = np.uint8).tolist()
+
+    for (title, mget_binary_codes, mget_distances) in [("", f_dict.mget_binary_codes_as_buffer, f_dict.mget_hamming_distances),
+                                                       ("VLQ base64 ", f_dict.mget_VLQ_base64_binary_codes_as_buffer, f_dict.mget_VLQ_base64_hamming_distances)]:
+        if title != "":
+            f_dict.to_VLQ_base64_dict()
+        (expected, elapsed) = benchmark(title + "decode then popcount", decode_and_popcount, mget_binary_codes)
+        print title + "decode then popcount codes/s: " + str(num_codes / elapsed)
+        (distances, elapsed) = benchmark(title + "distances from runs", run_distances, mget_distances)
+        print title + "distances from runs codes/s: " + str(num_codes / elapsed)
+        print "same distances: " + str(expected == distances)
+
+
+def bench_format(args):
+    # file size and load time of the boost text archive vs the binary index format
+    import os
+    import tempfile
+
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+    dirname = tempfile.mkdtemp()
+
+    f_dict = build_dict(num_codes, num_buckets, int(args.r))
+    for (title, convert) in [("raw", None), ("compressed", f_dict.go_index), ("VLQ base64", f_dict.to_VLQ_base64_dict)]:
+        if convert != None:
+            convert()
+
+        text_filename = os.path.join(dirname, "index.cdict")
+        binary_filename = os.path.join(dirname, "index.bdict")
+        benchmark(title + " text save", fastdict.save_compress_uint32_int, text_filename, f_dict)
+        benchmark(title + " binary save", fastdict.save_compress_binary_uint32_int, binary_filename, f_dict)
+        print title + " text bytes/code: " + str(float(os.path.getsize(text_filename)) / num_codes)
+        print title + " binary bytes/code: " + str(float(os.path.getsize(binary_filename)) / num_codes)
+
+        benchmark(title + " text load", fastdict.load_compress_uint32_int, text_filename, fastdict.FastCompressUInt32IntDict(int(args.r)))
+        benchmark(title + " binary load", fastdict.load_compress_uint32_int, binary_filename, fastdict.FastCompressUInt32IntDict(int(args.r)))
+
+        os.remove(text_filename)
+        os.remove(binary_filename)
+    os.rmdir(dirname)
+
+
+def bench_mapped(args):
+    # startup and query time of a loaded runtime dict vs a mapped binary index
+    import os
+    import tempfile
+
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+    dirname = tempfile.mkdtemp()
+    filename = os.path.join(dirname, "index.bdict")
+
+    built_dict = build_dict(num_codes, num_buckets, int(args.r))
+    built_dict.go_index()
+    fastdict.save_compress_binary_uint32_int(filename, built_dict)
+    del built_dict
+    keys = probe_keys(int(args.probes), num_buckets)
+
+    def load():
+        f_dict = fastdict.FastCompressUInt32IntDict(int(args.r))
+        fastdict.load_compress_uint32_int(filename, f_dict)
+        return f_dict
+
+    def load_runtime():
+        f_dict = load()
+        f_dict.init_runtime_python_dict()
+        return f_dict
+
+    def open_mapped():
+        f_dict = fastdict.MappedCompressUInt32IntDict()
+        f_dict.open(filename)
+        return f_dict
+
+    (loaded_dict, elapsed) = benchmark("load", load)
+    (runtime_dict, elapsed) = benchmark("load + init runtime dict", load_runtime)
+    (mapped_dict, elapsed) = benchmark("mapped open", open_mapped)
+
+    for (title, f_dict) in [("loaded", loaded_dict), ("mapped", mapped_dict)]:
+        benchmark(title + " mget_binary_codes_as_buffer x" + args.repeat,
+            lambda: [f_dict.mget_binary_codes_as_buffer(keys) for i in range(0, int(args.repeat))])
+    for (title, f_dict) in [("runtime", runtime_dict), ("mapped", mapped_dict)]:
+        benchmark(title + " mget_python_cols_as_buffer x" + args.repeat,
+            lambda: [f_dict.mget_python_cols_as_buffer(keys) for i in range(0, int(args.repeat))])
+
+    mapped_dict.close()
+    os.remove(filename)
+    os.rmdir(dirname)
+
+
+def bench_runtime(args):
+    # time to the first query of a compressed dict initialized after load vs a saved runtime dict
+    import os
+    import tempfile
+
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+    dirname = tempfile.mkdtemp()
+    compressed_filename = os.path.join(dirname, "compressed.bdict")
+    runtime_filename = os.path.join(dirname, "runtime.bdict")
+
+    built_dict = build_dict(num_codes, num_buckets, int(args.r))
+    built_dict.go_index()
+    fastdict.save_compress_binary_uint32_int(compressed_filename, built_dict)
+    built_dict.init_runtime_python_dict()
+    fastdict.save_compress_binary_uint32_int(runtime_filename, built_dict)
+    built_dict.clear()
+    keys = probe_keys(int(args.probes), num_buckets)
+
+    for (title, filename) in [("init after load", compressed_filename), ("saved runtime dict", runtime_filename)]:
+        f_dict = fastdict.FastCompressUInt32IntDict(int(args.r))
+        start = time.time()
+        benchmark(title + " load", fastdict.load_compress_uint32_int, filename, f_dict)
+        if f_dict.get_dict_status() == 0:
+            benchmark(title + " init_runtime_python_dict", f_dict.init_runtime_python_dict)
+        benchmark(title + " first query", f_dict.mget_python_cols_as_buffer, keys)
+        print title + " time to first query: " + str(time.time() - start)
+        benchmark(title + " second query", f_dict.mget_python_cols_as_buffer, keys)
+        print title + " runtime bytes: " + str(f_dict.runtime_memory_usage())
+        f_dict.clear()
+
+    os.remove(compressed_filename)
+    os.remove(runtime_filename)
+    os.rmdir(dirname)
+
+
+def bench_merge(args):
+    # time and peak memory of building a compressed index from shard files:
+    # loading and merging them into one dict + go_index vs merge_compress
+    import os
+    import tempfile
+
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+    num_shards = int(args.shards)
+    dirname = tempfile.mkdtemp()
+    output = os.path.join(dirname, "compressed.cdict")
+
+    shard_filenames = []
+    shard_size = num_codes / num_shards
+    codes = random_codes(num_codes)
+    keys = np.random.randint(0, num_buckets, size = num_codes).astype(np.uint32)
+    for shard in range(0, num_shards):
+        shard_dict = fastdict.FastCompressUInt32IntDict(int(args.r))
+        begin = shard * shard_size
+        shard_dict.fast_batch_append(keys[begin:begin + shard_size].tolist(), codes[begin:begin + shard_size].tolist(), range(begin, begin + shard_size))
+        shard_filenames.append(os.path.join(dirname, "%d_0.dict" % shard))
+        fastdict.save_compress_binary_uint32_int(shard_filenames[-1], shard_dict)
+    del codes, keys
+
+    def load_and_compress():
+        f_dict = fastdict.FastCompressUInt32IntDict(int(args.r))
+        load_dict = fastdict.FastCompressUInt32IntDict(int(args.r))
+        for filename in shard_filenames:
+            fastdict.load_compress_uint32_int(filename, load_dict)
+            f_dict.merge(load_dict)
+            load_dict.clear()
+        f_dict.go_index()
+        fastdict.save_compress_binary_uint32_int(output, f_dict)
+
+    def merge_compress():
+        fastdict.merge_compress_uint32_int(shard_filenames, output)
+
+    # each build runs in a child process so that its peak rss is measured alone
+    for (title, build) in [("load + merge + go_index", load_and_compress), ("merge_compress", merge_compress)]:
+        pid = os.fork()
+        if pid == 0:
+            benchmark(title, build)
+            os._exit(0)
+        (pid, status, rusage) = os.wait4(pid, 0)
+        print title + " peak rss (MB): " + str(rusage.ru_maxrss / 1024.0)
+        print title + " output bytes: " + str(os.path.getsize(output))
+        os.remove(output)
+
+    for filename in shard_filenames:
+        os.remove(filename)
+    os.rmdir(dirname)
+
+
+def bench_codecs(args):
+    num_codes = int(args.n)
+    r = int(args.r)
+    codes = sift_like_codes(num_codes)
+
+    def sift_dict(dict_type = fastdict.FastCompressUInt32IntDict):
+        f_dict = dict_type(r)
+        f_dict.set_keydimensions(range(0, r))
+        f_dict.append_codes(codes, 0)
+        return f_dict
+
+    def report(title, f_dict):
+        print title + " bytes/code: " + str(float(f_dict.compressed_size()) / num_codes)
+
+    f_dict = sift_dict()
+    print "buckets: " + str(f_dict.size())
+    report("raw", f_dict)
+    f_dict.go_index()
+    report("run counts uint32", f_dict)
+    f_dict.to_VLQ_base64_dict()
+    report("run counts VLQ base64", f_dict)
+
+    f_dict = sift_dict(fastdict.FastCompressIntDict)
+    f_dict.go_index()
+    report("run counts uint8 (wrapping)", f_dict)
+
+    for (title, containers) in [("run", 1), ("bitmap", 2), ("array", 4), ("run+bitmap", 3), ("run+array", 5), ("run+bitmap+array", 7)]:
+        f_dict = sift_dict()
+        f_dict.go_hybrid_index(containers, 0)
+        report("hybrid " + title, f_dict)
+        print "  [run, bitmap, array] columns: " + str(list(f_dict.hybrid_container_counts()))
+
+
+def bench_order(args):
+    num_codes = int(args.n)
+    r = int(args.r)
+    codes = sift_like_codes(num_codes)
+
+    for (title, code_order) in [("numeric", 0), ("Gray code", 1), ("greedy", 2)]:
+        f_dict = fastdict.FastCompressUInt32IntDict(r)
+        f_dict.set_keydimensions(range(0, r))
+        f_dict.append_codes(codes, 0)
+        f_dict.set_code_order(code_order)
+        benchmark(title + " go_index", f_dict.go_index)
+        print title + " bytes/code: " + str(float(f_dict.compressed_size()) / num_codes)
+
+
+def bench_ids(args):
+    num_codes = int(args.n)
+    num_buckets = int(args.buckets)
+
+    # ids are sequential, as batch_append_vals assigns them
+    f_dict = build_dict(num_codes, num_buckets)
+    f_dict.go_index()
+    f_dict.init_runtime_dict()
+
+    probes = probe_keys(int(args.probes), num_buckets)
+    probe_array = np.array(probes, dtype = np.uint32)
+    repeat = int(args.repeat)
+
+    def mget_image_ids_all():
+        for i in range(0, repeat):
+            f_dict.mget_image_ids_as_buffer(probe_array)
+
+    for (title, codec) in [("raw", 0), ("delta varint", 1), ("block", 2)]:
+        benchmark(title + " pack_ids", f_dict.pack_ids, codec)
+        print title + " bytes/id: " + str(float(f_dict.ids_memory_usage()) / num_codes)
+        (_, elapsed) = benchmark(title + " mget_image_ids_as_buffer", mget_image_ids_all)
+        print title + " mget_image_ids_as_buffer lookups/s: " + str(len(probes) * repeat / elapsed)
+
+
+def bench_duplicates(args):
+    # query_topk over codes which collide, one distance per distinct code vs one per code
+    num_codes = int(args.n)
+    r = int(args.r)
+    k = int(args.k)
+    codes = sift_like_codes(num_codes)
+    # coarser codes of the same vectors collide more, like the identical codes of SIFT1B
+    coarse_codes = codes & np.uint64(0xFFFFFFFF00000000)
+
+    for (title, title_codes) in [("sift", codes), ("coarse sift", coarse_codes)]:
+        f_dict = fastdict.FastCompressUInt32IntDict(r)
+        f_dict.set_keydimensions(range(0, r))
+        f_dict.append_codes(title_codes, 0)
+        print title + " duplicate ratio: " + str(f_dict.duplicate_ratio())
+        # the raw layout keeps a (code, id) pair per image, a layout of distinct codes keeps
+        # each code once plus an offset into the posting lists of ids
+        distinct = int(num_codes * (1.0 - f_dict.duplicate_ratio()))
+        print title + " raw bytes/code: " + str(float(num_codes * 12) / num_codes)
+        print title + " distinct codes bytes/code: " + str(float(distinct * 12 + num_codes * 4) / num_codes)
+
+        probes = np.array(list(f_dict.keys())[:1000], dtype = np.uint32)
+        f_dict.go_index()
+        query = int(title_codes[0]) ^ 0x11
+
+        def per_code():
+            (distances, image_ids) = f_dict.mget_hamming_distances(query, probes)
+            distances = np.frombuffer(distances, dtype = np.uint8)
+            return np.sort(distances, kind = 'mergesort')[:k].tolist()
+
+        def per_distinct_code():
+            (image_ids, distances) = f_dict.query_topk(query, probes, k)
+            return np.frombuffer(distances, dtype = np.uint8).tolist()
+
+        (expected, _) = benchmark(title + " distances and sort per code", per_code)
+        (distances, _) = benchmark(title + " query_topk per distinct code", per_distinct_code)
+        print title + " same distances: " + str(expected == distances)
+
+
+benchmarks = {
+    'lookup': bench_lookup,
+    'codecs': bench_codecs,
+    'compress': bench_compress,
+    'decode': bench_decode,
+    'dense': bench_dense,
+    'distances': bench_distances,
+    'duplicates': bench_duplicates,
+    'export': bench_export,
+    'format': bench_format,
+    'ids': bench_ids,
+    'ingest': bench_ingest,
+    'keys': bench_keys,
+    'mapped': bench_mapped,
+    'occupancy': bench_occupancy,
+    'order': bench_order,
+    'memory': bench_memory,
+    'merge': bench_merge,
+    'peak': bench_peak,
+    'runtime': bench_runtime,
+    'topk': bench_topk,
+}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Micro benchmarks for fastdict')
+    parser.add_argument('benchmark', choices = sorted(benchmarks.keys()), help = 'The benchmark to run.')
+    parser.add_argument('-n', default = '1000000', help = 'Number of binary codes.')
+    parser.add_argument('-r', default = '32', help = 'Number of sampled dimensions.')
+    parser.add_argument('-buckets', default = '200000', help = 'Number of buckets.')
+    parser.add_argument('-probes', default = '100000', help = 'Number of probed keys per round.')
+    parser.add_argument('-repeat', default = '10', help = 'Number of rounds.')
+    parser.add_argument('-k', default = '100', help = 'Number of nearest codes of a query.')
+    parser.add_argument('-shards', default = '8', help = 'Number of shard files.')
+    parser.add_argument('-threads', default = '1,2,4,8', help = 'Comma separated numbers of compressing threads.')
+
+    args = parser.parse_args()
+
+    benchmarks[args.benchmark](args)
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import unittest
 import fastdict
 import sys
 import struct
+import numpy as np
 
 class TestFastCompressUInt32IntDict(unittest.TestCase):
 
@@ -69,7 +70,7 @@ class TestFastCompressUInt32IntDict(unittest.TestCase):
         self.assertEqual(keys[1], 456)
         
     def test_saveandload(self):
-        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)    
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
         f_dict.set(123, 78912893, 0)
         f_dict.set(456, 789, 1)
 
@@ -79,6 +80,384 @@ class TestFastCompressUInt32IntDict(unittest.TestCase):
 
         self.assertEqual(another_f_dict.size(), 2)
 
+    def test_binary_format(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        keys = (np.arange(1000) % 7).astype(np.uint32)
+
+        def binary_dict():
+            f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            f_dict.set_keydimensions([1, 2, 3])
+            f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+            return f_dict
+
+        def reload(f_dict, frozen = False):
+            fastdict.save_compress_binary_uint32_int("test.bdict", f_dict)
+            another_f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            if frozen:
+                another_f_dict.freeze()
+            fastdict.load_compress_uint32_int("test.bdict", another_f_dict)
+            self.assertEqual(another_f_dict.get_dict_status(), f_dict.get_dict_status())
+            key_dimensions = []
+            another_f_dict.get_keydimensions(key_dimensions)
+            self.assertEqual(key_dimensions, [1, 2, 3])
+            return another_f_dict
+
+        f_dict = binary_dict()
+        another_f_dict = reload(f_dict)
+        self.assertEqual(list(another_f_dict.keys()), range(0, 7))
+        self.assertEqual([(e.first, e.second) for e in another_f_dict.get(3)], [(e.first, e.second) for e in f_dict.get(3)])
+
+        f_dict.freeze()
+        another_f_dict = reload(f_dict, frozen = True)
+        self.assertTrue(another_f_dict.is_frozen())
+        self.assertEqual([(e.first, e.second) for e in another_f_dict.get(3)], [(e.first, e.second) for e in f_dict.get(3)])
+
+        f_dict.go_index()
+        all_keys = np.arange(0, 7, dtype = np.uint32)
+        another_f_dict = reload(f_dict)
+        self.assertEqual(another_f_dict.mget_binary_codes_as_buffer(all_keys), f_dict.mget_binary_codes_as_buffer(all_keys))
+
+        f_dict.to_VLQ_base64_dict()
+        another_f_dict = reload(f_dict)
+        self.assertEqual(another_f_dict.mget_VLQ_base64_binary_codes_as_buffer(all_keys), f_dict.mget_VLQ_base64_binary_codes_as_buffer(all_keys))
+
+        f_dict = binary_dict()
+        f_dict.go_hybrid_index(7, 1)
+        another_f_dict = reload(f_dict)
+        self.assertEqual(another_f_dict.mget_hybrid_binary_codes_as_buffer(all_keys), f_dict.mget_hybrid_binary_codes_as_buffer(all_keys))
+        self.assertEqual(another_f_dict.compressed_size(), f_dict.compressed_size())
+
+        # text index files are converted to the same binary index
+        fastdict.save_compress_uint32_int("test.dict", f_dict)
+        fastdict.convert_compress_uint32_int("test.dict", "test.bdict")
+        another_f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        fastdict.load_compress_uint32_int("test.bdict", another_f_dict)
+        self.assertEqual(another_f_dict.mget_hybrid_binary_codes_as_buffer(all_keys), f_dict.mget_hybrid_binary_codes_as_buffer(all_keys))
+
+        # the run count and id types must match
+        another_f_dict = fastdict.FastCompressIntDict(self.dimension)
+        self.assertRaises(ValueError, fastdict.load_compress_int, "test.bdict", another_f_dict)
+        another_f_dict = fastdict.FastCompressUInt32Int8Dict(self.dimension)
+        self.assertRaises(ValueError, fastdict.load_compress_uint32_int8, "test.bdict", another_f_dict)
+
+    def test_mapped_dict(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        keys = (np.arange(1000) % 7).astype(np.uint32)
+        all_keys = np.arange(0, 8, dtype = np.uint32)
+        query = int(codes[0])
+
+        def compressed_dict():
+            f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            f_dict.set_keydimensions([1, 2, 3])
+            f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+            f_dict.go_index()
+            return f_dict
+
+        def mapped(f_dict):
+            fastdict.save_compress_binary_uint32_int("test.bdict", f_dict)
+            mapped_dict = fastdict.MappedCompressUInt32IntDict()
+            mapped_dict.open("test.bdict")
+            self.assertEqual(mapped_dict.get_dict_status(), f_dict.get_dict_status())
+            self.assertEqual(mapped_dict.size(), 7)
+            self.assertEqual(list(mapped_dict.keys()), range(0, 7))
+            self.assertTrue(mapped_dict.exist(3))
+            self.assertFalse(mapped_dict.exist(7))
+            key_dimensions = []
+            mapped_dict.get_keydimensions(key_dimensions)
+            self.assertEqual(key_dimensions, [1, 2, 3])
+            return mapped_dict
+
+        f_dict = compressed_dict()
+        mapped_dict = mapped(f_dict)
+        binary_codes = f_dict.mget_binary_codes_as_buffer(all_keys)
+        self.assertEqual(mapped_dict.mget_binary_codes_as_buffer(all_keys), binary_codes)
+        self.assertEqual(mapped_dict.mget_hamming_distances(query, all_keys), f_dict.mget_hamming_distances(query, all_keys))
+        self.assertEqual(mapped_dict.query_topk(query, all_keys, 10), f_dict.query_topk(query, all_keys, 10))
+        self.assertEqual(list(mapped_dict.mget_image_ids([3, 7, 5])), list(f_dict.mget_image_ids_before_runtime_init([3, 5])))
+
+        # the same columns and ids as the runtime dict
+        f_dict.init_runtime_python_dict()
+        self.assertEqual([[str(column) for column in columns] for columns in mapped_dict.mget_python_cols_as_buffer([3, 5])],
+            [[str(column) for column in columns] for columns in f_dict.mget_python_cols_as_buffer([3, 5])])
+        self.assertEqual(mapped_dict.mget_image_ids_as_buffer(all_keys), f_dict.mget_image_ids_as_buffer(all_keys))
+        self.assertRaises(ValueError, mapped_dict.mget_VLQ_base64_cols_as_buffer, [3])
+
+        f_dict = compressed_dict()
+        f_dict.to_VLQ_base64_dict()
+        mapped_dict = mapped(f_dict)
+        self.assertEqual(mapped_dict.mget_VLQ_base64_binary_codes_as_buffer(all_keys), binary_codes)
+        self.assertEqual(mapped_dict.query_topk(query, all_keys, 10), f_dict.query_topk(query, all_keys, 10))
+        f_dict.init_runtime_VLQ_base64_dict()
+        self.assertEqual([[str(column) for column in columns] for columns in mapped_dict.mget_VLQ_base64_cols_as_buffer([3, 5])],
+            [[str(column) for column in columns] for columns in f_dict.mget_VLQ_base64_cols_as_buffer([3, 5])])
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.set_keydimensions([1, 2, 3])
+        f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+        f_dict.go_hybrid_index(7, 1)
+        mapped_dict = mapped(f_dict)
+        self.assertEqual(mapped_dict.mget_hybrid_binary_codes_as_buffer(all_keys), f_dict.mget_hybrid_binary_codes_as_buffer(all_keys))
+        self.assertEqual(mapped_dict.mget_hybrid_hamming_distances(query, all_keys), f_dict.mget_hybrid_hamming_distances(query, all_keys))
+
+        # the codes appended after go_index are compacted into the saved index
+        f_dict = compressed_dict()
+        f_dict.fast_batch_append([3, 3], [123, 456], [1000, 1001])
+        mapped_dict = mapped(f_dict)
+        self.assertEqual(f_dict.delta_size(), 0)
+        (binary_codes, ids) = mapped_dict.mget_binary_codes_as_buffer(np.array([3], dtype = np.uint32))
+        self.assertEqual(sorted(np.frombuffer(ids, dtype = np.uint32).tolist()), range(3, 1000, 7) + [1000, 1001])
+        self.assertEqual(mapped_dict.mget_binary_codes_as_buffer(all_keys), f_dict.mget_binary_codes_as_buffer(all_keys))
+
+        # only compressed dicts with the same run count and id types can be mapped
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+        fastdict.save_compress_binary_uint32_int("test.bdict", f_dict)
+        self.assertRaises(ValueError, mapped_dict.open, "test.bdict")
+        f_dict.go_index()
+        fastdict.save_compress_binary_uint32_int("test.bdict", f_dict)
+        self.assertRaises(ValueError, fastdict.MappedCompressUInt32Int8Dict().open, "test.bdict")
+        self.assertRaises(ValueError, fastdict.MappedCompressIntDict().open, "test.bdict")
+
+    def test_merge_compress(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 3000, dtype = np.int64).astype(np.uint64)
+        keys = np.random.randint(0, 50, size = 3000).astype(np.uint32)
+        all_keys = np.arange(0, 50, dtype = np.uint32)
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.set_keydimensions([1, 2, 3])
+        f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 3000))
+
+        # shards in both formats, one of them frozen
+        shard_filenames = []
+        for shard in range(0, 3):
+            shard_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            shard_dict.set_keydimensions([1, 2, 3])
+            begin = shard * 1000
+            shard_dict.fast_batch_append(keys[begin:begin + 1000].tolist(), codes[begin:begin + 1000].tolist(), range(begin, begin + 1000))
+            shard_filenames.append("test_%d_0.dict" % shard)
+            if shard == 1:
+                shard_dict.freeze()
+                fastdict.save_compress_binary_uint32_int(shard_filenames[-1], shard_dict)
+            else:
+                fastdict.save_compress_uint32_int(shard_filenames[-1], shard_dict)
+
+        fastdict.merge_compress_uint32_int(shard_filenames, "test.cdict")
+        another_f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        fastdict.load_compress_uint32_int("test.cdict", another_f_dict)
+
+        f_dict.go_index()
+        self.assertEqual(another_f_dict.get_dict_status(), 0)
+        self.assertEqual(list(another_f_dict.keys()), list(f_dict.keys()))
+        self.assertEqual(another_f_dict.mget_binary_codes_as_buffer(all_keys), f_dict.mget_binary_codes_as_buffer(all_keys))
+        key_dimensions = []
+        another_f_dict.get_keydimensions(key_dimensions)
+        self.assertEqual(key_dimensions, [1, 2, 3])
+
+        # no shards, an empty compressed index
+        fastdict.merge_compress_uint32_int([], "test.cdict")
+        fastdict.load_compress_uint32_int("test.cdict", another_f_dict)
+        self.assertEqual(another_f_dict.size(), 0)
+
+    def test_manybuckets(self):
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        keys = range(0, 5000, 7)
+        f_dict.fast_batch_append(keys, [key * 3 for key in keys], range(0, len(keys)))
+        # only the lowest bytes covering the key dimensions are used
+        f_dict.append(65536 + 7, 1, len(keys))
+
+        self.assertEqual(f_dict.size(), len(keys))
+        self.assertEqual(list(f_dict.keys()), keys)
+        self.assertEqual(f_dict.get(7)[1].first, 1)
+        self.assertFalse(f_dict.exist(8))
+
+        fastdict.save_compress_uint32_int("test.dict", f_dict)
+        another_f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        fastdict.load_compress_uint32_int("test.dict", another_f_dict)
+
+        self.assertEqual(list(another_f_dict.keys()), keys)
+        self.assertEqual(another_f_dict.get(4998)[0].first, 4998 * 3)
+
+    def test_dense_directory(self):
+        self.assertRaises(ValueError, fastdict.FastCompressUInt32IntDict, 32, dense = True)
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension, dense = True)
+        hashed_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        self.assertTrue(f_dict.is_dense())
+        self.assertFalse(hashed_dict.is_dense())
+
+        keys = range(0, 5000, 7)
+        for d in [f_dict, hashed_dict]:
+            d.fast_batch_append(keys, [key * 3 for key in keys], range(0, len(keys)))
+            d.append(65536 + 7, 1, len(keys))
+
+        self.assertEqual(list(f_dict.keys()), keys)
+        self.assertFalse(f_dict.exist(8))
+        self.assertEqual([e.first for e in f_dict.mget([7, 8, 4998])], [e.first for e in hashed_dict.mget([7, 8, 4998])])
+        # the directory takes 2^16 slots of 4 bytes
+        self.assertTrue(f_dict.memory_usage() >= 4 * 65536)
+
+        for d in [f_dict, hashed_dict]:
+            d.go_index()
+            d.init_runtime_dict()
+        probes = np.array([0, 7, 8, 4998, 65535], dtype = np.uint32)
+        self.assertEqual(f_dict.mget_image_ids_as_buffer(probes), hashed_dict.mget_image_ids_as_buffer(probes))
+
+        # the dict stays dense across clear and load
+        fastdict.save_compress_uint32_int("test.dict", f_dict)
+        f_dict.clear()
+        fastdict.load_compress_uint32_int("test.dict", f_dict)
+        self.assertTrue(f_dict.is_dense())
+        self.assertEqual(f_dict.mget_image_ids_as_buffer(probes), hashed_dict.mget_image_ids_as_buffer(probes))
+
+    def test_occupancy(self):
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.fast_batch_append([3, 1, 3, 65536 + 9], [30, 10, 31, 90], [0, 1, 2, 3])
+        probes = np.array([0, 1, 2, 3, 9, 70000], dtype = np.uint32)
+
+        # all probes are kept until the set is built
+        self.assertFalse(f_dict.has_occupancy())
+        self.assertEqual(np.frombuffer(f_dict.occupied_keys(probes), dtype = np.uint32).tolist(), probes.tolist())
+        f_dict.build_occupancy()
+        self.assertTrue(f_dict.has_occupancy())
+        self.assertEqual(np.frombuffer(f_dict.occupied_keys(probes), dtype = np.uint32).tolist(), [1, 3, 9])
+
+        # appending clears the set, loading builds it
+        f_dict.append(2, 20, 4)
+        self.assertFalse(f_dict.has_occupancy())
+        f_dict.go_index()
+
+        fastdict.save_compress_binary_uint32_int("test.bdict", f_dict)
+        another_f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        fastdict.load_compress_uint32_int("test.bdict", another_f_dict)
+        self.assertTrue(another_f_dict.has_occupancy())
+        self.assertEqual(np.frombuffer(another_f_dict.occupied_keys(probes), dtype = np.uint32).tolist(), [1, 2, 3, 9])
+
+        mapped_dict = fastdict.MappedCompressUInt32IntDict()
+        mapped_dict.open("test.bdict")
+        self.assertEqual(np.frombuffer(mapped_dict.occupied_keys(probes), dtype = np.uint32).tolist(), [1, 2, 3, 9])
+
+        # the delta segment of a compressed dict is included
+        f_dict.append(0, 0, 5)
+        f_dict.build_occupancy()
+        self.assertEqual(np.frombuffer(f_dict.occupied_keys(probes), dtype = np.uint32).tolist(), [0, 1, 2, 3, 9])
+
+        # keys of 2^24 and more are kept in a Bloom filter, which has no false negatives
+        np.random.seed(0)
+        keys = np.random.randint(2 ** 24, 2 ** 32, size = 1000, dtype = np.int64).astype(np.uint32)
+        f_dict = fastdict.FastCompressUInt32IntDict(32)
+        f_dict.fast_batch_append(keys.tolist(), range(0, 1000), range(0, 1000))
+        f_dict.build_occupancy()
+        self.assertEqual(np.frombuffer(f_dict.occupied_keys(keys), dtype = np.uint32).tolist(), keys.tolist())
+        missing = np.setdiff1d(np.arange(2 ** 24, 2 ** 24 + 10000, dtype = np.uint32), keys)
+        self.assertTrue(len(f_dict.occupied_keys(missing)) / 4 < len(missing) / 20)
+
+    def test_freeze(self):
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.fast_batch_append([3, 1, 3, 2], [30, 10, 31, 20], [0, 1, 2, 3])
+        f_dict.freeze()
+
+        self.assertTrue(f_dict.is_frozen())
+        self.assertEqual(f_dict.size(), 3)
+        self.assertEqual(list(f_dict.keys()), [1, 2, 3])
+        self.assertEqual([(e.first, e.second) for e in f_dict.get(3)], [(30, 0), (31, 2)])
+        self.assertEqual(f_dict.get(4)[0].first, 0)
+        self.assertEqual([e.first for e in f_dict.mget([1, 4, 2])], [10, 20])
+        self.assertTrue(f_dict.exist(2))
+        self.assertFalse(f_dict.exist(4))
+
+        # frozen dicts are saved in the same format and can be loaded frozen
+        fastdict.save_compress_uint32_int("test.dict", f_dict)
+        another_f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        fastdict.load_compress_uint32_int("test.dict", another_f_dict)
+        self.assertEqual(another_f_dict.get(3)[1].first, 31)
+
+        another_f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        another_f_dict.freeze()
+        fastdict.load_compress_uint32_int("test.dict", another_f_dict)
+        self.assertTrue(another_f_dict.is_frozen())
+        self.assertEqual(another_f_dict.get(3)[1].first, 31)
+
+        # appending thaws the dict
+        f_dict.append(4, 40, 4)
+        self.assertFalse(f_dict.is_frozen())
+        self.assertEqual(f_dict.size(), 4)
+        self.assertEqual(f_dict.get(3)[1].first, 31)
+
+    def test_mget_as_buffer(self):
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.batch_append([123, 123, 456], [6794572984750169060, 678, 789], [0, 1, 2])
+
+        (codes, ids) = f_dict.mget_as_buffer(np.array([123, 456, 789], dtype = np.uint32))
+        self.assertEqual(np.frombuffer(codes, dtype = np.uint64).tolist(), [6794572984750169060, 678, 789])
+        self.assertEqual(np.frombuffer(ids, dtype = np.uint32).tolist(), [0, 1, 2])
+
+        f_dict.freeze()
+        (codes, ids) = f_dict.mget_as_buffer([456])
+        self.assertEqual(np.frombuffer(codes, dtype = np.uint64).tolist(), [789])
+
+        f_dict.go_index()
+        (codes, ids) = f_dict.mget_binary_codes_as_buffer(np.array([123, 456], dtype = np.uint32))
+        self.assertEqual(np.frombuffer(codes, dtype = np.uint64).tolist(), [678, 6794572984750169060, 789])
+        self.assertEqual(np.frombuffer(ids, dtype = np.uint32).tolist(), [1, 0, 2])
+
+        f_dict.init_runtime_dict()
+        ids = f_dict.mget_image_ids_as_buffer(np.array([456, 123], dtype = np.uint32))
+        self.assertEqual(np.frombuffer(ids, dtype = np.uint32).tolist(), [2, 1, 0])
+
+    def test_append_codes(self):
+        key_dimensions = [0, 5, 17, 63]
+        codes = np.array([0, 2 ** 63 + 1, 2 ** 58 + 2 ** 46, 2 ** 63 + 2 ** 58 + 2 ** 46 + 1, 1], dtype = np.uint64)
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.set_keydimensions(key_dimensions)
+        self.assertEqual(f_dict.append_codes(codes, 10), 15)
+
+        # the first dimension is the most significant bit of the key, dimension d is bit (63 - d) of the code
+        self.assertEqual(list(f_dict.keys()), [0, 1, 6, 9, 15])
+        self.assertEqual(f_dict.get(9)[0].first, 2 ** 63 + 1)
+        self.assertEqual(f_dict.get(9)[0].second, 11)
+        self.assertEqual(f_dict.get(15)[0].second, 13)
+
+        self.assertRaises(ValueError, f_dict.append_codes, np.array([1, 2], dtype = np.uint32), 0)
+
+    def test_hybrid(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 62, size = 300, dtype = np.int64).astype(np.uint64)
+        # long runs in the high-order columns and a sparse column
+        codes[:200] = codes[:200] % 1024 + (1 << 40) * (np.arange(200) % 50 == 0)
+        # a bucket of more than 255 codes stores 2-byte run lengths and positions
+        keys = (np.arange(300) >= 280).astype(np.uint32)
+
+        for containers in [1, 2, 4, 7]:
+            f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 300))
+            f_dict.go_hybrid_index(containers, 2)
+            self.assertEqual(f_dict.get_dict_status(), 4)
+
+            (binary_codes, ids) = f_dict.mget_hybrid_binary_codes_as_buffer(np.array([0, 1, 2], dtype = np.uint32))
+            binary_codes = np.frombuffer(binary_codes, dtype = np.uint64)
+            ids = np.frombuffer(ids, dtype = np.uint32)
+            self.assertEqual(sorted(binary_codes.tolist()), sorted(codes.tolist()))
+            self.assertEqual(codes[ids].tolist(), binary_codes.tolist())
+
+        counts = list(f_dict.hybrid_container_counts())
+        self.assertEqual(sum(counts), 128)
+        self.assertTrue(counts[0] > 0 and counts[1] > 0 and counts[2] > 0)
+
+        (distances, ids) = f_dict.mget_hybrid_hamming_distances(int(codes[5]), [0])
+        distances = np.frombuffer(distances, dtype = np.uint8)
+        self.assertEqual(distances[list(np.frombuffer(ids, dtype = np.uint32)).index(5)], 0)
+
+        fastdict.save_compress_uint32_int("test.dict", f_dict)
+        another_f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        fastdict.load_compress_uint32_int("test.dict", another_f_dict)
+        self.assertEqual(another_f_dict.get_dict_status(), 4)
+        self.assertEqual(list(another_f_dict.get_hybrid_binary_codes(1).first), list(f_dict.get_hybrid_binary_codes(1).first))
+        self.assertEqual(another_f_dict.compressed_size(), f_dict.compressed_size())
+
     def test_keydimensions(self):
         f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
         f_dict.set_keydimensions([1, 2, 3])
@@ -146,7 +525,197 @@ class TestFastCompressUInt32IntDict(unittest.TestCase):
             ids.append(image_id)
 
         self.assertEqual(ids, [3, 1, 4, 0])
- 
+
+    def test_incremental_compress(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        keys = (np.arange(1000) % 7).astype(np.uint32)
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+        f_dict.go_index()
+
+        incremental_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        incremental_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+        incremental_dict.incremental_go_index()
+
+        self.assertEqual(incremental_dict.get_dict_status(), 0)
+        self.assertEqual(incremental_dict.size(), 0)
+        for key in range(0, 7):
+            cols = f_dict.get_cols(key)
+            incremental_cols = incremental_dict.get_cols(key)
+            self.assertEqual([list(column) for column in incremental_cols.first], [list(column) for column in cols.first])
+            self.assertEqual(list(incremental_cols.second), list(cols.second))
+
+    def test_compact(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        keys = (np.arange(1000) % 7).astype(np.uint32)
+        query = int(codes[4]) ^ 0x11
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.fast_batch_append(keys[:800].tolist(), codes[:800].tolist(), range(0, 800))
+        f_dict.go_index()
+        f_dict.fast_batch_append(keys[800:].tolist(), codes[800:].tolist(), range(800, 1000))
+
+        self.assertEqual(f_dict.get_dict_status(), 0)
+        self.assertEqual(f_dict.delta_size(), 200)
+
+        def check():
+            (binary_codes, ids) = f_dict.mget_binary_codes_as_buffer(np.array([2, 0, 9], dtype = np.uint32))
+            binary_codes = np.frombuffer(binary_codes, dtype = np.uint64)
+            ids = np.frombuffer(ids, dtype = np.uint32)
+            self.assertEqual(sorted(ids.tolist()), [i for i in range(0, 1000) if i % 7 in [0, 2]])
+            self.assertEqual(codes[ids].tolist(), binary_codes.tolist())
+
+            (distances, ids) = f_dict.mget_hamming_distances(query, np.array([2, 0, 9], dtype = np.uint32))
+            distances = np.frombuffer(distances, dtype = np.uint8)
+            ids = np.frombuffer(ids, dtype = np.uint32)
+            self.assertEqual(distances.tolist(), [bin(int(codes[i]) ^ query).count('1') for i in ids])
+
+            (ids, distances) = f_dict.query_topk(query, np.array([4 % 7], dtype = np.uint32), 1)
+            self.assertEqual(np.frombuffer(ids, dtype = np.uint32).tolist(), [4])
+
+        check()
+        f_dict.compact(2)
+        self.assertEqual(f_dict.delta_size(), 0)
+        check()
+
+        self.assertEqual(list(f_dict.get_binary_codes(3).first), sorted(codes[3::7].tolist()))
+
+        f_dict.to_VLQ_base64_dict()
+        f_dict.append(5, 123, 1000)
+        self.assertEqual(f_dict.delta_size(), 1)
+        self.assertEqual(list(f_dict.get_VLQ_base64_binary_codes(5).second)[-1], 1000)
+        f_dict.compact(0)
+        self.assertEqual(f_dict.delta_size(), 0)
+        self.assertEqual(list(f_dict.get_VLQ_base64_binary_codes(5).first), sorted(codes[5::7].tolist() + [123]))
+
+        # the runtime dicts compact the delta first
+        for vlq in [False, True]:
+            f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            f_dict.fast_batch_append(keys[:800].tolist(), codes[:800].tolist(), range(0, 800))
+            f_dict.go_index()
+            if vlq:
+                f_dict.to_VLQ_base64_dict()
+            f_dict.fast_batch_append(keys[800:].tolist(), codes[800:].tolist(), range(800, 1000))
+            if vlq:
+                f_dict.init_runtime_VLQ_base64_dict()
+                self.assertEqual(sorted(f_dict.mget_VLQ_base64_image_ids([2, 0])), [i for i in range(0, 1000) if i % 7 in [0, 2]])
+            else:
+                f_dict.init_runtime_dict()
+                self.assertEqual(sorted(f_dict.mget_image_ids([2, 0])), [i for i in range(0, 1000) if i % 7 in [0, 2]])
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.fast_batch_append(keys[:800].tolist(), codes[:800].tolist(), range(0, 800))
+        f_dict.go_hybrid_index(7, 2)
+        f_dict.fast_batch_append(keys[800:].tolist(), codes[800:].tolist(), range(800, 1000))
+        self.assertEqual(f_dict.delta_size(), 200)
+
+        def check_hybrid():
+            (binary_codes, ids) = f_dict.mget_hybrid_binary_codes_as_buffer(np.array([2, 0, 9], dtype = np.uint32))
+            binary_codes = np.frombuffer(binary_codes, dtype = np.uint64)
+            ids = np.frombuffer(ids, dtype = np.uint32)
+            self.assertEqual(sorted(ids.tolist()), [i for i in range(0, 1000) if i % 7 in [0, 2]])
+            self.assertEqual(codes[ids].tolist(), binary_codes.tolist())
+
+            (distances, ids) = f_dict.mget_hybrid_hamming_distances(query, np.array([2, 0, 9], dtype = np.uint32))
+            distances = np.frombuffer(distances, dtype = np.uint8)
+            ids = np.frombuffer(ids, dtype = np.uint32)
+            self.assertEqual(distances.tolist(), [bin(int(codes[i]) ^ query).count('1') for i in ids])
+
+            self.assertEqual(sorted(f_dict.get_hybrid_binary_codes(3).first), sorted(codes[3::7].tolist()))
+            self.assertEqual(sorted(f_dict.mget_hybrid_binary_codes([3, 5]).second), sorted(range(3, 1000, 7) + range(5, 1000, 7)))
+
+        check_hybrid()
+        f_dict.compact(2)
+        self.assertEqual(f_dict.delta_size(), 0)
+        self.assertEqual(f_dict.get_dict_status(), 4)
+        check_hybrid()
+
+    def test_delete_ids(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        keys = (np.arange(1000) % 7).astype(np.uint32)
+        deleted = [0, 7, 14, 21, 3]
+        kept = [i for i in range(0, 1000) if i % 7 in [0, 3] and i not in deleted]
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+        f_dict.go_index()
+
+        self.assertEqual(f_dict.delete_ids(deleted), 5)
+        self.assertEqual(f_dict.deleted_size(), 5)
+        # ids deleted again are not counted twice
+        self.assertEqual(f_dict.delete_ids([3, 7]), 0)
+        self.assertEqual(f_dict.deleted_size(), 5)
+
+        def check():
+            (binary_codes, ids) = f_dict.mget_binary_codes_as_buffer(np.array([0, 3], dtype = np.uint32))
+            binary_codes = np.frombuffer(binary_codes, dtype = np.uint64)
+            ids = np.frombuffer(ids, dtype = np.uint32)
+            self.assertEqual(sorted(ids.tolist()), kept)
+            self.assertEqual(codes[ids].tolist(), binary_codes.tolist())
+
+            (distances, ids) = f_dict.mget_hamming_distances(int(codes[0]), np.array([0, 3], dtype = np.uint32))
+            self.assertEqual(sorted(np.frombuffer(ids, dtype = np.uint32).tolist()), kept)
+            self.assertEqual(len(distances), len(kept))
+
+            (ids, distances) = f_dict.query_topk(int(codes[0]), np.array([0], dtype = np.uint32), 1)
+            self.assertNotEqual(np.frombuffer(ids, dtype = np.uint32).tolist(), [0])
+
+        check()
+
+        # only bucket 0 has more than 2% deleted codes
+        f_dict.compact_deleted(0.02)
+        self.assertEqual(f_dict.deleted_size(), 1)
+        check()
+        self.assertEqual(f_dict.delete_ids([0, 3]), 0)
+        self.assertEqual(f_dict.deleted_size(), 1)
+        self.assertEqual(len(f_dict.get_cols(0).second), 143 - 4)
+
+        f_dict.init_runtime_dict()
+        self.assertEqual(f_dict.deleted_size(), 0)
+        self.assertEqual(sorted(f_dict.mget_image_ids([0, 3])), kept)
+
+        f_dict.delete_ids([10])
+        self.assertEqual(sorted(f_dict.get_image_ids(3)), [i for i in kept if i % 7 == 3 and i != 10])
+        self.assertEqual(len(f_dict.get_python_cols_as_buffer(3)), 64)
+
+    def test_delete_ids_appended_again(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        keys = (np.arange(1000) % 7).astype(np.uint32)
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+        f_dict.go_index()
+
+        # 4 is deleted and appended again, 5000 is deleted before it is appended
+        self.assertEqual(f_dict.delete_ids([4, 5000]), 1)
+        f_dict.append(4, 123, 4)
+        f_dict.append(2, 456, 5000)
+
+        def check():
+            for (key, code, image_id) in [(4, 123, 4), (2, 456, 5000)]:
+                (ids, distances) = f_dict.query_topk(code, np.array([key], dtype = np.uint32), 1)
+                self.assertEqual(np.frombuffer(ids, dtype = np.uint32).tolist(), [image_id])
+                self.assertEqual(np.frombuffer(distances, dtype = np.uint8).tolist(), [0])
+
+                (binary_codes, ids) = f_dict.mget_binary_codes_as_buffer(np.array([key], dtype = np.uint32))
+                ids = np.frombuffer(ids, dtype = np.uint32).tolist()
+                self.assertEqual(ids.count(image_id), 1)
+                self.assertEqual(np.frombuffer(binary_codes, dtype = np.uint64)[ids.index(image_id)], code)
+
+                (distances, ids) = f_dict.mget_hamming_distances(code, np.array([key], dtype = np.uint32))
+                ids = np.frombuffer(ids, dtype = np.uint32).tolist()
+                self.assertEqual(np.frombuffer(distances, dtype = np.uint8)[ids.index(image_id)], 0)
+
+        check()
+        f_dict.compact(0)
+        self.assertEqual(f_dict.deleted_size(), 0)
+        check()
+
     def test_getbinarycodes(self):
         f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
         f_dict.set(123, 6794572984750169060, 0)
@@ -170,6 +739,261 @@ class TestFastCompressUInt32IntDict(unittest.TestCase):
             codes.append(code)
         self.assertEqual(codes, [456, 678, 123123, 6794572984750169060, 789])
  
+    def test_uncompress_many_codes(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        keys = (np.arange(1000) % 3).astype(np.uint32)
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+        f_dict.go_index()
+
+        (binary_codes, ids) = f_dict.mget_binary_codes_as_buffer(np.array([2, 0, 7], dtype = np.uint32))
+        binary_codes = np.frombuffer(binary_codes, dtype = np.uint64)
+        ids = np.frombuffer(ids, dtype = np.uint32)
+        self.assertEqual(len(ids), 667)
+        self.assertEqual(codes[ids].tolist(), binary_codes.tolist())
+        self.assertEqual(list(f_dict.mget_binary_codes([2, 0, 7]).first), binary_codes.tolist())
+
+        f_dict.to_VLQ_base64_dict()
+        (vlq_binary_codes, vlq_ids) = f_dict.mget_VLQ_base64_binary_codes_as_buffer(np.array([2, 0, 7], dtype = np.uint32))
+        self.assertEqual(np.frombuffer(vlq_binary_codes, dtype = np.uint64).tolist(), binary_codes.tolist())
+        self.assertEqual(list(f_dict.get_VLQ_base64_binary_codes(1).first), sorted(codes[1::3].tolist()))
+
+    def test_hamming_distances(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        # long runs in the high-order columns
+        codes[:500] = codes[:500] % 4096
+        keys = (np.arange(1000) % 3).astype(np.uint32)
+        query = int(codes[4]) ^ (2 ** 63 + 0x11)
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+        f_dict.go_index()
+
+        def check(distances, ids):
+            distances = np.frombuffer(distances, dtype = np.uint8)
+            ids = np.frombuffer(ids, dtype = np.uint32)
+            self.assertEqual(len(ids), 667)
+            self.assertEqual(distances.tolist(), [bin(int(codes[i]) ^ query).count('1') for i in ids])
+
+        check(*f_dict.mget_hamming_distances(query, np.array([2, 0, 7], dtype = np.uint32)))
+        f_dict.to_VLQ_base64_dict()
+        check(*f_dict.mget_VLQ_base64_hamming_distances(query, [2, 0, 7]))
+
+    def test_key_dimension_columns(self):
+        np.random.seed(0)
+        key_dimensions = [0, 5, 17, 63]
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        codes[::2] |= np.uint64(2 ** 63)
+        query = int(codes[4]) ^ (2 ** 58 + 0x11)
+
+        for status in [0, 1]:
+            f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            f_dict.set_keydimensions(key_dimensions)
+            f_dict.append_codes(codes, 0)
+            keys = list(f_dict.keys())
+            f_dict.go_index()
+
+            # the columns of the key dimensions are taken from the key
+            if status == 0:
+                columns = f_dict.get_cols(keys[0]).first
+                self.assertEqual([63 - d for d in range(64) if len(columns[63 - d]) == 0], [63 - d for d in key_dimensions])
+                (binary_codes, ids) = f_dict.mget_binary_codes_as_buffer(keys)
+                (distances, _) = f_dict.mget_hamming_distances(query, keys)
+            else:
+                f_dict.to_VLQ_base64_dict()
+                (binary_codes, ids) = f_dict.mget_VLQ_base64_binary_codes_as_buffer(keys)
+                (distances, _) = f_dict.mget_VLQ_base64_hamming_distances(query, keys)
+
+            ids = np.frombuffer(ids, dtype = np.uint32)
+            self.assertEqual(sorted(ids.tolist()), range(1000))
+            self.assertEqual(np.frombuffer(binary_codes, dtype = np.uint64).tolist(), codes[ids].tolist())
+            self.assertEqual(np.frombuffer(distances, dtype = np.uint8).tolist(), [bin(int(codes[i]) ^ query).count('1') for i in ids])
+
+            (ids, distances) = f_dict.query_topk(query, keys, 1)
+            self.assertEqual(list(np.frombuffer(ids, dtype = np.uint32)), [4])
+            self.assertEqual(list(np.frombuffer(distances, dtype = np.uint8)), [3])
+
+        # the runtime dict serves all 64 columns to the GPU
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.set_keydimensions(key_dimensions)
+        f_dict.append_codes(codes, 0)
+        f_dict.go_index()
+        f_dict.init_runtime_dict()
+        self.assertEqual(len(f_dict.get_python_cols_as_buffer(keys[0])), 64)
+        self.assertTrue(all(len(column) > 0 for column in f_dict.get_python_cols_as_buffer(keys[0])))
+
+    def test_code_order(self):
+        np.random.seed(0)
+        # codes close to a few centers, like the codes of clustered vectors
+        centers = np.random.randint(0, 2 ** 63 - 1, size = 4, dtype = np.int64).astype(np.uint64)
+        noise = np.uint64(1) << np.random.randint(0, 64, size = 1000).astype(np.uint64)
+        codes = centers[np.arange(1000) % 4] ^ noise
+        keys = (np.arange(1000) % 3).astype(np.uint32)
+        query = int(codes[4]) ^ 0x11
+
+        self.assertRaises(ValueError, fastdict.FastCompressUInt32IntDict(self.dimension).set_code_order, 3)
+
+        sizes = []
+        for code_order in [0, 1, 2]:
+            f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+            f_dict.set_code_order(code_order)
+            f_dict.go_index()
+            sizes.append(f_dict.compressed_size())
+
+            # the ids follow the reordered codes
+            (binary_codes, ids) = f_dict.mget_binary_codes_as_buffer(np.array([0, 1, 2], dtype = np.uint32))
+            ids = np.frombuffer(ids, dtype = np.uint32)
+            self.assertEqual(sorted(ids.tolist()), range(1000))
+            self.assertEqual(np.frombuffer(binary_codes, dtype = np.uint64).tolist(), codes[ids].tolist())
+
+            (distances, ids) = f_dict.mget_hamming_distances(query, np.array([0, 1, 2], dtype = np.uint32))
+            self.assertEqual(np.frombuffer(distances, dtype = np.uint8).tolist(), [bin(int(codes[i]) ^ query).count('1') for i in np.frombuffer(ids, dtype = np.uint32)])
+
+        self.assertLess(sizes[2], sizes[0])
+
+    def test_pack_ids(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        keys = (np.arange(1000) % 3).astype(np.uint32)
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+        f_dict.go_index()
+        self.assertRaises(ValueError, f_dict.pack_ids, 1)
+        f_dict.init_runtime_dict()
+        self.assertRaises(ValueError, f_dict.pack_ids, 3)
+
+        expected = list(f_dict.mget_image_ids([0, 1, 2, 7]))
+        raw_bytes = f_dict.ids_memory_usage()
+
+        for codec in [1, 2, 0]:
+            f_dict.pack_ids(codec)
+            if codec != 0:
+                self.assertLess(f_dict.ids_memory_usage(), raw_bytes)
+            # the ids stay in the order of the codes
+            self.assertEqual(list(f_dict.mget_image_ids([0, 1, 2, 7])), expected)
+            self.assertEqual(np.frombuffer(f_dict.mget_image_ids_as_buffer(np.array([0, 1, 2], dtype = np.uint32)), dtype = np.uint32).tolist(), expected)
+
+        f_dict.pack_ids(1)
+        f_dict.delete_ids([0, 3])
+        self.assertEqual(list(f_dict.get_image_ids(0)), [i for i in expected if i % 3 == 0 and i not in [0, 3]])
+        self.assertEqual(len(f_dict.get_python_cols_as_buffer(0)), 64)
+
+    def test_renumber_ids(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        keys = (np.arange(1000) % 3).astype(np.uint32)
+
+        f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+        f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+        f_dict.go_index()
+        f_dict.init_runtime_dict()
+        expected = np.frombuffer(f_dict.mget_image_ids_as_buffer(np.array([2, 0], dtype = np.uint32)), dtype = np.uint32).tolist()
+
+        f_dict.pack_ids(2)
+        f_dict.renumber_ids()
+        self.assertTrue(f_dict.is_renumbered())
+        self.assertRaises(ValueError, f_dict.pack_ids, 1)
+        self.assertRaises(ValueError, f_dict.delete_ids, [0])
+
+        # the buckets own contiguous ranges in key order
+        (starts, counts) = f_dict.mget_image_id_ranges(np.array([2, 0, 7], dtype = np.uint32))
+        self.assertEqual(np.frombuffer(starts, dtype = np.uint64).tolist(), [667, 0])
+        self.assertEqual(np.frombuffer(counts, dtype = np.uint64).tolist(), [333, 334])
+
+        internal_ids = np.concatenate([np.arange(667, 1000), np.arange(0, 334)]).astype(np.uint64)
+        self.assertEqual(np.frombuffer(f_dict.original_ids_as_buffer(internal_ids), dtype = np.uint32).tolist(), expected)
+        self.assertEqual(np.frombuffer(f_dict.mget_image_ids_as_buffer(np.array([2, 0], dtype = np.uint32)), dtype = np.uint32).tolist(), expected)
+        self.assertRaises(ValueError, f_dict.original_ids_as_buffer, np.array([1000], dtype = np.uint64))
+
+        f_dict.save_original_ids("test.ids")
+        original_ids = np.memmap("test.ids", dtype = np.uint32, mode = 'r')
+        self.assertEqual(original_ids[internal_ids].tolist(), expected)
+
+        # the original ids are served from the file
+        self.assertEqual(np.frombuffer(f_dict.original_ids_as_buffer(internal_ids), dtype = np.uint32).tolist(), expected)
+        self.assertEqual(np.frombuffer(f_dict.mget_image_ids_as_buffer(np.array([2, 0], dtype = np.uint32)), dtype = np.uint32).tolist(), expected)
+
+        # the loads keep the renumbering
+        fastdict.save_compress_uint32_int("test.dict", f_dict)
+        fastdict.save_compress_binary_uint32_int("test.bdict", f_dict)
+        for filename in ["test.dict", "test.bdict"]:
+            another_f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            fastdict.load_compress_uint32_int(filename, another_f_dict)
+            self.assertTrue(another_f_dict.is_renumbered())
+            (starts, counts) = another_f_dict.mget_image_id_ranges(np.array([2, 0], dtype = np.uint32))
+            self.assertEqual(np.frombuffer(starts, dtype = np.uint64).tolist(), [667, 0])
+            self.assertEqual(np.frombuffer(another_f_dict.original_ids_as_buffer(internal_ids), dtype = np.uint32).tolist(), expected)
+
+    def test_query_topk(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        keys = (np.arange(1000) % 3).astype(np.uint32)
+        query = int(codes[4]) ^ 0x11
+
+        for status in [0, 1, 4]:
+            f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+            self.assertRaises(ValueError, f_dict.query_topk, query, [0], 10)
+            if status == 4:
+                f_dict.go_hybrid_index(7, 1)
+            else:
+                f_dict.go_index()
+            if status == 1:
+                f_dict.to_VLQ_base64_dict()
+
+            (ids, distances) = f_dict.query_topk(query, np.array([0, 1, 7], dtype = np.uint32), 10)
+            ids = np.frombuffer(ids, dtype = np.uint32)
+            distances = np.frombuffer(distances, dtype = np.uint8)
+
+            candidates = np.arange(1000)[keys < 2]
+            expected = sorted([bin(int(codes[i]) ^ query).count('1') for i in candidates])[:10]
+            self.assertEqual(distances.tolist(), expected)
+            self.assertEqual(ids[0], 4)
+            self.assertEqual(distances[0], 2)
+            for (image_id, distance) in zip(ids, distances):
+                self.assertEqual(bin(int(codes[image_id]) ^ query).count('1'), distance)
+
+            (ids, distances) = f_dict.query_topk(query, [0, 1], 2000)
+            self.assertEqual(len(distances), len(candidates))
+
+    def test_duplicate_codes(self):
+        np.random.seed(0)
+        # 100 distinct codes, each one 5 times in its bucket
+        codes = np.repeat(np.random.randint(0, 2 ** 63 - 1, size = 100, dtype = np.int64).astype(np.uint64), 5)
+        keys = ((np.arange(500) / 5) % 3).astype(np.uint32)
+        query = int(codes[20]) ^ 0x11
+
+        for status in [0, 1, 4]:
+            f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 500))
+            self.assertAlmostEqual(f_dict.duplicate_ratio(), 0.8)
+            if status == 4:
+                f_dict.go_hybrid_index(7, 1)
+            else:
+                f_dict.go_index()
+            if status == 1:
+                f_dict.to_VLQ_base64_dict()
+            self.assertAlmostEqual(f_dict.duplicate_ratio(), 0.8)
+
+            # the group of the nearest code is cut at k ids
+            f_dict.delete_ids([20, 21])
+            (ids, distances) = f_dict.query_topk(query, [0, 1, 2], 7)
+            ids = np.frombuffer(ids, dtype = np.uint32)
+            distances = np.frombuffer(distances, dtype = np.uint8)
+            self.assertEqual(sorted(ids[:3].tolist()), [22, 23, 24])
+            self.assertEqual(distances[:3].tolist(), [2, 2, 2])
+
+            candidates = [i for i in range(0, 500) if i not in [20, 21]]
+            expected = sorted([bin(int(codes[i]) ^ query).count('1') for i in candidates])[:7]
+            self.assertEqual(distances.tolist(), expected)
+            for (image_id, distance) in zip(ids, distances):
+                self.assertEqual(bin(int(codes[image_id]) ^ query).count('1'), distance)
+ 
     def test_runtimedict(self):
         f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
         f_dict.set(123, 6794572984750169060, 0)
@@ -219,6 +1043,12 @@ class TestFastCompressUInt32IntDict(unittest.TestCase):
                             self.assertEqual(data[0], 0)
                 index += 1
             buffer_index += 1
+
+        # the runtime buckets would not see the appended codes
+        self.assertRaises(ValueError, f_dict.append, 123, 1, 5)
+        self.assertRaises(ValueError, f_dict.batch_append, [456], [1], [5])
+        self.assertRaises(ValueError, f_dict.append_codes, np.array([1, 2], dtype = np.uint64), 5)
+        self.assertEqual(len(f_dict.get_cols_as_buffer(123)[0]), 16)
  
     def test_runtime_python_dict(self):
         f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
@@ -270,6 +1100,54 @@ class TestFastCompressUInt32IntDict(unittest.TestCase):
                 index += 1
             buffer_index += 1
  
+    def test_persisted_runtime_dict(self):
+        np.random.seed(0)
+        codes = np.random.randint(0, 2 ** 63 - 1, size = 1000, dtype = np.int64).astype(np.uint64)
+        keys = (np.arange(1000) % 7).astype(np.uint32)
+        all_keys = range(0, 7)
+
+        def runtime_dict(vlq = False):
+            f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            f_dict.set_keydimensions([1, 2, 3])
+            f_dict.fast_batch_append(keys.tolist(), codes.tolist(), range(0, 1000))
+            f_dict.go_index()
+            if vlq:
+                f_dict.to_VLQ_base64_dict()
+                f_dict.init_runtime_VLQ_base64_dict()
+            else:
+                f_dict.init_runtime_python_dict()
+            self.assertTrue(f_dict.runtime_memory_usage() > 0)
+            return f_dict
+
+        def columns(cols_buffers):
+            return [[str(column) for column in cols_buffer] for cols_buffer in cols_buffers]
+
+        # the runtime dicts are saved and loaded without init_runtime_*
+        f_dict = runtime_dict()
+        for save in [fastdict.save_compress_uint32_int, fastdict.save_compress_binary_uint32_int]:
+            save("test.dict", f_dict)
+            another_f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            fastdict.load_compress_uint32_int("test.dict", another_f_dict)
+            self.assertEqual(another_f_dict.get_dict_status(), 2)
+            self.assertEqual(columns(another_f_dict.mget_python_cols_as_buffer(all_keys)), columns(f_dict.mget_python_cols_as_buffer(all_keys)))
+            self.assertEqual(list(another_f_dict.mget_image_ids(all_keys)), list(f_dict.mget_image_ids(all_keys)))
+            self.assertEqual(columns(another_f_dict.mget_cols_as_buffer(all_keys)), columns(f_dict.mget_cols_as_buffer(all_keys)))
+
+        f_dict = runtime_dict(vlq = True)
+        for save in [fastdict.save_compress_uint32_int, fastdict.save_compress_binary_uint32_int]:
+            save("test.dict", f_dict)
+            another_f_dict = fastdict.FastCompressUInt32IntDict(self.dimension)
+            fastdict.load_compress_uint32_int("test.dict", another_f_dict)
+            self.assertEqual(another_f_dict.get_dict_status(), 3)
+            self.assertEqual(columns(another_f_dict.mget_VLQ_base64_cols_as_buffer(all_keys)), columns(f_dict.mget_VLQ_base64_cols_as_buffer(all_keys)))
+            self.assertEqual(list(another_f_dict.mget_VLQ_base64_image_ids(all_keys)), list(f_dict.mget_VLQ_base64_image_ids(all_keys)))
+
+        # clear() releases the arena of the runtime columns
+        another_f_dict.clear()
+        self.assertEqual(another_f_dict.runtime_memory_usage(), 0)
+        self.assertEqual(another_f_dict.get_dict_status(), -1)
+        self.assertEqual(another_f_dict.size(), 0)
+
     def test_VLQ_base64(self):
         vlq_dict = fastdict.FastCompressUInt32IntDict(8)
         self.assertEqual(vlq_dict.base64VLQ_encode(123123), 'zn4D')
@@ -377,6 +1255,9 @@ class TestFastCompressUInt32IntDict(unittest.TestCase):
                             self.assertEqual(buffers[i], 'A') 
                 index += 1
             VLQ_cols_buffer_index += 1
+
+        self.assertRaises(ValueError, vlq_dict.set, 123, 1, 2)
+        self.assertRaises(ValueError, vlq_dict.fast_batch_append, [123], [1], [2])
  
 class TestFastCompressUInt32Int8Dict(unittest.TestCase):
 
@@ -451,6 +1332,14 @@ class TestFastCompressUInt32Int8Dict(unittest.TestCase):
 
         self.assertEqual(another_f_dict.size(), 2)
 
+    def test_append_codes(self):
+        f_dict = fastdict.FastCompressUInt32Int8Dict(self.dimension)
+        f_dict.set_keydimensions([63])
+        f_dict.append_codes(np.array([1, 3], dtype = np.uint64), 254)
+
+        # ids saturate at 255 like batch_append_vals
+        self.assertEqual([e.second for e in f_dict.get(1)], [254, 255])
+
     def test_keydimensions(self):
         f_dict = fastdict.FastCompressUInt32Int8Dict(self.dimension)
         f_dict.set_keydimensions([1, 2, 3])
@@ -824,6 +1713,29 @@ class TestFastCompressUInt32StringDict(unittest.TestCase):
 
         self.assertEqual(another_f_dict.size(), 2)
 
+    def test_binary_format(self):
+        f_dict = fastdict.FastCompressUInt32StringDict(self.dimension)
+        f_dict.batch_append([123, 123, 456], [78912893, 12, 789], ["0", "", "abc"])
+
+        fastdict.save_compress_binary_uint32_string("test.bdict", f_dict)
+        another_f_dict = fastdict.FastCompressUInt32StringDict(self.dimension)
+        fastdict.load_compress_uint32_string("test.bdict", another_f_dict)
+        self.assertEqual([(e.first, e.second) for e in another_f_dict.mget([123, 456])], [(78912893, "0"), (12, ""), (789, "abc")])
+
+        f_dict.go_index()
+        fastdict.save_compress_binary_uint32_string("test.bdict", f_dict)
+        fastdict.load_compress_uint32_string("test.bdict", another_f_dict)
+        self.assertEqual(another_f_dict.get_dict_status(), 0)
+        self.assertEqual(list(another_f_dict.mget_binary_codes([123, 456]).second), ["", "0", "abc"])
+
+    def test_append_codes(self):
+        f_dict = fastdict.FastCompressUInt32StringDict(self.dimension)
+        f_dict.set_keydimensions([62, 63])
+        f_dict.append_codes(np.array([2, 3, 1], dtype = np.uint64), 31)
+
+        self.assertEqual([e.second for e in f_dict.get(2)], list(f_dict.NumberIdsToVLQ_base64([31])))
+        self.assertEqual([e.second for e in f_dict.get(1)], list(f_dict.NumberIdsToVLQ_base64([33])))
+
     def test_keydimensions(self):
         f_dict = fastdict.FastCompressUInt32StringDict(self.dimension)
         f_dict.set_keydimensions([1, 2, 3])
@@ -914,6 +1826,10 @@ class TestFastCompressUInt32StringDict(unittest.TestCase):
         for code in binary_codes.first:
             codes.append(code)
         self.assertEqual(codes, [456, 678, 123123, 6794572984750169060, 789])
+
+        (codes, ids) = f_dict.mget_binary_codes_as_buffer(np.array([123, 456]))
+        self.assertEqual(np.frombuffer(codes, dtype = np.uint64).tolist(), [456, 678, 123123, 6794572984750169060, 789])
+        self.assertEqual(ids, ["3", "1", "4", "0", "2"])
  
     def test_runtimedict(self):
         f_dict = fastdict.FastCompressUInt32StringDict(self.dimension)
@@ -964,6 +1880,10 @@ class TestFastCompressUInt32StringDict(unittest.TestCase):
                             self.assertEqual(data[0], 0)
                 index += 1
             buffer_index += 1
+
+        ids = list(f_dict.mget_image_ids([123, 456, 789]))
+        f_dict.pack_ids(1)
+        self.assertEqual(list(f_dict.mget_image_ids([123, 456, 789])), ids)
  
     def test_runtime_python_dict(self):
         f_dict = fastdict.FastCompressUInt32StringDict(self.dimension)
@@ -1015,6 +1935,15 @@ class TestFastCompressUInt32StringDict(unittest.TestCase):
                 index += 1
             buffer_index += 1
  
+    def test_hybrid(self):
+        f_dict = fastdict.FastCompressUInt32StringDict(self.dimension)
+        f_dict.batch_append([123, 123, 123, 456], [6794572984750169060, 678, 456, 789], ["0", "1", "3", "2"])
+        f_dict.go_hybrid_index(7, 1)
+
+        binary_codes = f_dict.mget_hybrid_binary_codes([123, 456])
+        self.assertEqual(list(binary_codes.first), [456, 678, 6794572984750169060, 789])
+        self.assertEqual(list(binary_codes.second), ["3", "1", "0", "2"])
+
     def test_VLQ_base64(self):
         vlq_dict = fastdict.FastCompressUInt32StringDict(8)
         self.assertEqual(vlq_dict.base64VLQ_encode(123123), 'zn4D')
@@ -0,0 +1,173 @@
+#ifndef FASTDICT_HYBRID_COLUMN_HPP
+#define FASTDICT_HYBRID_COLUMN_HPP
+
+// hybrid_column.hpp:
+// per-column codec of the hybrid compressed dict (dict status 4).
+//
+// After sorting the codes of a bucket, the high-order columns are long runs
+// while the low-order columns alternate almost every bit, where run-length
+// encoding is larger than the plain bitmap. Like Roaring/EWAH, each column
+// picks the smallest of three containers:
+//
+//   HYBRID_RUN:    run lengths, starting with a run of 0 bits (as column_dict)
+//   HYBRID_BITMAP: the bits themselves, 8 codes per byte, code j is bit (j % 8) of byte j / 8
+//   HYBRID_ARRAY:  the ascending positions of the 1 bits
+//
+// Run lengths and positions never exceed the number of codes of the bucket, so
+// they are stored with the smallest width able to hold it (1, 2 or 4 bytes,
+// little-endian, see value_width), i.e. a column costs value_width bytes per
+// run, one byte per 8 codes or value_width bytes per 1 bit respectively.
+
+#include <stdint.h>
+#include <vector>
+
+#include <boost/serialization/vector.hpp>
+
+enum HybridContainerType {
+    HYBRID_RUN = 0,
+    HYBRID_BITMAP = 1,
+    HYBRID_ARRAY = 2
+};
+
+// bit masks of the containers allowed when encoding
+static const uint8_t HYBRID_ALLOW_RUN = 1 << HYBRID_RUN;
+static const uint8_t HYBRID_ALLOW_BITMAP = 1 << HYBRID_BITMAP;
+static const uint8_t HYBRID_ALLOW_ARRAY = 1 << HYBRID_ARRAY;
+static const uint8_t HYBRID_ALLOW_ALL = HYBRID_ALLOW_RUN | HYBRID_ALLOW_BITMAP | HYBRID_ALLOW_ARRAY;
+
+struct HybridColumn
+{
+    HybridColumn() : type(HYBRID_RUN) {}
+
+    // bytes of a run length or position in a column of num_bits bits
+    static uint8_t value_width(uint32_t num_bits) {
+        if (num_bits <= 0xFF)
+            return 1;
+        else if (num_bits <= 0xFFFF)
+            return 2;
+        return 4;
+    }
+
+    // encode the first num_bits bits of words (bit j % 64 of words[j / 64] is bit j)
+    // with the smallest allowed container
+    void encode(const std::vector<uint64_t>& words, uint32_t num_bits, uint8_t allowed) {
+        uint32_t ones = 0;
+        uint32_t runs = 1;
+        uint64_t prev_bit = 0;
+        for (size_t w = 0; w < words.size(); w++) {
+            uint32_t word_bits = (num_bits - w * 64) < 64 ? (num_bits - w * 64) : 64;
+            uint64_t valid_bits = word_bits == 64 ? ~(uint64_t)0 : (((uint64_t)1 << word_bits) - 1);
+            uint64_t word = words[w] & valid_bits;
+            ones += __builtin_popcountll(word);
+            runs += __builtin_popcountll((word ^ ((word << 1) | prev_bit)) & valid_bits);
+            prev_bit = (word >> (word_bits - 1)) & 0x01;
+        }
+
+        uint8_t width = value_width(num_bits);
+        uint64_t run_bytes = (uint64_t)runs * width;
+        uint64_t array_bytes = (uint64_t)ones * width;
+        uint64_t bitmap_bytes = (num_bits + 7) / 8;
+
+        type = HYBRID_RUN;
+        uint64_t size = run_bytes;
+        if ((allowed & HYBRID_ALLOW_ARRAY) && (!(allowed & HYBRID_ALLOW_RUN) || array_bytes < size)) {
+            type = HYBRID_ARRAY;
+            size = array_bytes;
+        }
+        if ((allowed & HYBRID_ALLOW_BITMAP) && (!(allowed & (HYBRID_ALLOW_RUN | HYBRID_ALLOW_ARRAY)) || bitmap_bytes < size))
+            type = HYBRID_BITMAP;
+
+        data.clear();
+        if (type == HYBRID_RUN) {
+            data.reserve(run_bytes);
+            uint32_t position = 0;
+            uint32_t num_runs = 0;
+            for (uint32_t j = 0; j < num_bits; j++) {
+                uint64_t bit = (words[j / 64] >> (j % 64)) & 0x01;
+                if (bit != (num_runs % 2)) {
+                    push_value(j - position, width);
+                    num_runs++;
+                    position = j;
+                }
+            }
+            push_value(num_bits - position, width);
+        } else if (type == HYBRID_BITMAP) {
+            data.resize(bitmap_bytes, 0);
+            for (uint32_t i = 0; i < bitmap_bytes; i++)
+                data[i] = (uint8_t)(words[i / 8] >> (8 * (i % 8)));
+            // clear the bits after the last code
+            if (num_bits % 8 != 0)
+                data[bitmap_bytes - 1] &= ((uint8_t)1 << (num_bits % 8)) - 1;
+        } else {
+            data.reserve(array_bytes);
+            for (size_t w = 0; w < words.size(); w++) {
+                uint64_t word = words[w];
+                while (word != 0) {
+                    uint32_t position = w * 64 + __builtin_ctzll(word);
+                    if (position >= num_bits)
+                        break;
+                    push_value(position, width);
+                    word &= word - 1;
+                }
+            }
+        }
+    }
+
+    // decode into (num_bits + 63) / 64 words, bit j % 64 of words[j / 64] is bit j
+    void decode(std::vector<uint64_t>& words, uint32_t num_bits) const {
+        words.assign((num_bits + 63) / 64, 0);
+
+        uint8_t width = value_width(num_bits);
+        size_t num_values = data.size() / width;
+
+        if (type == HYBRID_RUN) {
+            uint32_t position = 0;
+            for (size_t i = 0; i < num_values; i++) {
+                uint32_t end = position + value(i, width);
+                if (i % 2 == 1) {
+                    for (uint32_t j = position; j < end; j++)
+                        words[j / 64] |= (uint64_t)1 << (j % 64);
+                }
+                position = end;
+            }
+        } else if (type == HYBRID_BITMAP) {
+            for (size_t i = 0; i < data.size(); i++)
+                words[i / 8] |= (uint64_t)data[i] << (8 * (i % 8));
+        } else {
+            for (size_t i = 0; i < num_values; i++) {
+                uint32_t position = value(i, width);
+                words[position / 64] |= (uint64_t)1 << (position % 64);
+            }
+        }
+    }
+
+    // bytes taken by the column, as counted by FastCompressDict::compressed_size
+    uint64_t bytes() const {
+        return sizeof(type) + data.size();
+    }
+
+    template<class Archive>
+    void serialize(Archive & ar, const unsigned int version) {
+        ar & type;
+        ar & data;
+    }
+
+    uint8_t type;
+    std::vector<uint8_t> data;
+
+private:
+
+    void push_value(uint32_t val, uint8_t width) {
+        for (uint8_t i = 0; i < width; i++)
+            data.push_back((uint8_t)(val >> (8 * i)));
+    }
+
+    uint32_t value(size_t index, uint8_t width) const {
+        uint32_t val = 0;
+        for (uint8_t i = 0; i < width; i++)
+            val |= (uint32_t)data[index * width + i] << (8 * i);
+        return val;
+    }
+};
+
+#endif // FASTDICT_HYBRID_COLUMN_HPP
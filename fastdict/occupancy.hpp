@@ -0,0 +1,119 @@
+#ifndef FASTDICT_OCCUPANCY_HPP
+#define FASTDICT_OCCUPANCY_HPP
+
+// occupancy.hpp:
+// the set of keys which have a bucket, tested by the multi-probe queries
+// before any bucket lookup, see FastCompressDict::occupied_keys.
+//
+// If every key is below 2^24 the set is an exact bitmap indexed by the key
+// (2 MB at most). Otherwise it is a blocked Bloom filter of about 16 bits per
+// key: a key sets 3 bits of one 512-bit block, so a test loads one cache line
+// and lets well under 1% of the missing keys through.
+//
+// The set is a snapshot of the keys it was built from, an empty set lets all
+// keys through.
+
+#include <stdint.h>
+#include <vector>
+#include <algorithm>
+
+static const uint32_t OCCUPANCY_MAX_BITMAP_KEY = 1 << 24;
+static const uint32_t OCCUPANCY_BLOCK_WORDS = 8;
+static const uint32_t OCCUPANCY_BITS_PER_KEY = 16;
+
+class KeyOccupancy
+{
+
+public:
+
+    KeyOccupancy() : built(false), bloom(false), block_shift(64), max_key(0) {}
+
+    void build(const std::vector<uint32_t>& keys) {
+        clear();
+        built = true;
+        if (keys.empty())
+            return;
+
+        max_key = *std::max_element(keys.begin(), keys.end());
+        bloom = max_key >= OCCUPANCY_MAX_BITMAP_KEY;
+        if (!bloom) {
+            words.assign((uint64_t)max_key / 64 + 1, 0);
+            for (size_t i = 0; i < keys.size(); i++)
+                words[keys[i] / 64] |= (uint64_t)1 << (keys[i] % 64);
+            return;
+        }
+
+        uint64_t num_blocks = 1;
+        uint8_t block_bits = 0;
+        while (num_blocks * OCCUPANCY_BLOCK_WORDS * 64 < (uint64_t)keys.size() * OCCUPANCY_BITS_PER_KEY) {
+            num_blocks *= 2;
+            block_bits++;
+        }
+        block_shift = 64 - block_bits;
+        words.assign(num_blocks * OCCUPANCY_BLOCK_WORDS, 0);
+        for (size_t i = 0; i < keys.size(); i++) {
+            uint64_t hash = hash_key(keys[i]);
+            uint64_t* block = &words[block_index(hash) * OCCUPANCY_BLOCK_WORDS];
+            for (uint32_t j = 0; j < 3; j++) {
+                uint32_t bit = (hash >> (9 * j)) & 511;
+                block[bit / 64] |= (uint64_t)1 << (bit % 64);
+            }
+        }
+    }
+
+    // false only if key has no bucket
+    bool contains(uint32_t key) const {
+        if (!built)
+            return true;
+        if (!bloom)
+            return key <= max_key && !words.empty() && ((words[key / 64] >> (key % 64)) & 0x01);
+
+        uint64_t hash = hash_key(key);
+        const uint64_t* block = &words[block_index(hash) * OCCUPANCY_BLOCK_WORDS];
+        for (uint32_t j = 0; j < 3; j++) {
+            uint32_t bit = (hash >> (9 * j)) & 511;
+            if (!((block[bit / 64] >> (bit % 64)) & 0x01))
+                return false;
+        }
+        return true;
+    }
+
+    bool is_built() const { return built; }
+
+    bool is_bloom() const { return bloom; }
+
+    void clear() {
+        std::vector<uint64_t>().swap(words);
+        built = false;
+        bloom = false;
+        block_shift = 64;
+        max_key = 0;
+    }
+
+    uint64_t bytes() const { return words.capacity() * sizeof(uint64_t); }
+
+private:
+
+    // the finalizer of murmur3, the upper bits pick the block and the lower ones the bits
+    static uint64_t hash_key(uint32_t key) {
+        uint64_t hash = key;
+        hash ^= hash >> 33;
+        hash *= 0xFF51AFD7ED558CCDULL;
+        hash ^= hash >> 33;
+        hash *= 0xC4CEB9FE1A85EC53ULL;
+        hash ^= hash >> 33;
+        return hash;
+    }
+
+    uint64_t block_index(uint64_t hash) const {
+        return block_shift >= 64 ? 0 : hash >> block_shift;
+    }
+
+    std::vector<uint64_t> words;
+    bool built;
+    bool bloom;
+    uint8_t block_shift;
+    uint32_t max_key;
+};
+
+#endif // FASTDICT_OCCUPANCY_HPP
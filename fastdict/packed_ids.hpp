@@ -0,0 +1,242 @@
+#ifndef FASTDICT_PACKED_IDS_HPP
+#define FASTDICT_PACKED_IDS_HPP
+
+// packed_ids.hpp:
+// compressed image id list of a bucket, see FastCompressDict::pack_ids.
+//
+// The ids of a bucket are kept in the order of its codes, which is not the order
+// they were appended in. Two codecs are available for numeric ids:
+//
+//   ID_CODEC_DELTA_VARINT  the ids sorted, as varint gaps, followed by the rank
+//                          of each id in the sorted list (the permutation back to
+//                          code order) bit-packed with ceil(log2(n)) bits
+//   ID_CODEC_BLOCK         blocks of 128 ids in code order, each one a varint
+//                          minimum, a bit width and the bit-packed offsets from
+//                          the minimum (frame of reference)
+//
+// String ids are concatenated with varint lengths, whatever the codec.
+// decode appends all ids at once.
+
+#include <stdint.h>
+#include <vector>
+#include <string>
+#include <algorithm>
+
+enum IdCodec {
+    ID_CODEC_RAW = 0,
+    ID_CODEC_DELTA_VARINT = 1,
+    ID_CODEC_BLOCK = 2
+};
+
+static const uint32_t ID_BLOCK_SIZE = 128;
+
+inline void write_varint(std::vector<uint8_t>& data, uint64_t value) {
+    while (value >= 0x80) {
+        data.push_back((uint8_t)(value | 0x80));
+        value >>= 7;
+    }
+    data.push_back((uint8_t)value);
+}
+
+inline uint64_t read_varint(const uint8_t*& position) {
+    uint64_t value = 0;
+    for (uint32_t shift = 0; ; shift += 7) {
+        uint8_t byte = *position++;
+        value |= (uint64_t)(byte & 0x7F) << shift;
+        if (!(byte & 0x80))
+            return value;
+    }
+}
+
+// the number of bits of the largest value
+inline uint8_t bit_width(uint64_t value) {
+    return value == 0 ? 0 : 64 - __builtin_clzll(value);
+}
+
+// appends count values of width bits each, least significant bits first
+inline void write_bits(std::vector<uint8_t>& data, const uint64_t* values, size_t count, uint8_t width) {
+    if (width == 0)
+        return;
+
+    uint64_t buffer = 0;
+    uint32_t buffered = 0;
+    for (size_t i = 0; i < count; i++) {
+        buffer |= values[i] << buffered;
+        uint32_t written = std::min<uint32_t>(width, 64 - buffered);
+        buffered += width;
+        while (buffered >= 8) {
+            data.push_back((uint8_t)buffer);
+            buffer >>= 8;
+            buffered -= 8;
+            // the bits of the value that did not fit into buffer
+            if (written < width && buffered < 64 - 8) {
+                buffer |= (values[i] >> written) << buffered;
+                written = width;
+            }
+        }
+    }
+    if (buffered > 0)
+        data.push_back((uint8_t)buffer);
+}
+
+inline const uint8_t* read_bits(const uint8_t* position, uint64_t* values, size_t count, uint8_t width) {
+    if (width == 0) {
+        std::fill(values, values + count, 0);
+        return position;
+    }
+
+    uint64_t mask = width == 64 ? ~(uint64_t)0 : (((uint64_t)1 << width) - 1);
+    uint64_t bit = 0;
+    for (size_t i = 0; i < count; i++, bit += width) {
+        uint64_t value = 0;
+        for (uint32_t done = 0; done < width; ) {
+            uint64_t byte_bit = (bit + done) % 8;
+            uint32_t take = std::min<uint32_t>(8 - byte_bit, width - done);
+            value |= (uint64_t)((position[(bit + done) / 8] >> byte_bit) & ((1 << take) - 1)) << done;
+            done += take;
+        }
+        values[i] = value & mask;
+    }
+    return position + (bit + 7) / 8;
+}
+
+template <class IdType>
+class PackedIds
+{
+
+public:
+
+    PackedIds() : count(0), codec(ID_CODEC_RAW) {}
+
+    void encode(const std::vector<IdType>& ids, uint8_t id_codec) {
+        std::vector<uint8_t>().swap(data);
+        count = ids.size();
+        codec = id_codec;
+        if (codec == ID_CODEC_DELTA_VARINT)
+            encode_delta_varint(ids);
+        else
+            encode_blocks(ids);
+        std::vector<uint8_t>(data).swap(data);
+    }
+
+    void decode(std::vector<IdType>& ids) const {
+        if (count == 0)
+            return;
+        size_t first = ids.size();
+        ids.resize(first + count);
+        if (codec == ID_CODEC_DELTA_VARINT)
+            decode_delta_varint(&ids[first]);
+        else
+            decode_blocks(&ids[first]);
+    }
+
+    uint64_t size() const { return count; }
+
+    uint64_t bytes() const { return data.capacity(); }
+
+private:
+
+    void encode_delta_varint(const std::vector<IdType>& ids) {
+        std::vector<std::pair<uint64_t, uint64_t> > sorted(ids.size());
+        for (size_t i = 0; i < ids.size(); i++)
+            sorted[i] = std::pair<uint64_t, uint64_t>((uint64_t)ids[i], i);
+        std::sort(sorted.begin(), sorted.end());
+
+        uint64_t previous = 0;
+        std::vector<uint64_t> ranks(ids.size());
+        for (size_t rank = 0; rank < sorted.size(); rank++) {
+            write_varint(data, sorted[rank].first - previous);
+            previous = sorted[rank].first;
+            ranks[sorted[rank].second] = rank;
+        }
+        write_bits(data, ranks.data(), ranks.size(), bit_width(count - 1));
+    }
+
+    void decode_delta_varint(IdType* ids) const {
+        const uint8_t* position = data.data();
+        std::vector<uint64_t> sorted(count);
+        uint64_t value = 0;
+        for (uint64_t i = 0; i < count; i++) {
+            value += read_varint(position);
+            sorted[i] = value;
+        }
+
+        std::vector<uint64_t> ranks(count);
+        read_bits(position, ranks.data(), count, bit_width(count - 1));
+        for (uint64_t i = 0; i < count; i++)
+            ids[i] = (IdType)sorted[ranks[i]];
+    }
+
+    void encode_blocks(const std::vector<IdType>& ids) {
+        uint64_t offsets[ID_BLOCK_SIZE];
+        for (size_t begin = 0; begin < ids.size(); begin += ID_BLOCK_SIZE) {
+            size_t block_size = std::min<size_t>(ID_BLOCK_SIZE, ids.size() - begin);
+            uint64_t minimum = (uint64_t)*std::min_element(ids.begin() + begin, ids.begin() + begin + block_size);
+            uint64_t maximum = 0;
+            for (size_t i = 0; i < block_size; i++) {
+                offsets[i] = (uint64_t)ids[begin + i] - minimum;
+                maximum = std::max(maximum, offsets[i]);
+            }
+            write_varint(data, minimum);
+            data.push_back(bit_width(maximum));
+            write_bits(data, offsets, block_size, bit_width(maximum));
+        }
+    }
+
+    void decode_blocks(IdType* ids) const {
+        const uint8_t* position = data.data();
+        uint64_t offsets[ID_BLOCK_SIZE];
+        for (uint64_t begin = 0; begin < count; begin += ID_BLOCK_SIZE) {
+            size_t block_size = std::min<uint64_t>(ID_BLOCK_SIZE, count - begin);
+            uint64_t minimum = read_varint(position);
+            uint8_t width = *position++;
+            position = read_bits(position, offsets, block_size, width);
+            for (size_t i = 0; i < block_size; i++)
+                ids[begin + i] = (IdType)(minimum + offsets[i]);
+        }
+    }
+
+    std::vector<uint8_t> data;
+    uint64_t count;
+    uint8_t codec;
+};
+
+template <>
+class PackedIds<std::string>
+{
+
+public:
+
+    PackedIds() : count(0) {}
+
+    void encode(const std::vector<std::string>& ids, uint8_t) {
+        std::vector<uint8_t>().swap(data);
+        count = ids.size();
+        for (size_t i = 0; i < ids.size(); i++) {
+            write_varint(data, ids[i].size());
+            data.insert(data.end(), ids[i].begin(), ids[i].end());
+        }
+        std::vector<uint8_t>(data).swap(data);
+    }
+
+    void decode(std::vector<std::string>& ids) const {
+        const uint8_t* position = data.data();
+        ids.reserve(ids.size() + count);
+        for (uint64_t i = 0; i < count; i++) {
+            uint64_t length = read_varint(position);
+            ids.push_back(std::string((const char*)position, length));
+            position += length;
+        }
+    }
+
+    uint64_t size() const { return count; }
+
+    uint64_t bytes() const { return data.capacity(); }
+
+private:
+
+    std::vector<uint8_t> data;
+    uint64_t count;
+};
+
+#endif // FASTDICT_PACKED_IDS_HPP
@@ -0,0 +1,80 @@
+#ifndef FASTDICT_RUNTIME_ARENA_HPP
+#define FASTDICT_RUNTIME_ARENA_HPP
+
+// runtime_arena.hpp:
+// bump allocator owning the column arrays of the runtime dicts (dict status 2/3).
+//
+// The runtime dicts used to new[] one array per column and never free them.
+// The arena hands out consecutive pieces of large chunks instead, so that the
+// columns of neighbouring buckets are contiguous, and clear() releases all of
+// them at once. Pointers handed out stay valid until clear().
+
+#include <stdint.h>
+#include <stdlib.h>
+#include <vector>
+#include <new>
+
+class RuntimeArena
+{
+
+public:
+
+    RuntimeArena(uint64_t chunk_bytes = 1 << 20) : chunk_bytes(chunk_bytes), cursor(NULL), remaining(0), allocated(0) {}
+
+    ~RuntimeArena() {
+        clear();
+    }
+
+    // n uninitialized elements, aligned to 8 bytes
+    template <class T>
+    T* allocate(uint64_t n) {
+        uint64_t bytes = (n * sizeof(T) + 7) & ~(uint64_t)7;
+        if (bytes > remaining) {
+            // large requests get a chunk of their own, the current chunk is kept
+            if (bytes > chunk_bytes / 4)
+                return (T*)new_chunk(bytes);
+            cursor = new_chunk(chunk_bytes);
+            remaining = chunk_bytes;
+        }
+        char* data = cursor;
+        cursor += bytes;
+        remaining -= bytes;
+        return (T*)data;
+    }
+
+    // free every chunk
+    void clear() {
+        for (size_t i = 0; i < chunks.size(); i++)
+            free(chunks[i]);
+        std::vector<char*>().swap(chunks);
+        cursor = NULL;
+        remaining = 0;
+        allocated = 0;
+    }
+
+    // bytes of the chunks
+    uint64_t bytes() const { return allocated; }
+
+private:
+
+    // the chunks are owned by one arena
+    RuntimeArena(const RuntimeArena&);
+    RuntimeArena& operator=(const RuntimeArena&);
+
+    char* new_chunk(uint64_t bytes) {
+        char* chunk = (char*)malloc(bytes == 0 ? 1 : bytes);
+        if (chunk == NULL)
+            throw std::bad_alloc();
+        chunks.push_back(chunk);
+        allocated += bytes;
+        return chunk;
+    }
+
+    uint64_t chunk_bytes;
+    char* cursor;
+    uint64_t remaining;
+    uint64_t allocated;
+    std::vector<char*> chunks;
+};
+
+#endif // FASTDICT_RUNTIME_ARENA_HPP
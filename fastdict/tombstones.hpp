@@ -0,0 +1,144 @@
+#ifndef FASTDICT_TOMBSTONES_HPP
+#define FASTDICT_TOMBSTONES_HPP
+
+// tombstones.hpp:
+// the set of deleted image ids of a FastCompressDict.
+//
+// Numeric ids are split into chunks of 2^16 ids by their high bits. A chunk keeps
+// the low 16 bits of its ids in a sorted array, which turns into a bitmap of the
+// chunk (8 KB) once it holds more ids than the bitmap has words of 16 bits. A few
+// scattered ids take a few bytes each whatever their values, a dense range one bit
+// per id. A test is a binary search of the chunk and a word load or a binary search
+// inside it. String ids are kept in a hash set.
+
+#include <stdint.h>
+#include <vector>
+#include <string>
+#include <algorithm>
+#include <unordered_set>
+
+static const uint32_t TOMBSTONE_CHUNK_BITS = 16;
+static const uint32_t TOMBSTONE_CHUNK_WORDS = (1 << TOMBSTONE_CHUNK_BITS) / 64;
+static const uint32_t TOMBSTONE_ARRAY_MAX = (1 << TOMBSTONE_CHUNK_BITS) / 16;
+
+template <class IdType>
+class Tombstones
+{
+
+public:
+
+    Tombstones() : count(0) {}
+
+    // returns false if id was already deleted
+    bool insert(IdType id) {
+        uint64_t high = (uint64_t)id >> TOMBSTONE_CHUNK_BITS;
+        std::vector<uint64_t>::iterator key = std::lower_bound(chunk_keys.begin(), chunk_keys.end(), high);
+        size_t index = key - chunk_keys.begin();
+        if (key == chunk_keys.end() || *key != high) {
+            chunk_keys.insert(key, high);
+            chunks.insert(chunks.begin() + index, Chunk());
+        }
+
+        if (!chunks[index].insert((uint16_t)id))
+            return false;
+        count++;
+        return true;
+    }
+
+    bool contains(IdType id) const {
+        if (count == 0)
+            return false;
+        uint64_t high = (uint64_t)id >> TOMBSTONE_CHUNK_BITS;
+        std::vector<uint64_t>::const_iterator key = std::lower_bound(chunk_keys.begin(), chunk_keys.end(), high);
+        return key != chunk_keys.end() && *key == high && chunks[key - chunk_keys.begin()].contains((uint16_t)id);
+    }
+
+    uint64_t size() const { return count; }
+
+    bool empty() const { return count == 0; }
+
+    void clear() {
+        std::vector<uint64_t>().swap(chunk_keys);
+        std::vector<Chunk>().swap(chunks);
+        count = 0;
+    }
+
+    uint64_t bytes() const {
+        uint64_t bytes = chunk_keys.capacity() * sizeof(uint64_t) + chunks.capacity() * sizeof(Chunk);
+        for (size_t i = 0; i < chunks.size(); i++)
+            bytes += chunks[i].lows.capacity() * sizeof(uint16_t) + chunks[i].bits.capacity() * sizeof(uint64_t);
+        return bytes;
+    }
+
+private:
+
+    // the low bits of the ids of a chunk, in lows until they are too many for it, then in bits
+    struct Chunk
+    {
+        std::vector<uint16_t> lows;
+        std::vector<uint64_t> bits;
+
+        bool insert(uint16_t low) {
+            if (!bits.empty()) {
+                uint64_t bit = (uint64_t)1 << (low % 64);
+                if (bits[low / 64] & bit)
+                    return false;
+                bits[low / 64] |= bit;
+                return true;
+            }
+
+            std::vector<uint16_t>::iterator it = std::lower_bound(lows.begin(), lows.end(), low);
+            if (it != lows.end() && *it == low)
+                return false;
+            lows.insert(it, low);
+
+            if (lows.size() > TOMBSTONE_ARRAY_MAX) {
+                bits.assign(TOMBSTONE_CHUNK_WORDS, 0);
+                for (size_t i = 0; i < lows.size(); i++)
+                    bits[lows[i] / 64] |= (uint64_t)1 << (lows[i] % 64);
+                std::vector<uint16_t>().swap(lows);
+            }
+            return true;
+        }
+
+        bool contains(uint16_t low) const {
+            if (!bits.empty())
+                return (bits[low / 64] >> (low % 64)) & 0x01;
+            return std::binary_search(lows.begin(), lows.end(), low);
+        }
+    };
+
+    std::vector<uint64_t> chunk_keys;
+    std::vector<Chunk> chunks;
+    uint64_t count;
+};
+
+template <>
+class Tombstones<std::string>
+{
+
+public:
+
+    bool insert(const std::string& id) { return ids.insert(id).second; }
+
+    bool contains(const std::string& id) const { return ids.count(id) > 0; }
+
+    uint64_t size() const { return ids.size(); }
+
+    bool empty() const { return ids.empty(); }
+
+    void clear() { std::unordered_set<std::string>().swap(ids); }
+
+    uint64_t bytes() const {
+        uint64_t bytes = ids.bucket_count() * sizeof(void*);
+        for (std::unordered_set<std::string>::const_iterator it = ids.begin(); it != ids.end(); ++it)
+            bytes += sizeof(std::string) + it->capacity();
+        return bytes;
+    }
+
+private:
+
+    std::unordered_set<std::string> ids;
+};
+
+#endif // FASTDICT_TOMBSTONES_HPP
@@ -0,0 +1,60 @@
+#ifndef FASTDICT_TOPK_HEAP_HPP
+#define FASTDICT_TOPK_HEAP_HPP
+
+// topk_heap.hpp:
+// bounded max-heap keeping the k candidates with the smallest hamming distance.
+//
+// Each candidate is keyed by (distance << 56) | arrival order, so that the
+// heap only compares integers and candidates of equal distance keep the order
+// they were offered in (i.e. the order of the probed buckets).
+
+#include <stdint.h>
+#include <vector>
+#include <utility>
+#include <algorithm>
+
+template <class ValueType>
+class TopKHeap
+{
+
+public:
+
+    TopKHeap(uint32_t k) : k(k), count(0) {}
+
+    // offer a candidate, it is dropped if k closer candidates are already kept
+    void push(uint8_t distance, const ValueType& value) {
+        uint64_t key = ((uint64_t)distance << 56) | count++;
+        if (heap.size() < k) {
+            heap.push_back(std::pair<uint64_t, ValueType>(key, value));
+            std::push_heap(heap.begin(), heap.end(), compare);
+        } else if (k > 0 && key < heap.front().first) {
+            std::pop_heap(heap.begin(), heap.end(), compare);
+            heap.back() = std::pair<uint64_t, ValueType>(key, value);
+            std::push_heap(heap.begin(), heap.end(), compare);
+        }
+    }
+
+    // the kept candidates in ascending distance, the heap is emptied
+    void sorted(std::vector<uint8_t>& distances, std::vector<ValueType>& values) {
+        std::sort_heap(heap.begin(), heap.end(), compare);
+        distances.reserve(distances.size() + heap.size());
+        values.reserve(values.size() + heap.size());
+        for (size_t i = 0; i < heap.size(); i++) {
+            distances.push_back((uint8_t)(heap[i].first >> 56));
+            values.push_back(heap[i].second);
+        }
+        heap.clear();
+    }
+
+private:
+
+    static bool compare(const std::pair<uint64_t, ValueType>& a, const std::pair<uint64_t, ValueType>& b) {
+        return a.first < b.first;
+    }
+
+    uint32_t k;
+    uint64_t count;
+    std::vector<std::pair<uint64_t, ValueType> > heap;
+};
+
+#endif // FASTDICT_TOPK_HEAP_HPP
@@ -241,7 +241,7 @@ class LSHash(object):
         #    self.hash_tables[0].append_val(data, extra_data)
         #    extra_data += 1
 
-        self.hash_tables[0].batch_append_vals(indexed_data.tolist(), extra_data)
+        self.hash_tables[0].append_codes(indexed_data, extra_data)
             
 
     def load_index(self, dirname):
@@ -282,25 +282,56 @@ class LSHash(object):
             #    npzfiles = sorted(npzfiles.items(), key=lambda x: x[0])
             #    self.hash_tables = [t[1] for t in npzfiles]
 
-    def compress_index(self, dirname):
+    # the compressed index is written in the binary index format, see storage.save
+    def compress_index(self, dirname, binary = True):
         if 'random' in self.storage_config:
             for i, table in enumerate(self.hash_tables):
                 table.compress()
-                table.save(dirname + '/' + "compressed.cdict")
+                table.save(dirname + '/' + "compressed.cdict", binary)
 
                 table.to_VLQ_base64()
-                table.save(dirname + '/' + "compressed_vlq.cdict")
+                table.save(dirname + '/' + "compressed_vlq.cdict", binary)
  
                 table.clear()
 
-    def load_compress_index(self, dirname, vlq = False):
+    # same as load_index + compress_index, but the shards are merged into compressed.cdict bucket by
+    # bucket instead of being loaded into memory. the VLQ base64 index is converted from the merged
+    # compressed index, which is the only one held in memory
+    def merge_compress_index(self, dirname):
+        if 'random' in self.storage_config:
+            onlyfiles = sorted([ f for f in os.listdir(dirname) if os.path.isfile(os.path.join(dirname, f)) ])
+
+            for i, table in enumerate(self.hash_tables):
+                shard_filenames = []
+                for afile in onlyfiles:
+                    m = re.search('(.*)_(\d)\.dict', afile)
+                    if m != None and int(m.group(2)) == i:
+                        shard_filenames.append(dirname + '/' + afile)
+
+                print "merging " + str(len(shard_filenames)) + " shards ..."
+                table.merge_compress(shard_filenames, dirname + '/' + "compressed.cdict")
+
+                table.load(dirname + '/' + "compressed.cdict")
+                table.to_VLQ_base64()
+                table.save(dirname + '/' + "compressed_vlq.cdict", True)
+
+                table.clear()
+
+    # mapped: serve the binary index files read-only from memory mappings, see RandomInMemoryStorage.load_mapped
+    def load_compress_index(self, dirname, vlq = False, mapped = False):
         if 'random' in self.storage_config:
             for i, table in enumerate(self.hash_tables):
                 if not vlq:
-                    table.load(dirname + '/' + "compressed.cdict")
+                    filename = dirname + '/' + "compressed.cdict"
                 else:
                     print "loading VLQ base64 version..."
-                    table.load(dirname + '/' + "compressed_vlq.cdict")
+                    filename = dirname + '/' + "compressed_vlq.cdict"
+                if not os.path.isfile(filename):
+                    raise IOError("no compressed index " + filename + ", build it with compress_index or merge_compress_index")
+                if mapped:
+                    table.load_mapped(filename)
+                else:
+                    table.load(filename)
 
     def save_index(self, filename):
 
@@ -331,7 +362,7 @@ class LSHash(object):
         print "loading keys..."
         (keys, image_ids) = self.hash_tables[0].keys(key, expand_level)
 
-        return (np.array(keys).astype(np.uint64), image_ids)
+        return (keys, image_ids)
 
 
     def fetch_extra_data(self, hamming_candidates):
@@ -359,23 +390,19 @@ class LSHash(object):
                 if 'random' in self.storage_config:
 
                     if gpu_mode == 'n':
-                        print "cpu-based uncompressing..."
+                        print "cpu-based query..."
                         start = time.clock()
 
-                        b_codes = self.hash_tables[0].uncompress_binary_codes(binary_hash, expand_level)
-
-                        binary_codes = []
-                        for binary_code in b_codes.first:
-                            #print long(binary_code)
-                            binary_codes.append(str(binary_code))
+                        results = self.hash_tables[0].query_topk(binary_hash[0], expand_level, num_results)
 
                         elapsed = (time.clock() - start)
                         print "time: " + str(elapsed)
 
-                        binary_codes = np.array(binary_codes).astype(np.uint64)
-                        hamming_distances = self.query_with_binary_codes(binary_hash, binary_codes, num_results)
+                        if results == None:
+                            return []
 
-                        return self.sorting(b_codes.second, hamming_distances)
+                        (image_ids, hamming_distances) = results
+                        return zip(image_ids, hamming_distances)
 
                     else:
 
@@ -397,7 +424,12 @@ class LSHash(object):
 
                             hamming_distances = hamming_distances[0]
 
-                            return self.sorting(image_ids, hamming_distances)
+                            results = self.sorting(image_ids, hamming_distances)
+                            # renumbered ids are mapped back for the sorted results only
+                            if self.hash_tables[0].is_renumbered() and len(results) > 0:
+                                (internal_ids, distances) = zip(*results)
+                                results = zip(self.hash_tables[0].original_ids(internal_ids), distances)
+                            return results
 
                         except Exception as e:
                             print "Exception found in computing hamming distance."
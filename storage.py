@@ -11,7 +11,6 @@ import struct
 
 import fastdict
 
-from bitarray import bitarray
 
 try:
     import redis
@@ -97,15 +96,17 @@ class RandomInMemoryStorage(InMemoryStorage):
     def __init__(self, config):
         self.name = 'random'
 
+        # dense: direct-indexed bucket directory, for r <= 24
+        dense = config.get('dense', False)
         if config['t'] == 'string':
-            self.storage = fastdict.FastCompressUInt32StringDict(config['r'])
-            self.load_dict = fastdict.FastCompressUInt32StringDict(config['r'])
+            self.storage = fastdict.FastCompressUInt32StringDict(config['r'], dense = dense)
+            self.load_dict = fastdict.FastCompressUInt32StringDict(config['r'], dense = dense)
         elif config['t'] == 'int8':
-            self.storage = fastdict.FastCompressUInt32Int8Dict(config['r'])
-            self.load_dict = fastdict.FastCompressUInt32Int8Dict(config['r'])
+            self.storage = fastdict.FastCompressUInt32Int8Dict(config['r'], dense = dense)
+            self.load_dict = fastdict.FastCompressUInt32Int8Dict(config['r'], dense = dense)
         elif config['t'] == 'int32':
-            self.storage = fastdict.FastCompressUInt32IntDict(config['r'])
-            self.load_dict = fastdict.FastCompressUInt32IntDict(config['r'])
+            self.storage = fastdict.FastCompressUInt32IntDict(config['r'], dense = dense)
+            self.load_dict = fastdict.FastCompressUInt32IntDict(config['r'], dense = dense)
 
         self.init_key_dimension(config['r'], config['dim'], config['random'])
         self.init_bases(config['r'])
@@ -114,6 +115,8 @@ class RandomInMemoryStorage(InMemoryStorage):
 
         self.inited_runtime = False
         self.inited_runtime_VLQ_base64 = False
+        self.mapped = False
+        self.skipped_probes = 0
 
     def init_key_dimension(self, num_of_r, dim, random = True):
         if random:
@@ -123,6 +126,13 @@ class RandomInMemoryStorage(InMemoryStorage):
         print "key dimensions:"
         print self.key_dimensions
         self.storage.set_keydimensions(self.key_dimensions.tolist())
+        self.init_key_shifts()
+
+    # bit 63 - key_dimensions[j] of a code is bit r - 1 - j of its sampled key, see actual_keys_of
+    def init_key_shifts(self):
+        num_of_r = len(self.key_dimensions)
+        self.code_shifts = (63 - np.asarray(self.key_dimensions, dtype = np.int64)).astype(np.uint64)
+        self.key_shifts = np.arange(num_of_r - 1, -1, -1, dtype = np.int64).astype(np.uint64)
 
     def init_bases(self, num_of_r):
         self.bases = np.left_shift(1, range(0, num_of_r))
@@ -132,23 +142,18 @@ class RandomInMemoryStorage(InMemoryStorage):
         return np.bitwise_xor(actual_key, self.bases)
 
     def actual_key(self, key):
-        key_binary = np.binary_repr(key, width = 64)
-        bits = bitarray(key_binary)
-
-        actual_key_bits = []
-        for empty_dim in range(0, 32 - self.config['r']):
-            actual_key_bits.append(False)
-
-        for dim in self.key_dimensions:
-            actual_key_bits.append(bits[dim])
-
-        #actual_key_bits = np.zeros(32 - len(actual_key_bits)).astype(np.int).tolist() + actual_key_bits
-
-        actual_key_binary = bitarray(actual_key_bits, endian='big')
-        string = struct.unpack(">I", actual_key_binary.tobytes())[0]
-        actual_key = np.array([string]).astype(np.uint32)[0]
-
-        return actual_key
+        return self.actual_keys_of(np.array([key], dtype = np.uint64))[0]
+
+    # the uint32 sampled keys of an array of uint64 codes: the bits of the key dimensions are
+    # gathered with shifts and masks, a chunk of codes at a time to bound the temporaries
+    def actual_keys_of(self, codes):
+        codes = np.asarray(codes, dtype = np.uint64).ravel()
+        keys = np.empty(len(codes), dtype = np.uint32)
+        for begin in range(0, len(codes), 65536):
+            chunk = codes[begin:begin + 65536, np.newaxis]
+            bits = np.bitwise_and(np.right_shift(chunk, self.code_shifts), np.uint64(1))
+            keys[begin:begin + 65536] = np.bitwise_or.reduce(np.left_shift(bits, self.key_shifts), axis = 1)
+        return keys
  
     def set_val(self, key, val):
         actual_key = self.actual_key(key)
@@ -158,6 +163,14 @@ class RandomInMemoryStorage(InMemoryStorage):
         actual_key = self.actual_key(key)
         return self.storage.get(int(actual_key))
 
+    # ids returned by the *_as_buffer methods of fastdict: numeric ids come as bytearray
+    def ids_from_buffer(self, ids):
+        if self.config['t'] == 'int8':
+            return np.frombuffer(ids, dtype = np.uint8)
+        elif self.config['t'] == 'int32':
+            return np.frombuffer(ids, dtype = np.uint32)
+        return ids
+
     def benchmark_begin(self, title):
         print "start to " + title
         self.start = time.clock()
@@ -176,9 +189,8 @@ class RandomInMemoryStorage(InMemoryStorage):
 
     def batch_append_vals(self, keys, val):
         vals = []
-        actual_keys = []
+        actual_keys = self.actual_keys_of(keys).tolist()
         for key in keys:
-            actual_keys.append(int(self.actual_key(key)))
             vals.append(val)
             if self.config['t'] == 'int8':
                 if val < 255:
@@ -196,6 +208,13 @@ class RandomInMemoryStorage(InMemoryStorage):
         self.storage.fast_batch_append(actual_keys, keys, vals) 
         self.benchmark_end('batch insert to fastdict')   
 
+    # same as batch_append_vals, but the sampled keys are computed inside fastdict
+    # codes is a numpy array of uint64 binary codes
+    def append_codes(self, codes, val):
+        self.benchmark_begin('batch insert to fastdict')
+        self.storage.append_codes(np.ascontiguousarray(codes, dtype = np.uint64), val)
+        self.benchmark_end('batch insert to fastdict')   
+
 
     def get_list(self, key, filter_code):
         actual_key = self.actual_key(key)
@@ -217,7 +236,9 @@ class RandomInMemoryStorage(InMemoryStorage):
 
         return np.unique(np.array(expanded_keys))
 
-    # given sub-sampled key, return all expanded sub-sampled keys
+    # given sub-sampled key, return all expanded sub-sampled keys.
+    # the keys of empty buckets are dropped against the occupancy set of fastdict, built when
+    # loading (see build_occupancy), before any bucket lookup. skipped_probes counts them
     def actual_keys(self, reference_key, level = 1):
  
         actual_key = self.actual_key(reference_key)
@@ -226,21 +247,24 @@ class RandomInMemoryStorage(InMemoryStorage):
             all_keys = np.unique(np.append(neighbor_keys, actual_key)).astype(np.uint32)
         else:
             all_keys = np.array([actual_key]).astype(np.uint32)
-        return all_keys
+
+        occupied_keys = np.frombuffer(self.storage.occupied_keys(all_keys), dtype = np.uint32)
+        self.skipped_probes = len(all_keys) - len(occupied_keys)
+        return occupied_keys
+
+    # snapshot the keys of the non-empty buckets for actual_keys. loading builds it, appending
+    # clears it (all probes are then looked up) until it is built again
+    def build_occupancy(self):
+        self.storage.build_occupancy()
  
     # given sub-sampled key, retrieve all binary codes in corresponding buckets
     def keys(self, reference_key, level = 1):
 
         all_keys = self.actual_keys(reference_key, level)  
 
-        keys = []
-        image_ids = []
-
-        for key_value in self.storage.mget(all_keys.tolist()):
-            keys.append(str(key_value.first))
-            image_ids.append(key_value.second)
+        (keys, image_ids) = self.storage.mget_as_buffer(all_keys)
 
-        return (keys, image_ids)
+        return (np.frombuffer(keys, dtype = np.uint64), self.ids_from_buffer(image_ids))
  
     def get_neighbor_vals(self, key):
         neighbor_keys = self.neighbor_keys(key)
@@ -250,27 +274,46 @@ class RandomInMemoryStorage(InMemoryStorage):
 
         return np.array(vals)
 
-    def init_runtime(self):
+    # ids_codec: compress the image ids of the runtime buckets,
+    # 0 raw, 1 delta + varint, 2 bit-packed blocks
+    def init_runtime(self, ids_codec = 0):
         if not self.inited_runtime:
             print "init rumtime dict..."
             if self.storage.get_dict_status() == 0:
+                # the delta segment is compacted into the runtime dict
                 self.storage.init_runtime_python_dict()
-            else:
+            elif self.storage.get_dict_status() != 2:
+                # a saved runtime dict (status 2) is loaded ready to use
                 print "Incorrect dict mode."
+            if ids_codec != 0 and self.storage.get_dict_status() == 2:
+                self.storage.pack_ids(ids_codec)
             print "done."
             self.inited_runtime = True
 
-    def init_runtime_vlq_base64(self):
+    def init_runtime_vlq_base64(self, ids_codec = 0):
         if not self.inited_runtime_VLQ_base64:
             print "init rumtine VLQ base64 dict..." 
             if self.storage.get_dict_status() == 1:
                 self.storage.init_runtime_VLQ_base64_dict()
-            else:
+            elif self.storage.get_dict_status() != 3:
                 print "Incorrect dict mode."
+            if ids_codec != 0 and self.storage.get_dict_status() == 3:
+                self.storage.pack_ids(ids_codec)
             print "done."
             self.inited_runtime_VLQ_base64 = True
 
-    def save(self, filename):
+    # binary: write the binary index format instead of the boost text archive,
+    # load() reads both formats
+    def save(self, filename, binary = False):
+        if binary:
+            if self.config['t'] == 'string':
+                fastdict.save_compress_binary_uint32_string(filename, self.storage)
+            elif self.config['t'] == 'int8':
+                fastdict.save_compress_binary_uint32_int8(filename, self.storage)
+            elif self.config['t'] == 'int32':
+                fastdict.save_compress_binary_uint32_int(filename, self.storage)
+            return
+
         if self.config['t'] == 'string':
             fastdict.save_compress_uint32_string(filename, self.storage)
         elif self.config['t'] == 'int8':
@@ -289,6 +332,7 @@ class RandomInMemoryStorage(InMemoryStorage):
 
             self.storage.merge(self.load_dict) 
             self.load_dict.clear()
+            self.storage.build_occupancy()
         else:
             if self.config['t'] == 'string':        
                 fastdict.load_compress_uint32_string(filename, self.storage)
@@ -300,13 +344,80 @@ class RandomInMemoryStorage(InMemoryStorage):
             key_dimensions = []
             self.storage.get_keydimensions(key_dimensions)
             self.key_dimensions = np.array(key_dimensions)
+            self.init_key_shifts()
+
+    # offline build: merge the raw shard files into a compressed index file (status 0) bucket by
+    # bucket, without loading the shards into one raw dict, see fastdict.merge_compress_*
+    def merge_compress(self, shard_filenames, filename):
+        if self.config['t'] == 'string':
+            fastdict.merge_compress_uint32_string(shard_filenames, filename)
+        elif self.config['t'] == 'int8':
+            fastdict.merge_compress_uint32_int8(shard_filenames, filename)
+        elif self.config['t'] == 'int32':
+            fastdict.merge_compress_uint32_int(shard_filenames, filename)
+
+    # serve a binary index file (see save) read-only from a memory mapping instead of loading it.
+    # the compressed columns are served from the mapping without runtime dicts, which makes
+    # startup near-instant and shares the page cache among the processes on the host.
+    # only numeric ids are supported
+    def load_mapped(self, filename):
+        if self.config['t'] == 'int8':
+            self.storage = fastdict.MappedCompressUInt32Int8Dict()
+        elif self.config['t'] == 'int32':
+            self.storage = fastdict.MappedCompressUInt32IntDict()
+        else:
+            raise ValueError("mapped dicts need numeric ids")
+        self.storage.open(filename)
+
+        key_dimensions = []
+        self.storage.get_keydimensions(key_dimensions)
+        self.key_dimensions = np.array(key_dimensions)
+        self.init_key_shifts()
+
+        self.mapped = True
+        self.inited_runtime = True
+        self.inited_runtime_VLQ_base64 = True
+
+    # incremental: erase each raw bucket as soon as it is compressed, for a lower peak memory
+    # code_order: order of the codes in a bucket before run-length encoding,
+    # 0 numeric, 1 Gray code, 2 greedy nearest neighbour
+    def compress(self, incremental = False, code_order = 0):
+        if self.storage.get_dict_status() == -1:
+            self.storage.set_code_order(code_order)
+            if incremental:
+                self.storage.incremental_go_index()
+            else:
+                self.storage.go_index()
+        else:
+            print "Incorrect dict mode."
 
-    def compress(self):
+    # containers: bit mask of hybrid column containers, 1 run, 2 bitmap, 4 array
+    # num_threads: 0 for one thread per cpu
+    def compress_hybrid(self, containers = 7, num_threads = 0):
         if self.storage.get_dict_status() == -1:
-            self.storage.go_index()
+            self.storage.go_hybrid_index(containers, num_threads)
         else:
             print "Incorrect dict mode."
 
+    # codes appended to a compressed index go to a delta segment which the cpu queries consult
+    # alongside the compressed buckets. compact folds it into the buckets it touches.
+    # num_threads: 0 for one thread per cpu
+    def compact(self, num_threads = 0):
+        if self.storage.get_dict_status() in [0, 1, 4]:
+            if self.storage.delta_size() > 0:
+                self.storage.compact(num_threads)
+        else:
+            print "Incorrect dict mode."
+
+    # remove images from the index. the compressed buckets keep the codes of deleted ids, which the
+    # queries filter out, until they are more than threshold of the bucket's codes
+    def delete_ids(self, ids, threshold = 0.1):
+        if self.mapped:
+            raise ValueError("mapped dicts are read-only")
+        self.storage.delete_ids(list(ids))
+        if self.storage.get_dict_status() in [0, 1, 4]:
+            self.storage.compact_deleted(threshold)
+
     def to_VLQ_base64(self):
         if self.storage.get_dict_status() == 0:
             self.storage.to_VLQ_base64_dict()
@@ -319,16 +430,43 @@ class RandomInMemoryStorage(InMemoryStorage):
         self.benchmark_begin('uncompressing binary codes')
         if self.storage.get_dict_status() == 0:
             print "non VLQ base64"
-            binary_codes = self.storage.mget_binary_codes(self.actual_keys(reference_key, level).tolist())
+            binary_codes = self.storage.mget_binary_codes_as_buffer(self.actual_keys(reference_key, level))
         elif self.storage.get_dict_status() == 1:
             print "VLQ base64"
-            binary_codes = self.storage.mget_VLQ_base64_binary_codes(self.actual_keys(reference_key, level).tolist())
+            binary_codes = self.storage.mget_VLQ_base64_binary_codes_as_buffer(self.actual_keys(reference_key, level))
+        elif self.storage.get_dict_status() == 4:
+            print "hybrid"
+            binary_codes = self.storage.mget_hybrid_binary_codes_as_buffer(self.actual_keys(reference_key, level))
         else:
             print "Incorrect dict mode."
         self.benchmark_end('uncompressing binary codes') 
+        print "skipped empty probes: " + str(self.skipped_probes)
+
+        if binary_codes != None:
+            binary_codes = (np.frombuffer(binary_codes[0], dtype = np.uint64), self.ids_from_buffer(binary_codes[1]))
 
         return binary_codes
 
+    # the k nearest binary codes to reference_key in the expanded buckets, by hamming distance.
+    # decoding, distances and top-k selection are fused in fastdict, k = None returns all candidates.
+    # returns (ids, distances) sorted by distance
+    def query_topk(self, reference_key, level, k = None):
+
+        if k is None:
+            k = 2 ** 32 - 1
+
+        results = None
+        self.benchmark_begin('cpu query')
+        if self.storage.get_dict_status() in [0, 1, 4]:
+            (image_ids, distances) = self.storage.query_topk(long(reference_key), self.actual_keys(reference_key, level), k)
+            results = (self.ids_from_buffer(image_ids), np.frombuffer(distances, dtype = np.uint8))
+        else:
+            print "Incorrect dict mode."
+        self.benchmark_end('cpu query')
+        print "skipped empty probes: " + str(self.skipped_probes)
+
+        return results
+
     def show_uncompressed_keys(self, cols_buffer):
         index = 0
         for buffers in cols_buffer:
@@ -353,17 +491,26 @@ class RandomInMemoryStorage(InMemoryStorage):
 
         cols = None
         image_ids = None
+        keys = self.actual_keys(reference_key, level)
 
-        if self.storage.get_dict_status() == 2:
+        # a mapped dict serves the columns of its compressed (0) or VLQ base64 (1) dict directly
+        if self.storage.get_dict_status() == 2 or (self.mapped and self.storage.get_dict_status() == 0):
             print "compressed runtime dict"
-            cols = self.storage.mget_python_cols_as_buffer(self.actual_keys(reference_key, level).tolist())
-            image_ids = self.storage.mget_image_ids(self.actual_keys(reference_key, level).tolist())
-        elif self.storage.get_dict_status() == 3:
+            cols = self.storage.mget_python_cols_as_buffer(keys.tolist())
+            if self.is_renumbered():
+                image_ids = self.internal_ids(keys)
+            else:
+                image_ids = self.ids_from_buffer(self.storage.mget_image_ids_as_buffer(keys))
+        elif self.storage.get_dict_status() == 3 or (self.mapped and self.storage.get_dict_status() == 1):
             print "VLQ base64 compressed runtime dict"
-            cols = self.storage.mget_VLQ_base64_cols_as_buffer(self.actual_keys(reference_key, level).tolist())
-            image_ids = self.storage.mget_VLQ_base64_image_ids(self.actual_keys(reference_key, level).tolist())
+            cols = self.storage.mget_VLQ_base64_cols_as_buffer(keys.tolist())
+            if self.is_renumbered():
+                image_ids = self.internal_ids(keys)
+            else:
+                image_ids = self.storage.mget_VLQ_base64_image_ids(keys.tolist())
 
         self.benchmark_end('load cols')
+        print "skipped empty probes: " + str(self.skipped_probes)
 
         #columns = [0] * len(cols.first)
         
@@ -383,6 +530,34 @@ class RandomInMemoryStorage(InMemoryStorage):
 
         return (cols, image_ids)
 
+    # renumber the image ids of the runtime dict so that the codes of each bucket own a
+    # contiguous range of internal ids, get_compressed_cols then returns internal ids.
+    # original_ids maps them back. filename: save the map there, fastdict then serves it from a
+    # read-only mapping of the file instead of the heap. saving the index keeps the renumbering
+    def renumber_ids(self, filename = None):
+        if self.mapped or self.config['t'] == 'string' or self.storage.get_dict_status() not in [2, 3]:
+            print "Incorrect dict mode."
+            return
+
+        self.storage.renumber_ids()
+        if filename is not None:
+            self.storage.save_original_ids(filename)
+
+    def is_renumbered(self):
+        return not self.mapped and self.storage.is_renumbered()
+
+    # the internal ids of the buckets of keys, expanded from their ranges
+    def internal_ids(self, keys):
+        (starts, counts) = self.storage.mget_image_id_ranges(keys)
+        starts = np.frombuffer(starts, dtype = np.uint64).astype(np.int64)
+        counts = np.frombuffer(counts, dtype = np.uint64).astype(np.int64)
+        offsets = np.cumsum(counts) - counts
+        return np.repeat(starts - offsets, counts) + np.arange(np.sum(counts), dtype = np.int64)
+
+    def original_ids(self, internal_ids):
+        internal_ids = np.ascontiguousarray(internal_ids, dtype = np.uint64)
+        return self.ids_from_buffer(self.storage.original_ids_as_buffer(internal_ids))
+
     def clear(self):
         self.storage.clear()
 